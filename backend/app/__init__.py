@@ -43,6 +43,12 @@ def create_app(config_name=None):
     # ──────────────────────────────────────────────
     CORS(app, origins="*", supports_credentials=True)
 
+    # ──────────────────────────────────────────────
+    # Concurrency runtime (threading / gevent) — before any gRPC client exists
+    # ──────────────────────────────────────────────
+    from app.services.async_runtime import init_async_runtime
+    init_async_runtime(app)
+
     # ──────────────────────────────────────────────
     # Initialize Firebase
     # ──────────────────────────────────────────────
@@ -9,7 +9,9 @@ from app.services.ai_model import (
     generate_trip_plan,
     is_ai_configured,
 )
+from app.services import planner_jobs
 from app.services.planner_errors import (
+    PLANNER_BUSY,
     PLANNER_FORBIDDEN,
     PLANNER_NOT_FOUND,
     PLANNER_VALIDATION_FAILED,
@@ -17,12 +19,11 @@ from app.services.planner_errors import (
 from app.services.planner_orchestrator import (
     cancel_session,
     create_session,
+    discard_session,
     get_session,
     list_sessions,
-    run_session,
 )
 from app.services.planner_schemas import validate_create_session_payload
-from app.services.socket_service import get_socketio
 from app.utils.auth import require_auth, require_role
 from app.utils.responses import success_response, error_response
 
@@ -83,6 +84,16 @@ def ai_plan_trip():
     return success_response(plan)
 
 
+def _refused_response(refused, retry_after):
+    if refused == PLANNER_BUSY:
+        body, status = error_response(refused, "Planner is busy. Please retry shortly.", 503)
+    else:
+        body, status = error_response(
+            refused, "You already have planner sessions in progress. Please wait for one to finish.", 429
+        )
+    return body, status, {"Retry-After": str(retry_after)}
+
+
 @ai_bp.route("/planner/sessions", methods=["POST"])
 @require_auth
 @require_role("TRAVELER")
@@ -94,9 +105,17 @@ def create_planner_session():
         return error_response(PLANNER_VALIDATION_FAILED, validation_error, 400)
 
     traveler_uid = g.current_user["uid"]
+    # Early check, so a shed request never creates a session.
+    refused, retry_after = planner_jobs.admission_error(traveler_uid)
+    if refused:
+        return _refused_response(refused, retry_after)
+
     session = create_session(traveler_uid, normalized)
-    socketio = get_socketio()
-    socketio.start_background_task(run_session, session["id"])
+    # The atomic check: concurrent requests may all have passed the early one.
+    position, refused, retry_after = planner_jobs.enqueue(session["id"], traveler_uid)
+    if refused:
+        discard_session(session["id"])
+        return _refused_response(refused, retry_after)
 
     return success_response(
         {
@@ -104,12 +123,21 @@ def create_planner_session():
             "status": session["status"],
             "input": session["input"],
             "created_at": session["created_at"],
+            "queue_position": position,
         },
         201,
-        "Planner session started.",
+        "Planner session queued.",
     )
 
 
+@ai_bp.route("/planner/queue", methods=["GET"])
+@require_auth
+@require_role("PLATFORM_ADMIN")
+def planner_queue_stats():
+    """Planner worker pool and queue depth for this process."""
+    return success_response(planner_jobs.stats())
+
+
 @ai_bp.route("/planner/sessions", methods=["GET"])
 @require_auth
 @require_role("TRAVELER")
@@ -3,9 +3,9 @@ Events Blueprint — Server-Sent Events (SSE) stream for real-time admin alerts.
 """
 
 import json
-from flask import Blueprint, Response, g
+from flask import Blueprint, Response, current_app, g
 from app.utils.auth import require_auth
-from app.services.redis_service import subscribe_channel
+from app.services.redis_service import subscribe_fanout
 
 events_bp = Blueprint("events", __name__, url_prefix="/api/events")
 
@@ -15,23 +15,30 @@ events_bp = Blueprint("events", __name__, url_prefix="/api/events")
 def sse_stream():
     """
     SSE endpoint — admin clients connect here to receive live alerts.
-    Subscribes to the Redis 'disruptions' pub/sub channel and pushes
-    events down the stream as they arrive.
+    Shares one Redis subscription to the 'disruptions' channel per worker
+    and pushes events down the stream as they arrive, with keepalive
+    comments so dead clients are detected and their slot released.
     """
+    keepalive_seconds = current_app.config.get("SSE_KEEPALIVE_SECONDS", 15)
+
     def generate():
-        pubsub = subscribe_channel("disruptions")
+        subscription = subscribe_fanout("disruptions")
 
-        if pubsub is None:
+        if subscription is None:
             # Redis unavailable — send heartbeat only
             yield "data: {\"event_type\": \"CONNECTED\", \"message\": \"SSE connected (no Redis)\"}\n\n"
             return
 
-        yield "data: {\"event_type\": \"CONNECTED\", \"message\": \"SSE stream connected\"}\n\n"
-
-        for message in pubsub.listen():
-            if message["type"] == "message":
-                data = message["data"]
+        try:
+            yield "data: {\"event_type\": \"CONNECTED\", \"message\": \"SSE stream connected\"}\n\n"
+            while True:
+                data = subscription.get(timeout=keepalive_seconds)
+                if data is None:
+                    yield ": keepalive\n\n"
+                    continue
                 yield f"data: {data}\n\n"
+        finally:
+            subscription.close()
 
     return Response(
         generate(),
@@ -4,18 +4,19 @@ Rides Blueprint - REST APIs for traveler/driver ride lifecycle.
 
 from flask import Blueprint, g, request
 
+from app.services import driver_ratings as rating_aggregates
+from app.services import ride_dispatch, ride_location, ride_trace
 from app.services.firebase_service import get_firestore_client
-from app.services.geocode_service import forward_geocode, reverse_geocode, suggest_addresses
-from app.services.socket_service import end_ride_by_traveler, get_socketio
+from app.services.geocode_service import forward_geocode, geocode_stats, locate, suggest_addresses
+from app.services.socket_service import end_ride_by_traveler, get_socketio, ingest_driver_locations
 from app.utils.auth import require_auth, require_role
-from app.utils.responses import error_response, success_response
+from app.utils.responses import error_response, paginated_response, success_response
 from app.utils.rides import (
-    RIDE_STATUS_COMPLETED,
+    RIDE_STATUS_EXPIRED,
     add_ride_event,
     is_cab_driver_user,
     normalize_city_key,
     serialize_doc,
-    utcnow_iso,
 )
 
 rides_bp = Blueprint("rides", __name__, url_prefix="/api/rides")
@@ -48,103 +49,140 @@ def _get_ride_or_404(ride_id):
     return doc, None
 
 
-@rides_bp.route("/traveler", methods=["GET"])
-@require_auth
-@require_role("TRAVELER")
-def traveler_rides():
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def _ride_history_page(field, uid):
+    """
+    One page of a user's rides, newest first. ``?cursor=`` is the id of the
+    last ride of the previous page. EXPIRED rides are skipped here (and
+    deleted by the background sweeper); the scan continues until the page is
+    full or the history is exhausted, so a short page means no more rides.
+    Returns (rides, next_cursor, page_size, error_response).
+    """
+    try:
+        page_size = int(request.args.get("page_size", HISTORY_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return None, None, None, error_response("INVALID_PAGE_SIZE", "page_size must be an integer.", 400)
+    page_size = min(max(page_size, 1), HISTORY_MAX_PAGE_SIZE)
+
     db = get_firestore_client()
-    uid = g.current_user["uid"]
+    query = db.collection("rides").where(field, "==", uid).order_by("created_at", direction="DESCENDING")
+    last_doc = None
+    cursor = str(request.args.get("cursor") or "").strip()
+    if cursor:
+        cursor_doc = db.collection("rides").document(cursor).get()
+        if not cursor_doc.exists or (cursor_doc.to_dict() or {}).get(field) != uid:
+            return None, None, None, error_response("INVALID_CURSOR", "cursor does not match a ride in this history.", 400)
+        last_doc = cursor_doc
 
     rides = []
-    query = db.collection("rides").where("traveler_uid", "==", uid)
-    for doc in query.stream():
-        ride_data = serialize_doc(doc)
-        if ride_data.get("status") == "EXPIRED":
-            db.collection("rides").document(doc.id).delete()
-        else:
-            rides.append(ride_data)
+    exhausted = False
+    while len(rides) < page_size and not exhausted:
+        batch_query = query.limit(page_size)
+        if last_doc is not None:
+            batch_query = batch_query.start_after(last_doc)
+        docs = list(batch_query.stream())
+        exhausted = len(docs) < page_size
+        for index, doc in enumerate(docs):
+            last_doc = doc
+            ride = serialize_doc(doc)
+            if ride.get("status") != RIDE_STATUS_EXPIRED:
+                rides.append(ride)
+            if len(rides) == page_size:
+                # Rides left in this batch belong to the next page.
+                exhausted = exhausted and index == len(docs) - 1
+                break
+    next_cursor = last_doc.id if last_doc is not None and not exhausted else None
+    return rides, next_cursor, page_size, None
 
-    rides.sort(key=lambda r: r.get("created_at", ""), reverse=True)
-    return success_response(rides)
+
+@rides_bp.route("/traveler", methods=["GET"])
+@require_auth
+@require_role("TRAVELER")
+def traveler_rides():
+    rides, next_cursor, page_size, err = _ride_history_page("traveler_uid", g.current_user["uid"])
+    if err:
+        return err
+    return paginated_response(rides, next_cursor, page_size)
 
 
 @rides_bp.route("/driver", methods=["GET"])
 @require_auth
 @require_role("BUSINESS")
 def driver_rides():
-    db = get_firestore_client()
     uid = g.current_user["uid"]
     if _require_cab_driver(uid) is None:
         return error_response("FORBIDDEN", "Only CAB_DRIVER business users can access driver rides.", 403)
 
-    rides = []
-    query = db.collection("rides").where("driver_uid", "==", uid)
-    for doc in query.stream():
-        ride_data = serialize_doc(doc)
-        if ride_data.get("status") == "EXPIRED":
-            db.collection("rides").document(doc.id).delete()
-        else:
-            rides.append(_sanitize_ride_for_driver(ride_data))
+    rides, next_cursor, page_size, err = _ride_history_page("driver_uid", uid)
+    if err:
+        return err
+    return paginated_response([_sanitize_ride_for_driver(ride) for ride in rides], next_cursor, page_size)
 
-    rides.sort(key=lambda r: r.get("created_at", ""), reverse=True)
-    return success_response(rides)
+
+@rides_bp.route("/driver/locations", methods=["POST"])
+@require_auth
+@require_role("BUSINESS")
+def upload_driver_locations():
+    """Background upload of buffered GPS points: {"ride_id"?, "points": [{lat, lng, ts}, ...]}."""
+    uid = g.current_user["uid"]
+    if _require_cab_driver(uid) is None:
+        return error_response("FORBIDDEN", "Only CAB_DRIVER business users can send location.", 403)
+
+    data = request.get_json() or {}
+    if not isinstance(data.get("points"), list):
+        return error_response("INVALID_BODY", "points must be a list of {lat, lng, ts}.", 400)
+    ack, error_code, message = ingest_driver_locations(uid, data)
+    if error_code:
+        if error_code == "NOT_FOUND":
+            return error_response("NOT_FOUND", message, 404)
+        if error_code == "FORBIDDEN":
+            return error_response("FORBIDDEN", message, 403)
+        return error_response(error_code, message, 400)
+    return success_response(ack)
 
 
 @rides_bp.route("/driver/ratings", methods=["GET"])
 @require_auth
 @require_role("BUSINESS")
 def driver_ratings():
-    db = get_firestore_client()
     uid = g.current_user["uid"]
     if _require_cab_driver(uid) is None:
         return error_response("FORBIDDEN", "Only CAB_DRIVER business users can access driver ratings.", 403)
 
-    ratings = []
-    total_rides = 0
-    rated_count = 0
-    stars_sum = 0
-    text_feedback_count = 0
-
-    query = db.collection("rides").where("driver_uid", "==", uid)
-    for doc in query.stream():
-        total_rides += 1
-        ride = doc.to_dict() or {}
-        rating = ride.get("rating") or {}
-        stars = rating.get("stars")
-        message = str(rating.get("message") or "").strip()
-        has_stars = isinstance(stars, int) and 1 <= stars <= 5
-        has_message = bool(message)
-
-        if has_stars:
-            rated_count += 1
-            stars_sum += stars
-        if has_message:
-            text_feedback_count += 1
-
-        if not has_stars and not has_message:
-            continue
-
-        ratings.append(
-            {
-                "ride_id": doc.id,
-                "stars": stars if has_stars else None,
-                "message": message or None,
-                "traveler_name": ride.get("traveler_name"),
-                "source": (ride.get("source") or {}).get("address"),
-                "destination": (ride.get("destination") or {}).get("address"),
-                "completed_at": ride.get("completed_at"),
-                "updated_at": rating.get("updated_at") or ride.get("updated_at") or ride.get("created_at"),
-            }
-        )
+    stats = rating_aggregates.get_stats(uid)
+    return success_response({"summary": rating_aggregates.summarize(stats), "ratings": stats.get("recent") or []})
+
+
+@rides_bp.route("/dispatch/stats", methods=["GET"])
+@require_auth
+@require_role("PLATFORM_ADMIN")
+def get_dispatch_stats():
+    """Wave dispatch counters and acceptance latency for this worker."""
+    return success_response(ride_dispatch.dispatch_stats())
+
 
-    ratings.sort(key=lambda r: r.get("updated_at", ""), reverse=True)
-    summary = {
-        "total_rides": total_rides,
-        "rated_rides": rated_count,
-        "text_feedback_count": text_feedback_count,
-        "average_stars": round((stars_sum / rated_count), 2) if rated_count else None,
-    }
-    return success_response({"summary": summary, "ratings": ratings})
+@rides_bp.route("/geocode/stats", methods=["GET"])
+@require_auth
+@require_role("PLATFORM_ADMIN")
+def get_geocode_stats():
+    """Per-provider geocoding call outcomes and latency for this worker."""
+    return success_response(geocode_stats())
+
+
+def _ride_access_error(ride, uid, role):
+    if role == "TRAVELER" and ride.get("traveler_uid") != uid:
+        return error_response("FORBIDDEN", "You do not have access to this ride.", 403)
+    if role == "BUSINESS":
+        if _require_cab_driver(uid) is None:
+            return error_response("FORBIDDEN", "Only CAB_DRIVER business users can access rides.", 403)
+        if ride.get("driver_uid") != uid:
+            return error_response("FORBIDDEN", "You do not have access to this ride.", 403)
+    if role not in {"TRAVELER", "BUSINESS", "PLATFORM_ADMIN"}:
+        return error_response("FORBIDDEN", "You do not have access to this ride.", 403)
+    return None
 
 
 @rides_bp.route("/<ride_id>", methods=["GET"])
@@ -157,19 +195,31 @@ def get_ride(ride_id):
         return err
 
     ride = doc.to_dict()
-    if role == "TRAVELER" and ride.get("traveler_uid") != uid:
-        return error_response("FORBIDDEN", "You do not have access to this ride.", 403)
+    access_error = _ride_access_error(ride, uid, role)
+    if access_error:
+        return access_error
     if role == "BUSINESS":
-        if _require_cab_driver(uid) is None:
-            return error_response("FORBIDDEN", "Only CAB_DRIVER business users can access rides.", 403)
-        if ride.get("driver_uid") != uid:
-            return error_response("FORBIDDEN", "You do not have access to this ride.", 403)
         ride = _sanitize_ride_for_driver(ride)
-    if role not in {"TRAVELER", "BUSINESS", "PLATFORM_ADMIN"}:
-        return error_response("FORBIDDEN", "You do not have access to this ride.", 403)
 
     ride["id"] = doc.id
-    return success_response(ride)
+    return success_response(ride_location.overlay(ride))
+
+
+@rides_bp.route("/<ride_id>/trace", methods=["GET"])
+@require_auth
+def get_ride_trace(ride_id):
+    """Decoded driver route for a ride: points [{lat, lng, ts}], encoded polyline, distance."""
+    doc, err = _get_ride_or_404(ride_id)
+    if err:
+        return err
+    access_error = _ride_access_error(doc.to_dict(), g.current_user["uid"], g.current_user["role"])
+    if access_error:
+        return access_error
+
+    trace = ride_trace.get_trace(ride_id)
+    if trace is None:
+        return error_response("NOT_FOUND", "No route trace recorded for this ride.", 404)
+    return success_response(trace)
 
 
 @rides_bp.route("/geocode", methods=["POST"])
@@ -197,18 +247,14 @@ def geocode_location():
 
     source_resolved = None
     if isinstance(source, dict) and source.get("lat") is not None and source.get("lng") is not None:
-        source_resolved = reverse_geocode(source.get("lat"), source.get("lng"))
-        if source_resolved and source.get("address"):
-            source_resolved["address"] = source.get("address")
+        source_resolved = locate(source.get("lat"), source.get("lng"), address=source.get("address"))
     elif source.get("address"):
         source_resolved = forward_geocode(source.get("address"), city_hint=user_city_hint)
 
     destination_resolved = None
     destination_city_hint = (source_resolved or {}).get("city") or user_city_hint
     if isinstance(destination, dict) and destination.get("lat") is not None and destination.get("lng") is not None:
-        destination_resolved = reverse_geocode(destination.get("lat"), destination.get("lng"))
-        if destination_resolved and destination.get("address"):
-            destination_resolved["address"] = destination.get("address")
+        destination_resolved = locate(destination.get("lat"), destination.get("lng"), address=destination.get("address"))
     elif destination.get("address"):
         destination_resolved = forward_geocode(destination.get("address"), city_hint=destination_city_hint)
 
@@ -286,17 +332,6 @@ def rate_driver(ride_id):
     message = str(data.get("message") or "").strip()
     uid = g.current_user["uid"]
 
-    db = get_firestore_client()
-    doc, err = _get_ride_or_404(ride_id)
-    if err:
-        return err
-
-    ride = doc.to_dict()
-    if ride.get("traveler_uid") != uid:
-        return error_response("FORBIDDEN", "Only ride traveler can submit rating.", 403)
-    if ride.get("status") != RIDE_STATUS_COMPLETED:
-        return error_response("INVALID_STATE", "Rating can only be submitted after ride completion.", 400)
-
     normalized_stars = None
     if stars is not None:
         try:
@@ -306,45 +341,22 @@ def rate_driver(ride_id):
         if normalized_stars < 1 or normalized_stars > 5:
             return error_response("INVALID_RATING", "stars must be between 1 and 5.", 400)
 
-    rating_payload = {}
-    if normalized_stars is not None:
-        rating_payload["stars"] = normalized_stars
-    if message:
-        rating_payload["message"] = message
-    rating_payload["updated_at"] = utcnow_iso()
+    try:
+        rating_payload = rating_aggregates.submit_rating(ride_id, uid, stars=normalized_stars, message=message)
+    except ValueError as e:
+        error_code = str(e)
+        if error_code == "NOT_FOUND":
+            return error_response("NOT_FOUND", "Ride not found.", 404)
+        if error_code == "FORBIDDEN":
+            return error_response("FORBIDDEN", "Only ride traveler can submit rating.", 403)
+        return error_response("INVALID_STATE", "Rating can only be submitted after ride completion.", 400)
 
-    db.collection("rides").document(ride_id).set({"rating": rating_payload, "updated_at": utcnow_iso()}, merge=True)
+    db = get_firestore_client()
     add_ride_event(db, ride_id, "RIDE_RATED", uid, rating_payload)
-
-    driver_uid = ride.get("driver_uid")
-    if normalized_stars is not None and driver_uid:
-        driver_ref = db.collection("users").document(driver_uid)
-        driver_doc = driver_ref.get()
-        if driver_doc.exists:
-            driver_data = driver_doc.to_dict()
-            details = ((driver_data.get("business_profile") or {}).get("details") or {})
-            count = int(details.get("cab_rating_count", 0))
-            avg = float(details.get("cab_rating_avg", 0))
-            new_count = count + 1
-            new_avg = ((avg * count) + normalized_stars) / new_count
-            driver_ref.set(
-                {
-                    "business_profile": {
-                        **(driver_data.get("business_profile") or {}),
-                        "details": {
-                            **details,
-                            "cab_rating_count": new_count,
-                            "cab_rating_avg": round(new_avg, 2),
-                        },
-                    },
-                    "updated_at": utcnow_iso(),
-                },
-                merge=True,
-            )
-
     updated = db.collection("rides").document(ride_id).get().to_dict()
     updated["id"] = ride_id
 
+    driver_uid = updated.get("driver_uid")
     if driver_uid:
         socketio = get_socketio()
         socketio.emit(
@@ -355,7 +367,7 @@ def rate_driver(ride_id):
                     "stars": normalized_stars,
                     "message": message or None,
                 },
-                "traveler_name": ride.get("traveler_name"),
+                "traveler_name": updated.get("traveler_name"),
             },
             room=f"user:{driver_uid}",
             namespace="/rides",
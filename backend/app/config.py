@@ -31,6 +31,81 @@ class Config:
     HF_EMBED_MODEL = os.getenv("HF_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     RAG_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
     RAG_SCORE_THRESHOLD = float(os.getenv("RAG_SCORE_THRESHOLD", "0.45"))
+    # threading | gevent (see gunicorn.conf.py); gevent holds 10k+ sockets per worker.
+    SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+    SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+    # Socket.IO scale-out: "auto" uses REDIS_URL as the message queue when Redis is up.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "auto")
+    SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "tripallied-socketio")
+    # "websocket" alone needs no sticky sessions; polling requires them across workers.
+    SOCKETIO_TRANSPORTS = os.getenv("SOCKETIO_TRANSPORTS", "polling,websocket")
+    SOCKETIO_STICKY_COOKIE = os.getenv("SOCKETIO_STICKY_COOKIE")
+    # Read by gunicorn.conf.py; here only to warn when polling spans workers without affinity.
+    GUNICORN_WORKERS = int(os.getenv("GUNICORN_WORKERS", "1"))
+    SOCKETIO_REGISTRY_TTL = int(os.getenv("SOCKETIO_REGISTRY_TTL", "90"))
+    # Live driver presence (Redis GEO); Firestore driver_presence docs are periodic snapshots.
+    DRIVER_PRESENCE_TTL_SECONDS = float(os.getenv("DRIVER_PRESENCE_TTL_SECONDS", "90"))
+    DRIVER_PRESENCE_SNAPSHOT_SECONDS = float(os.getenv("DRIVER_PRESENCE_SNAPSHOT_SECONDS", "60"))
+    # Travelers' rides:online_count pushes are coalesced per city over this window.
+    ONLINE_COUNT_DEBOUNCE_SECONDS = float(os.getenv("ONLINE_COUNT_DEBOUNCE_SECONDS", "2"))
+    DISPATCH_RADIUS_KM = float(os.getenv("DISPATCH_RADIUS_KM", "15"))
+    DISPATCH_MAX_DRIVERS = int(os.getenv("DISPATCH_MAX_DRIVERS", "50"))
+    # Ride offers go out in waves of the nearest drivers by ETA; the last size repeats.
+    DISPATCH_WAVE_SIZES = os.getenv("DISPATCH_WAVE_SIZES", "5,10,20")
+    DISPATCH_WAVE_TIMEOUT_SECONDS = float(os.getenv("DISPATCH_WAVE_TIMEOUT_SECONDS", "10"))
+    # Request/quote expiries live in a Redis sorted set; each worker polls it this often.
+    RIDE_TIMER_POLL_SECONDS = float(os.getenv("RIDE_TIMER_POLL_SECONDS", "1"))
+    # Threads running due timer handlers, so a slow one does not delay the rest.
+    RIDE_TIMER_WORKERS = int(os.getenv("RIDE_TIMER_WORKERS", "4"))
+    # Driver GPS pings on a ride are buffered and written to Firestore at most this often.
+    RIDE_LOCATION_FLUSH_SECONDS = float(os.getenv("RIDE_LOCATION_FLUSH_SECONDS", "15"))
+    # Most points kept from one batched location upload (oldest are dropped).
+    DRIVER_LOCATION_BATCH_MAX = int(os.getenv("DRIVER_LOCATION_BATCH_MAX", "500"))
+    # Points recorded longer ago than this are dropped; future timestamps are clamped to server time.
+    DRIVER_LOCATION_MAX_AGE_SECONDS = float(os.getenv("DRIVER_LOCATION_MAX_AGE_SECONDS", "3600"))
+    # Route trace points per encoded chunk appended to ride_traces/{ride_id}.
+    RIDE_TRACE_CHUNK_POINTS = int(os.getenv("RIDE_TRACE_CHUNK_POINTS", "120"))
+    # EXPIRED rides are deleted in the background once they are this old.
+    RIDE_EXPIRY_SWEEP_SECONDS = float(os.getenv("RIDE_EXPIRY_SWEEP_SECONDS", "60"))
+    RIDE_EXPIRED_RETENTION_SECONDS = float(os.getenv("RIDE_EXPIRED_RETENTION_SECONDS", "300"))
+    # Geocoding cache: per-worker LRU in front of Redis. Reverse lookups are keyed
+    # by coordinates rounded to GEOCODE_REVERSE_PRECISION decimals (4 ~ 11 m).
+    GEOCODE_CACHE_TTL_SECONDS = float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", "604800"))
+    GEOCODE_NEGATIVE_TTL_SECONDS = float(os.getenv("GEOCODE_NEGATIVE_TTL_SECONDS", "600"))
+    GEOCODE_CACHE_LOCAL_SIZE = int(os.getenv("GEOCODE_CACHE_LOCAL_SIZE", "2048"))
+    GEOCODE_REVERSE_PRECISION = int(os.getenv("GEOCODE_REVERSE_PRECISION", "4"))
+    # Photon candidates run concurrently, Nominatim ones in order; the whole lookup gives up after this.
+    GEOCODE_DEADLINE_SECONDS = float(os.getenv("GEOCODE_DEADLINE_SECONDS", "4"))
+    GEOCODE_FANOUT_WORKERS = int(os.getenv("GEOCODE_FANOUT_WORKERS", "8"))
+    # Nominatim usage policy: at most one request per second (per process).
+    NOMINATIM_MIN_INTERVAL_SECONDS = float(os.getenv("NOMINATIM_MIN_INTERVAL_SECONDS", "1"))
+    # Planner sessions run on a fixed worker pool per process behind a Redis queue.
+    PLANNER_WORKERS = int(os.getenv("PLANNER_WORKERS", "4"))
+    PLANNER_QUEUE_MAX = int(os.getenv("PLANNER_QUEUE_MAX", "100"))
+    PLANNER_MAX_ACTIVE_PER_USER = int(os.getenv("PLANNER_MAX_ACTIVE_PER_USER", "2"))
+    PLANNER_JOB_MAX_SECONDS = float(os.getenv("PLANNER_JOB_MAX_SECONDS", "900"))
+    # Streamed planner chunks are persisted/emitted in batches of this size or age.
+    PLANNER_TOKEN_FLUSH_BYTES = int(os.getenv("PLANNER_TOKEN_FLUSH_BYTES", "2048"))
+    PLANNER_TOKEN_FLUSH_MS = float(os.getenv("PLANNER_TOKEN_FLUSH_MS", "250"))
+    # Threads shared by planner stages that run concurrently (RAG retrieval, transport lookup).
+    PLANNER_STAGE_WORKERS = int(os.getenv("PLANNER_STAGE_WORKERS", "8"))
+    # Finished plans are reused for identical (and, with embeddings, near-identical) requests.
+    PLANNER_CACHE_ENABLED = os.getenv("PLANNER_CACHE_ENABLED", "true").lower() == "true"
+    PLANNER_CACHE_SEMANTIC = os.getenv("PLANNER_CACHE_SEMANTIC", "true").lower() == "true"
+    PLANNER_CACHE_TTL_SECONDS = int(os.getenv("PLANNER_CACHE_TTL_SECONDS", "21600"))
+    PLANNER_CACHE_SIMILARITY = float(os.getenv("PLANNER_CACHE_SIMILARITY", "0.92"))
+    # Known city pairs get offline matrix estimates; set true to ask the model for every route.
+    TRANSPORT_MODEL_ESTIMATES = os.getenv("TRANSPORT_MODEL_ESTIMATES", "false").lower() == "true"
+    # Model transport estimates are cached per route (city pair, month, modes, travelers bucket).
+    TRANSPORT_CACHE_TTL_SECONDS = int(os.getenv("TRANSPORT_CACHE_TTL_SECONDS", "86400"))
+    TRANSPORT_FILL_WAIT_SECONDS = float(os.getenv("TRANSPORT_FILL_WAIT_SECONDS", "30"))
+    TRANSPORT_PREWARM_TOP_N = int(os.getenv("TRANSPORT_PREWARM_TOP_N", "20"))
+    TRANSPORT_PREWARM_INTERVAL_SECONDS = float(os.getenv("TRANSPORT_PREWARM_INTERVAL_SECONDS", "21600"))
+    # Planner socket events are kept per session so late or reconnecting clients can replay them.
+    PLANNER_REPLAY_RING_SIZE = int(os.getenv("PLANNER_REPLAY_RING_SIZE", "1000"))
+    PLANNER_REPLAY_TTL_SECONDS = int(os.getenv("PLANNER_REPLAY_TTL_SECONDS", "3600"))
+    # Compiled, memory-mapped offline gazetteer (defaults to the system temp dir).
+    GAZETTEER_CACHE_DIR = os.getenv("GAZETTEER_CACHE_DIR")
 
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,66 @@
+"""
+Concurrency runtime selection for Socket.IO and SSE.
+
+SOCKETIO_ASYNC_MODE=threading (default) pins one OS thread per socket/SSE
+stream. SOCKETIO_ASYNC_MODE=gevent runs them as greenlets so a single worker
+can hold 10k+ connections; it requires the stdlib to be monkey-patched before
+the app is imported (``run.py`` does this, and gunicorn's gevent worker does it
+itself, see ``gunicorn.conf.py``).
+
+Firestore talks gRPC, which is made cooperative here; Redis and ``requests``
+become cooperative through the patched socket module. eventlet is not offered
+because gRPC has no eventlet integration.
+"""
+
+import os
+
+SUPPORTED_ASYNC_MODES = ("threading", "gevent")
+
+_grpc_initialized = False
+
+
+def configured_async_mode(config=None):
+    mode = str((config or {}).get("SOCKETIO_ASYNC_MODE") or os.getenv("SOCKETIO_ASYNC_MODE") or "threading")
+    mode = mode.strip().lower()
+    return mode if mode in SUPPORTED_ASYNC_MODES else "threading"
+
+
+def is_stdlib_patched(mode):
+    if mode != "gevent":
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def init_async_runtime(app):
+    """
+    Resolve the Socket.IO async mode and prepare blocking clients for it.
+
+    Falls back to ``threading`` when gevent is configured but the stdlib was
+    not patched, since mixing real threads with an unpatched hub deadlocks.
+    """
+    global _grpc_initialized
+
+    mode = configured_async_mode(app.config)
+    if mode != "threading" and not is_stdlib_patched(mode):
+        app.logger.warning(
+            "SOCKETIO_ASYNC_MODE=%s but the stdlib is not monkey-patched; falling back to threading. "
+            "Start via run.py or gunicorn -c gunicorn.conf.py.",
+            mode,
+        )
+        mode = "threading"
+
+    if mode == "gevent" and not _grpc_initialized:
+        try:
+            from grpc.experimental import gevent as grpc_gevent
+
+            grpc_gevent.init_gevent()
+            _grpc_initialized = True
+        except Exception:
+            app.logger.warning("Could not make gRPC gevent-cooperative; Firestore calls will block the hub.", exc_info=True)
+
+    app.config["SOCKETIO_ASYNC_MODE"] = mode
+    return mode
@@ -0,0 +1,448 @@
+"""
+Live driver presence index for dispatch.
+
+Redis holds the hot state:
+  presence:driver:{uid}   JSON record (city, location, socket, last seen)
+  presence:geo:{city_key} GEO set of online drivers' positions
+  presence:seen:{city_key} sorted set uid -> last-seen epoch (staleness)
+  presence:cities         set of city keys with online drivers (for sweeps)
+  presence:counts         hash city_key -> online drivers, moved by HINCRBY
+                          only when ZADD/ZREM on the seen set reports a real
+                          transition (reconciled against ZCARD on each sweep)
+
+A driver whose last ping is older than DRIVER_PRESENCE_TTL_SECONDS is treated
+as offline and removed by ``sweep_stale``. Each city is swept in a WATCH/MULTI
+transaction on its seen set, and pings write their GEO, seen and cities
+updates in one MULTI. A ping that lands mid-sweep therefore aborts that
+city's pass, so the sweep never removes a driver who has just pinged, and
+never drops the city from ``presence:cities``. Firestore ``driver_presence`` docs
+are only snapshots: written on online/offline transitions and at most every
+DRIVER_PRESENCE_SNAPSHOT_SECONDS per driver otherwise.
+
+Falls back to process-local dicts when Redis is unavailable, which is exact
+for a single worker.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from redis.exceptions import WatchError
+
+from app.services.firebase_service import get_firestore_client
+from app.services.redis_service import get_redis_client
+from app.utils.rides import nearest_k, utcnow_iso
+
+logger = logging.getLogger(__name__)
+
+CITIES_KEY = "presence:cities"
+COUNTS_KEY = "presence:counts"
+
+_SWEEP_ATTEMPTS = 3
+
+_lock = threading.Lock()
+# Fallback state: {uid: record}
+_local_records = {}
+# {uid: monotonic time of last Firestore snapshot}
+_last_snapshot = {}
+_sweeper_started = False
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def presence_ttl_seconds():
+    return _to_float(os.getenv("DRIVER_PRESENCE_TTL_SECONDS", "90"), 90.0)
+
+
+def snapshot_interval_seconds():
+    return _to_float(os.getenv("DRIVER_PRESENCE_SNAPSHOT_SECONDS", "60"), 60.0)
+
+
+def _record_key(uid):
+    return f"presence:driver:{uid}"
+
+
+def _geo_key(city_key):
+    return f"presence:geo:{city_key}"
+
+
+def _seen_key(city_key):
+    return f"presence:seen:{city_key}"
+
+
+def is_live(record, now=None):
+    """True when *record* is online and pinged within the TTL."""
+    if not record or not record.get("online"):
+        return False
+    now = time.time() if now is None else now
+    return now - float(record.get("last_seen_ts") or 0) <= presence_ttl_seconds()
+
+
+def _public(record, uid=None):
+    """Shape a record like ``serialize_doc(driver_presence doc)`` for callers."""
+    if not record:
+        return None
+    data = {key: value for key, value in record.items() if key != "last_seen_ts"}
+    data["id"] = uid or record.get("driver_uid")
+    return data
+
+
+# ──────────────────────────────────────────────
+# Firestore snapshots
+# ──────────────────────────────────────────────
+
+def _snapshot(record, force=False):
+    uid = record.get("driver_uid")
+    if not uid:
+        return
+    now = time.monotonic()
+    with _lock:
+        last = _last_snapshot.get(uid)
+        if not force and last is not None and now - last < snapshot_interval_seconds():
+            return
+        _last_snapshot[uid] = now
+    try:
+        payload = {key: value for key, value in record.items() if key != "last_seen_ts"}
+        get_firestore_client().collection("driver_presence").document(uid).set(payload, merge=True)
+    except Exception:
+        logger.warning("Driver presence snapshot failed for %s.", uid, exc_info=True)
+
+
+# ──────────────────────────────────────────────
+# Reads
+# ──────────────────────────────────────────────
+
+def get_presence(uid):
+    """Current record for *uid* (online or not), or None."""
+    if not uid:
+        return None
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.get(_record_key(uid))
+            return json.loads(raw) if raw else None
+        except Exception:
+            logger.warning("Presence read failed; using local index.", exc_info=True)
+    with _lock:
+        record = _local_records.get(uid)
+        return dict(record) if record else None
+
+
+def is_online(uid):
+    return is_live(get_presence(uid))
+
+
+def _live_uids(client, city_key, cutoff):
+    return client.zrangebyscore(_seen_key(city_key), cutoff, "+inf")
+
+
+def online_drivers(city_key):
+    """All live drivers in a city, shaped like serialized ``driver_presence`` docs."""
+    if not city_key:
+        return []
+    client = get_redis_client()
+    if client is not None:
+        try:
+            uids = _live_uids(client, city_key, time.time() - presence_ttl_seconds())
+            if not uids:
+                return []
+            raws = client.mget([_record_key(uid) for uid in uids])
+            records = [(uid, json.loads(raw)) for uid, raw in zip(uids, raws) if raw]
+            return [_public(record, uid) for uid, record in records if record.get("city_key") == city_key]
+        except Exception:
+            logger.warning("Presence city read failed; using local index.", exc_info=True)
+    now = time.time()
+    with _lock:
+        return [
+            _public(record, uid)
+            for uid, record in _local_records.items()
+            if record.get("city_key") == city_key and is_live(record, now)
+        ]
+
+
+def count_online(city_key):
+    """Online drivers in a city: an O(1) counter read with Redis, a scan otherwise."""
+    if not city_key:
+        return 0
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.hget(COUNTS_KEY, city_key)
+            if raw is not None:
+                return max(int(raw), 0)
+            return int(client.zcount(_seen_key(city_key), time.time() - presence_ttl_seconds(), "+inf"))
+        except Exception:
+            logger.warning("Presence count failed; using local index.", exc_info=True)
+    return len(online_drivers(city_key))
+
+
+def nearest_drivers(city_key, lat, lng, radius_km=15.0, limit=50):
+    """
+    Live drivers in *city_key* within *radius_km* of (lat, lng), nearest first.
+    Each entry carries ``distance_km``.
+    """
+    if not city_key or lat is None or lng is None:
+        return []
+    limit = max(int(limit or 0), 1)
+    client = get_redis_client()
+    if client is not None:
+        try:
+            hits = client.geosearch(
+                _geo_key(city_key),
+                longitude=float(lng),
+                latitude=float(lat),
+                radius=float(radius_km),
+                unit="km",
+                sort="ASC",
+                count=limit,
+                withdist=True,
+            )
+            if not hits:
+                return []
+            uids = [uid for uid, _ in hits]
+            raws = client.mget([_record_key(uid) for uid in uids])
+            now = time.time()
+            drivers = []
+            for (uid, distance), raw in zip(hits, raws):
+                record = json.loads(raw) if raw else None
+                if not is_live(record, now) or record.get("city_key") != city_key:
+                    continue
+                entry = _public(record, uid)
+                entry["distance_km"] = round(float(distance), 3)
+                drivers.append(entry)
+            return drivers
+        except Exception:
+            logger.warning("Presence geo search failed; using local index.", exc_info=True)
+
+    now = time.time()
+    with _lock:
+        candidates = [
+            (uid, dict(record))
+            for uid, record in _local_records.items()
+            if record.get("city_key") == city_key and record.get("location") and is_live(record, now)
+        ]
+    if not candidates:
+        return []
+    lats = [record["location"]["lat"] for _, record in candidates]
+    lngs = [record["location"]["lng"] for _, record in candidates]
+    order, distances = nearest_k(lat, lng, lats, lngs, limit)
+    drivers = []
+    for index, distance in zip(order, distances):
+        if distance > radius_km:
+            break
+        uid, record = candidates[index]
+        entry = _public(record, uid)
+        entry["distance_km"] = round(float(distance), 3)
+        drivers.append(entry)
+    return drivers
+
+
+# ──────────────────────────────────────────────
+# Writes
+# ──────────────────────────────────────────────
+
+def _apply_count_deltas(client, deltas):
+    deltas = {city_key: delta for city_key, delta in deltas.items() if city_key and delta}
+    if not deltas:
+        return
+    pipe = client.pipeline(transaction=False)
+    for city_key, delta in deltas.items():
+        pipe.hincrby(COUNTS_KEY, city_key, delta)
+    pipe.execute()
+
+
+def _write_redis(client, record, previous=None):
+    uid = record["driver_uid"]
+    city_key = record.get("city_key") or ""
+    ttl = int(presence_ttl_seconds() * 4)
+    # MULTI, so the GEO, seen and cities updates land together for a sweep WATCHing the seen set.
+    pipe = client.pipeline(transaction=True)
+    removed_at = added_at = None
+    prev_city_key = (previous or {}).get("city_key") or ""
+    if prev_city_key and (prev_city_key != city_key or not record.get("online")):
+        pipe.zrem(_geo_key(prev_city_key), uid)
+        removed_at = len(pipe)
+        pipe.zrem(_seen_key(prev_city_key), uid)
+    pipe.set(_record_key(uid), json.dumps(record), ex=ttl)
+    if record.get("online") and city_key:
+        location = record.get("location")
+        if location:
+            pipe.geoadd(_geo_key(city_key), (location["lng"], location["lat"], uid))
+        added_at = len(pipe)
+        pipe.zadd(_seen_key(city_key), {uid: record["last_seen_ts"]})
+        pipe.sadd(CITIES_KEY, city_key)
+    results = pipe.execute()
+    # ZREM/ZADD report whether this call made the transition, so concurrent
+    # writers never double-count.
+    deltas = {}
+    if removed_at is not None and results[removed_at]:
+        deltas[prev_city_key] = deltas.get(prev_city_key, 0) - 1
+    if added_at is not None and results[added_at]:
+        deltas[city_key] = deltas.get(city_key, 0) + 1
+    _apply_count_deltas(client, deltas)
+
+
+def _write(record, previous=None):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            _write_redis(client, record, previous)
+            return
+        except Exception:
+            logger.warning("Presence write failed; using local index.", exc_info=True)
+    with _lock:
+        _local_records[record["driver_uid"]] = record
+
+
+def set_online(uid, city, city_key, location=None, socket_id=None):
+    """
+    Mark *uid* online in *city_key*. Returns ``(record, previous)`` so callers
+    can refresh counts for a city the driver just left.
+    """
+    previous = get_presence(uid)
+    record = {
+        "driver_uid": uid,
+        "online": True,
+        "city": city,
+        "city_key": city_key,
+        "location": location or (previous or {}).get("location"),
+        "socket_id": socket_id,
+        "last_seen_at": utcnow_iso(),
+        "last_seen_ts": time.time(),
+    }
+    _write(record, previous)
+    _snapshot(record, force=True)
+    return record, previous
+
+
+def set_offline(uid, socket_id=None):
+    """
+    Mark *uid* offline. With *socket_id*, only if that socket still owns the
+    presence (a reconnect on another socket must not be clobbered).
+    Returns the previous record when a transition happened, else None.
+    """
+    previous = get_presence(uid)
+    if not previous or not previous.get("online"):
+        return None
+    if socket_id and previous.get("socket_id") != socket_id:
+        return None
+    record = dict(previous)
+    record.update({
+        "online": False,
+        "city": "",
+        "city_key": "",
+        "socket_id": None,
+        "last_seen_at": utcnow_iso(),
+        "last_seen_ts": time.time(),
+    })
+    _write(record, previous)
+    _snapshot(record, force=True)
+    return previous
+
+
+def touch_location(uid, location):
+    """Record a GPS ping for an online driver. Returns the record, or None if offline."""
+    previous = get_presence(uid)
+    if not previous or not previous.get("online"):
+        return None
+    record = dict(previous)
+    record.update({
+        "location": location,
+        "last_seen_at": utcnow_iso(),
+        "last_seen_ts": time.time(),
+    })
+    _write(record, previous)
+    _snapshot(record)
+    return record
+
+
+def _sweep_city(client, city_key, cutoff):
+    """
+    Remove the city's stale drivers in one transaction WATCHing its seen set,
+    and return the uids removed. Every ping rewrites the seen set, so a ping
+    landing between the read and the removal aborts it (WatchError) instead
+    of dropping a driver who is live again.
+    """
+    seen_key = _seen_key(city_key)
+    with client.pipeline() as pipe:
+        pipe.watch(seen_key)
+        stale = pipe.zrangebyscore(seen_key, "-inf", f"({cutoff}")
+        online = int(pipe.zcard(seen_key)) - len(stale)
+        pipe.multi()
+        for uid in stale:
+            pipe.zrem(seen_key, uid)
+        if stale:
+            pipe.zrem(_geo_key(city_key), *stale)
+        # Re-anchor the counter so drift (lost HINCRBYs, flushes) heals each sweep.
+        pipe.hset(COUNTS_KEY, city_key, online)
+        if not online:
+            pipe.srem(CITIES_KEY, city_key)
+        results = pipe.execute()
+    # Per-member ZREM results tell which worker actually removed each driver,
+    # so concurrent sweepers never double-report.
+    return [uid for uid, hit in zip(stale, results) if hit]
+
+
+def sweep_stale():
+    """
+    Drop drivers whose last ping is older than the TTL.
+    Returns ``{city_key: [uid, ...]}`` of drivers that went offline.
+    """
+    cutoff = time.time() - presence_ttl_seconds()
+    removed = {}
+    client = get_redis_client()
+    if client is not None:
+        try:
+            for city_key in client.smembers(CITIES_KEY):
+                for _attempt in range(_SWEEP_ATTEMPTS):
+                    try:
+                        claimed = _sweep_city(client, city_key, cutoff)
+                    except WatchError:
+                        continue
+                    if claimed:
+                        removed[city_key] = claimed
+                    break
+                # Still contended: the city is busy with pings; the next sweep retries it.
+        except Exception:
+            logger.warning("Presence sweep failed.", exc_info=True)
+            return removed
+    else:
+        with _lock:
+            for uid, record in list(_local_records.items()):
+                if record.get("online") and float(record.get("last_seen_ts") or 0) < cutoff:
+                    removed.setdefault(record.get("city_key") or "", []).append(uid)
+                    _local_records[uid] = dict(record, online=False, socket_id=None)
+
+    for uids in removed.values():
+        for uid in uids:
+            _snapshot({"driver_uid": uid, "online": False, "socket_id": None, "last_seen_at": utcnow_iso()}, force=True)
+    return removed
+
+
+def start_sweeper(socketio, on_removed=None, interval_seconds=None):
+    """Run ``sweep_stale`` periodically on this worker; *on_removed(removed)* sees each batch."""
+    global _sweeper_started
+    with _lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+    interval = interval_seconds or max(presence_ttl_seconds() / 3.0, 5.0)
+
+    def _loop():
+        while True:
+            socketio.sleep(interval)
+            removed = sweep_stale()
+            if removed and on_removed:
+                try:
+                    on_removed(removed)
+                except Exception:
+                    logger.warning("Presence sweep callback failed.", exc_info=True)
+
+    socketio.start_background_task(_loop)
@@ -0,0 +1,203 @@
+"""
+Running driver rating aggregates.
+
+``driver_rating_stats/{driver_uid}`` holds what the ratings screen needs:
+total assigned rides, rated rides, star sum and histogram, text feedback
+count and a ring of the most recent RECENT_RATINGS_LIMIT ratings. It is
+updated in the same Firestore transaction as the ride's rating, and the delta
+against any earlier rating of that ride is applied, so re-rating never
+double-counts. Drivers whose history predates the aggregate are backfilled
+once by scanning their rides (``backfilled`` marks the doc as complete).
+
+The user's ``business_profile.details.cab_rating_count/avg`` are kept in step
+so ride acceptance can carry the driver's rating without extra reads.
+"""
+
+from firebase_admin import firestore
+
+from app.services.firebase_service import get_firestore_client
+from app.utils.rides import RIDE_STATUS_COMPLETED, utcnow_iso
+
+STATS_COLLECTION = "driver_rating_stats"
+RECENT_RATINGS_LIMIT = 50
+
+
+def _stats_ref(db, driver_uid):
+    return db.collection(STATS_COLLECTION).document(driver_uid)
+
+
+def _valid_stars(value):
+    return value if isinstance(value, int) and 1 <= value <= 5 else None
+
+
+def _entry(ride_id, ride, rating):
+    return {
+        "ride_id": ride_id,
+        "stars": _valid_stars(rating.get("stars")),
+        "message": str(rating.get("message") or "").strip() or None,
+        "traveler_name": ride.get("traveler_name"),
+        "source": (ride.get("source") or {}).get("address"),
+        "destination": (ride.get("destination") or {}).get("address"),
+        "completed_at": ride.get("completed_at"),
+        "updated_at": rating.get("updated_at") or ride.get("updated_at") or ride.get("created_at"),
+    }
+
+
+def _empty_stats(driver_uid):
+    return {
+        "driver_uid": driver_uid,
+        "total_rides": 0,
+        "rated_rides": 0,
+        "stars_sum": 0,
+        "histogram": {str(stars): 0 for stars in range(1, 6)},
+        "text_feedback_count": 0,
+        "recent": [],
+    }
+
+
+def _apply_rating(stats, entry, previous):
+    """Move *stats* from the ride's *previous* rating entry (or None) to *entry*."""
+    histogram = dict(stats.get("histogram") or {})
+    for old_or_new, sign in ((previous, -1), (entry, 1)):
+        if not old_or_new:
+            continue
+        stars = old_or_new.get("stars")
+        if stars:
+            stats["rated_rides"] = int(stats.get("rated_rides") or 0) + sign
+            stats["stars_sum"] = int(stats.get("stars_sum") or 0) + sign * stars
+            histogram[str(stars)] = int(histogram.get(str(stars)) or 0) + sign
+        if old_or_new.get("message"):
+            stats["text_feedback_count"] = int(stats.get("text_feedback_count") or 0) + sign
+    stats["histogram"] = histogram
+
+    recent = [item for item in stats.get("recent") or [] if item.get("ride_id") != entry["ride_id"]]
+    if entry.get("stars") or entry.get("message"):
+        recent.append(entry)
+    recent.sort(key=lambda item: item.get("updated_at") or "", reverse=True)
+    stats["recent"] = recent[:RECENT_RATINGS_LIMIT]
+    return stats
+
+
+def _average(stats):
+    rated = int(stats.get("rated_rides") or 0)
+    return round(int(stats.get("stars_sum") or 0) / rated, 2) if rated else None
+
+
+def count_assignment(transaction, db, driver_uid):
+    """Count a newly assigned ride inside the accepting transaction."""
+    transaction.set(
+        _stats_ref(db, driver_uid),
+        {"driver_uid": driver_uid, "total_rides": firestore.Increment(1)},
+        merge=True,
+    )
+
+
+def submit_rating(ride_id, traveler_uid, stars=None, message=""):
+    """
+    Store a traveler's rating and update the driver's aggregates atomically.
+    Returns the rating payload; raises ValueError("NOT_FOUND" | "FORBIDDEN" |
+    "INVALID_STATE").
+    """
+    db = get_firestore_client()
+    ride_ref = db.collection("rides").document(ride_id)
+    now_iso = utcnow_iso()
+    rating_payload = {}
+    if stars is not None:
+        rating_payload["stars"] = stars
+    if message:
+        rating_payload["message"] = message
+    rating_payload["updated_at"] = now_iso
+
+    @firestore.transactional
+    def _rate(transaction):
+        snapshot = ride_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            raise ValueError("NOT_FOUND")
+        ride = snapshot.to_dict()
+        if ride.get("traveler_uid") != traveler_uid:
+            raise ValueError("FORBIDDEN")
+        if ride.get("status") != RIDE_STATUS_COMPLETED:
+            raise ValueError("INVALID_STATE")
+
+        driver_uid = ride.get("driver_uid")
+        stats_snapshot = user_snapshot = None
+        if driver_uid:
+            stats_snapshot = _stats_ref(db, driver_uid).get(transaction=transaction)
+            user_snapshot = db.collection("users").document(driver_uid).get(transaction=transaction)
+
+        previous_rating = ride.get("rating") or {}
+        # set(merge=True) merges into the existing rating map, so does the aggregate.
+        merged_rating = {**previous_rating, **rating_payload}
+        transaction.set(ride_ref, {"rating": rating_payload, "updated_at": now_iso}, merge=True)
+        if not driver_uid:
+            return
+        stats = stats_snapshot.to_dict() if stats_snapshot.exists else _empty_stats(driver_uid)
+        previous = _entry(ride_id, ride, previous_rating) if previous_rating else None
+        stats = _apply_rating(stats, _entry(ride_id, ride, merged_rating), previous)
+        stats["average_stars"] = _average(stats)
+        stats["updated_at"] = now_iso
+        transaction.set(_stats_ref(db, driver_uid), stats)
+        if user_snapshot.exists:
+            transaction.update(
+                user_snapshot.reference,
+                {
+                    "business_profile.details.cab_rating_count": int(stats.get("rated_rides") or 0),
+                    "business_profile.details.cab_rating_avg": stats["average_stars"] or 0,
+                    "updated_at": now_iso,
+                },
+            )
+
+    _rate(db.transaction())
+    return rating_payload
+
+
+def rebuild_stats(driver_uid):
+    """
+    Recompute a driver's aggregate from all their rides (one-off backfill). It
+    runs in a transaction over the stats doc and the scanned rides, so a rating
+    or assignment committed meanwhile makes it retry instead of being
+    overwritten, and a doc another worker already backfilled is returned as is.
+    """
+    db = get_firestore_client()
+    stats_ref = _stats_ref(db, driver_uid)
+    rides_query = db.collection("rides").where("driver_uid", "==", driver_uid)
+
+    @firestore.transactional
+    def _rebuild(transaction):
+        snapshot = stats_ref.get(transaction=transaction)
+        current = snapshot.to_dict() if snapshot.exists else {}
+        if current.get("backfilled"):
+            return current
+        stats = _empty_stats(driver_uid)
+        for doc in transaction.get(rides_query):
+            stats["total_rides"] += 1
+            ride = doc.to_dict() or {}
+            rating = ride.get("rating") or {}
+            if rating:
+                _apply_rating(stats, _entry(doc.id, ride, rating), None)
+        stats["average_stars"] = _average(stats)
+        stats["backfilled"] = True
+        stats["updated_at"] = utcnow_iso()
+        transaction.set(stats_ref, stats)
+        return stats
+
+    return _rebuild(db.transaction())
+
+
+def get_stats(driver_uid):
+    """The driver's aggregate: one document read once backfilled."""
+    doc = _stats_ref(get_firestore_client(), driver_uid).get()
+    stats = doc.to_dict() if doc.exists else {}
+    if not stats.get("backfilled"):
+        stats = rebuild_stats(driver_uid)
+    return stats
+
+
+def summarize(stats):
+    return {
+        "total_rides": int(stats.get("total_rides") or 0),
+        "rated_rides": int(stats.get("rated_rides") or 0),
+        "text_feedback_count": int(stats.get("text_feedback_count") or 0),
+        "average_stars": _average(stats),
+        "histogram": stats.get("histogram") or {},
+    }
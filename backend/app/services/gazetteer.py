@@ -0,0 +1,263 @@
+"""
+Offline Indian gazetteer: city resolution and first-pass autocomplete.
+
+``app/data/gazetteer_in.tsv`` lists Indian cities and well-known localities
+with a centroid and radius. On first use it is compiled into a NumPy
+structured array, which is saved under GAZETTEER_CACHE_DIR and memory-mapped
+read-only. Gunicorn workers on a host therefore share the same pages.
+Names and aliases go into a prefix trie.
+
+- ``resolve_point(lat, lng)``: among the entries whose bounding box contains
+  the point, pick the one whose centroid is nearest relative to its radius.
+  A locality reports its parent city. Returns None outside every box.
+- ``suggest(query, ...)``: prefix matches on any word of a name or alias,
+  ranked by city hint, proximity and file order.
+
+No network is involved. Callers fall back to Nominatim/Photon on a miss.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+from app.utils.rides import haversine_km_many, normalize_city_key
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer_in.tsv")
+
+KIND_CITY = 0
+KIND_LOCALITY = 1
+_KINDS = {"city": KIND_CITY, "locality": KIND_LOCALITY}
+_KIND_NAMES = {KIND_CITY: "city", KIND_LOCALITY: "locality"}
+
+# Kilometres per degree of latitude; longitude degrees shrink with cos(lat).
+_KM_PER_DEG = 111.32
+# Ids kept per trie node; enough to rank a page of suggestions.
+_TRIE_NODE_LIMIT = 32
+
+_DTYPE = np.dtype(
+    [
+        ("kind", "u1"),
+        ("name", "U64"),
+        ("city", "U32"),
+        ("state", "U32"),
+        ("aliases", "U96"),
+        ("lat", "f8"),
+        ("lng", "f8"),
+        ("radius_km", "f4"),
+        ("min_lat", "f8"),
+        ("max_lat", "f8"),
+        ("min_lng", "f8"),
+        ("max_lng", "f8"),
+    ]
+)
+
+_lock = threading.Lock()
+_table = None
+_trie = None
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9]+", " ", str(text or "").lower())).strip()
+
+
+def _cache_dir():
+    return os.getenv("GAZETTEER_CACHE_DIR") or tempfile.gettempdir()
+
+
+# ──────────────────────────────────────────────
+# Compilation
+# ──────────────────────────────────────────────
+
+def _parse_rows(text):
+    rows = []
+    for line in text.splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        fields = line.split("\t")
+        kind, name, city, state, lat, lng, radius = fields[:7]
+        aliases = fields[7] if len(fields) > 7 else ""
+        lat, lng, radius = float(lat), float(lng), float(radius)
+        dlat = radius / _KM_PER_DEG
+        dlng = radius / (_KM_PER_DEG * max(np.cos(np.radians(lat)), 0.01))
+        rows.append(
+            (
+                _KINDS[kind], name, city or name, state, aliases, lat, lng, radius,
+                lat - dlat, lat + dlat, lng - dlng, lng + dlng,
+            )
+        )
+    return np.array(rows, dtype=_DTYPE)
+
+
+def compile_table(data_path=DATA_PATH, cache_dir=None):
+    """
+    Compile *data_path* to ``gazetteer-<digest>.npy`` in *cache_dir* (once per
+    source version) and return it memory-mapped. Falls back to an in-memory
+    array when the cache dir is not writable.
+    """
+    with open(data_path, "rb") as handle:
+        raw = handle.read()
+    digest = hashlib.sha1(raw + _DTYPE.descr.__repr__().encode("utf-8")).hexdigest()[:12]
+    path = os.path.join(cache_dir or _cache_dir(), f"gazetteer-{digest}.npy")
+    if not os.path.exists(path):
+        table = _parse_rows(raw.decode("utf-8"))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as handle:
+                np.save(handle, table)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("Gazetteer cache %s not writable; keeping it in memory.", path, exc_info=True)
+            return table
+    return np.load(path, mmap_mode="r")
+
+
+class _PrefixTrie:
+    """Character trie; each node keeps the best-ranked ids of every key below it."""
+
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key, entry_id):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+            ids = node.setdefault("", [])
+            # Ids arrive in rank order, so the first _TRIE_NODE_LIMIT are the best.
+            if len(ids) < _TRIE_NODE_LIMIT and entry_id not in ids:
+                ids.append(entry_id)
+
+    def lookup(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get("", [])
+
+
+def _build_trie(table):
+    trie = _PrefixTrie()
+    for entry_id in range(len(table)):
+        row = table[entry_id]
+        for label in [row["name"], *filter(None, str(row["aliases"]).split("|"))]:
+            words = _normalize(label).split(" ")
+            # Index every word start so "airport" or "east" match mid-name.
+            for index in range(len(words)):
+                trie.insert(" ".join(words[index:]), entry_id)
+    return trie
+
+
+def _load():
+    global _table, _trie
+    with _lock:
+        if _table is None:
+            table = compile_table()
+            _trie = _build_trie(table)
+            _table = table
+        return _table, _trie
+
+
+def city_rows():
+    """The city rows of the table, in file (prominence) order."""
+    table, _ = _load()
+    return table[table["kind"] == KIND_CITY]
+
+
+def reset():
+    """Drop the loaded table (tests, data reloads)."""
+    global _table, _trie
+    with _lock:
+        _table = _trie = None
+
+
+# ──────────────────────────────────────────────
+# Lookups
+# ──────────────────────────────────────────────
+
+def _place(row, lat=None, lng=None):
+    kind = int(row["kind"])
+    name = str(row["name"])
+    city = str(row["city"])
+    state = str(row["state"])
+    label_parts = [name] if kind == KIND_CITY else [name, city]
+    return {
+        "name": name,
+        "address": ", ".join([*label_parts, state]),
+        "lat": float(row["lat"]) if lat is None else lat,
+        "lng": float(row["lng"]) if lng is None else lng,
+        "city": city,
+        "state": state,
+        "locality": name if kind == KIND_LOCALITY else None,
+        "type": _KIND_NAMES[kind],
+    }
+
+
+def resolve_point(lat, lng):
+    """City (and locality) for a point, or None when it is outside the gazetteer."""
+    try:
+        lat_val = float(lat)
+        lng_val = float(lng)
+    except (TypeError, ValueError):
+        return None
+    table, _ = _load()
+    inside = np.flatnonzero(
+        (table["min_lat"] <= lat_val)
+        & (table["max_lat"] >= lat_val)
+        & (table["min_lng"] <= lng_val)
+        & (table["max_lng"] >= lng_val)
+    )
+    if not inside.size:
+        return None
+    candidates = table[inside]
+    distances = haversine_km_many(lat_val, lng_val, candidates["lat"], candidates["lng"])
+    best = int(np.argmin(distances / candidates["radius_km"]))
+    return _place(candidates[best], lat=lat_val, lng=lng_val)
+
+
+def _tokens(row):
+    return _normalize(f"{row['name']} {row['aliases']} {row['city']} {row['state']}").split(" ")
+
+
+def suggest(query, city_hint=None, limit=5, lat=None, lng=None):
+    """Gazetteer places matching *query* as a prefix, best first."""
+    words = _normalize(query).split(" ")
+    if not words or not words[0]:
+        return []
+    table, trie = _load()
+    # Later words narrow the match: "andheri mum" -> Andheri East/West, Mumbai.
+    ids = trie.lookup(" ".join(words))
+    if not ids and len(words) > 1:
+        ids = [
+            entry_id for entry_id in trie.lookup(words[0])
+            if all(any(token.startswith(word) for token in _tokens(table[entry_id])) for word in words[1:])
+        ]
+    if not ids:
+        return []
+
+    hint_key = normalize_city_key(city_hint)
+    distances = None
+    if lat is not None and lng is not None:
+        try:
+            rows = table[ids]
+            distances = haversine_km_many(float(lat), float(lng), rows["lat"], rows["lng"])
+        except (TypeError, ValueError):
+            distances = None
+
+    def _score(position):
+        entry_id = ids[position]
+        row = table[entry_id]
+        same_city = bool(hint_key) and normalize_city_key(str(row["city"])) == hint_key
+        distance = float(distances[position]) if distances is not None else 0.0
+        return (not same_city, distance // 25, entry_id)
+
+    order = sorted(range(len(ids)), key=_score)
+    return [_place(table[ids[position]]) for position in order[: max(int(limit), 1)]]
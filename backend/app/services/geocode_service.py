@@ -1,16 +1,415 @@
 """
 Geocoding helpers using OpenStreetMap Nominatim + Photon autocomplete.
+
+Upstream calls share one pooled ``requests.Session`` (keep-alive per host).
+Results are cached in two tiers: a per-worker LRU, then Redis (``geo:*``) so
+workers share lookups. Reverse lookups are keyed by coordinates rounded to
+GEOCODE_REVERSE_PRECISION decimals (4 ~ 11 m), forward lookups and
+suggestions by the normalized query text + city hint. Lookups that found
+nothing are cached for GEOCODE_NEGATIVE_TTL_SECONDS; upstream errors are not
+cached.
+
+City resolution and the first autocomplete pass use the offline gazetteer
+(``app.services.gazetteer``); Nominatim/Photon are only asked on a miss.
+
+When they are, Photon candidates are issued at once on a small pool, while
+Nominatim candidates run one after another on a pool of their own (its usage
+policy allows one request per second, which NOMINATIM_MIN_INTERVAL_SECONDS
+enforces per process) and stop at the first hit. The lookup is bounded by
+GEOCODE_DEADLINE_SECONDS overall, and every request gets the time left as its
+timeout, so no pool thread outlives the lookup by much. Results are merged in
+candidate order as they arrive and the lookup returns as soon as the answer
+can no longer improve. Calls it stops waiting for are counted as timeouts
+before it returns, so ``geocode_stats`` counts each call exactly once, with
+per-provider latency.
 """
 
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from urllib.parse import quote_plus
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from app.services import gazetteer
+from app.services.redis_service import get_redis_client
+
+logger = logging.getLogger(__name__)
 
 NOMINATIM_BASE_URL = "https://nominatim.openstreetmap.org"
 PHOTON_BASE_URL = "https://photon.komoot.io/api"
 DEFAULT_HEADERS = {
     "User-Agent": "TripAllied/1.0 (support@tripallied.local)",
 }
+REQUEST_TIMEOUT_SECONDS = 8
+
+CACHE_PREFIX = "geo:"
+_MISS = {"miss": True}
+
+
+class _Partial(Exception):
+    """Raised by a cache loader to return *value* without caching it."""
+
+    def __init__(self, value):
+        super().__init__("partial geocode result")
+        self.value = value
+
+_session = None
+_session_lock = threading.Lock()
+
+_pool_lock = threading.Lock()
+# {provider: ThreadPoolExecutor}
+_pools = {}
+
+_nominatim_lock = threading.Lock()
+# Monotonic time before which the next Nominatim request may not start
+_nominatim_next_at = 0.0
+
+_LATENCY_WINDOW = 512
+_stats_lock = threading.Lock()
+# {provider: deque of recent call latencies in ms} and {(provider, outcome): count}
+_latencies_ms = {}
+_provider_stats = Counter()
+
+_cache_lock = threading.Lock()
+# {key: (value, expires_at)}, least recently used first
+_local_cache = OrderedDict()
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def cache_ttl_seconds():
+    return max(_to_float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", "604800"), 604800.0), 1.0)
+
+
+def negative_ttl_seconds():
+    return max(_to_float(os.getenv("GEOCODE_NEGATIVE_TTL_SECONDS", "600"), 600.0), 1.0)
+
+
+def _local_cache_size():
+    return max(int(_to_float(os.getenv("GEOCODE_CACHE_LOCAL_SIZE", "2048"), 2048)), 1)
+
+
+def _reverse_precision():
+    return min(max(int(_to_float(os.getenv("GEOCODE_REVERSE_PRECISION", "4"), 4)), 2), 6)
+
+
+def deadline_seconds():
+    return max(_to_float(os.getenv("GEOCODE_DEADLINE_SECONDS", "4"), 4.0), 0.1)
+
+
+def _nominatim_interval_seconds():
+    return max(_to_float(os.getenv("NOMINATIM_MIN_INTERVAL_SECONDS", "1"), 1.0), 0.0)
+
+
+def _fanout_workers():
+    return max(int(_to_float(os.getenv("GEOCODE_FANOUT_WORKERS", "8"), 8)), 1)
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def _http_get_json(url, timeout=REQUEST_TIMEOUT_SECONDS):
+    res = _get_session().get(url, timeout=timeout)
+    res.raise_for_status()
+    return res.json()
+
+
+# ──────────────────────────────────────────────
+# Concurrent fan-out
+# ──────────────────────────────────────────────
+
+def _get_pool(name):
+    """The fan-out pool for *name*; Nominatim lanes get their own so their 1 req/s waits never hold Photon's threads."""
+    with _pool_lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(max_workers=_fanout_workers(), thread_name_prefix=f"geocode-{name}")
+        return _pools[name]
+
+
+def _record(provider, outcome, latency_ms=None):
+    with _stats_lock:
+        _provider_stats[(provider, outcome)] += 1
+        if latency_ms is not None:
+            _latencies_ms.setdefault(provider, deque(maxlen=_LATENCY_WINDOW)).append(latency_ms)
+
+
+class _Lane:
+    """
+    Calls run one after another on a pool thread. Each call is recorded
+    exactly once: by the lane when it finishes, or by ``abandon`` when the
+    lookup gives up on it first.
+    """
+
+    def __init__(self, indices):
+        self.indices = indices
+        self.abandoned = threading.Event()
+        self._lock = threading.Lock()
+        self._settled = set()
+
+    def settle(self, index):
+        """Claim the right to record call *index*; False once the lane was abandoned."""
+        with self._lock:
+            if self.abandoned.is_set():
+                return False
+            self._settled.add(index)
+            return True
+
+    def abandon(self):
+        """Stop the lane and return the indices it had not recorded yet."""
+        with self._lock:
+            self.abandoned.set()
+            return [index for index in self.indices if index not in self._settled]
+
+
+def _nominatim_slot(deadline, abandoned=None):
+    """
+    Wait for this process's next Nominatim slot; False if it would start
+    after *deadline* or *abandoned* is set while waiting.
+    """
+    global _nominatim_next_at
+    with _nominatim_lock:
+        now = time.monotonic()
+        slot = max(now, _nominatim_next_at)
+        if slot >= deadline:
+            return False
+        _nominatim_next_at = slot + _nominatim_interval_seconds()
+    if slot > now:
+        if abandoned is None:
+            time.sleep(slot - now)
+        elif abandoned.wait(slot - now):
+            return False
+    return True
+
+
+def _provider_get(provider, url, deadline, lane=None, index=None):
+    """
+    One upstream call with the time left until *deadline* as timeout,
+    recorded once as ok/errors/timeouts. Within a *lane*, the call is only
+    recorded if the lane has not been abandoned meanwhile.
+    """
+
+    def _outcome(outcome, started=None):
+        if lane is not None and not lane.settle(index):
+            return
+        latency_ms = round((time.monotonic() - started) * 1000.0, 1) if started is not None else None
+        _record(provider, outcome, latency_ms)
+
+    if provider == "nominatim" and not _nominatim_slot(deadline, lane.abandoned if lane else None):
+        _outcome("timeouts")
+        raise TimeoutError("no Nominatim slot before the deadline")
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        _outcome("timeouts")
+        raise TimeoutError("geocode deadline passed")
+    started = time.monotonic()
+    try:
+        payload = _http_get_json(url, timeout=min(remaining, REQUEST_TIMEOUT_SECONDS))
+    except requests.Timeout:
+        _outcome("timeouts", started)
+        raise
+    except Exception:
+        _outcome("errors", started)
+        raise
+    _outcome("ok", started)
+    return payload
+
+
+def _run_lane(calls, lane, deadline):
+    """
+    Run the calls of *lane* in order, stopping at the first one with a
+    result or once the lane is abandoned. Returns ``{index: (ok, result)}``
+    for every index of the lane; calls skipped after a hit count as ok with
+    no result.
+    """
+    outcomes = {}
+    for position, index in enumerate(lane.indices):
+        if lane.abandoned.is_set():
+            break
+        provider, url, parse = calls[index]
+        try:
+            result = parse(_provider_get(provider, url, deadline, lane, index))
+        except Exception:
+            outcomes[index] = (False, None)
+            continue
+        outcomes[index] = (True, result)
+        if result:
+            for skipped in lane.indices[position + 1:]:
+                outcomes[skipped] = (True, None)
+            break
+    return outcomes
+
+
+def _fan_out(calls, settle):
+    """
+    Run ``(provider, url, parse)`` *calls*: each Photon call on its own, the
+    Nominatim calls as one sequential lane. After each arrival
+    ``settle(results, done_flags)`` sees the per-call results so far
+    (candidate order; ``None`` = pending or failed) and returns the answer
+    once it is final, or None to keep waiting. At the deadline it is called
+    once more with every call marked done. Returns ``(answer, results,
+    complete)``; *complete* is False when a call failed or never answered.
+    """
+    deadline = time.monotonic() + deadline_seconds()
+    nominatim_lane = [index for index, call in enumerate(calls) if call[0] == "nominatim"]
+    lanes = [_Lane([index]) for index, call in enumerate(calls) if call[0] != "nominatim"]
+    if nominatim_lane:
+        lanes.append(_Lane(nominatim_lane))
+    futures = {
+        _get_pool(calls[lane.indices[0]][0]).submit(_run_lane, calls, lane, deadline): lane for lane in lanes
+    }
+    results = [None] * len(calls)
+    done_flags = [False] * len(calls)
+    complete = True
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        finished, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in finished:
+            for index, (ok, result) in future.result().items():
+                done_flags[index] = True
+                results[index] = result
+                complete = complete and ok
+        answer = settle(results, done_flags)
+        if answer is not None:
+            _abandon(pending, futures, calls)
+            return answer, results, complete
+    _abandon(pending, futures, calls)
+    return settle(results, [True] * len(calls)), results, complete and not pending
+
+
+def _abandon(pending, futures, calls):
+    # Every call the lookup stops waiting for is recorded here, before it returns;
+    # a lane still running notices and records nothing more.
+    for future in pending:
+        future.cancel()
+        for index in futures[future].abandon():
+            _record(calls[index][0], "timeouts")
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (rank - low), 1)
+
+
+def geocode_stats():
+    """Per-provider call outcomes and latency percentiles over the recent calls."""
+    with _stats_lock:
+        counts = dict(_provider_stats)
+        latencies = {provider: sorted(samples) for provider, samples in _latencies_ms.items()}
+    providers = sorted({provider for provider, _ in counts} | set(latencies))
+    return {
+        provider: {
+            "ok": counts.get((provider, "ok"), 0),
+            "errors": counts.get((provider, "errors"), 0),
+            "timeouts": counts.get((provider, "timeouts"), 0),
+            "latency_ms": {
+                "samples": len(latencies.get(provider, [])),
+                "p50": _percentile(latencies.get(provider, []), 50),
+                "p90": _percentile(latencies.get(provider, []), 90),
+                "p99": _percentile(latencies.get(provider, []), 99),
+            },
+        }
+        for provider in providers
+    }
+
+
+# ──────────────────────────────────────────────
+# Cache (LRU -> Redis)
+# ──────────────────────────────────────────────
+
+def _normalize_text(value):
+    return re.sub(r"[\s,]+", " ", str(value or "").lower()).strip()
+
+
+def _text_key(kind, *parts):
+    digest = hashlib.sha1("|".join(_normalize_text(part) for part in parts).encode("utf-8")).hexdigest()
+    return f"{CACHE_PREFIX}{kind}:{digest}"
+
+
+def _local_get(key):
+    with _cache_lock:
+        entry = _local_cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del _local_cache[key]
+            return None
+        _local_cache.move_to_end(key)
+        return value
+
+
+def _local_set(key, value, ttl):
+    with _cache_lock:
+        _local_cache[key] = (value, time.time() + ttl)
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > _local_cache_size():
+            _local_cache.popitem(last=False)
+
+
+def _cached(key, loader, ttl=None):
+    """
+    Return the cached value for *key*, else ``loader()`` cached in both tiers.
+    A None/empty result is cached as a miss with the negative TTL. A loader
+    raising ``_Partial`` returns its value uncached; other exceptions propagate.
+    """
+    value = _local_get(key)
+    if value is not None:
+        return None if value == _MISS else value
+
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.get(key)
+            if raw:
+                value = json.loads(raw)
+                ttl_left = client.ttl(key)
+                _local_set(key, value, ttl_left if ttl_left and ttl_left > 0 else negative_ttl_seconds())
+                return None if value == _MISS else value
+        except Exception:
+            logger.warning("Geocode cache read failed for %s.", key, exc_info=True)
+
+    try:
+        value = loader()
+    except _Partial as partial:
+        return partial.value
+    stored, store_ttl = (value, ttl or cache_ttl_seconds()) if value else (_MISS, negative_ttl_seconds())
+    _local_set(key, stored, store_ttl)
+    if client is not None:
+        try:
+            client.setex(key, int(store_ttl), json.dumps(stored))
+        except Exception:
+            logger.warning("Geocode cache write failed for %s.", key, exc_info=True)
+    return value
 
 
 def _extract_city(address_dict):
@@ -25,18 +424,12 @@ def _extract_city(address_dict):
     )
 
 
-def _search_nominatim(query_text):
+def _nominatim_search_url(query_text, limit=1):
     query = quote_plus(str(query_text).strip())
-    url = (
+    return (
         f"{NOMINATIM_BASE_URL}/search?q={query}"
-        "&format=jsonv2&addressdetails=1&limit=1&countrycodes=in"
+        f"&format=jsonv2&addressdetails=1&limit={limit}&countrycodes=in"
     )
-    res = requests.get(url, headers=DEFAULT_HEADERS, timeout=8)
-    res.raise_for_status()
-    payload = res.json()
-    if not payload:
-        return None
-    return payload[0]
 
 
 def _format_photon_feature(feature):
@@ -104,19 +497,35 @@ def forward_geocode(address, city_hint=None):
         candidate_queries.append(f"{address_text}, {hint_text}, India")
     candidate_queries.append(f"{address_text}, India")
 
-    try:
-        for candidate in candidate_queries:
-            first = _search_nominatim(candidate)
-            if not first:
-                continue
-            city = _extract_city(first.get("address", {}))
-            return {
-                "address": first.get("display_name") or address_text,
-                "lat": float(first["lat"]),
-                "lng": float(first["lon"]),
-                "city": city,
-            }
+    def _parse(payload):
+        if not payload:
+            return None
+        first = payload[0]
+        return {
+            "address": first.get("display_name") or address_text,
+            "lat": float(first["lat"]),
+            "lng": float(first["lon"]),
+            "city": _extract_city(first.get("address", {})),
+        }
+
+    def _settle(results, done_flags):
+        # The first candidate (in order) with a hit wins, once every earlier one has answered.
+        for result, done in zip(results, done_flags):
+            if not done:
+                return None
+            if result:
+                return result
         return None
+
+    def _load():
+        calls = [("nominatim", _nominatim_search_url(candidate), _parse) for candidate in candidate_queries]
+        answer, _results, complete = _fan_out(calls, _settle)
+        if not complete:
+            raise _Partial(answer)
+        return answer
+
+    try:
+        return _cached(_text_key("fwd", address_text, hint_text), _load)
     except Exception:
         return None
 
@@ -129,24 +538,66 @@ def reverse_geocode(lat, lng):
     except (TypeError, ValueError):
         return None
 
-    url = (
-        f"{NOMINATIM_BASE_URL}/reverse?lat={lat_val}&lon={lng_val}"
-        "&format=jsonv2&addressdetails=1"
-    )
+    precision = _reverse_precision()
+    bucket_lat = round(lat_val, precision)
+    bucket_lng = round(lng_val, precision)
 
-    try:
-        res = requests.get(url, headers=DEFAULT_HEADERS, timeout=8)
-        res.raise_for_status()
-        payload = res.json()
-        city = _extract_city(payload.get("address", {}))
+    def _load():
+        url = (
+            f"{NOMINATIM_BASE_URL}/reverse?lat={bucket_lat}&lon={bucket_lng}"
+            "&format=jsonv2&addressdetails=1"
+        )
+        payload = _provider_get("nominatim", url, time.monotonic() + REQUEST_TIMEOUT_SECONDS)
+        if not payload or payload.get("error"):
+            return None
         return {
             "address": payload.get("display_name"),
-            "lat": lat_val,
-            "lng": lng_val,
-            "city": city,
+            "city": _extract_city(payload.get("address", {})),
         }
+
+    try:
+        place = _cached(f"{CACHE_PREFIX}rev:{precision}:{bucket_lat:.{precision}f}:{bucket_lng:.{precision}f}", _load)
     except Exception:
         return None
+    if not place:
+        return None
+    return {
+        "address": place.get("address"),
+        "lat": lat_val,
+        "lng": lng_val,
+        "city": place.get("city"),
+    }
+
+
+def resolve_city(lat, lng):
+    """City for a point: gazetteer first, reverse geocoding only outside it."""
+    place = gazetteer.resolve_point(lat, lng)
+    if place:
+        return {"address": None, "lat": place["lat"], "lng": place["lng"], "city": place["city"]}
+    return reverse_geocode(lat, lng)
+
+
+def locate(lat, lng, address=None):
+    """
+    Address + city for a point. With a caller-supplied *address* and a
+    gazetteer hit no network call is made; otherwise the (cached) reverse
+    geocode supplies the address, and the gazetteer label is the last resort.
+    """
+    place = gazetteer.resolve_point(lat, lng)
+    address = str(address).strip() if address else ""
+    if place and address:
+        return {"address": address, "lat": place["lat"], "lng": place["lng"], "city": place["city"]}
+    resolved = reverse_geocode(lat, lng)
+    if resolved:
+        if place:
+            # Keep city names consistent with gazetteer-resolved drivers.
+            resolved["city"] = place["city"]
+        if address:
+            resolved["address"] = address
+        return resolved
+    if place:
+        return {"address": address or place["address"], "lat": place["lat"], "lng": place["lng"], "city": place["city"]}
+    return None
 
 
 def suggest_addresses(query, city_hint=None, limit=5, lat=None, lng=None):
@@ -161,61 +612,76 @@ def suggest_addresses(query, city_hint=None, limit=5, lat=None, lng=None):
     except (TypeError, ValueError):
         max_limit = 5
 
+    offline = gazetteer.suggest(q, city_hint=hint_text, limit=max_limit, lat=lat, lng=lng)
+    if offline:
+        return offline
+
     candidate_queries = [f"{q}, {hint_text}, India" if hint_text else f"{q}, India", q]
     
     location_bias = ""
+    bias_key = ""
     if lat is not None and lng is not None:
         location_bias = f"&lat={lat}&lon={lng}"
+        try:
+            # Bias only nudges ranking; ~1 km buckets keep the cache useful.
+            bias_key = f"{round(float(lat), 2)},{round(float(lng), 2)}"
+        except (TypeError, ValueError):
+            bias_key = f"{lat},{lng}"
 
-    seen = set()
-    results = []
-    try:
-        # First pass: Photon autocomplete (better for typed suggestions, free).
-        for candidate in candidate_queries:
-            query_text = quote_plus(candidate)
-            photon_url = f"{PHOTON_BASE_URL}/?q={query_text}&limit={max_limit}&lang=en{location_bias}"
-            res = requests.get(photon_url, headers=DEFAULT_HEADERS, timeout=8)
-            res.raise_for_status()
-            features = (res.json() or {}).get("features", [])
-            for feature in features:
-                item = _format_photon_feature(feature)
-                if not item:
-                    continue
-                display = item["address"]
-                if display in seen:
-                    continue
-                seen.add(display)
-                results.append(item)
-                if len(results) >= max_limit:
-                    return results
-
-        # Fallback pass: Nominatim search results.
-        for candidate in candidate_queries:
-            query_text = quote_plus(candidate)
-            url = (
-                f"{NOMINATIM_BASE_URL}/search?q={query_text}"
-                f"&format=jsonv2&addressdetails=1&limit={max_limit}&countrycodes=in"
+    def _parse_photon(payload):
+        return [item for item in map(_format_photon_feature, (payload or {}).get("features", [])) if item]
+
+    def _parse_nominatim(payload):
+        items = []
+        for item in payload or []:
+            display = (item.get("display_name") or "").strip()
+            if not display:
+                continue
+            items.append(
+                {
+                    "name": item.get("name") or display.split(",")[0],
+                    "address": display,
+                    "lat": float(item["lat"]),
+                    "lng": float(item["lon"]),
+                    "city": _extract_city(item.get("address", {})),
+                }
             )
-            res = requests.get(url, headers=DEFAULT_HEADERS, timeout=8)
-            res.raise_for_status()
-            payload = res.json() or []
+        return items
+
+    # Photon autocomplete (better for typed suggestions) ranks ahead of Nominatim search.
+    calls = [
+        ("photon", f"{PHOTON_BASE_URL}/?q={quote_plus(candidate)}&limit={max_limit}&lang=en{location_bias}", _parse_photon)
+        for candidate in candidate_queries
+    ] + [
+        ("nominatim", _nominatim_search_url(candidate, limit=max_limit), _parse_nominatim)
+        for candidate in candidate_queries
+    ]
 
-            for item in payload:
-                display = (item.get("display_name") or "").strip()
-                if not display or display in seen:
+    def _merge(results):
+        seen = set()
+        merged = []
+        for items in results:
+            for item in items or []:
+                if item["address"] in seen:
                     continue
-                seen.add(display)
-                results.append(
-                    {
-                        "name": item.get("name") or display.split(",")[0],
-                        "address": display,
-                        "lat": float(item["lat"]),
-                        "lng": float(item["lon"]),
-                        "city": _extract_city(item.get("address", {})),
-                    }
-                )
-                if len(results) >= max_limit:
-                    return results
-        return results
+                seen.add(item["address"])
+                merged.append(item)
+        return merged[:max_limit]
+
+    def _settle(results, done_flags):
+        merged = _merge(results)
+        if len(merged) >= max_limit or all(done_flags):
+            return merged
+        return None
+
+    def _load():
+        answer, results, complete = _fan_out(calls, _settle)
+        answer = answer or _merge(results)
+        if not complete:
+            raise _Partial(answer)
+        return answer
+
+    try:
+        return _cached(_text_key("sug", q, hint_text, max_limit, bias_key), _load, ttl=86400) or []
     except Exception:
         return []
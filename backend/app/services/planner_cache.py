@@ -0,0 +1,356 @@
+"""
+Planner result cache.
+
+Finished plans are cached under a key built from the normalized planner
+input: destination city key, trip days, budget, interest set, travelers
+bucket, origin city key, transport modes and notes. A session with the same
+key is served the cached plan instead of running RAG, transport and Bedrock
+again.
+
+With PLANNER_CACHE_SEMANTIC enabled, an exact miss also compares an
+embedding of the request against the RECENT_LIMIT most recent plans for the
+same destination. Days, budget, origin, transport modes and the travelers
+bucket must match exactly, since the cached transport options and fares
+depend on them. If the cosine similarity reaches PLANNER_CACHE_SIMILARITY,
+that plan is reused as well.
+
+Invalidation when RAG entities change (``rag_indexer_service`` calls these):
+- ``invalidate_entity`` drops every plan that retrieved the entity and bumps
+  the generation of the entity's city, which stales every plan for that city;
+- ``invalidate_all`` bumps the global generation (full reindex).
+An entry records the generations it was built under; it is a miss as soon as
+either moves on.
+
+Redis keys (expire after PLANNER_CACHE_TTL_SECONDS):
+  planner:cache:{sha1}              JSON entry
+  planner:cache:recent:{city_key}   list of JSON {key, vector}, newest first
+  planner:cache:entity:{vector_id}  set of cache keys built from that entity
+  planner:cache:gen / gen:{city}    generation counters (no expiry)
+
+Without Redis, the same structures live in this process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.services.embedding_service import embed_text
+from app.services.redis_service import get_redis_client
+from app.utils.rides import normalize_city_key
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "planner:cache:"
+GLOBAL_GEN_KEY = "planner:cache:gen"
+RECENT_LIMIT = 50
+# Inputs a similar plan must share exactly: they decide the transport options and fares
+SIMILAR_EXACT_FIELDS = ("trip_days", "budget", "origin", "transport_modes", "travelers")
+
+_lock = threading.Lock()
+# Fallback state: {key: (entry, expires_at)} LRU, {city_key: [recent]}, {vector_id: set(keys)}, {gen_key: int}
+_local_entries = OrderedDict()
+_local_recent = {}
+_local_entity_keys = {}
+_local_gens = {}
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def enabled():
+    return os.getenv("PLANNER_CACHE_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+
+
+def semantic_enabled():
+    return os.getenv("PLANNER_CACHE_SEMANTIC", "true").strip().lower() not in {"0", "false", "no"}
+
+
+def ttl_seconds():
+    return max(int(_to_float(os.getenv("PLANNER_CACHE_TTL_SECONDS", "21600"), 21600)), 60)
+
+
+def similarity_threshold():
+    return min(max(_to_float(os.getenv("PLANNER_CACHE_SIMILARITY", "0.92"), 0.92), 0.5), 1.0)
+
+
+def _local_size():
+    return max(int(_to_float(os.getenv("PLANNER_CACHE_LOCAL_SIZE", "256"), 256)), 1)
+
+
+# ──────────────────────────────────────────────
+# Keys
+# ──────────────────────────────────────────────
+
+def _travelers_bucket(value):
+    try:
+        travelers = int(value)
+    except (TypeError, ValueError):
+        travelers = 1
+    if travelers <= 2:
+        return str(max(travelers, 1))
+    return "3-4" if travelers <= 4 else "5+"
+
+
+def _text(value):
+    return " ".join(str(value or "").lower().split())
+
+
+def normalized_input(planner_input):
+    """The parts of a planner request that decide the plan, normalized."""
+    planner_input = planner_input or {}
+    try:
+        trip_days = int(planner_input.get("trip_days") or 0)
+    except (TypeError, ValueError):
+        trip_days = 0
+    return {
+        "destination": normalize_city_key(planner_input.get("destination")),
+        "trip_days": trip_days,
+        "budget": str(planner_input.get("budget") or "MID_RANGE").upper(),
+        "interests": sorted({_text(item) for item in planner_input.get("interests") or [] if _text(item)}),
+        "travelers": _travelers_bucket(planner_input.get("travelers")),
+        "origin": normalize_city_key(planner_input.get("origin")),
+        "transport_modes": sorted({str(mode).upper() for mode in planner_input.get("transport_modes") or []}),
+        "notes": _text(planner_input.get("notes")),
+    }
+
+
+def cache_key(planner_input):
+    normalized = normalized_input(planner_input)
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}{digest}"
+
+
+def _similarity_text(normalized):
+    return " | ".join(
+        part
+        for part in [
+            normalized["destination"],
+            f"{normalized['trip_days']} days",
+            normalized["budget"].replace("_", " ").lower(),
+            ", ".join(normalized["interests"]),
+            normalized["notes"],
+        ]
+        if part
+    )
+
+
+def _gen_key(city_key):
+    return f"{KEY_PREFIX}gen:{city_key}"
+
+
+def _recent_key(city_key):
+    return f"{KEY_PREFIX}recent:{city_key}"
+
+
+def _entity_key(vector_id):
+    return f"{KEY_PREFIX}entity:{vector_id}"
+
+
+# ──────────────────────────────────────────────
+# Storage
+# ──────────────────────────────────────────────
+
+def _generations(city_key):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            values = client.mget([GLOBAL_GEN_KEY, _gen_key(city_key)])
+            return [int(value or 0) for value in values]
+        except Exception:
+            logger.warning("Planner cache generation read failed; using local state.", exc_info=True)
+    with _lock:
+        return [_local_gens.get(GLOBAL_GEN_KEY, 0), _local_gens.get(_gen_key(city_key), 0)]
+
+
+def _bump(gen_key):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.incr(gen_key)
+            return
+        except Exception:
+            logger.warning("Planner cache invalidation failed for %s; bumping locally.", gen_key, exc_info=True)
+    with _lock:
+        _local_gens[gen_key] = _local_gens.get(gen_key, 0) + 1
+
+
+def _read(key):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.get(key)
+            return json.loads(raw) if raw else None
+        except Exception:
+            logger.warning("Planner cache read failed; using local cache.", exc_info=True)
+    with _lock:
+        item = _local_entries.get(key)
+        if item is None:
+            return None
+        entry, expires_at = item
+        if expires_at <= time.time():
+            del _local_entries[key]
+            return None
+        _local_entries.move_to_end(key)
+        return entry
+
+
+def _write(key, entry, city_key, vector, entity_ids):
+    ttl = ttl_seconds()
+    recent = {"key": key, "vector": vector} if vector else None
+    client = get_redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.set(key, json.dumps(entry), ex=ttl)
+            if recent:
+                pipe.lpush(_recent_key(city_key), json.dumps(recent))
+                pipe.ltrim(_recent_key(city_key), 0, RECENT_LIMIT - 1)
+                pipe.expire(_recent_key(city_key), ttl)
+            for vector_id in entity_ids:
+                pipe.sadd(_entity_key(vector_id), key)
+                pipe.expire(_entity_key(vector_id), ttl)
+            pipe.execute()
+            return
+        except Exception:
+            logger.warning("Planner cache write failed; caching locally.", exc_info=True)
+    with _lock:
+        _local_entries[key] = (entry, time.time() + ttl)
+        _local_entries.move_to_end(key)
+        while len(_local_entries) > _local_size():
+            _local_entries.popitem(last=False)
+        if recent:
+            items = [item for item in _local_recent.get(city_key, []) if item["key"] != key]
+            _local_recent[city_key] = [recent, *items][:RECENT_LIMIT]
+        for vector_id in entity_ids:
+            _local_entity_keys.setdefault(vector_id, set()).add(key)
+
+
+def _recent(city_key):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return [json.loads(raw) for raw in client.lrange(_recent_key(city_key), 0, -1)]
+        except Exception:
+            logger.warning("Planner cache recent-list read failed; using local state.", exc_info=True)
+    with _lock:
+        return list(_local_recent.get(city_key, []))
+
+
+def _embed(normalized):
+    try:
+        return embed_text(_similarity_text(normalized)) or None
+    except Exception:
+        logger.warning("Planner cache embedding failed; skipping similarity lookup.", exc_info=True)
+        return None
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def _fresh(entry, normalized):
+    if not entry:
+        return False
+    return entry.get("generations") == _generations(normalized["destination"])
+
+
+def lookup(planner_input):
+    """
+    Cached plan for *planner_input*, as ``{"result", "stream_text", "match",
+    "similarity", "source_session_id"}`` (``match`` is "exact" or "similar"),
+    or None.
+    """
+    if not enabled():
+        return None
+    normalized = normalized_input(planner_input)
+    if not normalized["destination"]:
+        return None
+    entry = _read(cache_key(planner_input))
+    if _fresh(entry, normalized):
+        return {**entry, "match": "exact", "similarity": 1.0}
+    if not semantic_enabled():
+        return None
+
+    candidates = _recent(normalized["destination"])
+    if not candidates:
+        return None
+    vector = _embed(normalized)
+    if not vector:
+        return None
+    matrix = np.asarray([item["vector"] for item in candidates], dtype=np.float32)
+    # Embeddings are normalized, so the dot product is the cosine similarity.
+    scores = matrix @ np.asarray(vector, dtype=np.float32)
+    threshold = similarity_threshold()
+    for index in np.argsort(-scores):
+        if scores[index] < threshold:
+            break
+        entry = _read(candidates[index]["key"])
+        if not _fresh(entry, normalized):
+            continue
+        other = entry.get("input") or {}
+        if any(other.get(field) != normalized[field] for field in SIMILAR_EXACT_FIELDS):
+            continue
+        return {**entry, "match": "similar", "similarity": round(float(scores[index]), 4)}
+    return None
+
+
+def store(planner_input, result, stream_text, rag_matches, session_id):
+    """Cache a finished plan. The per-session fields (draft itinerary, timestamps) are dropped."""
+    if not enabled():
+        return
+    normalized = normalized_input(planner_input)
+    if not normalized["destination"]:
+        return
+    result = {key: value for key, value in (result or {}).items() if key not in {"draft_itinerary_id", "saved_at", "cache"}}
+    entry = {
+        "input": normalized,
+        "result": result,
+        "stream_text": stream_text,
+        "source_session_id": session_id,
+        "generations": _generations(normalized["destination"]),
+        "created_at": time.time(),
+    }
+    entity_ids = sorted({match.get("id") for match in rag_matches or [] if match.get("id")})
+    vector = _embed(normalized) if semantic_enabled() else None
+    _write(cache_key(planner_input), entry, normalized["destination"], vector, entity_ids)
+
+
+def invalidate_entity(vector_id, city=None):
+    """Drop plans that used RAG entity *vector_id*, and stale every plan for *city*."""
+    keys = []
+    client = get_redis_client()
+    if client is not None:
+        try:
+            keys = list(client.smembers(_entity_key(vector_id)))
+            client.delete(_entity_key(vector_id), *keys)
+        except Exception:
+            logger.warning("Planner cache entity invalidation failed for %s.", vector_id, exc_info=True)
+    with _lock:
+        for key in _local_entity_keys.pop(vector_id, set()):
+            _local_entries.pop(key, None)
+    city_key = normalize_city_key(city)
+    if city_key:
+        _bump(_gen_key(city_key))
+
+
+def invalidate_all():
+    _bump(GLOBAL_GEN_KEY)
+
+
+def reset():
+    """Drop the process-local cache (tests)."""
+    with _lock:
+        _local_entries.clear()
+        _local_recent.clear()
+        _local_entity_keys.clear()
+        _local_gens.clear()
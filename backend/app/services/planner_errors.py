@@ -10,3 +10,5 @@ PLANNER_VALIDATION_FAILED = "PLANNER_VALIDATION_FAILED"
 PLANNER_NOT_FOUND = "PLANNER_NOT_FOUND"
 PLANNER_FORBIDDEN = "PLANNER_FORBIDDEN"
 PLANNER_CANCELLED = "PLANNER_CANCELLED"
+PLANNER_BUSY = "PLANNER_BUSY"
+PLANNER_USER_LIMIT = "PLANNER_USER_LIMIT"
@@ -0,0 +1,121 @@
+"""
+Per-session replay ring for planner socket events.
+
+Every event emitted to a planner session room gets a ``seq``, increasing by
+one per session, and is kept in a bounded ring. A client subscribing (or
+re-subscribing after a reconnect) sends the last ``seq`` it saw and is
+replayed everything newer. Workers can therefore start emitting the moment a
+session is claimed, without waiting for the client to join the room. The ring
+is written before the live emit. ``socket_service`` assigns the seq and emits
+under one per-session lock, and replays and joins the room under the same
+lock, so a subscriber gets its replay before any live event from this
+process. Clients apply events strictly in ``seq`` order: they drop ones
+already applied, hold back ones that arrive early, and re-subscribe from the
+last contiguous ``seq`` when a gap does not fill.
+
+Redis keys (shared by all processes, expire PLANNER_REPLAY_TTL_SECONDS after
+the last event):
+  planner:seq:{session_id}    INCR counter
+  planner:ring:{session_id}   list of JSON {seq, event, payload}, oldest first
+
+Without Redis, the counters and rings live in this process.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+
+from app.services.redis_service import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Sessions kept in the process-local fallback
+_LOCAL_SESSION_LIMIT = 256
+
+_lock = threading.Lock()
+# {session_id: {"seq": int, "ring": deque}}, least recently written first
+_local = OrderedDict()
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def ring_size():
+    return max(int(_to_float(os.getenv("PLANNER_REPLAY_RING_SIZE", "1000"), 1000)), 10)
+
+
+def ttl_seconds():
+    return max(int(_to_float(os.getenv("PLANNER_REPLAY_TTL_SECONDS", "3600"), 3600)), 60)
+
+
+def _seq_key(session_id):
+    return f"planner:seq:{session_id}"
+
+
+def _ring_key(session_id):
+    return f"planner:ring:{session_id}"
+
+
+def record(session_id, event_name, payload):
+    """Assign the next ``seq`` to an event, store it in the ring and return the payload with ``seq``."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            seq = int(client.incr(_seq_key(session_id)))
+            stamped = {**(payload or {}), "seq": seq}
+            pipe = client.pipeline(transaction=False)
+            pipe.rpush(_ring_key(session_id), json.dumps({"seq": seq, "event": event_name, "payload": stamped}))
+            pipe.ltrim(_ring_key(session_id), -ring_size(), -1)
+            pipe.expire(_ring_key(session_id), ttl_seconds())
+            pipe.expire(_seq_key(session_id), ttl_seconds())
+            pipe.execute()
+            return stamped
+        except Exception:
+            logger.warning("Planner replay ring write failed; using local ring.", exc_info=True)
+    with _lock:
+        state = _local.pop(session_id, None) or {"seq": 0, "ring": deque(maxlen=ring_size())}
+        _local[session_id] = state
+        while len(_local) > _LOCAL_SESSION_LIMIT:
+            _local.popitem(last=False)
+        state["seq"] += 1
+        stamped = {**(payload or {}), "seq": state["seq"]}
+        state["ring"].append({"seq": state["seq"], "event": event_name, "payload": stamped})
+        return stamped
+
+
+def replay(session_id, after_seq=0):
+    """
+    Events newer than *after_seq*, oldest first, as ``(events, complete)``.
+    ``complete`` is False when the ring has already dropped some of them; the
+    client then has to reload the session over REST.
+    """
+    try:
+        after_seq = max(int(after_seq or 0), 0)
+    except (TypeError, ValueError):
+        after_seq = 0
+    entries = None
+    client = get_redis_client()
+    if client is not None:
+        try:
+            entries = [json.loads(raw) for raw in client.lrange(_ring_key(session_id), 0, -1)]
+        except Exception:
+            logger.warning("Planner replay ring read failed; using local ring.", exc_info=True)
+    if entries is None:
+        with _lock:
+            state = _local.get(session_id)
+            entries = list(state["ring"]) if state else []
+    events = [entry for entry in entries if entry["seq"] > after_seq]
+    complete = not events or events[0]["seq"] == after_seq + 1
+    return events, complete
+
+
+def reset():
+    """Drop the process-local rings (tests)."""
+    with _lock:
+        _local.clear()
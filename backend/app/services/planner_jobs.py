@@ -0,0 +1,443 @@
+"""
+Bounded planner job scheduler.
+
+Planner sessions are queued rather than each getting its own background task.
+Every process runs PLANNER_WORKERS workers that take session ids off the
+queue and call ``planner_orchestrator.run_session``. Bedrock streams and
+Firestore load therefore stay bounded however many requests arrive.
+
+Redis keys (shared by all processes; queued jobs survive restarts):
+  planner:queue        list of session ids, oldest first
+  planner:processing   list of claimed session ids (moved there atomically
+                       by BLMOVE, removed when the job finishes)
+  planner:unclaimed    hash session_id -> epoch a recovery pass first saw it
+                       in planner:processing without ``claimed_at``
+  planner:jobs         hash session_id -> JSON {session_id, traveler_uid,
+                       enqueued_at, claimed_at}
+  planner:user:{uid}   sorted set of the user's queued/running session ids
+  planner:recover_lease one process requeues stale claims per interval
+
+Admission control:
+- a traveler may have PLANNER_MAX_ACTIVE_PER_USER queued or running
+  sessions;
+- the queue holds at most PLANNER_QUEUE_MAX sessions.
+Beyond that, requests are shed with a retry-after estimate instead of piling
+up. ``enqueue`` checks both limits and adds the job in one atomic step (a
+WATCH/MULTI transaction on the user set and the queue, or under the local
+lock), so concurrent requests cannot all pass the check and then all
+enqueue. ``admission_error`` is the same check done early, before a session
+is created. Waiting sessions get ``planner:queued`` events with their position
+whenever the queue moves.
+
+A job claimed by a process that died is requeued once its claim is older
+than PLANNER_JOB_MAX_SECONDS. A process that died between BLMOVE and writing
+``claimed_at`` leaves an unstamped id in the processing list; recovery marks
+it on one pass and requeues it on the next. Without Redis the queue is
+process-local.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from redis.exceptions import WatchError
+
+from app.services.planner_errors import PLANNER_BUSY, PLANNER_USER_LIMIT
+from app.services.redis_service import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "planner:queue"
+PROCESSING_KEY = "planner:processing"
+UNCLAIMED_KEY = "planner:unclaimed"
+JOBS_KEY = "planner:jobs"
+RECOVER_LEASE_KEY = "planner:recover_lease"
+
+_BLOCK_SECONDS = 5
+_ENQUEUE_ATTEMPTS = 5
+_RECOVER_INTERVAL_SECONDS = 60
+
+_cond = threading.Condition()
+# Fallback state: queued session ids, {session_id: job}, {uid: {session_id: enqueued_at}}
+_local_queue = deque()
+_local_jobs = {}
+_local_user_jobs = {}
+_running = 0
+# Moving average of job duration, for retry-after estimates
+_avg_job_seconds = None
+_started = False
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def worker_count():
+    return max(int(_to_float(os.getenv("PLANNER_WORKERS", "4"), 4)), 1)
+
+
+def queue_max():
+    return max(int(_to_float(os.getenv("PLANNER_QUEUE_MAX", "100"), 100)), 1)
+
+
+def max_active_per_user():
+    return max(int(_to_float(os.getenv("PLANNER_MAX_ACTIVE_PER_USER", "2"), 2)), 1)
+
+
+def job_max_seconds():
+    return max(_to_float(os.getenv("PLANNER_JOB_MAX_SECONDS", "900"), 900.0), 60.0)
+
+
+def _user_key(uid):
+    return f"planner:user:{uid}"
+
+
+def _estimated_job_seconds():
+    return _avg_job_seconds or _to_float(os.getenv("PLANNER_JOB_ESTIMATE_SECONDS", "45"), 45.0)
+
+
+def retry_after_seconds(queue_length=None):
+    """Rough wait until a slot frees up, from queue depth and the average job time."""
+    if queue_length is None:
+        queue_length = queue_length_now()
+    waves = (queue_length + 1) / float(worker_count())
+    return max(int(math.ceil(waves * _estimated_job_seconds())), 5)
+
+
+# ──────────────────────────────────────────────
+# Queue state
+# ──────────────────────────────────────────────
+
+def queue_length_now():
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return int(client.llen(QUEUE_KEY))
+        except Exception:
+            logger.warning("Planner queue length failed; using local queue.", exc_info=True)
+    with _cond:
+        return len(_local_queue)
+
+
+def _active_for_user(uid):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            # Claims older than the job limit belong to dead workers; don't count them.
+            client.zremrangebyscore(_user_key(uid), "-inf", time.time() - job_max_seconds())
+            return int(client.zcard(_user_key(uid)))
+        except Exception:
+            logger.warning("Planner per-user count failed; using local state.", exc_info=True)
+    with _cond:
+        return len(_local_user_jobs.get(uid, {}))
+
+
+def _refusal(active, length):
+    """``(error_code, retry_after_seconds)`` for these counts, or ``(None, None)``."""
+    if active >= max_active_per_user():
+        return PLANNER_USER_LIMIT, retry_after_seconds(0)
+    if length >= queue_max():
+        return PLANNER_BUSY, retry_after_seconds(length)
+    return None, None
+
+
+def admission_error(traveler_uid):
+    """
+    Returns ``(error_code, retry_after_seconds)`` when a new session for
+    *traveler_uid* would be refused, else ``(None, None)``. A cheap early
+    check only: ``enqueue`` enforces the limits atomically.
+    """
+    return _refusal(_active_for_user(traveler_uid), queue_length_now())
+
+
+def _enqueue_shared(client, session_id, traveler_uid, job):
+    """Check both limits and queue the job in one WATCH/MULTI transaction; ``(position, error, retry_after)``."""
+    user_key = _user_key(traveler_uid)
+    client.zremrangebyscore(user_key, "-inf", time.time() - job_max_seconds())
+    for _attempt in range(_ENQUEUE_ATTEMPTS):
+        with client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(user_key, QUEUE_KEY)
+                refused, retry_after = _refusal(int(pipe.zcard(user_key)), int(pipe.llen(QUEUE_KEY)))
+                if refused:
+                    pipe.unwatch()
+                    return None, refused, retry_after
+                pipe.multi()
+                pipe.hset(JOBS_KEY, session_id, json.dumps(job))
+                pipe.zadd(user_key, {session_id: job["enqueued_at"]})
+                pipe.expire(user_key, int(job_max_seconds()) * 2)
+                pipe.rpush(QUEUE_KEY, session_id)
+                return int(pipe.execute()[-1]), None, None
+            except WatchError:
+                continue
+    # Still contended after every attempt: the queue is busy right now.
+    return None, PLANNER_BUSY, retry_after_seconds()
+
+
+def enqueue(session_id, traveler_uid):
+    """
+    Queue a planner session if the limits still allow it, checking and adding
+    in one atomic step. Returns ``(position, None, None)`` (1-based), or
+    ``(None, error_code, retry_after_seconds)`` when it was refused.
+    """
+    now = time.time()
+    job = {"session_id": session_id, "traveler_uid": traveler_uid, "enqueued_at": now, "claimed_at": None}
+    client = get_redis_client()
+    if client is not None:
+        try:
+            position, refused, retry_after = _enqueue_shared(client, session_id, traveler_uid, job)
+            if position is not None:
+                _emit_position(session_id, position, position)
+            return position, refused, retry_after
+        except Exception:
+            logger.warning("Planner enqueue failed; queueing locally.", exc_info=True)
+    with _cond:
+        refused, retry_after = _refusal(len(_local_user_jobs.get(traveler_uid, {})), len(_local_queue))
+        if refused:
+            return None, refused, retry_after
+        _local_jobs[session_id] = job
+        _local_user_jobs.setdefault(traveler_uid, {})[session_id] = now
+        _local_queue.append(session_id)
+        position = len(_local_queue)
+        _cond.notify()
+    _emit_position(session_id, position, position)
+    return position, None, None
+
+
+def remove(session_id):
+    """Drop a session from the queue (e.g. cancelled before it ran). Running jobs are left alone."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            if client.lrem(QUEUE_KEY, 0, session_id):
+                _finish(session_id)
+                _broadcast_positions()
+            return
+        except Exception:
+            logger.warning("Planner dequeue failed for %s.", session_id, exc_info=True)
+    with _cond:
+        try:
+            _local_queue.remove(session_id)
+        except ValueError:
+            return
+    _finish(session_id)
+    _broadcast_positions()
+
+
+def _claim(timeout):
+    """Take the next session id off the queue (waiting up to *timeout*), or None."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            session_id = client.blmove(QUEUE_KEY, PROCESSING_KEY, max(int(timeout), 1), "LEFT", "RIGHT")
+            if not session_id:
+                return None
+            raw = client.hget(JOBS_KEY, session_id)
+            job = json.loads(raw) if raw else {"session_id": session_id}
+            job["claimed_at"] = time.time()
+            pipe = client.pipeline(transaction=True)
+            pipe.hset(JOBS_KEY, session_id, json.dumps(job))
+            pipe.hdel(UNCLAIMED_KEY, session_id)
+            pipe.execute()
+            return session_id
+        except Exception:
+            logger.warning("Planner claim failed.", exc_info=True)
+            time.sleep(1)
+            return None
+    with _cond:
+        if not _local_queue:
+            _cond.wait(timeout=timeout)
+        if not _local_queue:
+            return None
+        session_id = _local_queue.popleft()
+        job = _local_jobs.setdefault(session_id, {"session_id": session_id})
+        job["claimed_at"] = time.time()
+        return session_id
+
+
+def _finish(session_id):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.hget(JOBS_KEY, session_id)
+            uid = (json.loads(raw) if raw else {}).get("traveler_uid")
+            pipe = client.pipeline(transaction=False)
+            pipe.hdel(JOBS_KEY, session_id)
+            pipe.lrem(PROCESSING_KEY, 0, session_id)
+            pipe.hdel(UNCLAIMED_KEY, session_id)
+            if uid:
+                pipe.zrem(_user_key(uid), session_id)
+            pipe.execute()
+            return
+        except Exception:
+            logger.warning("Planner job cleanup failed for %s.", session_id, exc_info=True)
+    with _cond:
+        job = _local_jobs.pop(session_id, None) or {}
+        user_jobs = _local_user_jobs.get(job.get("traveler_uid"), {})
+        user_jobs.pop(session_id, None)
+        if not user_jobs:
+            _local_user_jobs.pop(job.get("traveler_uid"), None)
+
+
+def recover_stale(now=None):
+    """
+    Requeue claimed jobs whose claim is older than PLANNER_JOB_MAX_SECONDS, or
+    that were never stamped by their claimer (seen unstamped on an earlier
+    pass). Returns the count.
+    """
+    client = get_redis_client()
+    if client is None:
+        return 0
+    now = now or time.time()
+    cutoff = now - job_max_seconds()
+    requeued = 0
+    try:
+        for session_id in client.lrange(PROCESSING_KEY, 0, -1):
+            raw = client.hget(JOBS_KEY, session_id)
+            if not raw:
+                client.lrem(PROCESSING_KEY, 0, session_id)
+                continue
+            job = json.loads(raw)
+            claimed_at = job.get("claimed_at")
+            if claimed_at is None:
+                # The claimer stamps right after BLMOVE; only requeue if it never did.
+                if client.hsetnx(UNCLAIMED_KEY, session_id, now):
+                    continue
+            elif claimed_at >= cutoff:
+                continue
+            job["claimed_at"] = None
+            pipe = client.pipeline(transaction=True)
+            pipe.hset(JOBS_KEY, session_id, json.dumps(job))
+            pipe.hdel(UNCLAIMED_KEY, session_id)
+            pipe.lrem(PROCESSING_KEY, 0, session_id)
+            pipe.lpush(QUEUE_KEY, session_id)
+            pipe.execute()
+            requeued += 1
+    except Exception:
+        logger.warning("Planner stale-job recovery failed.", exc_info=True)
+    return requeued
+
+
+# ──────────────────────────────────────────────
+# Queue position events
+# ──────────────────────────────────────────────
+
+def _emit_position(session_id, position, queue_length):
+    from app.services.socket_service import emit_planner_event
+
+    emit_planner_event(
+        session_id,
+        "planner:queued",
+        {
+            "session_id": session_id,
+            "status": "QUEUED",
+            "position": position,
+            "queue_length": queue_length,
+            "estimated_wait_seconds": retry_after_seconds(position - 1),
+        },
+    )
+
+
+def _broadcast_positions():
+    client = get_redis_client()
+    queued = None
+    if client is not None:
+        try:
+            queued = client.lrange(QUEUE_KEY, 0, -1)
+        except Exception:
+            logger.warning("Planner queue read failed; using local queue.", exc_info=True)
+    if queued is None:
+        with _cond:
+            queued = list(_local_queue)
+    for index, session_id in enumerate(queued):
+        _emit_position(session_id, index + 1, len(queued))
+
+
+# ──────────────────────────────────────────────
+# Workers
+# ──────────────────────────────────────────────
+
+def _run(session_id):
+    global _running, _avg_job_seconds
+    from app.services.planner_orchestrator import run_session
+
+    with _cond:
+        _running += 1
+    started = time.monotonic()
+    try:
+        run_session(session_id)
+    except Exception:
+        logger.exception("Planner job %s crashed.", session_id)
+    finally:
+        elapsed = time.monotonic() - started
+        with _cond:
+            _running -= 1
+            _avg_job_seconds = elapsed if _avg_job_seconds is None else 0.8 * _avg_job_seconds + 0.2 * elapsed
+        _finish(session_id)
+
+
+def work_once(timeout=_BLOCK_SECONDS):
+    """Claim and run one queued session; returns its id, or None when the queue stayed empty."""
+    session_id = _claim(timeout)
+    if session_id is None:
+        return None
+    _broadcast_positions()
+    _run(session_id)
+    return session_id
+
+
+def _acquire_recover_lease():
+    client = get_redis_client()
+    if client is None:
+        return False
+    try:
+        return bool(client.set(RECOVER_LEASE_KEY, str(os.getpid()), nx=True, ex=_RECOVER_INTERVAL_SECONDS))
+    except Exception:
+        return False
+
+
+def _worker_loop(index):
+    next_recovery = time.monotonic()
+    while True:
+        if index == 0 and time.monotonic() >= next_recovery:
+            next_recovery = time.monotonic() + _RECOVER_INTERVAL_SECONDS
+            if _acquire_recover_lease() and recover_stale():
+                _broadcast_positions()
+        try:
+            work_once()
+        except Exception:
+            logger.warning("Planner worker %s failed.", index, exc_info=True)
+            time.sleep(1)
+
+
+def stats():
+    with _cond:
+        running = _running
+    return {
+        "workers": worker_count(),
+        "running": running,
+        "queued": queue_length_now(),
+        "queue_max": queue_max(),
+        "avg_job_seconds": round(_avg_job_seconds, 1) if _avg_job_seconds else None,
+    }
+
+
+def start(socketio=None):
+    """Start this process's planner workers once."""
+    global _started
+    with _cond:
+        if _started:
+            return
+        _started = True
+    for index in range(worker_count()):
+        if socketio is not None:
+            socketio.start_background_task(_worker_loop, index)
+        else:
+            threading.Thread(target=_worker_loop, args=(index,), name=f"planner-{index}", daemon=True).start()
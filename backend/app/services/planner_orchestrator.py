@@ -1,13 +1,26 @@
-"""Realtime planner session orchestration (RAG + transport + Bedrock stream)."""
+"""
+Realtime planner session orchestration (RAG + transport + Bedrock stream).
+
+A cancel can be handled by any process, while the session runs wherever its
+job was claimed. ``mark_session_cancelled`` therefore also sets
+``planner:cancel:{session_id}`` in Redis. Runs poll that flag while streaming,
+and at stage boundaries also check the session's Firestore status. The final
+COMPLETED/FAILED write is a transaction that never overwrites CANCELLED.
+"""
 
 import json
 import logging
+import os
 import traceback
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from urllib.parse import quote_plus
 
+from firebase_admin import firestore
+
+from app.services import planner_cache, planner_jobs, ride_timers
 from app.services.ai_model import invoke_bedrock_stream, is_ai_configured
 from app.services.firebase_service import firestore_retry, get_firestore_client
 from app.services.planner_errors import (
@@ -20,12 +33,56 @@ from app.services.planner_errors import (
 )
 from app.services.planner_schemas import normalize_transport_option
 from app.services.rag_indexer_service import retrieve, retrieval_stats
+from app.services.redis_service import get_redis_client
 from app.services.transport_service import generate_transport_suggestions
 
 logger = logging.getLogger(__name__)
 
 _cancelled_sessions = set()
 _cancel_lock = threading.Lock()
+# {session_id: monotonic time of the last shared cancel-flag check}
+_cancel_checked_at = {}
+
+CANCEL_KEY_PREFIX = "planner:cancel:"
+
+TOKEN_FLUSH_TIMER = "planner_tokens"
+
+# How often a stage graph wait wakes up to check for cancellation
+_CANCEL_POLL_SECONDS = 0.25
+
+_stage_pool = None
+_stage_pool_lock = threading.Lock()
+
+# {session_id: _TokenBatcher} for sessions streaming on this worker
+_token_batchers = {}
+_token_batchers_lock = threading.Lock()
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def token_flush_bytes():
+    return max(int(_to_float(os.getenv("PLANNER_TOKEN_FLUSH_BYTES", "2048"), 2048)), 1)
+
+
+def token_flush_seconds():
+    return max(_to_float(os.getenv("PLANNER_TOKEN_FLUSH_MS", "250"), 250.0), 10.0) / 1000.0
+
+
+def _stage_workers():
+    return max(int(_to_float(os.getenv("PLANNER_STAGE_WORKERS", "8"), 8)), 1)
+
+
+def _get_stage_pool():
+    global _stage_pool
+    with _stage_pool_lock:
+        if _stage_pool is None:
+            _stage_pool = ThreadPoolExecutor(max_workers=_stage_workers(), thread_name_prefix="planner-stage")
+        return _stage_pool
 
 
 def _now_iso():
@@ -95,27 +152,152 @@ def _progress(session_id, stage, status, message, started_at, extra=None):
     _emit_socket(session_id, "planner:progress", payload)
 
 
-def _token(session_id, chunk):
-    logger.debug("[PLANNER:%s] TOKEN len=%d snippet=%r", session_id[-8:], len(chunk), chunk[:40])
+def _token(session_id, chunk, count=1):
     payload = {"session_id": session_id, "chunk": chunk}
-    _append_event(session_id, {"type": "token", "chunk": chunk})
+    _append_event(session_id, {"type": "token", "chunk": chunk, "count": count})
     _emit_socket(session_id, "planner:token", payload)
 
 
+class _TokenBatcher:
+    """
+    Coalesces streamed chunks into one ``token`` event (one Firestore write and
+    one socket emit) per PLANNER_TOKEN_FLUSH_BYTES or PLANNER_TOKEN_FLUSH_MS,
+    whichever comes first. Each event's ``chunk`` is the concatenated text, so
+    replaying the events in order still rebuilds the stream exactly.
+
+    Chunks are checked against the window as they arrive; a local timer covers
+    a stalled stream so buffered text is never held longer than the window.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self._lock = threading.Lock()
+        self._parts = []
+        self._size = 0
+        self._first_at = None
+
+    def add(self, chunk):
+        if not chunk:
+            return
+        with self._lock:
+            if not self._parts:
+                self._first_at = time.monotonic()
+                ride_timers.schedule(TOKEN_FLUSH_TIMER, self.session_id, token_flush_seconds(), local=True)
+            self._parts.append(chunk)
+            self._size += len(chunk.encode("utf-8"))
+            if self._size >= token_flush_bytes() or time.monotonic() - self._first_at >= token_flush_seconds():
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # Writing under the lock keeps batches in stream order across threads.
+        if not self._parts:
+            return
+        text, count = "".join(self._parts), len(self._parts)
+        self._parts, self._size, self._first_at = [], 0, None
+        ride_timers.cancel(TOKEN_FLUSH_TIMER, self.session_id)
+        _token(self.session_id, text, count)
+
+
+def _open_token_batcher(session_id):
+    batcher = _TokenBatcher(session_id)
+    with _token_batchers_lock:
+        _token_batchers[session_id] = batcher
+    return batcher
+
+
+def _close_token_batcher(session_id):
+    with _token_batchers_lock:
+        batcher = _token_batchers.pop(session_id, None)
+    if batcher is not None:
+        batcher.flush()
+
+
+def flush_tokens(session_id):
+    """``planner_tokens`` timer handler: flush a session's buffered chunks."""
+    with _token_batchers_lock:
+        batcher = _token_batchers.get(session_id)
+    if batcher is not None:
+        batcher.flush()
+
+
+def _cancel_flagged(session_id):
+    client = get_redis_client()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(CANCEL_KEY_PREFIX + session_id))
+    except Exception:
+        logger.warning("Planner cancel flag read failed for %s.", session_id, exc_info=True)
+        return False
+
+
 def _is_cancelled(session_id):
+    """Cancelled on this process, or through the shared flag (read at most every _CANCEL_POLL_SECONDS)."""
+    with _cancel_lock:
+        if session_id in _cancelled_sessions:
+            return True
+        now = time.monotonic()
+        if now - _cancel_checked_at.get(session_id, 0.0) < _CANCEL_POLL_SECONDS:
+            return False
+        _cancel_checked_at[session_id] = now
+    if not _cancel_flagged(session_id):
+        return False
     with _cancel_lock:
-        return session_id in _cancelled_sessions
+        _cancelled_sessions.add(session_id)
+    return True
 
 
-def mark_session_cancelled(session_id):
+def _raise_if_cancelled(session_id):
+    """Stage boundary check: the local set, the shared flag, then the session's Firestore status."""
+    with _cancel_lock:
+        cancelled = session_id in _cancelled_sessions
+    if not cancelled and not _cancel_flagged(session_id):
+        db = get_firestore_client()
+        doc = firestore_retry(lambda: db.collection("planner_sessions").document(session_id).get())
+        if (doc.to_dict() or {}).get("status") != "CANCELLED":
+            return
+    mark_session_cancelled(session_id, shared=False)
+    raise RuntimeError(PLANNER_CANCELLED)
+
+
+def mark_session_cancelled(session_id, shared=True):
     with _cancel_lock:
         _cancelled_sessions.add(session_id)
+    if not shared:
+        return
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.set(CANCEL_KEY_PREFIX + session_id, "1", ex=int(planner_jobs.job_max_seconds()) * 2)
+        except Exception:
+            logger.warning("Planner cancel flag write failed for %s.", session_id, exc_info=True)
 
 
 def _clear_cancel(session_id):
     with _cancel_lock:
-        if session_id in _cancelled_sessions:
-            _cancelled_sessions.remove(session_id)
+        _cancelled_sessions.discard(session_id)
+        _cancel_checked_at.pop(session_id, None)
+
+
+def _set_final_status(session_id, status, extra=None):
+    """Write a terminal status unless the session was cancelled meanwhile; returns False if it was."""
+    db = get_firestore_client()
+    ref = db.collection("planner_sessions").document(session_id)
+    update_payload = {"status": status, "updated_at": _now_iso(), **(extra or {})}
+
+    @firestore.transactional
+    def _write(transaction):
+        snapshot = ref.get(transaction=transaction)
+        if (snapshot.to_dict() or {}).get("status") == "CANCELLED":
+            return False
+        transaction.set(ref, update_payload, merge=True)
+        return True
+
+    return firestore_retry(lambda: _write(db.transaction()))
 
 
 def _validate_ownership(doc, traveler_uid):
@@ -149,6 +331,12 @@ def create_session(traveler_uid, planner_input):
     return payload
 
 
+def discard_session(session_id):
+    """Delete a session that was created but refused a queue slot."""
+    db = get_firestore_client()
+    firestore_retry(lambda: db.collection("planner_sessions").document(session_id).delete())
+
+
 def list_sessions(traveler_uid, limit=20):
     db = get_firestore_client()
     query = db.collection("planner_sessions").where("traveler_uid", "==", traveler_uid)
@@ -197,6 +385,7 @@ def cancel_session(session_id, traveler_uid):
         return True, None, None
 
     mark_session_cancelled(session_id)
+    planner_jobs.remove(session_id)
     _set_status(session_id, "CANCELLED")
     _append_event(
         session_id,
@@ -391,6 +580,110 @@ def _create_draft_itinerary(traveler_uid, planner_input):
     return ref.id
 
 
+def _persist_result(session_id, traveler_uid, planner_input, parsed, stream_text, rag_meta, progress_messages, started_at):
+    _raise_if_cancelled(session_id)
+    _progress(session_id, "persist_results", "RUNNING", "Saving planner result and draft itinerary", started_at)
+    draft_itinerary_id = _create_draft_itinerary(traveler_uid, planner_input)
+    parsed["draft_itinerary_id"] = draft_itinerary_id
+    parsed["saved_at"] = _now_iso()
+    completed = _set_final_status(
+        session_id,
+        "COMPLETED",
+        extra={
+            "stream_text": stream_text,
+            "result_json": parsed,
+            "retrieval_stats": rag_meta,
+            "progress_summary": progress_messages,
+            "draft_itinerary_id": draft_itinerary_id,
+            "error": None,
+        },
+    )
+    if not completed:
+        db = get_firestore_client()
+        firestore_retry(lambda: db.collection("itineraries").document(draft_itinerary_id).delete())
+        raise RuntimeError(PLANNER_CANCELLED)
+    _progress(session_id, "persist_results", "DONE", "Planner result saved successfully", started_at)
+
+    completion_payload = {
+        "session_id": session_id,
+        "status": "COMPLETED",
+        "result": parsed,
+        "draft_itinerary_id": draft_itinerary_id,
+    }
+    _append_event(session_id, {"type": "complete", **completion_payload})
+    _emit_socket(session_id, "planner:complete", completion_payload)
+
+
+def _serve_cached(session_id, traveler_uid, planner_input, cached, tokens, progress_messages, started_at):
+    """Complete a session from a cached plan: replay its stream as a draft, then save it as this session's result."""
+    match = cached["match"]
+    _progress(
+        session_id,
+        "cache_lookup",
+        "DONE",
+        "Reusing a recent plan for the same trip" if match == "exact" else "Reusing a recent plan for a very similar trip",
+        started_at,
+        {"cache": {"match": match, "similarity": cached.get("similarity")}},
+    )
+    progress_messages.append(f"Served from planner cache ({match} match)")
+    stream_text = cached.get("stream_text") or ""
+    size = token_flush_bytes()
+    for offset in range(0, len(stream_text), size):
+        tokens.add(stream_text[offset : offset + size])
+    tokens.flush()
+
+    parsed = json.loads(json.dumps(cached.get("result") or {}))
+    parsed["cache"] = {
+        "match": match,
+        "similarity": cached.get("similarity"),
+        "source_session_id": cached.get("source_session_id"),
+    }
+    _persist_result(
+        session_id,
+        traveler_uid,
+        planner_input,
+        parsed,
+        stream_text,
+        parsed.get("retrieval_stats"),
+        progress_messages,
+        started_at,
+    )
+
+
+def _run_stage_graph(session_id, stages):
+    """
+    Run *stages* ``{name: (dependency names, fn(results))}`` and return
+    ``{name: result}``. A stage starts on the stage pool as soon as all its
+    dependencies have finished, so independent stages overlap. Each stage
+    emits its own progress, so per-stage event order is unchanged.
+
+    The first failing stage's exception is raised. Cancellation is checked
+    while waiting and raises PLANNER_CANCELLED without waiting for stages
+    still in flight; their results are discarded.
+    """
+    results = {}
+    pending = dict(stages)
+    running = {}
+    pool = _get_stage_pool()
+    try:
+        while pending or running:
+            if _is_cancelled(session_id):
+                raise RuntimeError(PLANNER_CANCELLED)
+            for name, (deps, fn) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    del pending[name]
+                    running[pool.submit(fn, dict(results))] = name
+            if not running:
+                raise RuntimeError(f"Planner stages have unresolvable dependencies: {sorted(pending)}")
+            done, _ = wait(running, timeout=_CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    finally:
+        for future in running:
+            future.cancel()
+    return results
+
+
 def run_session(session_id):
     db = get_firestore_client()
     doc_ref = db.collection("planner_sessions").document(session_id)
@@ -398,67 +691,83 @@ def run_session(session_id):
     if not doc.exists:
         return
     session = doc.to_dict() or {}
+    if session.get("status") in {"COMPLETED", "FAILED", "CANCELLED"}:
+        # Cancelled while queued (possibly through another worker process).
+        return
     traveler_uid = session.get("traveler_uid")
     planner_input = session.get("input") or {}
     started_at = time.time()
     stream_buffer = []
+    tokens = _open_token_batcher(session_id)
     progress_messages = []
 
     logger.info("[PLANNER:%s] run_session started — traveler=%s destination=%s",
                  session_id[-8:], traveler_uid, planner_input.get("destination"))
 
-    # Allow the client a few seconds to subscribe to the session room
-    # before we start emitting events, to avoid a race condition.
-    time.sleep(3)
-
     try:
-        if _is_cancelled(session_id):
-            raise RuntimeError(PLANNER_CANCELLED)
+        _raise_if_cancelled(session_id)
 
         _set_status(session_id, "RUNNING")
         _progress(session_id, "validate_input", "DONE", "Input validated and planning started", started_at)
         progress_messages.append("Input validated")
 
+        cached = planner_cache.lookup(planner_input)
+        if cached:
+            _serve_cached(session_id, traveler_uid, planner_input, cached, tokens, progress_messages, started_at)
+            return
+
         if not is_ai_configured():
             raise RuntimeError(AI_NOT_CONFIGURED)
 
-        if _is_cancelled(session_id):
-            raise RuntimeError(PLANNER_CANCELLED)
+        _raise_if_cancelled(session_id)
 
-        _progress(session_id, "rag_retrieve", "RUNNING", "Retrieving relevant business data", started_at)
-        query_text = _destination_query(planner_input)
-        rag_matches = retrieve(query_text)
-        rag_meta = retrieval_stats(rag_matches)
-        rag_context = _build_rag_context(rag_matches)
-        _progress(
+        def rag_stage(_results):
+            if _is_cancelled(session_id):
+                raise RuntimeError(PLANNER_CANCELLED)
+            _progress(session_id, "rag_retrieve", "RUNNING", "Retrieving relevant business data", started_at)
+            matches = retrieve(_destination_query(planner_input))
+            meta = retrieval_stats(matches)
+            _progress(
+                session_id,
+                "rag_retrieve",
+                "DONE",
+                f"Retrieved {meta.get('count')} candidates (confidence: {meta.get('confidence')})",
+                started_at,
+                {"retrieval_stats": meta},
+            )
+            return matches, meta
+
+        def transport_stage(_results):
+            if _is_cancelled(session_id):
+                raise RuntimeError(PLANNER_CANCELLED)
+            options, warnings = _transport_lookup(planner_input, started_at, session_id)
+            live_count = len(options.get("flights") or []) + len(options.get("trains") or [])
+            _progress(
+                session_id,
+                "transport_lookup",
+                "DONE",
+                f"Transport lookup completed with {live_count} live options",
+                started_at,
+                {"warnings": warnings},
+            )
+            return options, warnings
+
+        # Retrieval and transport are independent; synthesis needs both.
+        stage_results = _run_stage_graph(
             session_id,
-            "rag_retrieve",
-            "DONE",
-            f"Retrieved {rag_meta.get('count')} candidates (confidence: {rag_meta.get('confidence')})",
-            started_at,
-            {"retrieval_stats": rag_meta},
+            {
+                "rag_retrieve": ((), rag_stage),
+                "transport_lookup": ((), transport_stage),
+            },
         )
+        rag_matches, rag_meta = stage_results["rag_retrieve"]
+        rag_context = _build_rag_context(rag_matches)
+        transport, transport_warnings = stage_results["transport_lookup"]
         progress_messages.append(f"RAG retrieval complete ({rag_meta.get('confidence')} confidence)")
-
-        if _is_cancelled(session_id):
-            raise RuntimeError(PLANNER_CANCELLED)
-
-        _progress(session_id, "transport_lookup", "RUNNING", "Fetching train/flight options", started_at)
-        transport, transport_warnings = _transport_lookup(planner_input, started_at, session_id)
-        live_count = len(transport.get("flights") or []) + len(transport.get("trains") or [])
-        _progress(
-            session_id,
-            "transport_lookup",
-            "DONE",
-            f"Transport lookup completed with {live_count} live options",
-            started_at,
-            {"warnings": transport_warnings},
-        )
         if transport_warnings:
             progress_messages.extend(transport_warnings)
 
-        if _is_cancelled(session_id):
-            raise RuntimeError(PLANNER_CANCELLED)
+        _raise_if_cancelled(session_id)
 
         _progress(session_id, "plan_synthesis_stream", "RUNNING", "Generating itinerary with streamed output", started_at)
         prompt = _build_planner_prompt(planner_input, rag_context, rag_meta, transport)
@@ -468,13 +777,16 @@ def run_session(session_id):
             if _is_cancelled(session_id):
                 return
             stream_buffer.append(chunk)
-            _token(session_id, chunk)
+            tokens.add(chunk)
 
         # NOTE: parameter name in invoke_bedrock_stream is `on_token` (not on_chunk)
         text = invoke_bedrock_stream(prompt, on_token=on_chunk, temperature=0.6, max_tokens=8192)
+        tokens.flush()
         logger.info("[PLANNER:%s] Bedrock stream finished — total_chars=%d", session_id[-8:], len(text))
         parsed = _extract_json(text)
-        if not isinstance(parsed, dict):
+        # Only well-formed plans are worth reusing; the fallback below is not.
+        cacheable = isinstance(parsed, dict)
+        if not cacheable:
             parsed = {
                 "destination": planner_input.get("destination"),
                 "trip_days": planner_input.get("trip_days"),
@@ -501,36 +813,17 @@ def run_session(session_id):
 
         _progress(session_id, "plan_synthesis_stream", "DONE", "Model generation completed", started_at)
 
-        if _is_cancelled(session_id):
-            raise RuntimeError(PLANNER_CANCELLED)
+        _raise_if_cancelled(session_id)
 
-        _progress(session_id, "persist_results", "RUNNING", "Saving planner result and draft itinerary", started_at)
-        draft_itinerary_id = _create_draft_itinerary(traveler_uid, planner_input)
-        parsed["draft_itinerary_id"] = draft_itinerary_id
-        parsed["saved_at"] = _now_iso()
-        _set_status(
-            session_id,
-            "COMPLETED",
-            extra={
-                "stream_text": "".join(stream_buffer),
-                "result_json": parsed,
-                "retrieval_stats": rag_meta,
-                "progress_summary": progress_messages,
-                "draft_itinerary_id": draft_itinerary_id,
-                "error": None,
-            },
+        stream_text = "".join(stream_buffer)
+        _persist_result(
+            session_id, traveler_uid, planner_input, parsed, stream_text, rag_meta, progress_messages, started_at
         )
-        _progress(session_id, "persist_results", "DONE", "Planner result saved successfully", started_at)
-
-        completion_payload = {
-            "session_id": session_id,
-            "status": "COMPLETED",
-            "result": parsed,
-            "draft_itinerary_id": draft_itinerary_id,
-        }
-        _append_event(session_id, {"type": "complete", **completion_payload})
-        _emit_socket(session_id, "planner:complete", completion_payload)
+        if cacheable:
+            planner_cache.store(planner_input, parsed, stream_text, rag_matches, session_id)
     except Exception as exc:
+        # Whatever streamed before the failure is still replayed ahead of the error.
+        tokens.flush()
         error_text = str(exc)
         status = "FAILED"
         error_code = PLANNER_STREAM_FAILED
@@ -550,14 +843,15 @@ def run_session(session_id):
             traceback.format_exc(),
         )
 
-        _set_status(
-            session_id,
-            status,
-            extra={
-                "error": {"code": error_code, "message": error_text},
-                "stream_text": "".join(stream_buffer),
-            },
-        )
+        extra = {
+            "error": {"code": error_code, "message": error_text},
+            "stream_text": "".join(stream_buffer),
+        }
+        if status == "CANCELLED":
+            _set_status(session_id, status, extra=extra)
+        elif not _set_final_status(session_id, status, extra=extra):
+            # Cancelled by another process while failing; keep CANCELLED.
+            return
         payload = {
             "session_id": session_id,
             "status": status,
@@ -566,4 +860,5 @@ def run_session(session_id):
         _append_event(session_id, {"type": "error", **payload})
         _emit_socket(session_id, "planner:error", payload)
     finally:
+        _close_token_batcher(session_id)
         _clear_cancel(session_id)
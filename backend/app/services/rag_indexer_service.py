@@ -3,6 +3,7 @@
 import logging
 import os
 
+from app.services import planner_cache
 from app.services.embedding_service import embed_text, embed_texts
 from app.services.pinecone_service import delete_vector, query_vector, upsert_vectors
 from app.services.rag_document_builder import (
@@ -76,12 +77,15 @@ def full_reindex(dry_run=False):
             break
         payload.append(_doc_to_vector_payload(doc, vectors[idx]))
     indexed = upsert_vectors(payload)
+    planner_cache.invalidate_all()
     return {"indexed": indexed, "total": len(docs)}
 
 
 def upsert_entity(entity_type, entity_id, dry_run=False):
     doc = build_entity_document(entity_type, entity_id)
     if not doc:
+        if not dry_run:
+            planner_cache.invalidate_entity(f"{str(entity_type or '').strip().upper()}:{entity_id}")
         return {"indexed": 0, "found": False}
     if dry_run:
         return {"indexed": 0, "found": True, "dry_run": True, "vector_id": doc.get("vector_id")}
@@ -94,6 +98,7 @@ def upsert_entity(entity_type, entity_id, dry_run=False):
     if not vector:
         return {"indexed": 0, "found": True, "vector_id": doc.get("vector_id")}
     indexed = upsert_vectors([_doc_to_vector_payload(doc, vector)])
+    planner_cache.invalidate_entity(doc.get("vector_id"), (doc.get("metadata") or {}).get("city"))
     return {"indexed": indexed, "found": True, "vector_id": doc.get("vector_id")}
 
 
@@ -105,6 +110,7 @@ def delete_entity(entity_type, entity_id, dry_run=False):
     if dry_run:
         return {"deleted": False, "dry_run": True, "vector_id": vector_id}
     delete_vector(vector_id)
+    planner_cache.invalidate_entity(vector_id)
     return {"deleted": True, "vector_id": vector_id}
 
 
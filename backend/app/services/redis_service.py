@@ -5,9 +5,14 @@ Falls back to an in-memory dict cache when Redis is unavailable.
 """
 
 import json
+import logging
+import queue
+import threading
 import time
 import redis
 
+logger = logging.getLogger(__name__)
+
 _redis_client = None
 
 # In-memory fallback cache: {key: (value, expires_at)}
@@ -137,3 +142,105 @@ def subscribe_channel(channel):
         return pubsub
     except Exception:
         return None
+
+
+class FanoutSubscription:
+    """One listener's view of a shared channel subscription."""
+
+    def __init__(self, fanout, maxsize=256):
+        self._fanout = fanout
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def _offer(self, data):
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            # Slow consumer: drop rather than stall every other listener.
+            pass
+
+    def get(self, timeout=None):
+        """Next message data, or None after *timeout* seconds without one."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._fanout.remove(self)
+
+
+class _ChannelFanout:
+    """A single Redis SUBSCRIBE per channel per worker, fanned out to local queues."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._listeners = set()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def add(self):
+        subscription = FanoutSubscription(self)
+        with self._lock:
+            self._listeners.add(subscription)
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, name=f"fanout:{self.channel}", daemon=True).start()
+        return subscription
+
+    def remove(self, subscription):
+        with self._lock:
+            self._listeners.discard(subscription)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._listeners:
+                    self._running = False
+                    return
+            client = get_redis_client()
+            if client is None:
+                time.sleep(5)
+                continue
+            pubsub = None
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                while True:
+                    message = pubsub.get_message(timeout=5.0)
+                    with self._lock:
+                        listeners = list(self._listeners)
+                    if not listeners:
+                        break
+                    if message and message.get("type") == "message":
+                        for subscription in listeners:
+                            subscription._offer(message["data"])
+            except Exception:
+                logger.warning("Fan-out listener for %s failed; resubscribing.", self.channel, exc_info=True)
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+_fanouts = {}
+_fanouts_lock = threading.Lock()
+
+
+def subscribe_fanout(channel):
+    """
+    Subscribe to a channel through a per-worker shared connection.
+
+    Unlike ``subscribe_channel`` this does not open a Redis connection per
+    caller, so thousands of SSE streams cost one connection per worker.
+    Returns None when Redis is unavailable.
+    """
+    if get_redis_client() is None:
+        return None
+    with _fanouts_lock:
+        fanout = _fanouts.get(channel)
+        if fanout is None:
+            fanout = _fanouts[channel] = _ChannelFanout(channel)
+    return fanout.add()
@@ -0,0 +1,105 @@
+"""
+Background deletion of expired rides.
+
+Ride history reads never write: EXPIRED rides are filtered out of the pages
+and deleted here instead. A sweep pages through ``status == EXPIRED`` rides
+last updated more than RIDE_EXPIRED_RETENTION_SECONDS ago and deletes them in
+write batches of at most SWEEP_BATCH_SIZE (Firestore's per-batch limit).
+A Redis lease keeps it to one sweeping worker per interval.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.services.firebase_service import get_firestore_client
+from app.services.redis_service import get_redis_client
+from app.utils.rides import RIDE_STATUS_EXPIRED
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "ride:expired_sweep_lease"
+SWEEP_BATCH_SIZE = 500
+
+_lock = threading.Lock()
+_sweeper_started = False
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def sweep_interval_seconds():
+    return max(_to_float(os.getenv("RIDE_EXPIRY_SWEEP_SECONDS", "60"), 60.0), 1.0)
+
+
+def retention_seconds():
+    return max(_to_float(os.getenv("RIDE_EXPIRED_RETENTION_SECONDS", "300"), 300.0), 0.0)
+
+
+def _acquire_lease(interval):
+    client = get_redis_client()
+    if client is None:
+        return True
+    try:
+        return bool(client.set(LEASE_KEY, str(os.getpid()), nx=True, ex=max(int(interval), 1)))
+    except Exception:
+        logger.warning("Expired ride sweep lease failed; sweeping locally.", exc_info=True)
+        return True
+
+
+def sweep_expired(max_batches=20, now=None):
+    """
+    Delete expired rides past the retention window, at most *max_batches*
+    batches per call. Returns the number of rides deleted.
+    """
+    db = get_firestore_client()
+    cutoff = ((now or datetime.utcnow()) - timedelta(seconds=retention_seconds())).isoformat()
+    query = (
+        db.collection("rides")
+        .where("status", "==", RIDE_STATUS_EXPIRED)
+        .where("updated_at", "<", cutoff)
+        .order_by("updated_at")
+        .limit(SWEEP_BATCH_SIZE)
+    )
+    deleted = 0
+    for _ in range(max_batches):
+        docs = list(query.select([]).stream())
+        if not docs:
+            break
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+        if len(docs) < SWEEP_BATCH_SIZE:
+            break
+    return deleted
+
+
+def start_sweeper(socketio, interval_seconds=None):
+    """Run ``sweep_expired`` periodically on this worker (the lease keeps it to one per interval)."""
+    global _sweeper_started
+    with _lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+    interval = interval_seconds or sweep_interval_seconds()
+
+    def _loop():
+        while True:
+            socketio.sleep(interval)
+            if not _acquire_lease(interval):
+                continue
+            try:
+                deleted = sweep_expired()
+                if deleted:
+                    logger.info("Deleted %s expired rides.", deleted)
+            except Exception:
+                logger.warning("Expired ride sweep failed.", exc_info=True)
+
+    socketio.start_background_task(_loop)
@@ -0,0 +1,285 @@
+"""
+Wave-based ride dispatch.
+
+Instead of broadcasting a request to every online driver in the city, the
+ride is offered to the nearest drivers by ETA in expanding waves (5, then the
+next 10, then 20 ...). A wave that gets no acceptance within
+DISPATCH_WAVE_TIMEOUT_SECONDS (a local ``ride_timers`` timer) triggers the
+next one; once the ranked list is exhausted the candidate set is refreshed so
+drivers who came online meanwhile are picked up. Dispatch stops on
+acceptance, when the request closes, or at its deadline (the request expiry
+may fire on another worker).
+
+The accept or expiry may be handled by a different worker than the one
+dispatching, so ``stop_dispatch`` also sets ``ride:dispatch_closed:{ride_id}``
+in Redis, and every wave checks that flag before offering the ride again.
+
+Acceptance latency (request -> accept) and the winning wave are kept in
+process for ``dispatch_stats`` and returned to the caller for the ride event.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+from app.services import ride_timers
+from app.services.redis_service import get_redis_client
+from app.utils.rides import estimate_eta_minutes_many, haversine_km_many
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_WINDOW = 1000
+
+_lock = threading.Lock()
+_dispatches = {}
+_latencies_ms = deque(maxlen=_LATENCY_WINDOW)
+_stats = Counter()
+_accepted_by_wave = Counter()
+
+WAVE_TIMER = "dispatch_wave"
+CLOSED_KEY_PREFIX = "ride:dispatch_closed:"
+# Outlives any dispatch deadline
+_CLOSED_TTL_SECONDS = 600
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def wave_sizes():
+    """DISPATCH_WAVE_SIZES, e.g. "5,10,20"; the last size repeats."""
+    sizes = []
+    for part in os.getenv("DISPATCH_WAVE_SIZES", "5,10,20").split(","):
+        size = int(_to_float(part.strip(), 0))
+        if size > 0:
+            sizes.append(size)
+    return sizes or [5]
+
+
+def wave_timeout_seconds():
+    return max(_to_float(os.getenv("DISPATCH_WAVE_TIMEOUT_SECONDS", "10"), 10.0), 0.5)
+
+
+class _Dispatch:
+    def __init__(self, ride, candidates_fn, offer_fn, on_wave, deadline_seconds=None):
+        self.ride = ride
+        self.candidates_fn = candidates_fn
+        self.offer_fn = offer_fn
+        self.on_wave = on_wave
+        self.ranked = []
+        # {driver_uid: wave number the offer went out in}
+        self.offered = {}
+        self.wave = 0
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_seconds if deadline_seconds else None
+
+
+def rank_candidates(ride, candidates):
+    """Order drivers by ETA to pickup, then straight-line distance (one vectorized pass)."""
+    source = ride.get("source")
+    located, unlocated = [], []
+    for driver in candidates:
+        location = driver.get("location") or {}
+        try:
+            located.append((driver, float(location["lat"]), float(location["lng"])))
+        except (TypeError, ValueError, KeyError):
+            unlocated.append(dict(driver, eta_minutes=None))
+    if not located:
+        return unlocated
+
+    lats = np.fromiter((lat for _, lat, _ in located), dtype=np.float64, count=len(located))
+    lngs = np.fromiter((lng for _, _, lng in located), dtype=np.float64, count=len(located))
+    etas = estimate_eta_minutes_many(source, lats, lngs)
+    if etas is None:
+        return [dict(driver, eta_minutes=None) for driver, _, _ in located] + unlocated
+    distances = haversine_km_many(source["lat"], source["lng"], lats, lngs)
+    order = np.lexsort((distances, etas))
+    ranked = [dict(located[i][0], eta_minutes=int(etas[i])) for i in order]
+    return ranked + unlocated
+
+
+def _pending(state):
+    return [d for d in state.ranked if d.get("id") not in state.offered]
+
+
+def _next_wave_locked(state):
+    sizes = wave_sizes()
+    size = sizes[min(state.wave, len(sizes) - 1)]
+    wave = _pending(state)[:size]
+    state.wave += 1
+    for driver in wave:
+        state.offered[driver.get("id")] = state.wave
+    return wave
+
+
+def _mark_closed(ride_id):
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.set(CLOSED_KEY_PREFIX + ride_id, "1", ex=_CLOSED_TTL_SECONDS)
+    except Exception:
+        logger.warning("Dispatch close flag failed for ride %s.", ride_id, exc_info=True)
+
+
+def _closed_elsewhere(ride_id):
+    client = get_redis_client()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(CLOSED_KEY_PREFIX + ride_id))
+    except Exception:
+        logger.warning("Dispatch close flag read failed for ride %s.", ride_id, exc_info=True)
+        return False
+
+
+def _run_wave(ride_id):
+    with _lock:
+        state = _dispatches.get(ride_id)
+        if state is None:
+            return
+        if state.deadline is not None and time.monotonic() >= state.deadline:
+            _dispatches.pop(ride_id, None)
+            _stats["deadline_stops"] += 1
+            return
+    if _closed_elsewhere(ride_id):
+        # Accepted, cancelled or expired through another worker.
+        with _lock:
+            if _dispatches.get(ride_id) is state:
+                _dispatches.pop(ride_id, None)
+                _stats["closed_elsewhere"] += 1
+        return
+    with _lock:
+        needs_refresh = not _pending(state)
+    if needs_refresh:
+        # Ranked list exhausted: pick up drivers who came online or moved closer.
+        refreshed = rank_candidates(state.ride, state.candidates_fn(state.ride))
+
+    with _lock:
+        if _dispatches.get(ride_id) is not state:
+            return
+        if needs_refresh:
+            state.ranked = refreshed
+        wave = _next_wave_locked(state)
+        wave_number = state.wave
+        offered_total = len(state.offered)
+        _stats["offers"] += len(wave)
+
+    for driver in wave:
+        try:
+            state.offer_fn(driver, state.ride)
+        except Exception:
+            logger.warning("Dispatch offer to %s failed for ride %s.", driver.get("id"), ride_id, exc_info=True)
+    if wave and state.on_wave:
+        state.on_wave(state.ride, {
+            "ride_id": ride_id,
+            "wave": wave_number,
+            "offered": len(wave),
+            "offered_total": offered_total,
+        })
+
+    with _lock:
+        if _dispatches.get(ride_id) is not state:
+            return
+    ride_timers.schedule(WAVE_TIMER, ride_id, wave_timeout_seconds(), local=True)
+
+
+def start_dispatch(ride, candidates_fn, offer_fn, on_wave=None, deadline_seconds=None):
+    """
+    Begin offering *ride* in waves.
+
+    ``candidates_fn(ride)`` returns live drivers (dicts with ``id`` and
+    ``location``); ``offer_fn(driver, ride)`` delivers one offer;
+    ``on_wave(ride, info)`` is told about each wave. No wave starts after
+    *deadline_seconds*. Returns the ranked list the first wave was drawn from.
+    """
+    ride_timers.register_handler(WAVE_TIMER, _run_wave)
+    ride_timers.start()
+    ride_id = ride["id"]
+    _stop_local(ride_id)
+    state = _Dispatch(ride, candidates_fn, offer_fn, on_wave, deadline_seconds)
+    state.ranked = rank_candidates(ride, candidates_fn(ride))
+    with _lock:
+        _dispatches[ride_id] = state
+        _stats["dispatches"] += 1
+    _run_wave(ride_id)
+    return state.ranked
+
+
+def _stop_local(ride_id):
+    with _lock:
+        state = _dispatches.pop(ride_id, None)
+    if state is not None:
+        ride_timers.cancel(WAVE_TIMER, ride_id)
+    return state
+
+
+def stop_dispatch(ride_id):
+    """End dispatch of a closed ride here and, through the Redis flag, on whichever worker runs it."""
+    _mark_closed(ride_id)
+    return _stop_local(ride_id)
+
+
+def record_acceptance(ride_id, driver_uid):
+    """
+    Stop dispatch for an accepted ride. Returns ``{"acceptance_latency_ms",
+    "wave", "offered_total"}`` when this worker dispatched it, else None.
+    """
+    state = stop_dispatch(ride_id)
+    if state is None:
+        return None
+    latency_ms = round((time.monotonic() - state.started) * 1000.0, 1)
+    with _lock:
+        _latencies_ms.append(latency_ms)
+        _stats["accepted"] += 1
+        wave = state.offered.get(driver_uid)
+        if wave is None:
+            _stats["accepted_unoffered"] += 1
+        else:
+            _accepted_by_wave[wave] += 1
+    return {"acceptance_latency_ms": latency_ms, "wave": wave, "offered_total": len(state.offered)}
+
+
+def is_dispatching(ride_id):
+    with _lock:
+        return ride_id in _dispatches
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (rank - low), 1)
+
+
+def dispatch_stats():
+    """Counters plus acceptance-latency percentiles over the last accepts."""
+    with _lock:
+        latencies = sorted(_latencies_ms)
+        active = len(_dispatches)
+        stats = dict(_stats)
+        by_wave = {str(wave): count for wave, count in sorted(_accepted_by_wave.items())}
+    return {
+        "active": active,
+        "dispatches": stats.get("dispatches", 0),
+        "offers": stats.get("offers", 0),
+        "accepted": stats.get("accepted", 0),
+        "accepted_unoffered": stats.get("accepted_unoffered", 0),
+        "deadline_stops": stats.get("deadline_stops", 0),
+        "accepted_by_wave": by_wave,
+        "acceptance_latency_ms": {
+            "samples": len(latencies),
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+        },
+    }
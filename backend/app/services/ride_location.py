@@ -0,0 +1,376 @@
+"""
+Live ride location state with write-behind to Firestore.
+
+GPS pings update the ride's live record only; ``ride:location_updated`` and
+``ride:eta_updated`` are emitted from it. Firestore ``rides`` docs get the
+latest ``driver_location``/``eta_minutes`` at most once per
+RIDE_LOCATION_FLUSH_SECONDS per ride, and immediately on status transitions
+(``sync_status``).
+
+Redis keys:
+  ride:live:{ride_id}   JSON live record (ride participants, status, pickup/drop,
+                        driver_location, eta_minutes)
+  ride:live:dirty       sorted set ride_id -> epoch of the first unflushed ping
+  ride:live:flush_lease one worker flushes per interval
+
+Crash safety: the dirty set lives in Redis next to the state, and a ride is
+only removed from it after Firestore accepted the write, so pings buffered by
+a worker that dies are flushed by any other worker's flusher. The lease
+expires on its own if the flushing worker dies. Without Redis the buffer is
+process-local and flushed at exit; at most one interval of pings can be lost
+on a hard crash.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from redis.exceptions import WatchError
+
+from app.services.firebase_service import get_firestore_client
+from app.services.redis_service import get_redis_client
+from app.utils.rides import ACTIVE_RIDE_STATUSES, utcnow_iso
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "ride:live:dirty"
+LEASE_KEY = "ride:live:flush_lease"
+
+_UPDATE_ATTEMPTS = 5
+
+_LIVE_FIELDS = ("traveler_uid", "driver_uid", "status", "source", "destination", "driver_location", "eta_minutes")
+
+_lock = threading.Lock()
+# Fallback state: {ride_id: record} and {ride_id: first dirty epoch}
+_local_live = {}
+_local_dirty = {}
+_flusher_started = False
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def flush_interval_seconds():
+    return max(_to_float(os.getenv("RIDE_LOCATION_FLUSH_SECONDS", "15"), 15.0), 1.0)
+
+
+def _live_ttl_seconds():
+    return int(max(flush_interval_seconds() * 20, 3600))
+
+
+def _live_key(ride_id):
+    return f"ride:live:{ride_id}"
+
+
+def _from_ride(ride):
+    record = {field: ride.get(field) for field in _LIVE_FIELDS}
+    record["id"] = ride["id"]
+    record["updated_at"] = ride.get("updated_at")
+    return record
+
+
+# ──────────────────────────────────────────────
+# Storage
+# ──────────────────────────────────────────────
+
+def get_live(ride_id):
+    """Live record for *ride_id*, or None when the ride is not being tracked."""
+    if not ride_id:
+        return None
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.get(_live_key(ride_id))
+            return json.loads(raw) if raw else None
+        except Exception:
+            logger.warning("Ride live read failed; using local state.", exc_info=True)
+    with _lock:
+        record = _local_live.get(ride_id)
+        return dict(record) if record else None
+
+
+def _store(record, dirty=False):
+    ride_id = record["id"]
+    client = get_redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.set(_live_key(ride_id), json.dumps(record), ex=_live_ttl_seconds())
+            if dirty:
+                # NX keeps the first-dirty time so a busy ride still flushes on schedule.
+                pipe.zadd(DIRTY_KEY, {ride_id: time.time()}, nx=True)
+            pipe.execute()
+            return
+        except Exception:
+            logger.warning("Ride live write failed; using local state.", exc_info=True)
+    with _lock:
+        _local_live[ride_id] = record
+        if dirty:
+            _local_dirty.setdefault(ride_id, time.time())
+
+
+def _drop(ride_id):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(_live_key(ride_id))
+            pipe.zrem(DIRTY_KEY, ride_id)
+            pipe.execute()
+        except Exception:
+            logger.warning("Ride live delete failed for %s.", ride_id, exc_info=True)
+    with _lock:
+        _local_live.pop(ride_id, None)
+        _local_dirty.pop(ride_id, None)
+
+
+def _is_dirty(ride_id):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return client.zscore(DIRTY_KEY, ride_id) is not None
+        except Exception:
+            logger.warning("Ride dirty check failed; using local state.", exc_info=True)
+    with _lock:
+        return ride_id in _local_dirty
+
+
+def _mark_clean(ride_id, flushed_at):
+    """
+    Clear the dirty flag unless a newer ping arrived while flushing. The
+    compare and the ZREM run under WATCH, so a ping landing in between keeps
+    its flag.
+    """
+    client = get_redis_client()
+    if client is not None:
+        try:
+            with client.pipeline() as pipe:
+                pipe.watch(_live_key(ride_id))
+                raw = pipe.get(_live_key(ride_id))
+                current = json.loads(raw) if raw else None
+                if current is not None and current.get("updated_at") != flushed_at:
+                    return
+                pipe.multi()
+                pipe.zrem(DIRTY_KEY, ride_id)
+                pipe.execute()
+            return
+        except WatchError:
+            return
+        except Exception:
+            logger.warning("Ride dirty clear failed for %s.", ride_id, exc_info=True)
+    with _lock:
+        current = _local_live.get(ride_id)
+        if current is None or current.get("updated_at") == flushed_at:
+            _local_dirty.pop(ride_id, None)
+
+
+# ──────────────────────────────────────────────
+# Tracking
+# ──────────────────────────────────────────────
+
+def track(ride):
+    """
+    Start (or refresh) live tracking for a ride doc, keeping a buffered
+    location that Firestore has not seen yet. Returns the live record, or None
+    for rides that are not active.
+    """
+    if not ride or ride.get("status") not in ACTIVE_RIDE_STATUSES:
+        return None
+    record = _from_ride(ride)
+    current = get_live(ride["id"])
+    if current:
+        record["location_ts"] = current.get("location_ts")
+        if _is_dirty(ride["id"]):
+            for field in ("driver_location", "eta_minutes", "updated_at"):
+                record[field] = current.get(field)
+    _store(record)
+    return record
+
+
+def _apply_ping(record, location, eta_minutes, ts):
+    """*record* updated with the ping, or None when the ping is older than the applied one."""
+    if ts is not None and record.get("location_ts") is not None and ts < record["location_ts"]:
+        return None
+    return {
+        **record,
+        "driver_location": location,
+        "eta_minutes": eta_minutes if eta_minutes is not None else record.get("eta_minutes"),
+        "location_ts": ts,
+        "updated_at": utcnow_iso(),
+    }
+
+
+def update_location(ride_id, location, eta_minutes, ts=None):
+    """
+    Buffer a ping for a tracked ride. A point recorded (*ts*) before the one
+    already applied is ignored, so late uploads cannot move the driver back.
+    The compare and the write are one compare-and-set (WATCH on the live key,
+    retried on a concurrent write), so two pings racing on different workers
+    cannot both pass the check. Returns the current record, or None if the
+    ride is untracked.
+    """
+    if not ride_id:
+        return None
+    client = get_redis_client()
+    if client is not None:
+        key = _live_key(ride_id)
+        try:
+            for _attempt in range(_UPDATE_ATTEMPTS):
+                with client.pipeline() as pipe:
+                    try:
+                        pipe.watch(key)
+                        raw = pipe.get(key)
+                        if not raw:
+                            return None
+                        record = json.loads(raw)
+                        updated = _apply_ping(record, location, eta_minutes, ts)
+                        if updated is None:
+                            return record
+                        pipe.multi()
+                        pipe.set(key, json.dumps(updated), ex=_live_ttl_seconds())
+                        # NX keeps the first-dirty time so a busy ride still flushes on schedule.
+                        pipe.zadd(DIRTY_KEY, {ride_id: time.time()}, nx=True)
+                        pipe.execute()
+                        return updated
+                    except WatchError:
+                        continue
+            # Other pings kept winning the race; theirs is the record to report.
+            return get_live(ride_id)
+        except Exception:
+            logger.warning("Ride live update failed; using local state.", exc_info=True)
+    with _lock:
+        record = _local_live.get(ride_id)
+        if record is None:
+            return None
+        updated = _apply_ping(record, location, eta_minutes, ts)
+        if updated is None:
+            return dict(record)
+        _local_live[ride_id] = updated
+        _local_dirty.setdefault(ride_id, time.time())
+        return dict(updated)
+
+
+def overlay(ride):
+    """Copy a buffered (not yet flushed) location/ETA onto a ride dict read from Firestore."""
+    ride_id = (ride or {}).get("id")
+    if not ride_id or not _is_dirty(ride_id):
+        return ride
+    record = get_live(ride_id)
+    if record:
+        ride["driver_location"] = record.get("driver_location")
+        ride["eta_minutes"] = record.get("eta_minutes")
+    return ride
+
+
+def sync_status(ride):
+    """
+    Called on every ride status change: flush a pending location, overlay it on
+    *ride*, and refresh or stop tracking. No-op for rides that are not tracked.
+    """
+    ride_id = ride.get("id")
+    if get_live(ride_id) is None:
+        return ride
+    overlay(ride)
+    flush_ride(ride_id, touch_updated_at=False)
+    if ride.get("status") in ACTIVE_RIDE_STATUSES:
+        track(ride)
+    else:
+        _drop(ride_id)
+    return ride
+
+
+# ──────────────────────────────────────────────
+# Flushing
+# ──────────────────────────────────────────────
+
+def flush_ride(ride_id, touch_updated_at=True):
+    """
+    Write the buffered location of one ride to Firestore. Returns True when
+    something was written. Status transitions pass ``touch_updated_at=False``
+    so the older ping time does not overwrite their ``updated_at``.
+    """
+    if not _is_dirty(ride_id):
+        return False
+    record = get_live(ride_id)
+    if record is None:
+        _drop(ride_id)
+        return False
+    payload = {"driver_location": record.get("driver_location"), "eta_minutes": record.get("eta_minutes")}
+    if touch_updated_at:
+        payload["updated_at"] = record.get("updated_at") or utcnow_iso()
+    try:
+        get_firestore_client().collection("rides").document(ride_id).set(payload, merge=True)
+    except Exception:
+        logger.warning("Ride location flush failed for %s; will retry.", ride_id, exc_info=True)
+        return False
+    _mark_clean(ride_id, record.get("updated_at"))
+    return True
+
+
+def _due_ride_ids(cutoff):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return list(client.zrangebyscore(DIRTY_KEY, "-inf", cutoff))
+        except Exception:
+            logger.warning("Ride dirty scan failed; using local state.", exc_info=True)
+    with _lock:
+        return [ride_id for ride_id, since in _local_dirty.items() if since <= cutoff]
+
+
+def _acquire_lease(interval):
+    client = get_redis_client()
+    if client is None:
+        return True
+    try:
+        return bool(client.set(LEASE_KEY, str(os.getpid()), nx=True, ex=max(int(interval), 1)))
+    except Exception:
+        logger.warning("Ride flush lease failed; flushing locally.", exc_info=True)
+        return True
+
+
+def flush_due(force=False):
+    """
+    Flush rides whose first unflushed ping is older than the interval (all of
+    them with *force*). Returns the number of rides written.
+    """
+    interval = flush_interval_seconds()
+    cutoff = float("inf") if force else time.time() - interval
+    if not force and not _acquire_lease(interval):
+        return 0
+    return sum(1 for ride_id in _due_ride_ids(cutoff) if flush_ride(ride_id))
+
+
+def start_flusher(socketio, interval_seconds=None):
+    """Run ``flush_due`` periodically on this worker (the lease keeps it to one per interval)."""
+    global _flusher_started
+    with _lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    interval = interval_seconds or max(flush_interval_seconds() / 3.0, 1.0)
+
+    def _loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                flush_due()
+            except Exception:
+                logger.warning("Ride location flusher failed.", exc_info=True)
+
+    socketio.start_background_task(_loop)
+
+
+@atexit.register
+def _flush_local_on_exit():
+    with _lock:
+        pending = list(_local_dirty)
+    for ride_id in pending:
+        flush_ride(ride_id)
@@ -0,0 +1,246 @@
+"""
+Ride timers (request/quote expiry, dispatch waves) on one scheduler per worker.
+
+Replaces a ``threading.Timer`` (an OS thread) per pending ride. Due times are
+kept in a Redis sorted set ``ride:timers`` (member ``{kind}|{ride_id}``, score
+= due epoch), so pending expiries survive restarts and deploys. Every worker's
+scheduler polls the set every RIDE_TIMER_POLL_SECONDS, and a per-member ZREM
+decides which single worker fires each timer. A local min-heap of the timers
+set on this worker lets its scheduler wake exactly on time instead of waiting
+for the next poll; without Redis the heap is the whole store. The read of due
+members and their ZREM run under WATCH, so a timer rescheduled in between is
+re-read instead of being removed early.
+
+Timers for in-process state (dispatch waves) are scheduled ``local=True``: they
+skip Redis and always fire on the worker that set them.
+
+Handlers are registered per kind (``register_handler("request", fn)``) and
+run with the ride id on a pool of RIDE_TIMER_WORKERS threads, so a slow
+handler (Firestore writes) does not hold back the timers due after it.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from redis.exceptions import WatchError
+
+from app.services.redis_service import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+TIMERS_KEY = "ride:timers"
+
+_CLAIM_BATCH = 500
+_CLAIM_ATTEMPTS = 3
+
+_cond = threading.Condition()
+# Min-heap of (due epoch, key); entries whose due no longer matches _local_due are stale.
+_heap = []
+# {key: due epoch} for timers scheduled through this worker
+_local_due = {}
+# Keys scheduled with local=True (never stored in Redis)
+_local_only = set()
+_handlers = {}
+_started = False
+_pool = None
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def poll_interval_seconds():
+    return max(_to_float(os.getenv("RIDE_TIMER_POLL_SECONDS", "1"), 1.0), 0.05)
+
+
+def _workers():
+    return max(int(_to_float(os.getenv("RIDE_TIMER_WORKERS", "4"), 4)), 1)
+
+
+def _key(kind, ride_id):
+    return f"{kind}|{ride_id}"
+
+
+def _split(key):
+    kind, _, ride_id = key.partition("|")
+    return kind, ride_id
+
+
+def register_handler(kind, handler):
+    """``handler(ride_id)`` runs when a timer of *kind* comes due."""
+    _handlers[kind] = handler
+
+
+def schedule(kind, ride_id, delay_seconds, local=False):
+    """
+    (Re)arm the *kind* timer for *ride_id*; replaces any pending one. With
+    *local* the timer is not shared through Redis.
+    """
+    key = _key(kind, ride_id)
+    due = time.time() + max(float(delay_seconds), 0.0)
+    client = None if local else get_redis_client()
+    if client is not None:
+        try:
+            client.zadd(TIMERS_KEY, {key: due})
+        except Exception:
+            logger.warning("Ride timer schedule failed; keeping it local only.", exc_info=True)
+            local = True
+    with _cond:
+        if local:
+            _local_only.add(key)
+        _local_due[key] = due
+        heapq.heappush(_heap, (due, key))
+        if _heap[0][1] == key:
+            _cond.notify()
+    return due
+
+
+def cancel(kind, ride_id):
+    key = _key(kind, ride_id)
+    with _cond:
+        _local_due.pop(key, None)
+        if key in _local_only:
+            _local_only.discard(key)
+            return
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.zrem(TIMERS_KEY, key)
+        except Exception:
+            logger.warning("Ride timer cancel failed for %s.", key, exc_info=True)
+
+
+def pending_count():
+    """Shared timers in Redis plus this worker's local-only ones (all local without Redis)."""
+    with _cond:
+        local_count = len(_local_due)
+        local_only = sum(1 for key in _local_due if key in _local_only)
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return int(client.zcard(TIMERS_KEY)) + local_only
+        except Exception:
+            logger.warning("Ride timer count failed; using local timers.", exc_info=True)
+    return local_count
+
+
+def _pop_local_due_locked(now):
+    due_keys = []
+    while _heap and _heap[0][0] <= now:
+        due, key = heapq.heappop(_heap)
+        if _local_due.get(key) == due:
+            del _local_due[key]
+            due_keys.append(key)
+    return due_keys
+
+
+def _claim_due(now):
+    with _cond:
+        local_keys = _pop_local_due_locked(now)
+        local_only = [key for key in local_keys if key in _local_only]
+        _local_only.difference_update(local_only)
+    client = get_redis_client()
+    if client is not None:
+        try:
+            # Shared timers in the local heap were only wake-up hints.
+            return local_only + _claim_shared(client, now)
+        except Exception:
+            logger.warning("Ride timer claim failed; firing local timers.", exc_info=True)
+    return local_keys
+
+
+def _claim_shared(client, now):
+    """ZREM the due members in one transaction; a concurrent (re)schedule or claim aborts and retries it."""
+    for _attempt in range(_CLAIM_ATTEMPTS):
+        try:
+            with client.pipeline() as pipe:
+                pipe.watch(TIMERS_KEY)
+                keys = pipe.zrangebyscore(TIMERS_KEY, "-inf", now, start=0, num=_CLAIM_BATCH)
+                if not keys:
+                    return []
+                pipe.multi()
+                pipe.zrem(TIMERS_KEY, *keys)
+                pipe.execute()
+                return keys
+        except WatchError:
+            continue
+    # Still contended: the next poll picks these up.
+    return []
+
+
+def _fire(key, handler, ride_id):
+    try:
+        handler(ride_id)
+    except Exception:
+        logger.warning("Ride timer %s failed.", key, exc_info=True)
+
+
+def _get_pool():
+    global _pool
+    with _cond:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="ride-timer")
+        return _pool
+
+
+def run_due(now=None, executor=None):
+    """
+    Fire every timer due at *now* that this worker claims, on *executor* when
+    given (inline otherwise). Returns the number fired.
+    """
+    fired = 0
+    for key in _claim_due(time.time() if now is None else now):
+        kind, ride_id = _split(key)
+        handler = _handlers.get(kind)
+        if handler is None:
+            logger.warning("No ride timer handler for %s.", key)
+            continue
+        if executor is None:
+            _fire(key, handler, ride_id)
+        else:
+            executor.submit(_fire, key, handler, ride_id)
+        fired += 1
+    return fired
+
+
+def _wait_seconds_locked(now, redis_backed):
+    while _heap and _local_due.get(_heap[0][1]) != _heap[0][0]:
+        heapq.heappop(_heap)
+    wait = _heap[0][0] - now if _heap else None
+    if redis_backed:
+        poll = poll_interval_seconds()
+        wait = poll if wait is None else min(wait, poll)
+    return None if wait is None else max(wait, 0.0)
+
+
+def _loop():
+    while True:
+        redis_backed = get_redis_client() is not None
+        with _cond:
+            wait = _wait_seconds_locked(time.time(), redis_backed)
+            if wait is None or wait > 0:
+                _cond.wait(timeout=wait)
+        try:
+            run_due(executor=_get_pool())
+        except Exception:
+            logger.warning("Ride timer loop failed.", exc_info=True)
+
+
+def start(socketio=None):
+    """Start this worker's scheduler once."""
+    global _started
+    with _cond:
+        if _started:
+            return
+        _started = True
+    if socketio is not None:
+        socketio.start_background_task(_loop)
+    else:
+        threading.Thread(target=_loop, name="ride-timers", daemon=True).start()
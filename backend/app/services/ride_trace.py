@@ -0,0 +1,265 @@
+"""
+Compact driver route traces for rides.
+
+Points received while the driver is heading to pickup or on the trip are
+appended to a per-ride Redis list ``ride:trace:{ride_id}`` (one RPUSH per
+location event, however many points it carries). Whenever the list reaches
+RIDE_TRACE_CHUNK_POINTS, the worker whose push crossed the threshold claims
+those points with LPOP. It encodes them (polyline for lat/lng, varint deltas
+for timestamps) and appends the chunk to ``ride_traces/{ride_id}``. That is
+one Firestore write per chunk instead of a document per point.
+
+When the ride ends, ``seal`` folds the chunks and the remaining tail into a
+single encoded path on the same document, with point count and distance for
+fare audits. Without Redis the tail list is process-local.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from firebase_admin import firestore
+
+from app.services.firebase_service import get_firestore_client
+from app.services.redis_service import get_redis_client
+from app.utils.polyline import decode_deltas, decode_polyline, encode_deltas, encode_polyline
+from app.utils.rides import RIDE_STATUS_DRIVER_EN_ROUTE, RIDE_STATUS_IN_PROGRESS, haversine_km, utcnow_iso
+
+logger = logging.getLogger(__name__)
+
+TRACE_STATUSES = {RIDE_STATUS_DRIVER_EN_ROUTE, RIDE_STATUS_IN_PROGRESS}
+TRACE_ENCODING = "polyline5+dt"
+
+_TRACE_TTL_SECONDS = 2 * 24 * 3600
+
+_lock = threading.Lock()
+# Fallback state: {ride_id: [point, ...]} not yet chunked
+_local_points = {}
+
+
+def chunk_points():
+    try:
+        return max(int(os.getenv("RIDE_TRACE_CHUNK_POINTS", "120")), 2)
+    except (TypeError, ValueError):
+        return 120
+
+
+def _trace_key(ride_id):
+    return f"ride:trace:{ride_id}"
+
+
+def _trace_ref(ride_id):
+    return get_firestore_client().collection("ride_traces").document(ride_id)
+
+
+# ──────────────────────────────────────────────
+# Encoding
+# ──────────────────────────────────────────────
+
+def encode_points(points):
+    """``[{lat, lng, ts}, ...]`` (oldest first) -> ``{"t0", "n", "path", "dt"}``."""
+    stamps = [int(round(point.get("ts") or 0)) for point in points]
+    t0 = stamps[0] if stamps else 0
+    return {
+        "t0": t0,
+        "n": len(points),
+        "path": encode_polyline((point["lat"], point["lng"]) for point in points),
+        "dt": encode_deltas(stamp - t0 for stamp in stamps),
+    }
+
+
+def decode_points(encoded):
+    coords = decode_polyline(encoded.get("path"))
+    t0 = int(encoded.get("t0") or 0)
+    offsets = decode_deltas(encoded.get("dt"))
+    return [
+        {"lat": lat, "lng": lng, "ts": t0 + (offsets[index] if index < len(offsets) else 0)}
+        for index, (lat, lng) in enumerate(coords)
+    ]
+
+
+def path_distance_km(points):
+    return round(
+        sum(
+            haversine_km(a["lat"], a["lng"], b["lat"], b["lng"])
+            for a, b in zip(points, points[1:])
+        ),
+        3,
+    )
+
+
+# ──────────────────────────────────────────────
+# Tail buffer
+# ──────────────────────────────────────────────
+
+def _push(ride_id, points):
+    """Append to the tail; returns its new length."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.rpush(_trace_key(ride_id), *[json.dumps(point) for point in points])
+            pipe.expire(_trace_key(ride_id), _TRACE_TTL_SECONDS)
+            return int(pipe.execute()[0])
+        except Exception:
+            logger.warning("Ride trace append failed; using local trail.", exc_info=True)
+    with _lock:
+        tail = _local_points.setdefault(ride_id, [])
+        tail.extend(points)
+        return len(tail)
+
+
+def _claim(ride_id, count=None):
+    """Atomically take up to *count* points (all when None) off the front of the tail."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            if count is None:
+                count = client.llen(_trace_key(ride_id))
+            raws = client.lpop(_trace_key(ride_id), count) if count else None
+            return [json.loads(raw) for raw in raws or []]
+        except Exception:
+            logger.warning("Ride trace claim failed; using local trail.", exc_info=True)
+    with _lock:
+        tail = _local_points.get(ride_id, [])
+        count = len(tail) if count is None else count
+        claimed, _local_points[ride_id] = tail[:count], tail[count:]
+        return claimed
+
+
+def _unclaim(ride_id, points):
+    """Put claimed points back at the front after a failed write."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.lpush(_trace_key(ride_id), *[json.dumps(point) for point in reversed(points)])
+            return
+        except Exception:
+            logger.warning("Ride trace restore failed for %s.", ride_id, exc_info=True)
+    with _lock:
+        _local_points[ride_id] = list(points) + _local_points.get(ride_id, [])
+
+
+def _peek(ride_id):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return [json.loads(raw) for raw in client.lrange(_trace_key(ride_id), 0, -1)]
+        except Exception:
+            logger.warning("Ride trace read failed; using local trail.", exc_info=True)
+    with _lock:
+        return list(_local_points.get(ride_id, []))
+
+
+# ──────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────
+
+def append_points(ride_id, points):
+    """Append ordered ``{"lat", "lng", "ts"}`` points to the ride's trace. Returns the count stored."""
+    if not ride_id or not points:
+        return 0
+    compact = [{"lat": point["lat"], "lng": point["lng"], "ts": point.get("ts")} for point in points]
+    size = chunk_points()
+    if _push(ride_id, compact) >= size:
+        claimed = _claim(ride_id, size)
+        if claimed:
+            _write_chunk(ride_id, claimed)
+    return len(compact)
+
+
+def _write_chunk(ride_id, points):
+    chunk = encode_points(points)
+    try:
+        _trace_ref(ride_id).set(
+            {
+                "ride_id": ride_id,
+                "sealed": False,
+                "encoding": TRACE_ENCODING,
+                "chunks": firestore.ArrayUnion([chunk]),
+                "point_count": firestore.Increment(len(points)),
+                "updated_at": utcnow_iso(),
+            },
+            merge=True,
+        )
+    except Exception:
+        logger.warning("Ride trace chunk write failed for %s; keeping points.", ride_id, exc_info=True)
+        _unclaim(ride_id, points)
+
+
+def _collect(doc_data, tail):
+    if doc_data.get("sealed"):
+        points = decode_points(doc_data)
+    else:
+        points = []
+        for chunk in sorted(doc_data.get("chunks") or [], key=lambda c: c.get("t0") or 0):
+            points.extend(decode_points(chunk))
+    points.extend({"lat": p["lat"], "lng": p["lng"], "ts": int(round(p.get("ts") or 0))} for p in tail)
+    points.sort(key=lambda point: point["ts"])
+    return points
+
+
+def seal(ride):
+    """
+    Fold a finished ride's chunks and tail into one encoded path. Idempotent;
+    returns the sealed trace doc, or None when the ride has no trace.
+    """
+    ride_id = ride.get("id")
+    if not ride_id:
+        return None
+    tail = _claim(ride_id)
+    ref = _trace_ref(ride_id)
+    try:
+        doc = ref.get()
+        data = doc.to_dict() if doc.exists else {}
+        if data.get("sealed") and not tail:
+            return data
+        points = _collect(data, tail)
+        if not points:
+            return None
+        sealed = {
+            "ride_id": ride_id,
+            "driver_uid": ride.get("driver_uid"),
+            "traveler_uid": ride.get("traveler_uid"),
+            "final_status": ride.get("status"),
+            "sealed": True,
+            "sealed_at": utcnow_iso(),
+            "encoding": TRACE_ENCODING,
+            "point_count": len(points),
+            "distance_km": path_distance_km(points),
+            **encode_points(points),
+        }
+        ref.set(sealed)
+        return sealed
+    except Exception:
+        logger.warning("Ride trace seal failed for %s; keeping tail.", ride_id, exc_info=True)
+        if tail:
+            _unclaim(ride_id, tail)
+        return None
+
+
+def get_trace(ride_id):
+    """Decoded trace for *ride_id* (sealed or in progress), or None when nothing was recorded."""
+    doc = _trace_ref(ride_id).get()
+    data = doc.to_dict() if doc.exists else {}
+    tail = [] if data.get("sealed") else _peek(ride_id)
+    points = _collect(data, tail)
+    if not points:
+        return None
+    return {
+        "ride_id": ride_id,
+        "sealed": bool(data.get("sealed")),
+        "sealed_at": data.get("sealed_at"),
+        "encoding": TRACE_ENCODING,
+        "point_count": len(points),
+        "distance_km": data.get("distance_km") if data.get("sealed") else path_distance_km(points),
+        "polyline": encode_polyline((point["lat"], point["lng"]) for point in points),
+        "points": points,
+    }
+
+
+def get_points(ride_id):
+    """All trace points recorded for *ride_id*, oldest first."""
+    trace = get_trace(ride_id)
+    return trace["points"] if trace else []
@@ -0,0 +1,246 @@
+"""
+Offline distance/fare matrix for Indian city pairs.
+
+The gazetteer's city rows give the cities. Their pairwise great-circle
+distances are compiled once into a float32 matrix, saved as
+``route-matrix-<digest>.npy`` next to the compiled gazetteer and
+memory-mapped read-only. A dict maps normalized city names, aliases and
+state names to matrix rows. Localities named exactly resolve to their parent
+city through the gazetteer. Comma-qualified names ("Jaipur, Rajasthan") fall
+back to their leading part.
+
+``estimate(origin, destination, mode, travelers)`` turns a distance into
+indicative options without any network call:
+- rail: distance x RAIL_DETOUR_FACTOR at each class's average speed, with
+  per-km fares. Vande Bharat runs only on shorter routes, Rajdhani only on
+  longer ones;
+- air: block time from cruise speed plus taxi/climb overhead, with the fare
+  band picked by distance class (short/medium/long haul). No flights under
+  MIN_FLIGHT_KM.
+Returns None when either city is unknown, so callers can fall back.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from app.services import gazetteer
+from app.utils.rides import haversine_km_many, normalize_city_key
+
+logger = logging.getLogger(__name__)
+
+RAIL_DETOUR_FACTOR = 1.25
+MIN_FLIGHT_KM = 250
+MIN_TRAIN_KM = 30
+
+# (max great-circle km, class label, base fare, fare per km) per person
+AIR_FARE_BANDS = (
+    (600, "short-haul", 2600, 3.4),
+    (1400, "medium-haul", 3000, 2.7),
+    (float("inf"), "long-haul", 3600, 2.3),
+)
+# (provider, fare multiplier) from budget to full-service
+AIRLINES = (("IndiGo (est.)", 1.0), ("Akasa Air (est.)", 1.06), ("Air India (est.)", 1.2))
+# Block time: cruise speed plus taxi, climb and descent
+AIR_CRUISE_KMH = 780
+AIR_OVERHEAD_MINUTES = 35
+
+# (provider, class, min rail km, max rail km, average km/h, base fare, fare per km) per person
+RAIL_CLASSES = (
+    ("Vande Bharat (est.)", "Chair Car", 0, 800, 78, 150, 1.9),
+    ("Rajdhani (est.)", "AC 3-tier", 400, float("inf"), 82, 200, 2.3),
+    ("Superfast Express (est.)", "Sleeper", 0, float("inf"), 55, 60, 0.6),
+)
+
+_lock = threading.Lock()
+_matrix = None
+_index = None
+_names = None
+
+
+def _cache_dir():
+    return os.getenv("GAZETTEER_CACHE_DIR") or tempfile.gettempdir()
+
+
+def _round_to(value, step):
+    return int(round(value / step) * step)
+
+
+def _format_minutes(minutes):
+    minutes = max(_round_to(minutes, 5), 5)
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+# ──────────────────────────────────────────────
+# Compilation
+# ──────────────────────────────────────────────
+
+def compile_matrix(cities, cache_dir=None):
+    """Pairwise great-circle km between *cities* (float32), compiled once per city set and memory-mapped."""
+    lats = np.asarray(cities["lat"], dtype=np.float64)
+    lngs = np.asarray(cities["lng"], dtype=np.float64)
+    digest = hashlib.sha1(lats.tobytes() + lngs.tobytes()).hexdigest()[:12]
+    path = os.path.join(cache_dir or _cache_dir(), f"route-matrix-{digest}.npy")
+    if not os.path.exists(path):
+        matrix = np.vstack([haversine_km_many(lat, lng, lats, lngs) for lat, lng in zip(lats, lngs)]).astype(np.float32)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as handle:
+                np.save(handle, matrix)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("Route matrix cache %s not writable; keeping it in memory.", path, exc_info=True)
+            return matrix
+    return np.load(path, mmap_mode="r")
+
+
+def _build_index(cities):
+    """Normalized name/alias -> row; a state name maps to its first (most prominent) city."""
+    index = {}
+    states = {}
+    for row_id in range(len(cities)):
+        row = cities[row_id]
+        for label in [row["name"], *filter(None, str(row["aliases"]).split("|"))]:
+            index.setdefault(normalize_city_key(label), row_id)
+        states.setdefault(normalize_city_key(str(row["state"])), row_id)
+    for state_key, row_id in states.items():
+        index.setdefault(state_key, row_id)
+    index.pop("", None)
+    return index
+
+
+def _load():
+    global _matrix, _index, _names
+    with _lock:
+        if _matrix is None:
+            cities = gazetteer.city_rows()
+            matrix = compile_matrix(cities)
+            _index = _build_index(cities)
+            _names = [str(name) for name in cities["name"]]
+            _matrix = matrix
+        return _matrix, _index, _names
+
+
+def reset():
+    """Drop the loaded matrix (tests, data reloads)."""
+    global _matrix, _index, _names
+    with _lock:
+        _matrix = _index = _names = None
+
+
+# ──────────────────────────────────────────────
+# Lookups
+# ──────────────────────────────────────────────
+
+def _resolve_name(name, index):
+    key = normalize_city_key(name)
+    if not key:
+        return None
+    if key in index:
+        return index[key]
+    # A locality named exactly ("Andheri East") resolves to its city. Prefix hits are
+    # not enough: "India" must not land on "India Gate".
+    for place in gazetteer.suggest(name, limit=5):
+        if normalize_city_key(place.get("name")) == key:
+            return index.get(normalize_city_key(place.get("city")))
+    return None
+
+
+def _resolve(name, index):
+    # "Goa, India" or "Jaipur, Rajasthan": drop trailing state/country parts until a name resolves.
+    parts = [part.strip() for part in str(name or "").split(",")]
+    for end in range(len(parts), 0, -1):
+        found = _resolve_name(", ".join(parts[:end]), index)
+        if found is not None:
+            return found
+    return None
+
+
+def route(origin, destination):
+    """``(origin city, destination city, great-circle km)`` or None when either city is unknown."""
+    matrix, index, names = _load()
+    origin_id = _resolve(origin, index)
+    destination_id = _resolve(destination, index)
+    if origin_id is None or destination_id is None:
+        return None
+    return names[origin_id], names[destination_id], float(matrix[origin_id, destination_id])
+
+
+def covers(origin, destination):
+    return route(origin, destination) is not None
+
+
+def _air_band(distance_km):
+    for max_km, label, base, per_km in AIR_FARE_BANDS:
+        if distance_km <= max_km:
+            return label, base, per_km
+
+
+def _flight_rows(origin, destination, distance_km, travelers):
+    if distance_km < MIN_FLIGHT_KM:
+        return []
+    label, base, per_km = _air_band(distance_km)
+    duration = _format_minutes(AIR_OVERHEAD_MINUTES + distance_km / AIR_CRUISE_KMH * 60)
+    rows = []
+    for provider, multiplier in AIRLINES:
+        fare = _round_to((base + per_km * distance_km) * multiplier, 50)
+        rows.append(
+            {
+                "provider": provider,
+                "departure": origin,
+                "arrival": destination,
+                "duration": duration,
+                "price": fare * travelers,
+                "currency": "INR",
+                "notes": (
+                    f"Offline estimate: {distance_km:,.0f} km {label} economy fare, about INR {fare:,} per person "
+                    f"for {travelers} traveler(s). Verify timings and fares before booking."
+                ),
+            }
+        )
+    return rows
+
+
+def _train_rows(origin, destination, distance_km, travelers):
+    if distance_km < MIN_TRAIN_KM:
+        return []
+    rail_km = distance_km * RAIL_DETOUR_FACTOR
+    rows = []
+    for provider, travel_class, min_km, max_km, speed_kmh, base, per_km in RAIL_CLASSES:
+        if not min_km <= rail_km <= max_km:
+            continue
+        fare = _round_to(base + per_km * rail_km, 10)
+        rows.append(
+            {
+                "provider": provider,
+                "departure": origin,
+                "arrival": destination,
+                "duration": _format_minutes(rail_km / speed_kmh * 60),
+                "price": fare * travelers,
+                "currency": "INR",
+                "notes": (
+                    f"Offline estimate: about {rail_km:,.0f} km by rail, {travel_class}, about INR {fare:,} per person "
+                    f"for {travelers} traveler(s). Verify timings and fares before booking."
+                ),
+            }
+        )
+    return rows
+
+
+def estimate(origin, destination, mode, travelers=1):
+    """Indicative options for one mode (``FLIGHT``/``TRAIN``), or None when the route is unknown."""
+    found = route(origin, destination)
+    if found is None:
+        return None
+    origin_name, destination_name, distance_km = found
+    try:
+        travelers = max(int(travelers or 1), 1)
+    except (TypeError, ValueError):
+        travelers = 1
+    if mode == "FLIGHT":
+        return _flight_rows(origin_name, destination_name, distance_km, travelers)
+    return _train_rows(origin_name, destination_name, distance_km, travelers)
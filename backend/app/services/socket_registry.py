@@ -0,0 +1,196 @@
+"""
+Cross-worker Socket.IO connection registry.
+
+Each worker records its live sockets in Redis so any worker can tell whether a
+user is connected somewhere in the cluster. Workers publish a heartbeat key;
+connections owned by a worker whose heartbeat has expired (crash, OOM kill,
+deploy) are treated as gone and pruned lazily on read.
+
+Falls back to process-local dicts when Redis is unavailable, which is exact
+for a single worker.
+"""
+
+import logging
+import os
+import socket
+import threading
+
+from app.services.redis_service import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 90
+
+_ttl_seconds = DEFAULT_TTL_SECONDS
+_heartbeat_started = False
+_lock = threading.Lock()
+# Fallback: {uid: {(namespace, sid), ...}}
+_local_user_conns = {}
+
+
+def worker_id():
+    """Stable id for this worker process (pid changes after a gunicorn fork)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_key(wid):
+    return f"sio:worker:{wid}"
+
+
+def _user_key(uid):
+    return f"sio:user:{uid}"
+
+
+def _member(namespace, sid, wid):
+    return f"{namespace}|{sid}|{wid}"
+
+
+def _parse_member(member):
+    namespace, sid, wid = member.split("|", 2)
+    return {"namespace": namespace, "sid": sid, "worker": wid}
+
+
+def configure(ttl_seconds=None):
+    global _ttl_seconds
+    if ttl_seconds:
+        _ttl_seconds = max(int(ttl_seconds), 10)
+
+
+def heartbeat():
+    """Refresh this worker's liveness key."""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.set(_worker_key(worker_id()), "1", ex=_ttl_seconds)
+    except Exception:
+        logger.warning("Socket registry heartbeat failed.", exc_info=True)
+
+
+def start_heartbeat(socketio):
+    """Start the heartbeat loop once per worker (no-op without Redis)."""
+    global _heartbeat_started
+    with _lock:
+        if _heartbeat_started or get_redis_client() is None:
+            return
+        _heartbeat_started = True
+
+    def _loop():
+        while True:
+            heartbeat()
+            socketio.sleep(max(_ttl_seconds // 3, 1))
+
+    heartbeat()
+    socketio.start_background_task(_loop)
+
+
+def register_connection(namespace, sid, uid):
+    if not uid or not sid:
+        return
+    client = get_redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.set(_worker_key(worker_id()), "1", ex=_ttl_seconds)
+            pipe.sadd(_user_key(uid), _member(namespace, sid, worker_id()))
+            pipe.execute()
+            return
+        except Exception:
+            logger.warning("Socket registry register failed; using local registry.", exc_info=True)
+    with _lock:
+        _local_user_conns.setdefault(uid, set()).add((namespace, sid))
+
+
+def unregister_connection(namespace, sid, uid):
+    if not uid or not sid:
+        return
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.srem(_user_key(uid), _member(namespace, sid, worker_id()))
+        except Exception:
+            logger.warning("Socket registry unregister failed.", exc_info=True)
+    with _lock:
+        conns = _local_user_conns.get(uid)
+        if conns is not None:
+            conns.discard((namespace, sid))
+            if not conns:
+                _local_user_conns.pop(uid, None)
+
+
+def _live_members(client, uids):
+    """Return ``{uid: [member, ...]}`` with dead-worker members pruned."""
+    pipe = client.pipeline(transaction=False)
+    for uid in uids:
+        pipe.smembers(_user_key(uid))
+    member_sets = pipe.execute()
+
+    by_uid = {uid: [_parse_member(m) for m in members or ()] for uid, members in zip(uids, member_sets)}
+    workers = sorted({conn["worker"] for conns in by_uid.values() for conn in conns})
+    if not workers:
+        return by_uid
+    alive = dict(zip(workers, client.mget([_worker_key(wid) for wid in workers])))
+
+    stale = client.pipeline(transaction=False)
+    has_stale = False
+    for uid, conns in by_uid.items():
+        live = []
+        for conn in conns:
+            if alive.get(conn["worker"]):
+                live.append(conn)
+            else:
+                stale.srem(_user_key(uid), _member(conn["namespace"], conn["sid"], conn["worker"]))
+                has_stale = True
+        by_uid[uid] = live
+    if has_stale:
+        stale.execute()
+    return by_uid
+
+
+def user_connections(uid, namespace=None):
+    """List ``{namespace, sid, worker}`` for every live socket of *uid*."""
+    if not uid:
+        return []
+    client = get_redis_client()
+    if client is not None:
+        try:
+            conns = _live_members(client, [uid]).get(uid, [])
+            return [c for c in conns if namespace is None or c["namespace"] == namespace]
+        except Exception:
+            logger.warning("Socket registry lookup failed; using local registry.", exc_info=True)
+    with _lock:
+        conns = list(_local_user_conns.get(uid, ()))
+    wid = worker_id()
+    return [
+        {"namespace": ns, "sid": sid, "worker": wid}
+        for ns, sid in conns
+        if namespace is None or ns == namespace
+    ]
+
+
+def connected_users(uids, namespace=None):
+    """Return the subset of *uids* with at least one live socket (one round-trip batch)."""
+    uids = [uid for uid in dict.fromkeys(uids or []) if uid]
+    if not uids:
+        return set()
+    client = get_redis_client()
+    if client is not None:
+        try:
+            by_uid = _live_members(client, uids)
+            return {
+                uid
+                for uid, conns in by_uid.items()
+                if any(namespace is None or c["namespace"] == namespace for c in conns)
+            }
+        except Exception:
+            logger.warning("Socket registry batch lookup failed; using local registry.", exc_info=True)
+    with _lock:
+        return {
+            uid
+            for uid in uids
+            if any(namespace is None or ns == namespace for ns, _ in _local_user_conns.get(uid, ()))
+        }
+
+
+def is_user_connected(uid, namespace=None):
+    return bool(user_connections(uid, namespace))
@@ -2,17 +2,33 @@
 Socket.IO service for realtime cab rides.
 """
 
+import logging
+import os
 import threading
 import random
+import time
 
 from firebase_admin import firestore
 from flask import request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 
+from app.services import (
+    driver_presence,
+    driver_ratings,
+    planner_events,
+    planner_jobs,
+    ride_cleanup,
+    ride_dispatch,
+    ride_location,
+    ride_timers,
+    ride_trace,
+    socket_registry,
+    transport_service,
+)
 from app.services.firebase_service import get_firestore_client, verify_firebase_token
-from app.services.geocode_service import forward_geocode, reverse_geocode
+from app.services.geocode_service import forward_geocode, locate, resolve_city
+from app.services.redis_service import get_redis_client
 from app.utils.rides import (
-    ACTIVE_RIDE_STATUSES,
     RIDE_STATUS_ACCEPTED_PENDING_QUOTE,
     RIDE_STATUS_CANCELLED,
     RIDE_STATUS_COMPLETED,
@@ -30,38 +46,57 @@ from app.utils.rides import (
     get_user_doc,
     is_cab_driver_user,
     normalize_city_key,
-    serialize_doc,
+    sync_active_ride_pointers,
     utcnow_iso,
 )
 
+logger = logging.getLogger(__name__)
+
 socketio = SocketIO()
 _socket_users = {}
 _planner_socket_users = {}
-_request_timers = {}
-_quote_timers = {}
 _init_lock = threading.Lock()
+_online_count_lock = threading.Lock()
+# Shared across workers: one pending push per city per window, and the last pushed count
+ONLINE_COUNT_DEBOUNCE_PREFIX = "rides:online_count:debounce:"
+ONLINE_COUNT_LAST_PREFIX = "rides:online_count:last:"
+_ONLINE_COUNT_LAST_TTL_SECONDS = 86400
+# Debounced city_presence pushes: cities with a push scheduled, last pushed count
+# (without Redis), display names
+_online_count_pending = set()
+_online_count_last = {}
+_online_count_cities = {}
 _handlers_registered = False
+# Striped per-session locks: a session's seq assignment and emit happen in one
+# step, so concurrent planner stages cannot deliver seq N+1 before N.
+_planner_emit_locks = [threading.Lock() for _ in range(64)]
 
 
 def get_socketio():
     return socketio
 
 
+def _planner_emit_lock(session_id):
+    return _planner_emit_locks[hash(session_id) % len(_planner_emit_locks)]
+
+
 def emit_planner_event(session_id, event_name, payload):
-    """Emit a planner event to subscribed clients for one session."""
+    """Emit a planner event to subscribed clients for one session, recording it for replay."""
     if not session_id or not event_name:
         return
     import logging
-    logging.getLogger(__name__).debug(
-        "[PLANNER_EMIT] event=%s session=%s payload_keys=%s",
-        event_name, session_id[-8:], list((payload or {}).keys()),
-    )
-    socketio.emit(
-        event_name,
-        payload or {},
-        room=f"planner_session:{session_id}",
-        namespace="/planner",
-    )
+    with _planner_emit_lock(session_id):
+        payload = planner_events.record(session_id, event_name, payload)
+        logging.getLogger(__name__).debug(
+            "[PLANNER_EMIT] event=%s session=%s payload_keys=%s",
+            event_name, session_id[-8:], list((payload or {}).keys()),
+        )
+        socketio.emit(
+            event_name,
+            payload or {},
+            room=f"planner_session:{session_id}",
+            namespace="/planner",
+        )
 
 
 def _city_key(city):
@@ -86,6 +121,10 @@ def _sanitize_ride_for_driver(ride):
 
 
 def _emit_status(ride):
+    sync_active_ride_pointers(ride)
+    ride_location.sync_status(ride)
+    if ride.get("driver_uid") and ride.get("status") in {RIDE_STATUS_COMPLETED, RIDE_STATUS_CANCELLED}:
+        ride_trace.seal(ride)
     traveler_payload = {"ride": ride}
     driver_payload = {"ride": _sanitize_ride_for_driver(ride)}
     public_payload = {"ride": _sanitize_ride_for_driver(ride)}
@@ -123,75 +162,114 @@ def _normalize_location(location):
     return normalized
 
 
-def _cancel_timer(timer_map, ride_id):
-    timer = timer_map.pop(ride_id, None)
-    if timer:
-        timer.cancel()
+REQUEST_TIMEOUT_SECONDS = 45
+QUOTE_TIMEOUT_SECONDS = 120
 
 
-def _schedule_request_timeout(ride_id, timeout_s=45):
-    _cancel_timer(_request_timers, ride_id)
+def _expire_request(ride_id):
+    ride_dispatch.stop_dispatch(ride_id)
+    db = get_firestore_client()
+    ride_ref = db.collection("rides").document(ride_id)
+    doc = ride_ref.get()
+    if not doc.exists:
+        return
+    ride = doc.to_dict()
+    if ride.get("status") != RIDE_STATUS_REQUESTED:
+        return
+    ride_ref.update({"status": RIDE_STATUS_EXPIRED, "updated_at": utcnow_iso()})
+    updated = ride_ref.get().to_dict()
+    updated["id"] = ride_id
+    add_ride_event(db, ride_id, "REQUEST_EXPIRED", "system", {})
+    _emit_status(updated)
 
-    def _expire():
-        db = get_firestore_client()
-        ride_ref = db.collection("rides").document(ride_id)
-        doc = ride_ref.get()
-        if not doc.exists:
-            return
-        ride = doc.to_dict()
-        if ride.get("status") != RIDE_STATUS_REQUESTED:
-            return
-        ride_ref.update({"status": RIDE_STATUS_EXPIRED, "updated_at": utcnow_iso()})
-        updated = ride_ref.get().to_dict()
-        updated["id"] = ride_id
-        add_ride_event(db, ride_id, "REQUEST_EXPIRED", "system", {})
-        _emit_status(updated)
 
-    timer = threading.Timer(timeout_s, _expire)
-    timer.daemon = True
-    timer.start()
-    _request_timers[ride_id] = timer
+def _expire_quote(ride_id):
+    db = get_firestore_client()
+    ride_ref = db.collection("rides").document(ride_id)
+    doc = ride_ref.get()
+    if not doc.exists:
+        return
+    ride = doc.to_dict()
+    if ride.get("status") != RIDE_STATUS_QUOTE_SENT:
+        return
+    ride_ref.update({"status": RIDE_STATUS_EXPIRED, "updated_at": utcnow_iso()})
+    updated = ride_ref.get().to_dict()
+    updated["id"] = ride_id
+    add_ride_event(db, ride_id, "QUOTE_EXPIRED", "system", {})
+    _emit_status(updated)
 
 
-def _schedule_quote_timeout(ride_id, timeout_s=120):
-    _cancel_timer(_quote_timers, ride_id)
+def _schedule_request_timeout(ride_id, timeout_s=REQUEST_TIMEOUT_SECONDS):
+    ride_timers.schedule("request", ride_id, timeout_s)
 
-    def _expire():
-        db = get_firestore_client()
-        ride_ref = db.collection("rides").document(ride_id)
-        doc = ride_ref.get()
-        if not doc.exists:
-            return
-        ride = doc.to_dict()
-        if ride.get("status") != RIDE_STATUS_QUOTE_SENT:
-            return
-        ride_ref.update({"status": RIDE_STATUS_EXPIRED, "updated_at": utcnow_iso()})
-        updated = ride_ref.get().to_dict()
-        updated["id"] = ride_id
-        add_ride_event(db, ride_id, "QUOTE_EXPIRED", "system", {})
-        _emit_status(updated)
 
-    timer = threading.Timer(timeout_s, _expire)
-    timer.daemon = True
-    timer.start()
-    _quote_timers[ride_id] = timer
+def _schedule_quote_timeout(ride_id, timeout_s=QUOTE_TIMEOUT_SECONDS):
+    ride_timers.schedule("quote", ride_id, timeout_s)
 
 
 def _presence_for_online_drivers(city_key_value):
-    db = get_firestore_client()
-    query = (
-        db.collection("driver_presence")
-        .where("online", "==", True)
-        .where("city_key", "==", city_key_value)
+    return driver_presence.online_drivers(city_key_value)
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _dispatch_candidates(ride):
+    """Nearest live drivers to the ride's pickup (Redis GEO), capped and radius-bounded."""
+    source = ride.get("source") or {}
+    drivers = driver_presence.nearest_drivers(
+        ride.get("city_key"),
+        source.get("lat"),
+        source.get("lng"),
+        radius_km=_to_float(os.getenv("DISPATCH_RADIUS_KM", "15"), 15.0),
+        limit=int(_to_float(os.getenv("DISPATCH_MAX_DRIVERS", "50"), 50)),
     )
-    return [serialize_doc(doc) for doc in query.stream()]
+    # Presence docs outlive crashed workers (no disconnect fires); only
+    # offer the ride to drivers with a live socket somewhere in the cluster.
+    connected = socket_registry.connected_users([d.get("id") for d in drivers], "/rides")
+    return [d for d in drivers if d.get("id") in connected]
+
+
+def _offer_ride(driver, ride):
+    driver_uid = driver.get("id")
+    if not driver_uid:
+        return
+    _emit_to_user(
+        driver_uid,
+        "ride:request_received",
+        {
+            "ride": {
+                "id": ride["id"],
+                "city": ride["city"],
+                "source": ride["source"],
+                "destination": ride["destination"],
+                "traveler_name": ride.get("traveler_name"),
+                "status": ride["status"],
+                "created_at": ride["created_at"],
+                "pickup_eta_minutes": driver.get("eta_minutes"),
+            }
+        },
+    )
+
+
+def _notify_dispatch_wave(ride, info):
+    _emit_to_user(ride["traveler_uid"], "ride:dispatch_wave", info)
+
+
+def _on_presence_swept(removed):
+    for city_key_value in removed:
+        _queue_online_count(city_key_value)
 
 
 def _emit_online_count(city_key_value, city=None, to_sid=None, to_room=None):
     if not city_key_value:
         payload = {"city": city or "", "city_key": "", "count": 0}
     else:
-        count = len(_presence_for_online_drivers(city_key_value))
+        count = driver_presence.count_online(city_key_value)
         payload = {"city": city or "", "city_key": city_key_value, "count": count}
     if to_sid:
         socketio.emit("rides:online_count", payload, to=to_sid, namespace="/rides")
@@ -199,6 +277,103 @@ def _emit_online_count(city_key_value, city=None, to_sid=None, to_room=None):
         socketio.emit("rides:online_count", payload, room=to_room, namespace="/rides")
 
 
+def _online_count_debounce_seconds():
+    return max(_to_float(os.getenv("ONLINE_COUNT_DEBOUNCE_SECONDS", "2"), 2.0), 0.0)
+
+
+def _claim_online_count_flush(city_key_value, window):
+    """
+    True when this worker should schedule the city's push. Across workers,
+    only the one that sets the debounce key does; the key expires on its own
+    if that worker dies before flushing.
+    """
+    client = get_redis_client()
+    if client is None:
+        return True
+    try:
+        key = f"{ONLINE_COUNT_DEBOUNCE_PREFIX}{city_key_value}"
+        return bool(client.set(key, os.getpid(), nx=True, px=max(int(window * 3000), 1000)))
+    except Exception:
+        logger.warning("Online-count debounce claim failed; pushing from this worker.", exc_info=True)
+        return True
+
+
+def _release_online_count_flush(city_key_value):
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        client.delete(f"{ONLINE_COUNT_DEBOUNCE_PREFIX}{city_key_value}")
+    except Exception:
+        logger.warning("Online-count debounce release failed for %s.", city_key_value, exc_info=True)
+
+
+def _swap_last_online_count(city_key_value, count):
+    """Store *count* as the city's last pushed count and return the previous one (shared across workers)."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            key = f"{ONLINE_COUNT_LAST_PREFIX}{city_key_value}"
+            pipe = client.pipeline(transaction=True)
+            pipe.getset(key, count)
+            pipe.expire(key, _ONLINE_COUNT_LAST_TTL_SECONDS)
+            previous = pipe.execute()[0]
+            return None if previous is None else int(previous)
+        except Exception:
+            logger.warning("Online-count last value swap failed; using local state.", exc_info=True)
+    with _online_count_lock:
+        previous = _online_count_last.get(city_key_value)
+        _online_count_last[city_key_value] = count
+        return previous
+
+
+def _queue_online_count(city_key_value, city=None):
+    """
+    Coalesce presence changes for a city into one ``rides:online_count`` push to
+    its ``city_presence`` room per debounce window, so flapping drivers do not
+    spam travelers. The window is shared through Redis, so one worker pushes
+    per window however many saw a change.
+    """
+    if not city_key_value:
+        return
+    with _online_count_lock:
+        if city:
+            _online_count_cities[city_key_value] = city
+        if city_key_value in _online_count_pending:
+            return
+        _online_count_pending.add(city_key_value)
+    window = _online_count_debounce_seconds()
+    if not _claim_online_count_flush(city_key_value, window):
+        # Another worker's push is due within the window and will read the shared count.
+        with _online_count_lock:
+            _online_count_pending.discard(city_key_value)
+        return
+    ride_timers.schedule("online_count", city_key_value, window, local=True)
+
+
+def _flush_online_count(city_key_value):
+    with _online_count_lock:
+        _online_count_pending.discard(city_key_value)
+        city = _online_count_cities.get(city_key_value)
+    # Released before the count is read: a change after this point schedules a new push.
+    _release_online_count_flush(city_key_value)
+    count = driver_presence.count_online(city_key_value)
+    previous = _swap_last_online_count(city_key_value, count)
+    if previous == count:
+        return
+    socketio.emit(
+        "rides:online_count",
+        {
+            "city": city or "",
+            "city_key": city_key_value,
+            "count": count,
+            "delta": None if previous is None else count - previous,
+        },
+        room=f"city_presence:{city_key_value}",
+        namespace="/rides",
+    )
+
+
 def _create_ride_from_request(uid, source, destination):
     db = get_firestore_client()
     user = get_user_doc(uid) or {}
@@ -278,8 +453,9 @@ def _end_ride_internal(ride_id, traveler_uid):
             "updated_at": utcnow_iso(),
         }
     )
-    _cancel_timer(_quote_timers, ride_id)
-    _cancel_timer(_request_timers, ride_id)
+    ride_timers.cancel("quote", ride_id)
+    ride_timers.cancel("request", ride_id)
+    ride_dispatch.stop_dispatch(ride_id)
     add_ride_event(db, ride_id, "RIDE_COMPLETED", traveler_uid, {})
 
     updated = ride_ref.get().to_dict()
@@ -296,16 +472,189 @@ def end_ride_by_traveler(ride_id, traveler_uid):
     return _end_ride_internal(ride_id, traveler_uid)
 
 
+def _location_batch_max():
+    return max(int(_to_float(os.getenv("DRIVER_LOCATION_BATCH_MAX", "500"), 500)), 1)
+
+
+def _location_max_age_seconds():
+    return max(_to_float(os.getenv("DRIVER_LOCATION_MAX_AGE_SECONDS", "3600"), 3600.0), 1.0)
+
+
+def _point_ts(value, now):
+    """
+    Epoch-seconds ``ts`` of a point, or None when it is too old to use. Device
+    clocks are not trusted past server time: a future ``ts`` would make every
+    later server-stamped ping look stale.
+    """
+    ts = _to_float(value, None)
+    if ts is None or ts <= 0:
+        return now
+    # Accept epoch milliseconds from mobile clients.
+    ts = ts / 1000.0 if ts > 1e11 else ts
+    if ts < now - _location_max_age_seconds():
+        return None
+    return min(ts, now)
+
+
+def _normalize_points(data):
+    """
+    Location points from ``{"location": {...}}`` or ``{"points": [{lat, lng, ts}, ...]}``,
+    oldest first, each with an epoch-seconds ``ts`` (receive time when absent,
+    never later than it). Points older than DRIVER_LOCATION_MAX_AGE_SECONDS are dropped.
+    """
+    now = time.time()
+    raw_points = data.get("points")
+    if not isinstance(raw_points, list):
+        raw_points = [data.get("location")]
+    points = []
+    for raw in raw_points:
+        location = _normalize_location(raw)
+        if not location:
+            continue
+        location["ts"] = _point_ts(raw.get("ts"), now)
+        if location["ts"] is not None:
+            points.append(location)
+    points.sort(key=lambda point: point["ts"])
+    return points[-_location_batch_max():]
+
+
+def _ingest_driver_locations(driver_uid, data):
+    """
+    Apply one location event (a single point or an ordered batch) from a driver.
+    Only the latest point updates presence, live ride state and listeners; the
+    whole batch is appended to the ride trail. Returns (ack, error_code, message).
+    """
+    points = _normalize_points(data)
+    if not points:
+        return None, "INVALID_LOCATION", "location with lat/lng is required."
+    latest = dict(points[-1])
+    latest_ts = latest.pop("ts")
+
+    driver_presence.touch_location(driver_uid, latest)
+
+    ride_id = data.get("ride_id")
+    if not ride_id:
+        return {"ok": True, "points": len(points)}, None, None
+
+    # Pings are served from live ride state; Firestore only sees the
+    # periodic flush and status transitions (see ride_location).
+    live = ride_location.get_live(ride_id)
+    if live is None:
+        ride_doc = get_firestore_client().collection("rides").document(ride_id).get()
+        if not ride_doc.exists:
+            return None, "NOT_FOUND", "Ride not found."
+        ride = ride_doc.to_dict()
+        ride["id"] = ride_id
+        if ride.get("driver_uid") != driver_uid:
+            return None, "FORBIDDEN", "You are not assigned to this ride."
+        live = ride_location.track(ride)
+        if live is None:
+            return {"ok": True, "ride_id": ride_id, "eta_minutes": None, "points": len(points)}, None, None
+
+    if live.get("driver_uid") != driver_uid:
+        return None, "FORBIDDEN", "You are not assigned to this ride."
+
+    status = live.get("status")
+    next_status = status
+    if status == RIDE_STATUS_QUOTE_ACCEPTED and can_transition(status, RIDE_STATUS_DRIVER_EN_ROUTE):
+        next_status = RIDE_STATUS_DRIVER_EN_ROUTE
+
+    if next_status in {RIDE_STATUS_QUOTE_ACCEPTED, RIDE_STATUS_DRIVER_EN_ROUTE}:
+        eta_target = live.get("source")
+    elif next_status == RIDE_STATUS_IN_PROGRESS:
+        eta_target = live.get("destination")
+    else:
+        eta_target = None
+    eta_minutes = estimate_eta_minutes(latest, eta_target)
+
+    if next_status != status:
+        db = get_firestore_client()
+        ride_ref = db.collection("rides").document(ride_id)
+        update_payload = {"driver_location": latest, "status": next_status, "updated_at": utcnow_iso()}
+        if eta_minutes is not None:
+            update_payload["eta_minutes"] = eta_minutes
+        ride_ref.set(update_payload, merge=True)
+        updated = ride_ref.get().to_dict()
+        updated["id"] = ride_id
+        add_ride_event(db, ride_id, "DRIVER_EN_ROUTE", driver_uid, {})
+        _emit_status(updated)
+    else:
+        updated = ride_location.update_location(ride_id, latest, eta_minutes, ts=latest_ts) or live
+    if next_status in ride_trace.TRACE_STATUSES:
+        ride_trace.append_points(ride_id, points)
+    _emit_location_and_eta(updated)
+    return {"ok": True, "ride_id": ride_id, "eta_minutes": updated.get("eta_minutes"), "points": len(points)}, None, None
+
+
+def ingest_driver_locations(driver_uid, data):
+    """Shared location ingestion for socket pings and REST batch uploads."""
+    return _ingest_driver_locations(driver_uid, data)
+
+
+def _resolve_message_queue(app):
+    """
+    SOCKETIO_MESSAGE_QUEUE: "auto" uses REDIS_URL when Redis answered at
+    startup, "" / "off" disables, anything else is used as the queue URL.
+    """
+    setting = str(app.config.get("SOCKETIO_MESSAGE_QUEUE") or "").strip()
+    if setting.lower() in {"", "off", "none", "false"}:
+        return None
+    if setting.lower() == "auto":
+        return app.config.get("REDIS_URL") if get_redis_client() is not None else None
+    return setting
+
+
+def _socketio_options(app):
+    options = {
+        "cors_allowed_origins": "*",
+        "async_mode": app.config.get("SOCKETIO_ASYNC_MODE") or "threading",
+    }
+    message_queue = _resolve_message_queue(app)
+    if message_queue:
+        # Emits from any worker (REST handlers, planner tasks, timers) fan out
+        # through Redis pub/sub to the worker that owns the target socket.
+        options["message_queue"] = message_queue
+        options["channel"] = app.config.get("SOCKETIO_CHANNEL") or "flask-socketio"
+    transports = [t.strip() for t in str(app.config.get("SOCKETIO_TRANSPORTS") or "").split(",") if t.strip()]
+    if transports:
+        options["transports"] = transports
+    if app.config.get("SOCKETIO_STICKY_COOKIE"):
+        # Lets cookie-based load balancers pin long-polling requests to one worker.
+        options["cookie"] = app.config["SOCKETIO_STICKY_COOKIE"]
+    return options
+
+
+def _polling_without_affinity(app, options):
+    """True when several workers serve long-polling with nothing pinning a session to one of them."""
+    try:
+        workers = int(app.config.get("GUNICORN_WORKERS") or 1)
+    except (TypeError, ValueError):
+        workers = 1
+    transports = options.get("transports") or ["polling", "websocket"]
+    return workers > 1 and "polling" in transports and not options.get("cookie")
+
+
 def init_socketio(app):
     global _handlers_registered
 
     with _init_lock:
         if not socketio.server:
-            socketio.init_app(
-                app,
-                cors_allowed_origins="*",
-                async_mode="threading",
+            options = _socketio_options(app)
+            socketio.init_app(app, **options)
+            app.logger.info(
+                "Socket.IO initialized (async_mode=%s, message_queue=%s, transports=%s).",
+                options["async_mode"],
+                "redis" if options.get("message_queue") else "none",
+                ",".join(options.get("transports") or ["polling", "websocket"]),
             )
+            if _polling_without_affinity(app, options):
+                app.logger.warning(
+                    "Socket.IO long-polling is enabled across %s workers without SOCKETIO_STICKY_COOKIE; "
+                    "polling clients will get 'Invalid session' errors. Set SOCKETIO_TRANSPORTS=websocket, "
+                    "a sticky cookie, or GUNICORN_WORKERS=1.",
+                    app.config.get("GUNICORN_WORKERS"),
+                )
+        socket_registry.configure(app.config.get("SOCKETIO_REGISTRY_TTL"))
 
         if _handlers_registered:
             return
@@ -336,18 +685,14 @@ def init_socketio(app):
                 "city": "",
             }
             _socket_users[request.sid] = ctx
+            socket_registry.register_connection("/rides", request.sid, uid)
             join_room(f"user:{uid}")
 
-            db = get_firestore_client()
-            ride_query = (
-                db.collection("rides").where("traveler_uid", "==", uid)
-                if ctx["role"] == "TRAVELER"
-                else db.collection("rides").where("driver_uid", "==", uid)
+            active_ride = (
+                get_active_ride_for_traveler(uid) if ctx["role"] == "TRAVELER" else get_active_ride_for_driver(uid)
             )
-            for doc in ride_query.stream():
-                ride_data = doc.to_dict()
-                if ride_data.get("status") in ACTIVE_RIDE_STATUSES:
-                    join_room(f"ride:{doc.id}")
+            if active_ride:
+                join_room(f"ride:{active_ride['id']}")
 
             if ctx["role"] == "TRAVELER":
                 traveler_city = (user_data.get("city") or "").strip()
@@ -366,29 +711,13 @@ def init_socketio(app):
             ctx = _socket_users.pop(request.sid, None)
             if not ctx:
                 return
+            socket_registry.unregister_connection("/rides", request.sid, ctx["uid"])
             if ctx.get("role") == "BUSINESS" and ctx.get("business_type") == "CAB_DRIVER":
-                db = get_firestore_client()
-                presence_ref = db.collection("driver_presence").document(ctx["uid"])
-                doc = presence_ref.get()
-                if doc.exists:
-                    current = doc.to_dict()
-                    if current.get("socket_id") == request.sid:
-                        current_city = current.get("city") or ""
-                        current_city_key = _city_key(current_city)
-                        presence_ref.set(
-                            {
-                                "online": False,
-                                "socket_id": None,
-                                "last_seen_at": utcnow_iso(),
-                            },
-                            merge=True,
-                        )
-                        if current_city_key:
-                            _emit_online_count(
-                                current_city_key,
-                                city=current_city,
-                                to_room=f"city_presence:{current_city_key}",
-                            )
+                previous = driver_presence.set_offline(ctx["uid"], socket_id=request.sid)
+                if previous:
+                    current_city = previous.get("city") or ""
+                    current_city_key = _city_key(current_city)
+                    _queue_online_count(current_city_key, city=current_city)
             elif ctx.get("role") == "TRAVELER":
                 city_key = ctx.get("city_key")
                 if city_key:
@@ -406,7 +735,7 @@ def init_socketio(app):
             location = _normalize_location(data.get("location"))
             city = (data.get("city") or "").strip()
             if not city and location:
-                reverse = reverse_geocode(location["lat"], location["lng"])
+                reverse = resolve_city(location["lat"], location["lng"])
                 if reverse:
                     city = reverse.get("city") or city
                     if reverse.get("address") and not location.get("address"):
@@ -416,37 +745,30 @@ def init_socketio(app):
                 _emit_error("City is required to go online as driver.", "INVALID_CITY", request.sid)
                 return
 
-            db = get_firestore_client()
-            presence_ref = db.collection("driver_presence").document(ctx["uid"])
-            prev_doc = presence_ref.get()
-            prev_data = prev_doc.to_dict() if prev_doc.exists else {}
-            prev_city = prev_data.get("city") or ""
-            prev_city_key = _city_key(prev_city)
-            payload = {
-                "driver_uid": ctx["uid"],
-                "online": online,
-                "city": city if online else "",
-                "city_key": _city_key(city) if online else "",
-                "location": location,
-                "socket_id": request.sid if online else None,
-                "last_seen_at": utcnow_iso(),
-            }
-            presence_ref.set(payload, merge=True)
+            if online:
+                record, prev_data = driver_presence.set_online(
+                    ctx["uid"], city, _city_key(city), location=location, socket_id=request.sid
+                )
+            else:
+                prev_data = driver_presence.set_offline(ctx["uid"])
+                record = {
+                    "driver_uid": ctx["uid"],
+                    "online": False,
+                    "city": "",
+                    "city_key": "",
+                    "location": location,
+                    "socket_id": None,
+                    "last_seen_at": utcnow_iso(),
+                }
+            prev_city = (prev_data or {}).get("city") if (prev_data or {}).get("online") else ""
+            prev_city_key = _city_key(prev_city or "")
+            payload = {key: value for key, value in record.items() if key != "last_seen_ts"}
             emit("driver:presence_updated", payload)
             new_city_key = payload.get("city_key") or ""
             new_city = payload.get("city") or ""
             if prev_city_key and prev_city_key != new_city_key:
-                _emit_online_count(
-                    prev_city_key,
-                    city=prev_city,
-                    to_room=f"city_presence:{prev_city_key}",
-                )
-            if new_city_key:
-                _emit_online_count(
-                    new_city_key,
-                    city=new_city,
-                    to_room=f"city_presence:{new_city_key}",
-                )
+                _queue_online_count(prev_city_key, city=prev_city)
+            _queue_online_count(new_city_key, city=new_city)
 
         @socketio.on("traveler:set_city", namespace="/rides")
         def on_traveler_set_city(data):
@@ -474,61 +796,11 @@ def init_socketio(app):
                 _emit_error("Only CAB_DRIVER business users can send location.", "FORBIDDEN", request.sid)
                 return
 
-            data = data or {}
-            location = _normalize_location(data.get("location"))
-            if not location:
-                _emit_error("location with lat/lng is required.", "INVALID_LOCATION", request.sid)
-                return
-
-            db = get_firestore_client()
-            db.collection("driver_presence").document(ctx["uid"]).set(
-                {"location": location, "last_seen_at": utcnow_iso()},
-                merge=True,
-            )
-
-            ride_id = data.get("ride_id")
-            if not ride_id:
-                emit("driver:location_ack", {"ok": True})
-                return
-
-            ride_ref = db.collection("rides").document(ride_id)
-            ride_doc = ride_ref.get()
-            if not ride_doc.exists:
-                _emit_error("Ride not found.", "NOT_FOUND", request.sid)
-                return
-
-            ride = ride_doc.to_dict()
-            if ride.get("driver_uid") != ctx["uid"]:
-                _emit_error("You are not assigned to this ride.", "FORBIDDEN", request.sid)
+            ack, error_code, message = _ingest_driver_locations(ctx["uid"], data or {})
+            if error_code:
+                _emit_error(message, error_code, request.sid)
                 return
-
-            status = ride.get("status")
-            update_payload = {"driver_location": location, "updated_at": utcnow_iso()}
-            next_status = status
-            if status == RIDE_STATUS_QUOTE_ACCEPTED and can_transition(status, RIDE_STATUS_DRIVER_EN_ROUTE):
-                next_status = RIDE_STATUS_DRIVER_EN_ROUTE
-                update_payload["status"] = next_status
-
-            if next_status in {RIDE_STATUS_QUOTE_ACCEPTED, RIDE_STATUS_DRIVER_EN_ROUTE}:
-                eta_target = ride.get("source")
-            elif next_status == RIDE_STATUS_IN_PROGRESS:
-                eta_target = ride.get("destination")
-            else:
-                eta_target = None
-
-            eta_minutes = estimate_eta_minutes(location, eta_target)
-            if eta_minutes is not None:
-                update_payload["eta_minutes"] = eta_minutes
-
-            ride_ref.set(update_payload, merge=True)
-            updated = ride_ref.get().to_dict()
-            updated["id"] = ride_id
-
-            if next_status != status:
-                add_ride_event(db, ride_id, "DRIVER_EN_ROUTE", ctx["uid"], {})
-                _emit_status(updated)
-            _emit_location_and_eta(updated)
-            emit("driver:location_ack", {"ok": True, "ride_id": ride_id, "eta_minutes": eta_minutes})
+            emit("driver:location_ack", ack)
 
         @socketio.on("traveler:request_ride", namespace="/rides")
         def on_traveler_request_ride(data):
@@ -550,11 +822,12 @@ def init_socketio(app):
 
             source_location = _normalize_location(source_payload)
             if source_location and use_current_location:
-                source = reverse_geocode(source_location["lat"], source_location["lng"])
-                if source and source_location.get("address"):
-                    source["address"] = source_location["address"]
+                source = locate(source_location["lat"], source_location["lng"], address=source_location.get("address"))
             elif source_location:
-                source = reverse_geocode(source_location["lat"], source_location["lng"]) or source_location
+                source = (
+                    locate(source_location["lat"], source_location["lng"], address=source_location.get("address"))
+                    or source_location
+                )
             else:
                 user_doc = get_user_doc(ctx["uid"]) or {}
                 city_hint = user_doc.get("city") or ""
@@ -562,7 +835,14 @@ def init_socketio(app):
 
             destination_location = _normalize_location(destination_payload)
             if destination_location:
-                destination = reverse_geocode(destination_location["lat"], destination_location["lng"]) or destination_location
+                destination = (
+                    locate(
+                        destination_location["lat"],
+                        destination_location["lng"],
+                        address=destination_location.get("address"),
+                    )
+                    or destination_location
+                )
             else:
                 destination = forward_geocode(
                     destination_payload.get("address"),
@@ -585,31 +865,16 @@ def init_socketio(app):
             ride = _create_ride_from_request(ctx["uid"], source, destination)
             join_room(f"ride:{ride['id']}")
 
-            online_drivers = _presence_for_online_drivers(ride["city_key"])
-            emit("rides:nearby_drivers", {"ride_id": ride["id"], "city": city, "count": len(online_drivers)})
             _emit_status(ride)
-
-            for driver in online_drivers:
-                driver_uid = driver.get("id")
-                if not driver_uid:
-                    continue
-                _emit_to_user(
-                    driver_uid,
-                    "ride:request_received",
-                    {
-                        "ride": {
-                            "id": ride["id"],
-                            "city": ride["city"],
-                            "source": ride["source"],
-                            "destination": ride["destination"],
-                            "traveler_name": ride.get("traveler_name"),
-                            "status": ride["status"],
-                            "created_at": ride["created_at"],
-                        }
-                    },
-                )
-
             _schedule_request_timeout(ride["id"])
+            ranked = ride_dispatch.start_dispatch(
+                ride,
+                candidates_fn=_dispatch_candidates,
+                offer_fn=_offer_ride,
+                on_wave=_notify_dispatch_wave,
+                deadline_seconds=REQUEST_TIMEOUT_SECONDS,
+            )
+            emit("rides:nearby_drivers", {"ride_id": ride["id"], "city": city, "count": len(ranked)})
 
         @socketio.on("driver:accept_request", namespace="/rides")
         def on_driver_accept_request(data):
@@ -632,9 +897,8 @@ def init_socketio(app):
             ride_ref = db.collection("rides").document(ride_id)
             user_doc = get_user_doc(ctx["uid"]) or {}
             driver_details = ((user_doc.get("business_profile") or {}).get("details") or {})
-            presence_doc = db.collection("driver_presence").document(ctx["uid"]).get()
-            presence = presence_doc.to_dict() if presence_doc.exists else {}
-            if not presence.get("online"):
+            presence = driver_presence.get_presence(ctx["uid"]) or {}
+            if not driver_presence.is_live(presence):
                 _emit_error("Driver must be online to accept requests.", "DRIVER_OFFLINE", request.sid)
                 return
 
@@ -672,11 +936,16 @@ def init_socketio(app):
                     "driver_name": driver_details.get("driver_name") or user_doc.get("display_name"),
                     "vehicle_type": driver_details.get("vehicle_type"),
                     "vehicle_number": driver_details.get("vehicle_number"),
+                    "driver_rating": {
+                        "average": driver_details.get("cab_rating_avg") or None,
+                        "count": int(driver_details.get("cab_rating_count") or 0),
+                    },
                     "status": RIDE_STATUS_ACCEPTED_PENDING_QUOTE,
                     "accepted_at": now_iso,
                     "updated_at": now_iso,
                 }
                 transaction_obj.update(ride_ref, update_payload)
+                driver_ratings.count_assignment(transaction_obj, db, ctx["uid"])
                 ride.update(update_payload)
                 return ride
 
@@ -699,9 +968,10 @@ def init_socketio(app):
                 _emit_error("Failed to accept ride.", "ACCEPT_FAILED", request.sid)
                 return
 
-            _cancel_timer(_request_timers, ride_id)
+            ride_timers.cancel("request", ride_id)
+            dispatch_info = ride_dispatch.record_acceptance(ride_id, ctx["uid"])
             if accepted_ride.get("status") == RIDE_STATUS_ACCEPTED_PENDING_QUOTE:
-                add_ride_event(db, ride_id, "RIDE_ACCEPTED", ctx["uid"], {})
+                add_ride_event(db, ride_id, "RIDE_ACCEPTED", ctx["uid"], dispatch_info or {})
             accepted_ride["id"] = ride_id
             join_room(f"ride:{ride_id}")
             _emit_to_user(
@@ -810,7 +1080,7 @@ def init_socketio(app):
                     "updated_at": utcnow_iso(),
                 }
             )
-            _cancel_timer(_quote_timers, ride_id)
+            ride_timers.cancel("quote", ride_id)
             add_ride_event(db, ride_id, "QUOTE_ACCEPTED", ctx["uid"], {"start_otp_generated": True})
             updated = ride_ref.get().to_dict()
             updated["id"] = ride_id
@@ -849,7 +1119,7 @@ def init_socketio(app):
                 return
 
             ride_ref.update({"status": RIDE_STATUS_CANCELLED, "updated_at": utcnow_iso()})
-            _cancel_timer(_quote_timers, ride_id)
+            ride_timers.cancel("quote", ride_id)
             add_ride_event(db, ride_id, "QUOTE_REJECTED", ctx["uid"], {})
             updated = ride_ref.get().to_dict()
             updated["id"] = ride_id
@@ -945,6 +1215,7 @@ def init_socketio(app):
                 "uid": uid,
                 "role": decoded.get("role", "TRAVELER"),
             }
+            socket_registry.register_connection("/planner", request.sid, uid)
             join_room(f"planner_user:{uid}")
             import logging; logging.getLogger(__name__).info("[PLANNER_WS] client connected sid=%s uid=%s", request.sid, uid)
             emit("planner:connected", {"connected": True, "uid": uid})
@@ -952,7 +1223,9 @@ def init_socketio(app):
 
         @socketio.on("disconnect", namespace="/planner")
         def on_planner_disconnect():
-            _planner_socket_users.pop(request.sid, None)
+            ctx = _planner_socket_users.pop(request.sid, None)
+            if ctx:
+                socket_registry.unregister_connection("/planner", request.sid, ctx["uid"])
 
         @socketio.on("planner:subscribe", namespace="/planner")
         def on_planner_subscribe(data):
@@ -979,12 +1252,23 @@ def init_socketio(app):
                 emit("planner:error", {"error": "FORBIDDEN", "message": "Not allowed to subscribe to this session."})
                 return
 
-            join_room(f"planner_session:{session_id}")
+            # Replay and join under the session's emit lock: no event of this process
+            # can be emitted in between, so the replay reaches the client before any
+            # live event. Events from other processes may still interleave; the
+            # client orders them by seq and re-subscribes on a gap.
+            with _planner_emit_lock(session_id):
+                missed, complete = planner_events.replay(session_id, (data or {}).get("last_seq"))
+                if not complete:
+                    emit("planner:resync", {"session_id": session_id, "status": session.get("status")})
+                for entry in missed:
+                    emit(entry["event"], entry["payload"])
+                join_room(f"planner_session:{session_id}")
             import logging; logging.getLogger(__name__).info(
-                "[PLANNER_WS] client subscribed sid=%s uid=%s session=%s",
-                request.sid, ctx.get("uid"), session_id[-8:],
+                "[PLANNER_WS] client subscribed sid=%s uid=%s session=%s replayed=%d",
+                request.sid, ctx.get("uid"), session_id[-8:], len(missed),
             )
-            emit("planner:subscribed", {"session_id": session_id})
+            last_seq = missed[-1]["seq"] if missed else (data or {}).get("last_seq") or 0
+            emit("planner:subscribed", {"session_id": session_id, "last_seq": last_seq})
 
         @socketio.on("planner:unsubscribe", namespace="/planner")
         def on_planner_unsubscribe(data):
@@ -995,4 +1279,17 @@ def init_socketio(app):
             leave_room(f"planner_session:{session_id}")
             emit("planner:unsubscribed", {"session_id": session_id})
 
+        socket_registry.start_heartbeat(socketio)
+        driver_presence.start_sweeper(socketio, on_removed=_on_presence_swept)
+        ride_location.start_flusher(socketio)
+        ride_cleanup.start_sweeper(socketio)
+        transport_service.start_prewarmer(socketio)
+        ride_timers.register_handler("request", _expire_request)
+        ride_timers.register_handler("quote", _expire_quote)
+        ride_timers.register_handler("online_count", _flush_online_count)
+        from app.services.planner_orchestrator import TOKEN_FLUSH_TIMER, flush_tokens
+
+        ride_timers.register_handler(TOKEN_FLUSH_TIMER, flush_tokens)
+        ride_timers.start(socketio)
+        planner_jobs.start(socketio)
         _handlers_registered = True
@@ -1,14 +1,90 @@
-"""Transport suggestion service without paid provider dependencies."""
+"""
+Transport suggestion service without paid provider dependencies.
 
+Estimates come from the offline city-pair matrix (``route_matrix``) whenever
+both cities are known. The Bedrock estimate is only used for routes the
+matrix cannot place, or for every route with TRANSPORT_MODEL_ESTIMATES
+enabled.
+
+Model fare estimates are cached per route: normalized origin/destination
+city keys, travel month, modes and travelers bucket. Entries live in a local
+LRU and in Redis ``transport:route:{sha1}`` for TRANSPORT_CACHE_TTL_SECONDS.
+Raw model rows are cached and normalized per request, so booking links still
+carry the traveler's exact date.
+
+Fills are single-flight. Within a process, concurrent misses for a route wait
+for the first caller. Across processes, a ``transport:route_fill:{sha1}``
+Redis lock makes the others poll the cache instead of calling Bedrock too.
+A background job pre-warms the TRANSPORT_PREWARM_TOP_N most requested routes
+from recent planner sessions.
+"""
+
+import hashlib
 import json
 import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
 from urllib.parse import quote_plus
 
+from app.services import route_matrix
 from app.services.ai_model import invoke_bedrock_stream, is_ai_configured
+from app.services.firebase_service import get_firestore_client
 from app.services.planner_schemas import normalize_transport_option
+from app.services.redis_service import get_redis_client
+from app.utils.rides import normalize_city_key
 
 logger = logging.getLogger(__name__)
 
+CACHE_PREFIX = "transport:route:"
+FILL_LOCK_PREFIX = "transport:route_fill:"
+PREWARM_LEASE_KEY = "transport:prewarm_lease"
+
+# Planner sessions scanned for popular routes per pre-warm run
+_PREWARM_SAMPLE = 500
+_FILL_POLL_SECONDS = 0.25
+_PREWARM_FIRST_DELAY_SECONDS = 120
+
+_cache_lock = threading.Lock()
+_local_cache = OrderedDict()
+# {cache key: threading.Event} for fills running in this process
+_inflight = {}
+_prewarmer_started = False
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def model_estimates_enabled():
+    return os.getenv("TRANSPORT_MODEL_ESTIMATES", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def cache_ttl_seconds():
+    return max(int(_to_float(os.getenv("TRANSPORT_CACHE_TTL_SECONDS", "86400"), 86400)), 60)
+
+
+def _local_cache_size():
+    return max(int(_to_float(os.getenv("TRANSPORT_CACHE_LOCAL_SIZE", "512"), 512)), 1)
+
+
+def fill_wait_seconds():
+    return max(_to_float(os.getenv("TRANSPORT_FILL_WAIT_SECONDS", "30"), 30.0), 1.0)
+
+
+def prewarm_top_n():
+    return max(int(_to_float(os.getenv("TRANSPORT_PREWARM_TOP_N", "20"), 20)), 0)
+
+
+def prewarm_interval_seconds():
+    return max(_to_float(os.getenv("TRANSPORT_PREWARM_INTERVAL_SECONDS", "21600"), 21600.0), 60.0)
+
 
 def _safe_json(value, fallback=None):
     try:
@@ -70,6 +146,10 @@ def _heuristic_options(criteria, mode):
     date = criteria.get("date") or ""
     travelers = int(criteria.get("travelers") or 1)
 
+    rows = route_matrix.estimate(origin, destination, mode, travelers)
+    if rows is not None:
+        return _normalize_rows(rows, mode, criteria)
+
     if mode == "FLIGHT":
         base = max(2500, 3200 + (travelers * 350))
         durations = ["1h 45m", "2h 10m", "2h 30m"]
@@ -96,7 +176,174 @@ def _heuristic_options(criteria, mode):
     return _normalize_rows(rows, mode, criteria)
 
 
-def _model_options(criteria, modes):
+# ──────────────────────────────────────────────
+# Route cache
+# ──────────────────────────────────────────────
+
+def _travelers_bucket(value):
+    try:
+        travelers = int(value)
+    except (TypeError, ValueError):
+        travelers = 1
+    if travelers <= 2:
+        return str(max(travelers, 1))
+    return "3-4" if travelers <= 4 else "5+"
+
+
+def _date_bucket(value):
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").strftime("%Y-%m")
+    except (TypeError, ValueError):
+        return "any"
+
+
+def route_parts(criteria, modes):
+    """The normalized route identity: (origin, destination, month, modes, travelers bucket)."""
+    return (
+        normalize_city_key(criteria.get("origin") or criteria.get("origin_city")),
+        normalize_city_key(criteria.get("destination") or criteria.get("destination_city")),
+        _date_bucket(criteria.get("date")),
+        ",".join(sorted(modes)),
+        _travelers_bucket(criteria.get("travelers")),
+    )
+
+
+def route_key(criteria, modes):
+    digest = hashlib.sha1("|".join(route_parts(criteria, modes)).encode("utf-8")).hexdigest()
+    return f"{CACHE_PREFIX}{digest}"
+
+
+def _local_get(key):
+    with _cache_lock:
+        entry = _local_cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del _local_cache[key]
+            return None
+        _local_cache.move_to_end(key)
+        return value
+
+
+def _local_set(key, value, ttl):
+    with _cache_lock:
+        _local_cache[key] = (value, time.time() + ttl)
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > _local_cache_size():
+            _local_cache.popitem(last=False)
+
+
+def _cache_get(key):
+    value = _local_get(key)
+    if value is not None:
+        return value
+    client = get_redis_client()
+    if client is None:
+        return None
+    try:
+        raw = client.get(key)
+        if not raw:
+            return None
+        value = json.loads(raw)
+        ttl_left = client.ttl(key)
+        _local_set(key, value, ttl_left if ttl_left and ttl_left > 0 else cache_ttl_seconds())
+        return value
+    except Exception:
+        logger.warning("Transport cache read failed for %s.", key, exc_info=True)
+        return None
+
+
+def _cache_set(key, value):
+    ttl = cache_ttl_seconds()
+    _local_set(key, value, ttl)
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.setex(key, ttl, json.dumps(value))
+        except Exception:
+            logger.warning("Transport cache write failed for %s.", key, exc_info=True)
+
+
+def _acquire_fill_lock(key):
+    """Returns a release token, None when another process is filling *key*, or "" without Redis."""
+    client = get_redis_client()
+    if client is None:
+        return ""
+    token = uuid.uuid4().hex
+    lock_key = FILL_LOCK_PREFIX + key[len(CACHE_PREFIX):]
+    try:
+        if client.set(lock_key, token, nx=True, ex=max(int(fill_wait_seconds()), 1)):
+            return token
+        return None
+    except Exception:
+        logger.warning("Transport fill lock failed for %s; filling locally.", key, exc_info=True)
+        return ""
+
+
+def _release_fill_lock(key, token):
+    client = get_redis_client()
+    if not token or client is None:
+        return
+    lock_key = FILL_LOCK_PREFIX + key[len(CACHE_PREFIX):]
+    try:
+        if client.get(lock_key) == token:
+            client.delete(lock_key)
+    except Exception:
+        logger.warning("Transport fill lock release failed for %s.", key, exc_info=True)
+
+
+def _wait_for_remote_fill(key):
+    """Poll the cache while another process fills *key*; None if it gave up or failed."""
+    client = get_redis_client()
+    lock_key = FILL_LOCK_PREFIX + key[len(CACHE_PREFIX):]
+    deadline = time.monotonic() + fill_wait_seconds()
+    while time.monotonic() < deadline:
+        value = _cache_get(key)
+        if value is not None:
+            return value
+        try:
+            if client is None or not client.exists(lock_key):
+                return _cache_get(key)
+        except Exception:
+            return None
+        time.sleep(_FILL_POLL_SECONDS)
+    return None
+
+
+def _single_flight(key, loader):
+    """Cached value for *key*, else ``loader()``, run once per key across threads and processes."""
+    value = _cache_get(key)
+    if value is not None:
+        return value
+    with _cache_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(fill_wait_seconds())
+        return _cache_get(key)
+
+    token = None
+    try:
+        token = _acquire_fill_lock(key)
+        if token is None:
+            value = _wait_for_remote_fill(key)
+            if value is not None:
+                return value
+        value = loader()
+        if value:
+            _cache_set(key, value)
+        return value
+    finally:
+        _release_fill_lock(key, token)
+        with _cache_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def _model_rows(criteria, modes):
     origin = criteria.get("origin") or criteria.get("origin_city") or ""
     destination = criteria.get("destination") or criteria.get("destination_city") or ""
     date = criteria.get("date") or ""
@@ -128,13 +375,27 @@ Rules:
     text = invoke_bedrock_stream(prompt, on_token=lambda c: chunks.append(c), temperature=0.3, max_tokens=1200)
     parsed = _extract_json(text or "".join(chunks))
     if not isinstance(parsed, dict):
-        return {"flights": [], "trains": []}
+        return None
+    rows = {"flights": parsed.get("flights") or [], "trains": parsed.get("trains") or []}
+    # Empty answers are not cached.
+    return rows if rows["flights"] or rows["trains"] else None
 
-    flights = _normalize_rows(parsed.get("flights") or [], "FLIGHT", criteria) if "FLIGHT" in modes else []
-    trains = _normalize_rows(parsed.get("trains") or [], "TRAIN", criteria) if "TRAIN" in modes else []
+
+def _model_options(criteria, modes):
+    rows = _single_flight(route_key(criteria, modes), lambda: _model_rows(criteria, modes)) or {}
+    flights = _normalize_rows(rows.get("flights") or [], "FLIGHT", criteria) if "FLIGHT" in modes else []
+    trains = _normalize_rows(rows.get("trains") or [], "TRAIN", criteria) if "TRAIN" in modes else []
     return {"flights": flights, "trains": trains}
 
 
+def _uses_model(criteria):
+    if model_estimates_enabled():
+        return True
+    origin = criteria.get("origin") or criteria.get("origin_city")
+    destination = criteria.get("destination") or criteria.get("destination_city")
+    return not route_matrix.covers(origin, destination)
+
+
 def generate_transport_suggestions(criteria, modes):
     """
     Return transport suggestions without third-party paid APIs.
@@ -146,14 +407,16 @@ def generate_transport_suggestions(criteria, modes):
 
     warnings = []
     options = {"flights": [], "trains": []}
-    if is_ai_configured():
-        try:
-            options = _model_options(criteria, requested)
-        except Exception as exc:
-            logger.warning("AI transport suggestion failed: %s", exc)
-            warnings.append("AI transport estimate failed; using default indicative suggestions.")
-    else:
-        warnings.append("AI not configured for transport estimate; using default indicative suggestions.")
+    # Known city pairs skip the model; the offline matrix below answers them instantly.
+    if _uses_model(criteria):
+        if is_ai_configured():
+            try:
+                options = _model_options(criteria, requested)
+            except Exception as exc:
+                logger.warning("AI transport suggestion failed: %s", exc)
+                warnings.append("AI transport estimate failed; using default indicative suggestions.")
+        else:
+            warnings.append("AI not configured for transport estimate; using default indicative suggestions.")
 
     if "FLIGHT" in requested and not options.get("flights"):
         options["flights"] = _heuristic_options(criteria, "FLIGHT")
@@ -170,3 +433,98 @@ def search_flights(criteria):
 def search_trains(criteria):
     options, _ = generate_transport_suggestions(criteria, {"TRAIN"})
     return options.get("trains") or []
+
+
+# ──────────────────────────────────────────────
+# Pre-warming
+# ──────────────────────────────────────────────
+
+def popular_routes(limit=None, sample=_PREWARM_SAMPLE):
+    """
+    The most requested routes among the last *sample* planner sessions, as
+    ``[(criteria, modes, count)]``. Routes for past months are skipped.
+    """
+    limit = prewarm_top_n() if limit is None else limit
+    db = get_firestore_client()
+    query = (
+        db.collection("planner_sessions")
+        .order_by("created_at", direction="DESCENDING")
+        .limit(sample)
+        .select(["input"])
+    )
+    this_month = datetime.utcnow().strftime("%Y-%m")
+    counts = Counter()
+    examples = {}
+    for doc in query.stream():
+        planner_input = (doc.to_dict() or {}).get("input") or {}
+        criteria = {
+            "origin": planner_input.get("origin"),
+            "destination": planner_input.get("destination"),
+            "date": planner_input.get("start_date"),
+            "travelers": planner_input.get("travelers"),
+        }
+        modes = {str(mode).upper() for mode in planner_input.get("transport_modes") or []} or {"FLIGHT", "TRAIN"}
+        parts = route_parts(criteria, modes)
+        if not parts[0] or not parts[1] or (parts[2] != "any" and parts[2] < this_month):
+            continue
+        counts[parts] += 1
+        examples.setdefault(parts, (criteria, modes))
+    return [(*examples[parts], count) for parts, count in counts.most_common(limit)]
+
+
+def prewarm_routes(limit=None):
+    """
+    Fill the cache for popular routes that would call the model and are not
+    cached yet. Returns the number filled.
+    """
+    if not is_ai_configured():
+        return 0
+    filled = 0
+    for criteria, modes, _count in popular_routes(limit):
+        key = route_key(criteria, modes)
+        if not _uses_model(criteria) or _cache_get(key) is not None:
+            continue
+        try:
+            if _single_flight(key, lambda criteria=criteria, modes=modes: _model_rows(criteria, modes)):
+                filled += 1
+        except Exception:
+            logger.warning("Transport pre-warm failed for %s.", key, exc_info=True)
+    return filled
+
+
+def _acquire_prewarm_lease(interval):
+    client = get_redis_client()
+    if client is None:
+        return True
+    try:
+        return bool(client.set(PREWARM_LEASE_KEY, str(os.getpid()), nx=True, ex=max(int(interval), 1)))
+    except Exception:
+        logger.warning("Transport pre-warm lease failed; pre-warming locally.", exc_info=True)
+        return True
+
+
+def start_prewarmer(socketio, interval_seconds=None):
+    """Run ``prewarm_routes`` periodically on this worker (the lease keeps it to one per interval)."""
+    global _prewarmer_started
+    with _cache_lock:
+        if _prewarmer_started:
+            return
+        _prewarmer_started = True
+    interval = interval_seconds or prewarm_interval_seconds()
+
+    def _loop():
+        # First run shortly after startup, so a fresh deploy is warm well before the interval.
+        delay = min(interval, _PREWARM_FIRST_DELAY_SECONDS)
+        while True:
+            socketio.sleep(delay)
+            delay = interval
+            if not _acquire_prewarm_lease(interval):
+                continue
+            try:
+                filled = prewarm_routes()
+                if filled:
+                    logger.info("Pre-warmed transport estimates for %s routes.", filled)
+            except Exception:
+                logger.warning("Transport pre-warm failed.", exc_info=True)
+
+    socketio.start_background_task(_loop)
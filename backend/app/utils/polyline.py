@@ -0,0 +1,79 @@
+"""
+Encoded polyline helpers (Google polyline algorithm) for compact route traces.
+
+Coordinates are stored as zig-zag, 5-bit-chunked deltas of fixed-point values;
+the same varint scheme encodes any integer series (e.g. timestamp deltas).
+"""
+
+
+def _encode_value(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def _decode_values(text):
+    values = []
+    index = 0
+    length = len(text)
+    while index < length:
+        result = 0
+        shift = 0
+        while True:
+            chunk = ord(text[index]) - 63
+            index += 1
+            result |= (chunk & 0x1F) << shift
+            shift += 5
+            if chunk < 0x20:
+                break
+        values.append(~(result >> 1) if result & 1 else result >> 1)
+    return values
+
+
+def encode_deltas(values):
+    """Encode an integer series as varint deltas from zero."""
+    out = []
+    previous = 0
+    for value in values:
+        value = int(value)
+        _encode_value(value - previous, out)
+        previous = value
+    return "".join(out)
+
+
+def decode_deltas(text):
+    values = []
+    total = 0
+    for delta in _decode_values(text or ""):
+        total += delta
+        values.append(total)
+    return values
+
+
+def encode_polyline(coords, precision=5):
+    """Encode ``[(lat, lng), ...]`` as a polyline string."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in coords:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lng_i - prev_lng, out)
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(out)
+
+
+def decode_polyline(text, precision=5):
+    """Decode a polyline string into ``[(lat, lng), ...]``."""
+    factor = float(10 ** precision)
+    values = _decode_values(text or "")
+    coords = []
+    lat = lng = 0
+    for index in range(0, len(values) - 1, 2):
+        lat += values[index]
+        lng += values[index + 1]
+        coords.append((lat / factor, lng / factor))
+    return coords
@@ -2,11 +2,18 @@
 Shared helpers and constants for the rides module.
 """
 
+import logging
 import math
 import re
 from datetime import datetime
 
+import numpy as np
+from redis.exceptions import WatchError
+
 from app.services.firebase_service import get_firestore_client
+from app.services.redis_service import get_redis_client
+
+logger = logging.getLogger(__name__)
 
 RIDE_STATUS_REQUESTED = "REQUESTED"
 RIDE_STATUS_ACCEPTED_PENDING_QUOTE = "ACCEPTED_PENDING_QUOTE"
@@ -90,9 +97,24 @@ def get_user_doc(uid):
     return doc.to_dict()
 
 
-def get_active_ride_for_traveler(uid):
+# Active-ride pointers: ride:active:{traveler|driver}:{uid} -> ride id, or "-"
+# when the user has none. Kept in step by sync_active_ride_pointers on every
+# status change; a missing or stale pointer falls back to one scan and is
+# re-seeded. Seeding never overwrites a pointer that changed since it was read
+# (SET NX, or compare-and-set under WATCH), so a scan racing a status change
+# cannot replace a fresh ride id with "-". Without Redis the scan is used
+# directly (exact across workers).
+_NO_ACTIVE_RIDE = "-"
+_ACTIVE_POINTER_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _active_ride_key(field, uid):
+    return f"ride:active:{field.split('_')[0]}:{uid}"
+
+
+def _scan_active_ride(field, uid):
     db = get_firestore_client()
-    query = db.collection("rides").where("traveler_uid", "==", uid)
+    query = db.collection("rides").where(field, "==", uid)
     for doc in query.stream():
         data = doc.to_dict()
         if data.get("status") in ACTIVE_RIDE_STATUSES:
@@ -101,15 +123,82 @@ def get_active_ride_for_traveler(uid):
     return None
 
 
+def _replace_pointer(client, key, expected, value):
+    """Set *key* to *value* only if it still holds *expected* (None: only if unset)."""
+    if expected is None:
+        return bool(client.set(key, value, nx=True, ex=_ACTIVE_POINTER_TTL_SECONDS))
+    try:
+        with client.pipeline() as pipe:
+            pipe.watch(key)
+            if pipe.get(key) != expected:
+                return False
+            pipe.multi()
+            pipe.set(key, value, ex=_ACTIVE_POINTER_TTL_SECONDS)
+            pipe.execute()
+            return True
+    except WatchError:
+        return False
+
+
+def _seed_active_ride(client, field, uid, stale_pointer=None):
+    ride = _scan_active_ride(field, uid)
+    _replace_pointer(client, _active_ride_key(field, uid), stale_pointer, ride["id"] if ride else _NO_ACTIVE_RIDE)
+    return ride
+
+
+def _get_active_ride(field, uid):
+    client = get_redis_client()
+    if client is None:
+        return _scan_active_ride(field, uid)
+    try:
+        pointer = client.get(_active_ride_key(field, uid))
+        if pointer is None:
+            return _seed_active_ride(client, field, uid)
+        if pointer == _NO_ACTIVE_RIDE:
+            return None
+        doc = get_firestore_client().collection("rides").document(pointer).get()
+        if doc.exists:
+            data = doc.to_dict()
+            if data.get("status") in ACTIVE_RIDE_STATUSES and data.get(field) == uid:
+                data["id"] = doc.id
+                return data
+        return _seed_active_ride(client, field, uid, stale_pointer=pointer)
+    except Exception:
+        logger.warning("Active ride pointer read failed; scanning rides.", exc_info=True)
+        return _scan_active_ride(field, uid)
+
+
+def get_active_ride_for_traveler(uid):
+    return _get_active_ride("traveler_uid", uid)
+
+
 def get_active_ride_for_driver(uid):
-    db = get_firestore_client()
-    query = db.collection("rides").where("driver_uid", "==", uid)
-    for doc in query.stream():
-        data = doc.to_dict()
-        if data.get("status") in ACTIVE_RIDE_STATUSES:
-            data["id"] = doc.id
-            return data
-    return None
+    return _get_active_ride("driver_uid", uid)
+
+
+def sync_active_ride_pointers(ride):
+    """Point the ride's traveler and driver at it while active; clear on any other status."""
+    client = get_redis_client()
+    ride_id = (ride or {}).get("id")
+    if client is None or not ride_id:
+        return
+    active = ride.get("status") in ACTIVE_RIDE_STATUSES
+    for field in ("traveler_uid", "driver_uid"):
+        uid = ride.get(field)
+        if not uid:
+            continue
+        key = _active_ride_key(field, uid)
+        try:
+            if active:
+                client.set(key, ride_id, ex=_ACTIVE_POINTER_TTL_SECONDS)
+            else:
+                _replace_pointer(client, key, ride_id, _NO_ACTIVE_RIDE)
+        except Exception:
+            logger.warning("Active ride pointer update failed for %s.", uid, exc_info=True)
+            try:
+                client.delete(key)
+            except Exception:
+                pass
 
 
 def add_ride_event(db, ride_id, event_type, actor_uid, payload=None):
@@ -153,3 +242,56 @@ def estimate_eta_minutes(source, target, avg_speed_kmph=25.0):
         return None
     minutes = (distance_km / avg_speed_kmph) * 60.0
     return max(1, int(round(minutes)))
+
+
+def haversine_km_many(lat, lng, lats, lngs):
+    """Vectorized ``haversine_km`` from one point to arrays of points; returns a float64 array."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    lat = float(lat)
+    lng = float(lng)
+    # Same operation order as the scalar version (degree deltas first) for parity.
+    d_lat = np.radians(lat - lats)
+    d_lon = np.radians(lng - lngs)
+    a = (
+        np.sin(d_lat / 2) ** 2
+        + np.cos(np.radians(lats))
+        * math.cos(math.radians(lat))
+        * np.sin(d_lon / 2) ** 2
+    )
+    return 2 * 6371.0 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def estimate_eta_minutes_many(target, lats, lngs, avg_speed_kmph=25.0):
+    """
+    Vectorized ``estimate_eta_minutes`` from many sources to one *target*.
+    Returns an int64 array (same rounding and 1-minute floor as the scalar),
+    or None when the target or speed is unusable.
+    """
+    try:
+        lat = float(target["lat"])
+        lng = float(target["lng"])
+    except (TypeError, ValueError, KeyError):
+        return None
+    if avg_speed_kmph <= 0:
+        return None
+    minutes = haversine_km_many(lat, lng, lats, lngs) / avg_speed_kmph * 60.0
+    return np.maximum(1, np.rint(minutes)).astype(np.int64)
+
+
+def nearest_k(lat, lng, lats, lngs, k):
+    """
+    Indices of the *k* points closest to (lat, lng), nearest first, plus their
+    distances in km. Uses argpartition so cost stays O(n) for small k.
+    """
+    distances = haversine_km_many(lat, lng, lats, lngs)
+    n = distances.shape[0]
+    k = max(0, min(int(k), n))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    if k < n:
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    order = candidates[np.argsort(distances[candidates], kind="stable")]
+    return order, distances[order]
@@ -0,0 +1 @@
+"""Local performance benchmarks backed by an in-memory Firestore double."""
@@ -0,0 +1,759 @@
+"""
+In-memory Firestore stand-in used by the benchmark suite and tests.
+
+Implements the subset of the google-cloud-firestore client surface the app
+relies on: collections, subcollections, collection_group, where/order_by/limit
+queries with cursors, write batches and optimistic transactions (compatible with
+``firestore.transactional``). Every read and write is counted so benchmarks can
+assert on Firestore cost, not just wall time.
+"""
+
+import copy
+import random
+import string
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import Aborted, AlreadyExists, InvalidArgument, NotFound
+from google.cloud.firestore_v1 import transforms
+
+MAX_BATCH_WRITES = 500
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_MISSING = object()
+
+
+class FirestoreStats:
+    """Thread-safe operation counters (reads follow Firestore billing rules)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.reads = 0
+            self.writes = 0
+            self.deletes = 0
+            self.queries = 0
+            self.reads_by_collection = Counter()
+            self.writes_by_collection = Counter()
+
+    def add_reads(self, collection_id, count=1):
+        with self._lock:
+            self.reads += count
+            self.reads_by_collection[collection_id] += count
+
+    def add_query(self):
+        with self._lock:
+            self.queries += 1
+
+    def add_write(self, collection_id, delete=False):
+        with self._lock:
+            if delete:
+                self.deletes += 1
+            else:
+                self.writes += 1
+            self.writes_by_collection[collection_id] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "reads": self.reads,
+                "writes": self.writes,
+                "deletes": self.deletes,
+                "queries": self.queries,
+                "reads_by_collection": dict(self.reads_by_collection),
+                "writes_by_collection": dict(self.writes_by_collection),
+            }
+
+
+def _split_field_path(field_path):
+    return [part for part in str(field_path).split(".") if part]
+
+
+def _get_field(data, field_path):
+    current = data
+    for part in _split_field_path(field_path):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _apply_transform(current, value):
+    if value is transforms.DELETE_FIELD:
+        return _MISSING
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and current is not _MISSING else 0
+        return base + value.value
+    if isinstance(value, transforms.Maximum):
+        base = current if isinstance(current, (int, float)) and current is not _MISSING else value.value
+        return max(base, value.value)
+    if isinstance(value, transforms.Minimum):
+        base = current if isinstance(current, (int, float)) and current is not _MISSING else value.value
+        return min(base, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in items:
+                items.append(item)
+        return items
+    if isinstance(value, transforms.ArrayRemove):
+        items = list(current) if isinstance(current, list) else []
+        return [item for item in items if item not in value.values]
+    if isinstance(value, dict):
+        resolved = {}
+        for key, item in value.items():
+            item_value = _apply_transform(_MISSING, item)
+            if item_value is not _MISSING:
+                resolved[key] = item_value
+        return resolved
+    return copy.deepcopy(value)
+
+
+def _set_field(data, field_path, value):
+    parts = _split_field_path(field_path)
+    current = data
+    for part in parts[:-1]:
+        nested = current.get(part)
+        if not isinstance(nested, dict):
+            nested = {}
+            current[part] = nested
+        current = nested
+    resolved = _apply_transform(current.get(parts[-1], _MISSING), value)
+    if resolved is _MISSING:
+        current.pop(parts[-1], None)
+    else:
+        current[parts[-1]] = resolved
+
+
+def _merge_into(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_into(target[key], value)
+        else:
+            resolved = _apply_transform(target.get(key, _MISSING), value)
+            if resolved is _MISSING:
+                target.pop(key, None)
+            else:
+                target[key] = resolved
+
+
+def _sort_value(value):
+    """Order values across types roughly the way Firestore does."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, (list, tuple)):
+        return (6, [_sort_value(item) for item in value])
+    if isinstance(value, dict):
+        return (7, sorted((k, _sort_value(v)) for k, v in value.items()))
+    return (5, str(value))
+
+
+def _matches(value, op, expected):
+    if op == "==":
+        return value is not _MISSING and value == expected
+    if op == "!=":
+        return value is not _MISSING and value is not None and value != expected
+    if op == "in":
+        return value is not _MISSING and value in (expected or [])
+    if op == "not-in":
+        return value is not _MISSING and value is not None and value not in (expected or [])
+    if op == "array-contains":
+        return isinstance(value, list) and expected in value
+    if op == "array-contains-any":
+        return isinstance(value, list) and any(item in value for item in (expected or []))
+    if value is _MISSING or value is None:
+        return False
+    left, right = _sort_value(value), _sort_value(expected)
+    if left[0] != right[0]:
+        return False
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    raise InvalidArgument(f"Unsupported operator: {op}")
+
+
+class FakeDocumentSnapshot:
+    # Stored documents are replaced, never mutated, on write, so snapshots can
+    # share them; to_dict() hands callers a private copy.
+
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.update_time = update_time
+        self.create_time = update_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        value = _get_field(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<FakeDocumentReference {self.path}>"
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def collections(self):
+        prefix = f"{self.path}/"
+        names = {
+            path[len(prefix):]
+            for path in self._client._list_collection_paths()
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        }
+        return [self.collection(name) for name in sorted(names)]
+
+    def get(self, field_paths=None, transaction=None, **_kwargs):
+        snapshot = self._client._get_document(self.path)
+        if transaction is not None:
+            transaction._record_read(self.path)
+        return snapshot
+
+    def create(self, document_data):
+        self._client._commit_writes([("create", self.path, document_data, False)])
+
+    def set(self, document_data, merge=False):
+        self._client._commit_writes([("set", self.path, document_data, merge)])
+
+    def update(self, field_updates, **_kwargs):
+        self._client._commit_writes([("update", self.path, field_updates, False)])
+
+    def delete(self, **_kwargs):
+        self._client._commit_writes([("delete", self.path, None, False)])
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias or "count"
+
+    def get(self, **_kwargs):
+        total = len(self._query._results())
+        # Aggregations bill one read per 1000 index entries (minimum one).
+        self._query._client.stats.add_reads(self._query._stats_collection, max(1, -(-total // 1000)))
+        self._query._client.stats.add_query()
+        return [[FakeAggregationResult(self._alias, total)]]
+
+
+class FakeQuery:
+    def __init__(self, client, collection_path=None, collection_group=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._collection_group = collection_group
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._limit_to_last = False
+        self._offset = 0
+        self._start = None
+        self._end = None
+        self._projection = None
+
+    def _copy(self):
+        clone = FakeQuery.__new__(FakeQuery)
+        clone.__dict__.update(self.__dict__)
+        clone._filters = list(self._filters)
+        clone._orders = list(self._orders)
+        return clone
+
+    @property
+    def _stats_collection(self):
+        if self._collection_group:
+            return self._collection_group
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        clone = self._copy()
+        if filter is not None:
+            field_path = getattr(filter, "field_path")
+            op_string = getattr(filter, "op_string")
+            value = getattr(filter, "value")
+        clone._filters.append((field_path, op_string, value))
+        return clone
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        clone = self._copy()
+        clone._orders.append((field_path, str(direction).upper() == "DESCENDING"))
+        return clone
+
+    def limit(self, count):
+        clone = self._copy()
+        clone._limit = count
+        clone._limit_to_last = False
+        return clone
+
+    def limit_to_last(self, count):
+        clone = self._copy()
+        clone._limit = count
+        clone._limit_to_last = True
+        return clone
+
+    def offset(self, num_to_skip):
+        clone = self._copy()
+        clone._offset = num_to_skip
+        return clone
+
+    def select(self, field_paths):
+        clone = self._copy()
+        clone._projection = list(field_paths)
+        return clone
+
+    def _cursor(self, values, before, inclusive):
+        clone = self._copy()
+        if isinstance(values, FakeDocumentSnapshot):
+            values = {"__snapshot__": values}
+        cursor = (values, inclusive)
+        if before:
+            clone._start = cursor
+        else:
+            clone._end = cursor
+        return clone
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._cursor(document_fields_or_snapshot, True, True)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._cursor(document_fields_or_snapshot, True, False)
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._cursor(document_fields_or_snapshot, False, True)
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._cursor(document_fields_or_snapshot, False, False)
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self, alias)
+
+    def _order_key(self, path, data):
+        key = []
+        for field_path, descending in self._orders:
+            value = _sort_value(_get_field(data, field_path))
+            key.append(_Reversed(value) if descending else value)
+        key.append(path)
+        return key
+
+    def _cursor_key(self, cursor):
+        values, _inclusive = cursor
+        if isinstance(values, dict) and "__snapshot__" in values:
+            snapshot = values["__snapshot__"]
+            return self._order_key(snapshot.reference.path, snapshot._data or {})
+        if isinstance(values, dict):
+            values = [values.get(field_path) for field_path, _ in self._orders]
+        key = []
+        for (field_path, descending), value in zip(self._orders, list(values)):
+            sort_value = _sort_value(value)
+            key.append(_Reversed(sort_value) if descending else sort_value)
+        return key
+
+    def _results(self):
+        rows = []
+        for path, data in self._client._iter_documents(self._collection_path, self._collection_group):
+            if all(_matches(_get_field(data, f), op, v) for f, op, v in self._filters):
+                if all(_get_field(data, f) is not _MISSING for f, _ in self._orders):
+                    rows.append((path, data))
+        rows.sort(key=lambda row: self._order_key(row[0], row[1]))
+
+        if self._start is not None:
+            start_key = self._cursor_key(self._start)
+            inclusive = self._start[1]
+            width = len(start_key)
+            rows = [
+                row for row in rows
+                if (self._order_key(*row)[:width] >= start_key if inclusive else self._order_key(*row)[:width] > start_key)
+            ]
+        if self._end is not None:
+            end_key = self._cursor_key(self._end)
+            inclusive = self._end[1]
+            width = len(end_key)
+            rows = [
+                row for row in rows
+                if (self._order_key(*row)[:width] <= end_key if inclusive else self._order_key(*row)[:width] < end_key)
+            ]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[-self._limit:] if self._limit_to_last else rows[: self._limit]
+        return rows
+
+    def stream(self, transaction=None, **_kwargs):
+        rows = self._results()
+        self._client.stats.add_query()
+        if not rows:
+            # An empty query result is still billed as one read.
+            self._client.stats.add_reads(self._stats_collection, 1)
+        for path, data in rows:
+            self._client.stats.add_reads(self._stats_collection, 1)
+            if transaction is not None:
+                transaction._record_read(path)
+            if self._projection is not None:
+                projected = {}
+                for field_path in self._projection:
+                    value = _get_field(data, field_path)
+                    if value is not _MISSING:
+                        _set_field(projected, field_path, value)
+                data = projected
+            yield FakeDocumentSnapshot(
+                FakeDocumentReference(self._client, path),
+                data,
+                self._client._update_times.get(path),
+            )
+
+    def get(self, transaction=None, **_kwargs):
+        return list(self.stream(transaction=transaction))
+
+
+class _Reversed:
+    """Sort key wrapper that inverts comparison for DESCENDING order."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __le__(self, other):
+        return self.value >= other.value
+
+    def __ge__(self, other):
+        return self.value <= other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, collection_path=path)
+        self.path = path
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self.path:
+            return None
+        return FakeDocumentReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = self._client._auto_id()
+        return FakeDocumentReference(self._client, f"{self.path}/{document_id}")
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self, page_size=None):
+        return [
+            FakeDocumentReference(self._client, path)
+            for path, _ in self._client._iter_documents(self.path, None)
+        ]
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def _add(self, write):
+        if len(self._writes) >= MAX_BATCH_WRITES:
+            raise InvalidArgument(f"A batch may contain at most {MAX_BATCH_WRITES} writes.")
+        self._writes.append(write)
+
+    def create(self, reference, document_data):
+        self._add(("create", reference.path, document_data, False))
+
+    def set(self, reference, document_data, merge=False):
+        self._add(("set", reference.path, document_data, merge))
+
+    def update(self, reference, field_updates, **_kwargs):
+        self._add(("update", reference.path, field_updates, False))
+
+    def delete(self, reference, **_kwargs):
+        self._add(("delete", reference.path, None, False))
+
+    def commit(self, **_kwargs):
+        writes, self._writes = self._writes, []
+        self._client._commit_writes(writes)
+        return [datetime.now(timezone.utc) for _ in writes]
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    Optimistic transaction: reads record document versions and the commit
+    aborts (and is retried by ``firestore.transactional``) if any of them moved.
+    """
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _record_read(self, path):
+        if path not in self._read_versions:
+            self._read_versions[path] = self._client._versions.get(path, 0)
+
+    def _clean_up(self):
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = self._client._auto_id().encode()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        try:
+            self._client._commit_writes(self._writes, expected_versions=self._read_versions)
+        finally:
+            self._clean_up()
+        return []
+
+    def get(self, ref_or_query, **_kwargs):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            return ref_or_query.get(transaction=self)
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references, **_kwargs):
+        return [ref.get(transaction=self) for ref in references]
+
+    def commit(self, **_kwargs):
+        raise RuntimeError("Use firestore.transactional to run FakeTransaction.")
+
+
+class FakeFirestore:
+    """Process-local Firestore client double with operation accounting."""
+
+    def __init__(self, seed=0):
+        self._lock = threading.RLock()
+        self._collections = {}
+        self._versions = {}
+        self._update_times = {}
+        self._rng = random.Random(seed)
+        self.stats = FirestoreStats()
+
+    # ── Client surface ─────────────────────────
+
+    def collection(self, collection_path):
+        return FakeCollectionReference(self, collection_path)
+
+    def document(self, document_path):
+        return FakeDocumentReference(self, document_path)
+
+    def collection_group(self, collection_id):
+        return FakeQuery(self, collection_group=collection_id)
+
+    def collections(self):
+        return [self.collection(path) for path in sorted(self._list_collection_paths()) if "/" not in path]
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return FakeTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, transaction=None, **_kwargs):
+        for ref in references:
+            yield ref.get(transaction=transaction)
+
+    # ── Helpers for fixtures ────────────────────
+
+    def seed_document(self, path, data):
+        """Write a document without touching counters (fixture loading)."""
+        collection_path, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            self._collections.setdefault(collection_path, {})[doc_id] = copy.deepcopy(data)
+            self._versions[path] = self._versions.get(path, 0) + 1
+            self._update_times[path] = datetime.now(timezone.utc)
+
+    def document_count(self, collection_path=None):
+        with self._lock:
+            if collection_path is None:
+                return sum(len(docs) for docs in self._collections.values())
+            return len(self._collections.get(collection_path, {}))
+
+    def dump(self):
+        with self._lock:
+            return {path: dict(docs) for path, docs in self._collections.items()}
+
+    def restore(self, collections):
+        with self._lock:
+            self._collections = {path: dict(docs) for path, docs in collections.items()}
+
+    # ── Internals ───────────────────────────────
+
+    def _auto_id(self):
+        with self._lock:
+            return "".join(self._rng.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+    def _list_collection_paths(self):
+        with self._lock:
+            return [path for path, docs in self._collections.items() if docs]
+
+    def _iter_documents(self, collection_path, collection_group):
+        with self._lock:
+            if collection_group is None:
+                docs = self._collections.get(collection_path, {})
+                return [(f"{collection_path}/{doc_id}", data) for doc_id, data in docs.items()]
+            rows = []
+            for path, docs in self._collections.items():
+                if path.rsplit("/", 1)[-1] != collection_group:
+                    continue
+                rows.extend((f"{path}/{doc_id}", data) for doc_id, data in docs.items())
+            return rows
+
+    def _get_document(self, path):
+        collection_path, doc_id = path.rsplit("/", 1)
+        self.stats.add_reads(collection_path.rsplit("/", 1)[-1], 1)
+        with self._lock:
+            data = self._collections.get(collection_path, {}).get(doc_id)
+            return FakeDocumentSnapshot(
+                FakeDocumentReference(self, path),
+                data,
+                self._update_times.get(path),
+            )
+
+    def _commit_writes(self, writes, expected_versions=None):
+        with self._lock:
+            for path, version in (expected_versions or {}).items():
+                if self._versions.get(path, 0) != version:
+                    raise Aborted(f"Transaction contention on {path}")
+
+            staged = {}
+
+            def _current(doc_path):
+                if doc_path in staged:
+                    return staged[doc_path]
+                collection_path, doc_id = doc_path.rsplit("/", 1)
+                existing = self._collections.get(collection_path, {}).get(doc_id)
+                return copy.deepcopy(existing) if existing is not None else None
+
+            for kind, path, data, merge in writes:
+                current = _current(path)
+                if kind == "create":
+                    if current is not None:
+                        raise AlreadyExists(f"Document already exists: {path}")
+                    staged[path] = {}
+                    _merge_into(staged[path], data or {})
+                elif kind == "set":
+                    base = current if (merge and current is not None) else {}
+                    _merge_into(base, data or {})
+                    staged[path] = base
+                elif kind == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {path}")
+                    for field_path, value in (data or {}).items():
+                        _set_field(current, field_path, value)
+                    staged[path] = current
+                else:
+                    staged[path] = None
+
+            now = datetime.now(timezone.utc)
+            for path, data in staged.items():
+                collection_path, doc_id = path.rsplit("/", 1)
+                docs = self._collections.setdefault(collection_path, {})
+                if data is None:
+                    docs.pop(doc_id, None)
+                else:
+                    docs[doc_id] = data
+                self._versions[path] = self._versions.get(path, 0) + 1
+                self._update_times[path] = now
+
+        for kind, path, _data, _merge in writes:
+            self.stats.add_write(path.rsplit("/", 2)[-2], delete=(kind == "delete"))
+
+
+@contextmanager
+def installed(db):
+    """Route ``get_firestore_client()`` to *db* for the duration of the block."""
+    from app.services import firebase_service
+
+    previous = firebase_service._firestore_client
+    firebase_service._firestore_client = db
+    try:
+        yield db
+    finally:
+        firebase_service._firestore_client = previous
@@ -0,0 +1,104 @@
+"""Microbenchmark: scalar vs vectorized driver ranking (haversine, ETA, top-k).
+
+Examples:
+  python -m benchmarks.geo
+  python -m benchmarks.geo --sizes 1000 10000 100000 --k 20 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(CURRENT_DIR)
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+import numpy as np  # noqa: E402
+
+from app.utils.rides import (  # noqa: E402
+    estimate_eta_minutes,
+    estimate_eta_minutes_many,
+    haversine_km,
+    nearest_k,
+)
+
+PICKUP = {"lat": 23.1815, "lng": 79.9864}
+
+
+def _drivers(n, seed):
+    rng = random.Random(seed)
+    lats = [PICKUP["lat"] + rng.uniform(-0.3, 0.3) for _ in range(n)]
+    lngs = [PICKUP["lng"] + rng.uniform(-0.3, 0.3) for _ in range(n)]
+    return lats, lngs
+
+
+def _scalar_rank(lats, lngs, k):
+    scored = []
+    for lat, lng in zip(lats, lngs):
+        location = {"lat": lat, "lng": lng}
+        scored.append((
+            estimate_eta_minutes(location, PICKUP),
+            haversine_km(lat, lng, PICKUP["lat"], PICKUP["lng"]),
+        ))
+    return sorted(range(len(scored)), key=scored.__getitem__)[:k]
+
+
+def _vector_rank(lats, lngs, k):
+    lat_arr = np.asarray(lats, dtype=np.float64)
+    lng_arr = np.asarray(lngs, dtype=np.float64)
+    # Top-k by distance first, then exact ETA ordering on the shortlist.
+    order, distances = nearest_k(PICKUP["lat"], PICKUP["lng"], lat_arr, lng_arr, k)
+    etas = estimate_eta_minutes_many(PICKUP, lat_arr[order], lng_arr[order])
+    return order[np.lexsort((distances, etas))].tolist()
+
+
+def _best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - started) * 1000.0)
+    return best
+
+
+def run(sizes, k, repeat, seed):
+    rows = []
+    for n in sizes:
+        lats, lngs = _drivers(n, seed)
+        scalar = _scalar_rank(lats, lngs, k)
+        vector = _vector_rank(lats, lngs, k)
+        rows.append({
+            "drivers": n,
+            "scalar_ms": _best_ms(lambda: _scalar_rank(lats, lngs, k), repeat),
+            "vector_ms": _best_ms(lambda: _vector_rank(lats, lngs, k), repeat),
+            "same_top_k": scalar == vector,
+        })
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scalar vs NumPy driver ranking microbenchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--k", type=int, default=20, help="Drivers returned per ranking")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of repetitions per size")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"{'drivers':>9} {'scalar_ms':>11} {'vector_ms':>11} {'speedup':>9} {'same_top_k':>11}")
+    for row in run(args.sizes, args.k, args.repeat, args.seed):
+        speedup = row["scalar_ms"] / row["vector_ms"] if row["vector_ms"] else float("inf")
+        print(
+            f"{row['drivers']:>9} {row['scalar_ms']:>11.2f} {row['vector_ms']:>11.2f} "
+            f"{speedup:>8.1f}x {str(row['same_top_k']):>11}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,609 @@
+"""Socket.IO load generator for the ``/rides`` and ``/planner`` namespaces.
+
+Simulates online drivers streaming ``driver:location_update``, travelers
+running the full request -> quote -> accept -> end flow, and planner clients
+subscribing to sessions. Reports p50/p90/p99 latency per event, dropped
+(never acknowledged) emits, error codes, Firestore ops and server CPU/RSS.
+
+Examples:
+  python -m benchmarks.loadtest --drivers 200 --travelers 50 --duration 30
+  python -m benchmarks.loadtest --drivers 2000 --travelers 200 --ping-interval 2 --json report.json
+  python -m benchmarks.loadtest --drivers 5000 --server-async-mode gevent
+  python -m benchmarks.loadtest --url http://127.0.0.1:5055 --drivers 500   # already running server
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter, defaultdict
+from queue import Empty, Queue
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(CURRENT_DIR)
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+import socketio  # noqa: E402
+
+from benchmarks.loadtest_server import STATS_PATH, load_identities  # noqa: E402
+from benchmarks.megadata import DEFAULT_SEED  # noqa: E402
+
+TERMINAL_STATUSES = {"COMPLETED", "CANCELLED", "EXPIRED"}
+# Driver-side errors that mean "lost the race for this ride", not a server fault.
+CONTENTION_ERRORS = {"RIDE_NOT_AVAILABLE", "RIDE_CLOSED", "INVALID_STATE", "ACTIVE_RIDE_EXISTS", "NOT_FOUND"}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * (pct / 100.0)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class Recorder:
+    """Thread-safe latency samples, in-flight emits and error counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.samples = defaultdict(list)
+        self.pending = {}
+        self.counters = Counter()
+        self.errors = Counter()
+
+    def record(self, metric, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self.samples[metric].append(elapsed_ms)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def error(self, namespace, code):
+        with self._lock:
+            self.errors[f"{namespace}:{code or 'UNKNOWN'}"] += 1
+
+    def timed_emit(self, client, metric, event, data, namespace):
+        """Emit with an ack callback; the ack round-trip is the server handling latency."""
+        token = next(self._ids)
+        started = time.perf_counter()
+        with self._lock:
+            self.pending[token] = (metric, started)
+
+        def _ack(*_args):
+            with self._lock:
+                entry = self.pending.pop(token, None)
+            if entry:
+                self.record(entry[0], entry[1])
+
+        try:
+            client.emit(event, data, namespace=namespace, callback=_ack)
+        except Exception:
+            with self._lock:
+                self.pending.pop(token, None)
+            self.count(f"emit_failed:{event}")
+
+    def dropped(self):
+        with self._lock:
+            return Counter(metric for metric, _ in self.pending.values())
+
+    def summary(self):
+        with self._lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        events = {}
+        for name, values in sorted(samples.items()):
+            events[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p90_ms": round(percentile(values, 90), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(max(values), 2),
+            }
+        return events
+
+
+class ProcessSampler(threading.Thread):
+    """Samples CPU% and RSS of a local pid from /proc (Linux only, no psutil)."""
+
+    def __init__(self, pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss_mb = []
+        self._stop_event = threading.Event()
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _cpu_ticks(self):
+        with open(f"/proc/{self.pid}/stat", "r", encoding="utf-8") as handle:
+            fields = handle.read().rsplit(")", 1)[1].split()
+        return int(fields[11]) + int(fields[12])  # utime + stime
+
+    def _rss_mb(self):
+        with open(f"/proc/{self.pid}/status", "r", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+        return 0.0
+
+    def run(self):
+        try:
+            last_ticks, last_wall = self._cpu_ticks(), time.monotonic()
+        except OSError:
+            return
+        while not self._stop_event.wait(self.interval):
+            try:
+                ticks, wall = self._cpu_ticks(), time.monotonic()
+                self.rss_mb.append(self._rss_mb())
+            except OSError:
+                return
+            self.cpu.append(100.0 * (ticks - last_ticks) / self._ticks / max(wall - last_wall, 1e-6))
+            last_ticks, last_wall = ticks, wall
+
+    def stop(self):
+        self._stop_event.set()
+
+    def summary(self):
+        if not self.cpu:
+            return {}
+        return {
+            "cpu_pct_avg": round(sum(self.cpu) / len(self.cpu), 1),
+            "cpu_pct_max": round(max(self.cpu), 1),
+            "rss_mb_max": round(max(self.rss_mb), 1),
+            "rss_mb_last": round(self.rss_mb[-1], 1),
+        }
+
+
+class _Bot:
+    namespace = "/rides"
+    # Bots that never call wait_for() skip the inbox so it cannot grow unbounded.
+    queue_events = True
+
+    def __init__(self, url, identity, role, recorder, args, stop_event):
+        self.url = url
+        self.uid = identity["uid"]
+        self.identity = identity
+        self.role = role
+        self.recorder = recorder
+        self.args = args
+        self.stop_event = stop_event
+        self.rng = random.Random(f"{args.seed}:{self.uid}")
+        self.inbox = Queue()
+        self.client = socketio.Client(reconnection=False)
+        self.client.on("*", self._on_any, namespace=self.namespace)
+
+    def _on_any(self, event, data=None):
+        if event.endswith(":error"):
+            code = (data or {}).get("error")
+            self.recorder.error(self.namespace, code)
+            self.on_error(code)
+        self.on_event(event, data or {})
+        if self.queue_events:
+            self.inbox.put((event, data or {}))
+
+    def on_event(self, event, data):
+        pass
+
+    def on_error(self, code):
+        pass
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            self.client.connect(
+                self.url,
+                namespaces=[self.namespace],
+                auth={"token": f"{self.uid}|{self.role}"},
+                transports=self.args.transports,
+                wait_timeout=self.args.timeout,
+            )
+        except Exception:
+            self.recorder.count(f"connect_failed:{self.namespace}")
+            return False
+        self.recorder.record(f"{self.namespace}.connect", started)
+        return True
+
+    def wait_for(self, predicate, timeout):
+        """Drain the inbox until *predicate(event, data)* matches or *timeout* elapses."""
+        deadline = time.monotonic() + timeout
+        while not self.stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                event, data = self.inbox.get(timeout=min(remaining, 0.5))
+            except Empty:
+                continue
+            if predicate(event, data):
+                return event, data
+        return None
+
+    def pause(self, seconds):
+        return self.stop_event.wait(seconds)
+
+    def disconnect(self):
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+
+class DriverBot(_Bot):
+    """Goes online, streams location updates, accepts and quotes some requests."""
+
+    queue_events = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.pending_ride_id = None
+        self.quoted_ride_id = None
+        self.active_ride_id = None
+
+    def _reset_ride(self):
+        with self._lock:
+            self.pending_ride_id = None
+            self.quoted_ride_id = None
+            self.active_ride_id = None
+
+    def on_error(self, code):
+        if code in CONTENTION_ERRORS:
+            with self._lock:
+                if self.active_ride_id is None:
+                    self.pending_ride_id = None
+
+    def on_event(self, event, data):
+        ride = data.get("ride") or {}
+        ride_id = ride.get("id")
+        if event == "ride:request_received":
+            self.recorder.count("driver.offers_received")
+            with self._lock:
+                if self.pending_ride_id or self.active_ride_id or self.rng.random() >= self.args.accept_probability:
+                    return
+                self.pending_ride_id = ride_id
+            self.recorder.timed_emit(self.client, "driver.accept_request", "driver:accept_request", {"ride_id": ride_id}, self.namespace)
+        elif event == "ride:status_changed" and ride.get("driver_uid") == self.uid:
+            status = ride.get("status")
+            if status == "ACCEPTED_PENDING_QUOTE":
+                # Status fans out to both the user room and the ride room; quote once.
+                with self._lock:
+                    if ride_id != self.pending_ride_id or ride_id == self.quoted_ride_id:
+                        return
+                    self.quoted_ride_id = ride_id
+                price = round(self.rng.uniform(120, 900), 2)
+                self.recorder.timed_emit(
+                    self.client, "driver.submit_quote", "driver:submit_quote", {"ride_id": ride_id, "price": price}, self.namespace
+                )
+            elif status in TERMINAL_STATUSES:
+                self._reset_ride()
+        elif event == "ride:quote_accepted":
+            with self._lock:
+                self.active_ride_id = ride_id
+        elif event == "ride:completed":
+            self._reset_ride()
+
+    def run(self):
+        lat, lng = self.identity["lat"], self.identity["lng"]
+        self.recorder.timed_emit(
+            self.client,
+            "driver.set_online",
+            "driver:set_online",
+            {"online": True, "city": self.identity["city"], "location": {"lat": lat, "lng": lng}},
+            self.namespace,
+        )
+        # Spread the first ping so the fleet does not fire in lockstep.
+        if self.pause(self.rng.uniform(0, self.args.ping_interval)):
+            return
+        while not self.stop_event.is_set():
+            lat += self.rng.uniform(-0.0008, 0.0008)
+            lng += self.rng.uniform(-0.0008, 0.0008)
+            payload = {"location": {"lat": round(lat, 6), "lng": round(lng, 6)}}
+            with self._lock:
+                if self.active_ride_id:
+                    payload["ride_id"] = self.active_ride_id
+            self.recorder.timed_emit(self.client, "driver.location_update", "driver:location_update", payload, self.namespace)
+            if self.pause(self.args.ping_interval):
+                return
+
+
+class TravelerBot(_Bot):
+    """Runs request -> quote -> accept -> end ride loops."""
+
+    def _mine(self, event_name, status=None):
+        def _predicate(event, data):
+            if event != event_name:
+                return False
+            ride = data.get("ride") or {}
+            if ride.get("traveler_uid") not in (None, self.uid):
+                return False
+            return status is None or ride.get("status") in status
+
+        return _predicate
+
+    def _end_ride(self, ride_id):
+        started = time.perf_counter()
+        self.recorder.timed_emit(self.client, "traveler.end_ride", "traveler:end_ride", {"ride_id": ride_id}, self.namespace)
+        if self.wait_for(self._mine("ride:completed"), self.args.timeout):
+            self.recorder.record("flow.end_ride->completed", started)
+        else:
+            self.recorder.count("flow.end_ride_timeout")
+
+    def _ride_once(self):
+        lat, lng = self.identity["lat"], self.identity["lng"]
+        payload = {
+            "source": {"lat": lat, "lng": lng},
+            "destination": {"lat": round(lat + self.rng.uniform(-0.05, 0.05), 6), "lng": round(lng + self.rng.uniform(-0.05, 0.05), 6)},
+        }
+        started = time.perf_counter()
+        self.recorder.timed_emit(self.client, "traveler.request_ride", "traveler:request_ride", payload, self.namespace)
+
+        def _requested(event, data):
+            if event == "ride:error":
+                return True
+            return self._mine("ride:status_changed", {"REQUESTED"})(event, data)
+
+        match = self.wait_for(_requested, self.args.timeout)
+        if not match:
+            self.recorder.count("flow.request_timeout")
+            return
+        if match[0] == "ride:error":
+            if match[1].get("error") == "ACTIVE_RIDE_EXISTS":
+                stale = self.wait_for(self._mine("ride:status_changed"), self.args.timeout)
+                if stale and (stale[1].get("ride") or {}).get("status") in {"QUOTE_ACCEPTED", "DRIVER_EN_ROUTE", "IN_PROGRESS"}:
+                    self._end_ride(stale[1]["ride"]["id"])
+            return
+        self.recorder.record("flow.request->requested", started)
+        ride_id = match[1]["ride"]["id"]
+
+        def _quoted_or_closed(event, data):
+            ride = data.get("ride") or {}
+            if ride.get("id") != ride_id:
+                return False
+            return event == "ride:quote_received" or (event == "ride:status_changed" and ride.get("status") in TERMINAL_STATUSES)
+
+        match = self.wait_for(_quoted_or_closed, self.args.quote_timeout)
+        if not match or match[0] != "ride:quote_received":
+            self.recorder.count("flow.no_quote")
+            return
+        self.recorder.record("flow.request->quote", started)
+
+        started = time.perf_counter()
+        self.recorder.timed_emit(self.client, "traveler.accept_quote", "traveler:accept_quote", {"ride_id": ride_id}, self.namespace)
+        if not self.wait_for(lambda event, data: event == "ride:otp_generated" and data.get("ride_id") == ride_id, self.args.timeout):
+            self.recorder.count("flow.otp_timeout")
+            return
+        self.recorder.record("flow.accept_quote->otp", started)
+        self.recorder.count("flow.rides_matched")
+
+        if self.pause(self.args.ride_hold):
+            return
+        self._end_ride(ride_id)
+
+    def run(self):
+        if self.pause(self.rng.uniform(0, self.args.think_time)):
+            return
+        while not self.stop_event.is_set():
+            self._ride_once()
+            if self.pause(self.rng.uniform(0.5, 1.5) * self.args.think_time):
+                return
+
+
+class PlannerBot(_Bot):
+    """Subscribes and unsubscribes to an owned planner session."""
+
+    namespace = "/planner"
+
+    def __init__(self, url, identity, role, recorder, args, stop_event, session_id):
+        super().__init__(url, identity, role, recorder, args, stop_event)
+        self.session_id = session_id
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = time.perf_counter()
+            self.recorder.timed_emit(self.client, "planner.subscribe", "planner:subscribe", {"session_id": self.session_id}, self.namespace)
+            if self.wait_for(lambda event, data: event in {"planner:subscribed", "planner:error"}, self.args.timeout):
+                self.recorder.record("flow.subscribe->subscribed", started)
+            self.recorder.timed_emit(self.client, "planner.unsubscribe", "planner:unsubscribe", {"session_id": self.session_id}, self.namespace)
+            if self.pause(self.rng.uniform(0.5, 1.5) * self.args.think_time):
+                return
+
+
+def _http_json(url, timeout=2.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def _start_server(args):
+    command = [
+        sys.executable, "-m", "benchmarks.loadtest_server",
+        "--port", str(args.port),
+        "--drivers", str(args.drivers),
+        "--travelers", str(args.travelers),
+        "--planner-sessions", str(args.planners),
+        "--scale", args.scale,
+        "--seed", str(args.seed),
+    ]
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=args.server_async_mode)
+    process = subprocess.Popen(command, cwd=BACKEND_ROOT, env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + args.server_start_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Load-test server exited with code {process.returncode}")
+        try:
+            _http_json(url + STATS_PATH)
+            return process, url
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Load-test server did not become ready in time")
+
+
+def _connect_all(bots, ramp_seconds):
+    """Connect bots spread over *ramp_seconds*; returns the ones that connected."""
+    connected = []
+    lock = threading.Lock()
+    delay = ramp_seconds / max(len(bots), 1)
+
+    def _connect(bot):
+        if bot.connect():
+            with lock:
+                connected.append(bot)
+
+    threads = []
+    for bot in bots:
+        thread = threading.Thread(target=_connect, args=(bot,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        if delay:
+            time.sleep(delay)
+    for thread in threads:
+        thread.join()
+    return connected
+
+
+def run_load(args, url, server_pid=None):
+    identities = load_identities(args.drivers, args.travelers, args.planners, args.seed)
+    recorder = Recorder()
+    stop_event = threading.Event()
+    travelers_by_uid = {traveler["uid"]: traveler for traveler in identities["travelers"]}
+
+    bots = [DriverBot(url, identity, "BUSINESS", recorder, args, stop_event) for identity in identities["drivers"]]
+    bots += [TravelerBot(url, identity, "TRAVELER", recorder, args, stop_event) for identity in identities["travelers"]]
+    bots += [
+        PlannerBot(url, travelers_by_uid[session["traveler_uid"]], "TRAVELER", recorder, args, stop_event, session["id"])
+        for session in identities["planner_sessions"]
+        if session["traveler_uid"] in travelers_by_uid
+    ]
+
+    sampler = ProcessSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    firestore_before = _http_json(url + STATS_PATH)
+
+    connected = _connect_all(bots, args.ramp)
+    started = time.monotonic()
+    workers = [threading.Thread(target=bot.run, daemon=True) for bot in connected]
+    for worker in workers:
+        worker.start()
+    stop_event.wait(args.duration)
+    stop_event.set()
+    for worker in workers:
+        worker.join(timeout=args.timeout)
+    time.sleep(args.drain)
+    elapsed = time.monotonic() - started
+
+    firestore_after = _http_json(url + STATS_PATH)
+    for bot in connected:
+        bot.disconnect()
+    if sampler:
+        sampler.stop()
+
+    events = recorder.summary()
+    return {
+        "config": {
+            "drivers": args.drivers,
+            "travelers": args.travelers,
+            "planners": len(identities["planner_sessions"]),
+            "duration_s": round(elapsed, 1),
+            "ping_interval_s": args.ping_interval,
+            "transports": args.transports,
+            "server_async_mode": args.server_async_mode if not args.url else None,
+        },
+        "connected": len(connected),
+        "connect_failed": len(bots) - len(connected),
+        "events": events,
+        "throughput_per_s": {name: round(stats["count"] / elapsed, 1) for name, stats in events.items() if elapsed},
+        "dropped": dict(recorder.dropped()),
+        "errors": dict(recorder.errors),
+        "counters": dict(recorder.counters),
+        "firestore": {
+            key: firestore_after[key] - firestore_before[key] for key in ("reads", "writes", "deletes", "queries")
+        },
+        "server": sampler.summary() if sampler else {},
+    }
+
+
+def _print_report(report):
+    config = report["config"]
+    print(
+        f"drivers={config['drivers']} travelers={config['travelers']} planners={config['planners']} "
+        f"duration={config['duration_s']}s connected={report['connected']} connect_failed={report['connect_failed']}"
+    )
+    print(f"{'event':<32} {'count':>8} {'per_s':>8} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9} {'dropped':>8}")
+    for name, stats in report["events"].items():
+        print(
+            f"{name:<32} {stats['count']:>8} {report['throughput_per_s'].get(name, 0):>8} {stats['p50_ms']:>9.2f} "
+            f"{stats['p90_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f} {report['dropped'].get(name, 0):>8}"
+        )
+    for label in ("errors", "counters", "firestore", "server"):
+        if report[label]:
+            print(f"{label}: " + ", ".join(f"{key}={value}" for key, value in sorted(report[label].items())))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Socket.IO load test for /rides and /planner")
+    parser.add_argument("--url", help="Target an already running server instead of spawning benchmarks.loadtest_server")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the spawned server")
+    parser.add_argument("--drivers", type=int, default=200)
+    parser.add_argument("--travelers", type=int, default=50)
+    parser.add_argument("--planners", type=int, default=20, help="Planner subscribers (one seeded session each)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of steady-state load after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds to spread client connects over")
+    parser.add_argument("--ping-interval", type=float, default=3.0, help="Seconds between driver location updates")
+    parser.add_argument("--accept-probability", type=float, default=0.3, help="Chance a driver accepts an offered ride")
+    parser.add_argument("--think-time", type=float, default=3.0, help="Mean pause between traveler/planner iterations")
+    parser.add_argument("--ride-hold", type=float, default=2.0, help="Seconds a matched ride stays active before ending")
+    parser.add_argument("--quote-timeout", type=float, default=60.0, help="Seconds a traveler waits for a quote")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-event response timeout")
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to wait for in-flight acks after stop")
+    parser.add_argument("--transport", dest="transports", action="append", choices=["polling", "websocket"],
+                        help="Client transports (repeatable); websocket needs websocket-client installed")
+    parser.add_argument("--server-async-mode", choices=["threading", "gevent"], default="threading",
+                        help="SOCKETIO_ASYNC_MODE for the spawned server")
+    parser.add_argument("--scale", default="small", help="Megadata scale for the spawned server")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--server-start-timeout", type=float, default=60.0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+    args.transports = args.transports or ["polling", "websocket"]
+    return args
+
+
+def main():
+    args = parse_args()
+    process = None
+    url = args.url
+    if not url:
+        process, url = _start_server(args)
+    try:
+        report = run_load(args, url, server_pid=process.pid if process else None)
+    finally:
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    return 0 if not report["connect_failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Local Socket.IO server for load tests: real app, Firestore double, stubbed geocoding.
+
+Examples:
+  python -m benchmarks.loadtest_server --port 5055 --drivers 2000 --travelers 200
+  SOCKETIO_ASYNC_MODE=gevent python -m benchmarks.loadtest_server --drivers 10000
+"""
+
+import os
+
+if os.getenv("SOCKETIO_ASYNC_MODE", "").strip().lower() == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import argparse  # noqa: E402
+import logging  # noqa: E402
+import random  # noqa: E402
+import sys  # noqa: E402
+from contextlib import ExitStack  # noqa: E402
+from unittest import mock  # noqa: E402
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(CURRENT_DIR)
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from benchmarks.firestore_double import FakeFirestore, installed  # noqa: E402
+from benchmarks.megadata import DEFAULT_SEED, load_megadata  # noqa: E402
+from benchmarks.suite import _fake_verify_token  # noqa: E402
+from scripts.seed_india_megadata import city_key, city_map, jitter, seq  # noqa: E402
+
+STATS_PATH = "/__loadtest/stats"
+
+
+def load_identities(drivers, travelers, planner_sessions=0, seed=DEFAULT_SEED):
+    """Deterministic load users shared by the server (seeding) and the load generator."""
+    rng = random.Random(seed)
+    cm = city_map()
+    identities = {"drivers": [], "travelers": [], "planner_sessions": []}
+    for i, city in enumerate(seq(drivers, rng), 1):
+        lat, lng = jitter(city, cm, rng)
+        identities["drivers"].append({"uid": f"load_driver_{i:05d}", "city": city, "lat": lat, "lng": lng})
+    for i, city in enumerate(seq(travelers, rng), 1):
+        lat, lng = jitter(city, cm, rng)
+        identities["travelers"].append({"uid": f"load_traveler_{i:05d}", "city": city, "lat": lat, "lng": lng})
+    for i in range(1, planner_sessions + 1):
+        owner = identities["travelers"][(i - 1) % len(identities["travelers"])] if identities["travelers"] else None
+        identities["planner_sessions"].append({"id": f"load_planner_{i:05d}", "traveler_uid": owner["uid"] if owner else None})
+    return identities
+
+
+def seed_load_identities(db, identities):
+    for driver in identities["drivers"]:
+        name = driver["uid"].replace("_", " ").title()
+        db.seed_document(f"users/{driver['uid']}", {
+            "uid": driver["uid"], "display_name": name, "role": "BUSINESS", "city": driver["city"],
+            "business_profile": {
+                "business_type": "CAB_DRIVER", "business_name": f"{name} Cabs", "city": driver["city"],
+                "details": {"driver_name": name, "vehicle_type": "Sedan", "vehicle_number": "IN-00-0000"},
+            },
+        })
+    for traveler in identities["travelers"]:
+        db.seed_document(f"users/{traveler['uid']}", {
+            "uid": traveler["uid"], "display_name": traveler["uid"], "role": "TRAVELER", "city": traveler["city"],
+        })
+    for session in identities["planner_sessions"]:
+        db.seed_document(f"planner_sessions/{session['id']}", {
+            "traveler_uid": session["traveler_uid"], "status": "COMPLETED", "input": {"destination": "Goa, India"},
+        })
+    db.stats.reset()
+
+
+def _nearest_city(lat, lng):
+    return min(city_map().values(), key=lambda c: (c["lat"] - lat) ** 2 + (c["lng"] - lng) ** 2)
+
+
+def stub_reverse_geocode(lat, lng):
+    """Offline reverse geocode: nearest seeded city centroid, no network."""
+    try:
+        lat_val, lng_val = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    city = _nearest_city(lat_val, lng_val)
+    return {
+        "address": f"{lat_val:.5f}, {lng_val:.5f}, {city['name']}, {city['state']}, India",
+        "lat": lat_val,
+        "lng": lng_val,
+        "city": city["name"],
+    }
+
+
+def stub_forward_geocode(address, city_hint=None):
+    """Offline forward geocode: match a seeded city name in the address or hint."""
+    text = f"{address or ''} {city_hint or ''}".lower()
+    for city in city_map().values():
+        if city["name"].lower() in text or city_key(city["name"]) in text:
+            return {"address": str(address or city["name"]), "lat": city["lat"], "lng": city["lng"], "city": city["name"]}
+    return None
+
+
+def stub_patches():
+    """Patch targets that would otherwise hit Firebase Auth or Nominatim."""
+    return [
+        mock.patch("app.utils.auth.verify_firebase_token", _fake_verify_token),
+        mock.patch("app.services.socket_service.verify_firebase_token", _fake_verify_token),
+        # locate()/resolve_city() try the offline gazetteer, then this reverse geocode.
+        mock.patch("app.services.geocode_service.reverse_geocode", stub_reverse_geocode),
+        mock.patch("app.services.socket_service.forward_geocode", stub_forward_geocode),
+        mock.patch("app.blueprints.rides.forward_geocode", stub_forward_geocode),
+    ]
+
+
+def build_server(drivers, travelers, planner_sessions=0, scale="small", seed=DEFAULT_SEED):
+    """Return ``(app, db)`` with megadata plus the load identities seeded."""
+    from app import create_app
+
+    db = FakeFirestore(seed=seed)
+    load_megadata(db, scale=scale, seed=seed)
+    seed_load_identities(db, load_identities(drivers, travelers, planner_sessions, seed))
+
+    app = create_app("development")
+
+    def _loadtest_stats():
+        return db.stats.snapshot()
+
+    app.add_url_rule(STATS_PATH, "loadtest_stats", _loadtest_stats, methods=["GET"])
+    return app, db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Socket.IO load-test server (Firestore double, stubbed geocoding)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--drivers", type=int, default=200)
+    parser.add_argument("--travelers", type=int, default=50)
+    parser.add_argument("--planner-sessions", type=int, default=20)
+    parser.add_argument("--scale", default="small", help="Megadata scale loaded alongside the load identities")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app, db = build_server(args.drivers, args.travelers, args.planner_sessions, args.scale, args.seed)
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in list(logging.root.manager.loggerDict) + ["werkzeug", "engineio.server", "socketio.server"]:
+        if name.startswith(("app", "werkzeug", "engineio", "socketio")):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    from app.services.socket_service import get_socketio
+
+    with ExitStack() as stack:
+        stack.enter_context(installed(db))
+        for patcher in stub_patches():
+            stack.enter_context(patcher)
+        get_socketio().run(
+            app,
+            host=args.host,
+            port=args.port,
+            debug=False,
+            use_reloader=False,
+            log_output=False,
+            allow_unsafe_werkzeug=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Deterministic India megadata fixtures for the Firestore double.
+
+Mirrors the document shapes written by ``scripts/seed_india_megadata.py`` (and
+reuses its city tables and helpers) so benchmarks exercise the same data the
+seeded dev/staging projects hold, at any scale and without network access.
+"""
+
+import math
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from scripts.seed_india_megadata import (
+    AMEN,
+    BASE,
+    CUIS,
+    DISH,
+    FACTORS,
+    FN,
+    GUIDE_CAT,
+    JBP,
+    LN,
+    ROOMS,
+    ROOMS_PER_HOTEL,
+    SLOTS_PER_TOUR,
+    TOUR_CAT,
+    addr,
+    city_display,
+    city_key,
+    city_map,
+    did,
+    jitter,
+    seq,
+    split,
+)
+
+DEFAULT_SEED = 20260226
+RUN_TAG = "bench"
+# Fixed clock so repeated runs produce byte-identical fixtures.
+BASE_TIME = datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)
+
+RIDE_STATUSES = ["REQUESTED", "ACCEPTED_PENDING_QUOTE", "QUOTE_SENT", "QUOTE_ACCEPTED", "DRIVER_EN_ROUTE", "IN_PROGRESS", "COMPLETED", "CANCELLED", "EXPIRED"]
+# Historical traffic is dominated by closed rides; long-time users accumulate them.
+RIDE_STATUS_WEIGHTS = [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.78, 0.1, 0.06]
+RIDES_PER_TRAVELER = 8
+DISRUPTION_TYPES = ["FLIGHT_DELAY", "FLIGHT_CANCELLATION", "WEATHER_DISRUPTION", "OTHER"]
+
+
+def resolve_factor(scale):
+    """Accept a seeder profile name ("small" … "massive") or a numeric factor."""
+    if isinstance(scale, str) and scale in FACTORS:
+        return FACTORS[scale]
+    try:
+        factor = float(scale)
+    except (TypeError, ValueError):
+        raise ValueError(f"scale must be one of {sorted(FACTORS)} or a number, got {scale!r}")
+    if factor <= 0:
+        raise ValueError("scale factor must be positive")
+    return factor
+
+
+def entity_counts(factor):
+    c = {k: max(1, int(round(v * factor))) for k, v in BASE.items()}
+    c["menu_items"] = max(c["menu_items"], c["restaurants"] * 3)
+    c["guide_services"] = max(c["guide_services"], c["guides"] * 2)
+    c["itineraries"] = max(c["itineraries"], c["travelers"])
+    c["rides"] = max(c["rides"], c["drivers"] * 2, c["travelers"] * RIDES_PER_TRAVELER)
+    c["disruption_events"] = max(1, c["itineraries"] // 3)
+    c["activity_log"] = c["itineraries"] * 2
+    return c
+
+
+def _iso(dt):
+    return dt.isoformat()
+
+
+def build_documents(scale="medium", seed=DEFAULT_SEED):
+    """Return ``{document_path: data}`` for a full India dataset at *scale*."""
+    factor = resolve_factor(scale)
+    rng = random.Random(seed)
+    cm = city_map()
+    c = entity_counts(factor)
+    now = _iso(BASE_TIME)
+    meta = {"generator": "benchmarks.megadata", "scale": str(scale), "run_tag": RUN_TAG, "seeded_at": now}
+    docs = {}
+
+    def put(path, data):
+        docs[path] = data
+
+    hotel_rooms_by_city = defaultdict(list)
+    for i, city in enumerate(seq(c["hotels"], rng, int(math.ceil(JBP["hotels"] * factor))), 1):
+        uid = did("hotel", RUN_TAG, i)
+        name = f"{rng.choice(['Grand', 'Royal', 'Urban', 'Heritage'])} {city} {rng.choice(['Residency', 'Suites', 'Palace', 'Inn'])}"
+        total_rooms = 0
+        for j in range(1, ROOMS_PER_HOTEL + 1):
+            room_id = did(f"room{i}", RUN_TAG, j)
+            rooms = rng.randint(2, 14)
+            beds = rng.randint(1, 3)
+            total_rooms += rooms
+            room = {
+                "name": f"{ROOMS[(j - 1) % len(ROOMS)]} {j}", "description": "Comfort room",
+                "price_per_day": float(rng.randint(1800, 14500)), "total_rooms": rooms, "beds": beds,
+                "max_guests": max(2, beds * 2), "area_sqft": float(rng.randint(180, 540)),
+                "room_count_available": rng.randint(max(1, rooms // 2), rooms),
+                "amenities": rng.sample(AMEN, k=rng.randint(3, 6)), "is_active": True,
+                "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+            }
+            put(f"users/{uid}/room_types/{room_id}", room)
+            hotel_rooms_by_city[city].append((uid, room_id, room))
+        put(f"users/{uid}", {
+            "uid": uid, "email": f"{uid}@seed.local", "display_name": name, "role": "BUSINESS",
+            "business_profile": {
+                "business_type": "HOTEL", "business_name": name, "city": city, "address": addr(city, cm, rng),
+                "description": f"Stay in {city}.", "details": {"total_rooms": total_rooms, "amenities": rng.sample(AMEN, k=6)},
+            },
+            "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+        })
+
+    menu_split = split(c["menu_items"], c["restaurants"])
+    for i, city in enumerate(seq(c["restaurants"], rng, int(math.ceil(JBP["restaurants"] * factor))), 1):
+        uid = did("restaurant", RUN_TAG, i)
+        name = f"{rng.choice(['Spice', 'Tandoor', 'Saffron', 'Urban'])} {city} {rng.choice(['Kitchen', 'Bistro', 'House', 'Dhaba'])}"
+        for j in range(1, menu_split[i - 1] + 1):
+            put(f"users/{uid}/menu_items/{did(f'menu{i}', RUN_TAG, j)}", {
+                "name": rng.choice(DISH), "description": "Freshly prepared", "price": float(rng.randint(120, 950)),
+                "is_veg": rng.choice([True, False]), "category": rng.choice(["Starter", "Main", "Dessert", "Beverage"]),
+                "is_available": rng.random() > 0.05, "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+            })
+        put(f"users/{uid}", {
+            "uid": uid, "email": f"{uid}@seed.local", "display_name": name, "role": "BUSINESS",
+            "business_profile": {
+                "business_type": "RESTAURANT", "business_name": name, "city": city, "address": addr(city, cm, rng, "Street"),
+                "description": f"Food in {city}.", "details": {"cuisine": rng.choice(CUIS), "opening_hours": "08:00 - 23:00", "seating_capacity": rng.randint(30, 180)},
+            },
+            "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+        })
+
+    guides = []
+    services_by_city = defaultdict(list)
+    service_split = split(c["guide_services"], c["guides"])
+    for i, city in enumerate(seq(c["guides"], rng, int(math.ceil(JBP["guides"] * factor))), 1):
+        uid = did("guide", RUN_TAG, i)
+        name = f"{rng.choice(FN)} {rng.choice(LN)}"
+        guides.append((uid, name))
+        for j in range(1, service_split[i - 1] + 1):
+            service_id = did(f"service{i}", RUN_TAG, j)
+            service_type = rng.choice(["ACTIVITY", "GUIDED_TOUR"])
+            cats = rng.sample(GUIDE_CAT, k=rng.randint(1, 3))
+            service = {
+                "id": service_id, "owner_uid": uid, "owner_display_name": name, "business_name": f"{name} Tours",
+                "business_city": city, "source": "GUIDE_SERVICE", "service_type": service_type,
+                "name": f"{city} {cats[0]} Experience", "description": f"Guided {cats[0]} in {city}",
+                "location": city_display(city, cm), "duration_hours": float(rng.choice([1.5, 2.0, 3.0, 4.0, 6.0])),
+                "price": float(rng.randint(600, 4500)), "price_unit": rng.choice(["PER_PERSON", "PER_GROUP"]),
+                "max_group_size": rng.randint(4, 20), "category": cats, "languages": ["Hindi", "English"],
+                "is_active": rng.random() > 0.03, "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+            }
+            put(f"users/{uid}/guide_services/{service_id}", service)
+            services_by_city[city].append(service)
+        put(f"users/{uid}", {
+            "uid": uid, "email": f"{uid}@seed.local", "display_name": name, "role": "BUSINESS",
+            "business_profile": {
+                "business_type": "TOURIST_GUIDE_SERVICE", "business_name": f"{name} Tours", "city": city,
+                "address": addr(city, cm, rng, "Lane"), "description": f"Guide in {city}.",
+                "details": {"guide_name": name, "years_experience": rng.randint(2, 20), "languages": ["Hindi", "English"]},
+            },
+            "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+        })
+
+    tours_by_city = defaultdict(list)
+    for i, city in enumerate(seq(c["tours"], rng, int(math.ceil(JBP["tours"] * factor))), 1):
+        tour_id = did("tour", RUN_TAG, i)
+        cats = rng.sample(TOUR_CAT, k=rng.randint(1, 3))
+        op_uid, op_name = rng.choice(guides) if guides else (did("operator", RUN_TAG, i), f"Operator {i}")
+        day = BASE_TIME.date() + timedelta(days=rng.randint(1, 120))
+        slots = []
+        for j in range(1, SLOTS_PER_TOUR + 1):
+            slot_id = did(f"slot{i}", RUN_TAG, j)
+            start = datetime.combine(day + timedelta(days=(j - 1) // 2), datetime.min.time()) + timedelta(hours=8 + ((j - 1) % 4) * 3)
+            capacity = rng.randint(12, 36)
+            put(f"tours/{tour_id}/time_slots/{slot_id}", {
+                "scheduled_time": start.isoformat(), "capacity": capacity, "booked_count": rng.randint(0, capacity // 2),
+                "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+            })
+            slots.append((slot_id, start.isoformat()))
+        tour = {
+            "name": f"{city} {cats[0]} Discovery", "description": f"{cats[0]} tour in {city}",
+            "destination": city_display(city, cm), "location": city_display(city, cm),
+            "duration_hours": float(rng.choice([2, 3, 4, 6, 8])), "price": float(rng.randint(500, 5500)),
+            "category": cats, "category_tags": cats, "rating": round(rng.uniform(3.8, 4.9), 2),
+            "operator_uid": op_uid, "operator_name": op_name, "source": "TOUR",
+            "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+        }
+        put(f"tours/{tour_id}", tour)
+        tours_by_city[city].append((tour_id, tour, slots))
+
+    drivers_by_city = defaultdict(list)
+    drivers = []
+    for i, city in enumerate(seq(c["drivers"], rng, int(math.ceil(JBP["drivers"] * factor))), 1):
+        uid = did("driver", RUN_TAG, i)
+        name = f"{rng.choice(FN)} {rng.choice(LN)}"
+        details = {
+            "driver_name": name, "vehicle_type": rng.choice(["Sedan", "Hatchback", "SUV", "Auto", "EV"]),
+            "vehicle_number": f"IN-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}", "service_area": city,
+            "cab_rating_count": rng.randint(5, 120), "cab_rating_avg": round(rng.uniform(3.9, 4.9), 2),
+        }
+        put(f"users/{uid}", {
+            "uid": uid, "email": f"{uid}@seed.local", "display_name": name, "role": "BUSINESS",
+            "business_profile": {"business_type": "CAB_DRIVER", "business_name": f"{name} Cabs", "city": city, "details": details},
+            "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+        })
+        lat, lng = jitter(city, cm, rng)
+        put(f"driver_presence/{uid}", {
+            "driver_uid": uid, "online": rng.random() > 0.3, "city": city, "city_key": city_key(city),
+            "location": {"address": addr(city, cm, rng, "Stand"), "lat": lat, "lng": lng},
+            "socket_id": None, "last_seen_at": now, "seed_meta": dict(meta),
+        })
+        drivers.append((uid, name, city, details))
+        drivers_by_city[city].append(drivers[-1])
+
+    travelers = []
+    for i, city in enumerate(seq(c["travelers"], rng, 0), 1):
+        uid = did("traveler", RUN_TAG, i)
+        name = f"{rng.choice(FN)} {rng.choice(LN)}"
+        put(f"users/{uid}", {
+            "uid": uid, "email": f"{uid}@seed.local", "display_name": name, "role": "TRAVELER", "city": city,
+            "address": addr(city, cm, rng, "Residency"), "created_at": now, "updated_at": now, "seed_meta": dict(meta),
+        })
+        travelers.append((uid, name, city))
+
+    itinerary_ids = []
+    for i in range(1, c["itineraries"] + 1):
+        itinerary_id = did("itinerary", RUN_TAG, i)
+        traveler_uid, traveler_name, city = travelers[(i - 1) % len(travelers)]
+        start = BASE_TIME.date() + timedelta(days=rng.randint(5, 150))
+        nights = rng.randint(1, 6)
+        end = start + timedelta(days=nights)
+        put(f"itineraries/{itinerary_id}", {
+            "traveler_uid": traveler_uid, "traveler_name": traveler_name, "destination": city_display(city, cm),
+            "start_date": start.isoformat(), "end_date": end.isoformat(),
+            "status": rng.choice(["DRAFT", "ON_TRACK", "CONFIRMED"]), "created_at": now, "updated_at": now,
+            "seed_meta": dict(meta),
+        })
+        itinerary_ids.append(itinerary_id)
+        pool = hotel_rooms_by_city.get(city) or [room for rooms in hotel_rooms_by_city.values() for room in rooms]
+        if pool:
+            hotel_uid, room_id, room = rng.choice(pool)
+            rooms_booked = rng.randint(1, 2)
+            put(f"itineraries/{itinerary_id}/bookings/{did(f'booking{i}', RUN_TAG, 1)}", {
+                "traveler_uid": traveler_uid, "traveler_name": traveler_name, "itinerary_id": itinerary_id,
+                "hotel_owner_uid": hotel_uid, "property_id": hotel_uid, "room_type_id": room_id, "room_type": room["name"],
+                "rooms_booked": rooms_booked, "check_in_date": start.isoformat(), "check_out_date": end.isoformat(),
+                "price_per_day": room["price_per_day"], "nights": nights,
+                "total_price": round(room["price_per_day"] * nights * rooms_booked, 2),
+                "status": rng.choice(["CONFIRMED", "CHECKED_IN", "LATE_ARRIVAL"]), "created_at": now, "updated_at": now,
+                "seed_meta": dict(meta),
+            })
+        city_tours = tours_by_city.get(city) or [tour for tours in tours_by_city.values() for tour in tours]
+        if city_tours:
+            tour_id, tour, slots = rng.choice(city_tours)
+            slot_id, scheduled = rng.choice(slots)
+            participants = rng.randint(1, 5)
+            put(f"itineraries/{itinerary_id}/activities/{did(f'activity{i}', RUN_TAG, 1)}", {
+                "traveler_uid": traveler_uid, "traveler_name": traveler_name, "itinerary_id": itinerary_id,
+                "participants": participants, "status": "UPCOMING", "source": "TOUR", "tour_id": tour_id,
+                "tour_name": tour["name"], "time_slot_id": slot_id, "scheduled_time": scheduled,
+                "price_per_person": tour["price"], "total_price": round(tour["price"] * participants, 2),
+                "currency": "INR", "provider_uid": tour["operator_uid"], "created_at": now, "updated_at": now,
+                "seed_meta": dict(meta),
+            })
+
+    for i in range(1, c["rides"] + 1):
+        ride_id = did("ride", RUN_TAG, i)
+        # Skew history towards the first travelers so "long-time user" lookups are realistic.
+        traveler_uid, traveler_name, city = travelers[min(int(rng.expovariate(1.0 / max(1, len(travelers) / 4))), len(travelers) - 1)]
+        driver_uid, driver_name, _, details = rng.choice(drivers_by_city.get(city) or drivers)
+        status = rng.choices(RIDE_STATUSES, weights=RIDE_STATUS_WEIGHTS, k=1)[0]
+        has_driver = status not in {"REQUESTED", "EXPIRED"}
+        created = BASE_TIME - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1439))
+        slat, slng = jitter(city, cm, rng)
+        dlat, dlng = jitter(city, cm, rng)
+        rating = {}
+        if status == "COMPLETED" and rng.random() > 0.45:
+            rating = {"stars": rng.randint(3, 5), "message": rng.choice(["Smooth ride", "Polite driver", "", "On-time pickup"]), "updated_at": _iso(created + timedelta(minutes=50))}
+        put(f"rides/{ride_id}", {
+            "traveler_uid": traveler_uid, "traveler_name": traveler_name,
+            "driver_uid": driver_uid if has_driver else None, "driver_name": driver_name if has_driver else None,
+            "vehicle_type": details["vehicle_type"] if has_driver else None,
+            "vehicle_number": details["vehicle_number"] if has_driver else None,
+            "city": city, "city_key": city_key(city),
+            "source": {"address": addr(city, cm, rng, "Pickup"), "lat": slat, "lng": slng},
+            "destination": {"address": addr(city, cm, rng, "Drop"), "lat": dlat, "lng": dlng},
+            "status": status, "quoted_price": float(rng.randint(140, 1400)) if has_driver else None, "currency": "INR",
+            "driver_location": {"lat": round((slat + dlat) / 2, 6), "lng": round((slng + dlng) / 2, 6)} if has_driver else None,
+            "eta_minutes": None, "created_at": _iso(created), "updated_at": _iso(created + timedelta(minutes=40)),
+            "completed_at": _iso(created + timedelta(minutes=45)) if status == "COMPLETED" else None,
+            "start_otp": None, "rating": rating, "seed_meta": dict(meta),
+        })
+        put(f"ride_events/{did(f'rideevent{i}', RUN_TAG, 1)}", {
+            "ride_id": ride_id, "event_type": "RIDE_REQUESTED", "actor_uid": traveler_uid,
+            "payload": {"city": city}, "timestamp": _iso(created), "seed_meta": dict(meta),
+        })
+
+    for i in range(1, c["disruption_events"] + 1):
+        itinerary_id = itinerary_ids[(i - 1) % len(itinerary_ids)]
+        put(f"disruption_events/{did('disruption', RUN_TAG, i)}", {
+            "itinerary_id": itinerary_id, "disruption_type": rng.choice(DISRUPTION_TYPES),
+            "new_time": _iso(BASE_TIME + timedelta(hours=rng.randint(1, 48))), "destination": "",
+            "cascaded_updates": [], "created_at": _iso(BASE_TIME - timedelta(hours=i)), "seed_meta": dict(meta),
+        })
+
+    for i in range(1, c["activity_log"] + 1):
+        put(f"activity_log/{did('audit', RUN_TAG, i)}", {
+            "actor_uid": travelers[(i - 1) % len(travelers)][0], "actor_role": "TRAVELER", "action": "ACTIVITY_BOOKED",
+            "resource_type": "activity", "resource_id": did("activity", RUN_TAG, i),
+            "timestamp": _iso(BASE_TIME - timedelta(minutes=i)), "seed_meta": dict(meta),
+        })
+
+    return docs
+
+
+def load_megadata(db, scale="medium", seed=DEFAULT_SEED):
+    """Seed *db* (a ``FakeFirestore``) and return per-collection document counts."""
+    counts = defaultdict(int)
+    for path, data in build_documents(scale, seed).items():
+        db.seed_document(path, data)
+        counts[path.rsplit("/", 2)[-2]] += 1
+    db.stats.reset()
+    return dict(counts)
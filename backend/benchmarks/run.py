@@ -0,0 +1,87 @@
+"""CLI for the local Firestore benchmark suite.
+
+Examples:
+  python -m benchmarks.run
+  python -m benchmarks.run --scale large --iterations 10
+  python -m benchmarks.run --case search.hotels --case platform.overview
+  python -m benchmarks.run --scale medium --update-baseline
+"""
+
+import argparse
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(CURRENT_DIR)
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from benchmarks.suite import CASES, compare_to_baseline, run_suite  # noqa: E402
+
+BASELINE_PATH = os.path.join(CURRENT_DIR, "baseline.json")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Firestore benchmark suite (in-memory double)")
+    parser.add_argument("--scale", default="medium", help="Seeder profile (small|medium|large|very_large|massive) or numeric factor")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed iterations per case")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="Run only this case (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline for this scale")
+    parser.add_argument("--time-tolerance", type=float, default=2.0, help="Allowed wall-time multiple of baseline")
+    parser.add_argument("--no-time-check", action="store_true", help="Only gate on read/write counts")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    return parser.parse_args()
+
+
+def _load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _print_report(report):
+    print(f"Scale={report['scale']}  Fixtures: " + ", ".join(f"{k}={v}" for k, v in sorted(report["fixtures"].items())))
+    print(f"{'case':<28} {'reads':>8} {'writes':>8} {'queries':>8} {'wall_ms':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<28} {result['reads']:>8} {result['writes']:>8} {result['queries']:>8} {result['wall_ms']:>10.2f}")
+
+
+def main():
+    args = parse_args()
+    report = run_suite(scale=args.scale, iterations=args.iterations, cases=args.case)
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        _print_report(report)
+
+    baseline = _load_baseline(args.baseline)
+    if args.update_baseline:
+        scale_baseline = baseline.setdefault(report["scale"], {})
+        for name, result in report["results"].items():
+            scale_baseline[name] = {key: result[key] for key in ("reads", "writes", "wall_ms")}
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    regressions = compare_to_baseline(
+        report,
+        baseline,
+        time_tolerance=args.time_tolerance,
+        check_time=not args.no_time_check,
+    )
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
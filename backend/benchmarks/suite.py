@@ -0,0 +1,144 @@
+"""
+Benchmark cases for Firestore-heavy endpoints and services.
+
+Each case runs against a ``FakeFirestore`` loaded with megadata fixtures and
+records Firestore reads/writes plus wall time per iteration.
+"""
+
+import logging
+import statistics
+import time
+from unittest import mock
+
+from benchmarks.firestore_double import FakeFirestore, installed
+from benchmarks.megadata import DEFAULT_SEED, RUN_TAG, load_megadata
+from scripts.seed_india_megadata import did
+
+ADMIN_TOKEN = "platform_admin_bench|PLATFORM_ADMIN"
+TRAVELER_TOKEN = f"{did('traveler', RUN_TAG, 1)}|TRAVELER"
+ITINERARY_ID = did("itinerary", RUN_TAG, 1)
+
+
+def _fake_verify_token(token):
+    """Bench tokens are ``<uid>|<ROLE>``; no Firebase Auth round-trip."""
+    uid, _, role = str(token or "").partition("|")
+    if not uid:
+        return None
+    return {"uid": uid, "email": f"{uid}@seed.local", "role": role or "TRAVELER"}
+
+
+def _http_case(method, path, token=None, json=None):
+    def _run(client):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = client.open(path, method=method, headers=headers, json=json)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    return _run
+
+
+def _rag_build_all(_client):
+    from app.services.rag_document_builder import build_all_documents
+
+    return build_all_documents()
+
+
+CASES = {
+    "search.hotels": _http_case("GET", "/api/search/hotels?destination=Jabalpur&checkin=2026-04-10&checkout=2026-04-12"),
+    "search.tours": _http_case("GET", "/api/search/tours?destination=Jaipur"),
+    "search.restaurants": _http_case("GET", "/api/search/restaurants?destination=Mumbai"),
+    "bookings.hotels_me": _http_case("GET", "/api/bookings/hotels/me", TRAVELER_TOKEN),
+    "bookings.activities_me": _http_case("GET", "/api/activities/me", TRAVELER_TOKEN),
+    "bookings.itinerary_detail": _http_case("GET", f"/api/itineraries/{ITINERARY_ID}", TRAVELER_TOKEN),
+    "disruptions.report": _http_case(
+        "PATCH",
+        f"/api/itineraries/{ITINERARY_ID}/disruption",
+        TRAVELER_TOKEN,
+        {"disruption_type": "FLIGHT_DELAY", "new_time": "2026-06-01T18:00:00", "original_time": "2026-06-01T09:00:00"},
+    ),
+    "platform.overview": _http_case("GET", "/api/platform/overview", ADMIN_TOKEN),
+    "rag.build_all_documents": _rag_build_all,
+}
+
+
+def _clear_caches():
+    from app.services import redis_service
+    from app.services.firebase_service import _user_cache
+
+    redis_service._mem_cache.clear()
+    _user_cache.clear()
+
+
+def run_suite(scale="medium", iterations=5, cases=None, seed=DEFAULT_SEED, app=None):
+    """
+    Run the selected cases and return ``{case: result}`` where result holds
+    reads/writes per iteration (max across iterations) and median wall_ms.
+    """
+    selected = cases or list(CASES)
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark case(s): {', '.join(unknown)}")
+
+    db = FakeFirestore(seed=seed)
+    fixture_counts = load_megadata(db, scale=scale, seed=seed)
+    pristine = db.dump()
+
+    if app is None:
+        from app import create_app
+
+        app = create_app("development")
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("app"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = {}
+    with installed(db), mock.patch("app.utils.auth.verify_firebase_token", _fake_verify_token):
+        client = app.test_client()
+        for name in selected:
+            run = CASES[name]
+            db.restore(pristine)
+            reads, writes, timings = [], [], []
+            for _ in range(max(1, int(iterations))):
+                _clear_caches()
+                db.stats.reset()
+                started = time.perf_counter()
+                run(client)
+                timings.append((time.perf_counter() - started) * 1000.0)
+                stats = db.stats.snapshot()
+                reads.append(stats["reads"])
+                writes.append(stats["writes"] + stats["deletes"])
+            results[name] = {
+                "reads": max(reads),
+                "writes": max(writes),
+                "queries": stats["queries"],
+                "wall_ms": round(statistics.median(timings), 3),
+                "reads_by_collection": stats["reads_by_collection"],
+            }
+
+    return {"scale": str(scale), "fixtures": fixture_counts, "results": results}
+
+
+def compare_to_baseline(report, baseline, time_tolerance=2.0, time_slack_ms=5.0, check_time=True):
+    """
+    Return a list of human-readable regressions against *baseline*.
+
+    Read/write counts are deterministic for a given scale and seed, so any
+    increase is a regression. Wall time is allowed ``time_tolerance`` × the
+    baseline plus ``time_slack_ms`` to absorb machine noise.
+    """
+    expected = (baseline or {}).get(report["scale"]) or {}
+    regressions = []
+    for name, result in report["results"].items():
+        base = expected.get(name)
+        if not base:
+            continue
+        for metric in ("reads", "writes"):
+            if result[metric] > base.get(metric, result[metric]):
+                regressions.append(f"{name}: {metric} {result[metric]} > baseline {base[metric]}")
+        if check_time and "wall_ms" in base:
+            limit = base["wall_ms"] * time_tolerance + time_slack_ms
+            if result["wall_ms"] > limit:
+                regressions.append(f"{name}: wall_ms {result['wall_ms']:.1f} > allowed {limit:.1f} (baseline {base['wall_ms']:.1f})")
+    return regressions
@@ -0,0 +1,140 @@
+"""
+Benchmark: a threading.Timer per pending ride vs the shared ride_timers scheduler.
+
+Arms N pending ride expiries spread over a window, then reports arm time,
+thread count and RSS while they are pending, and firing lag (fire time - due).
+
+Examples:
+  python -m benchmarks.timers
+  python -m benchmarks.timers --rides 10000 --delay 2 --spread 3
+  python -m benchmarks.timers --redis-url redis://localhost:6379/0
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(CURRENT_DIR)
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from app.services import ride_timers  # noqa: E402
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = min(int(round((len(ordered) - 1) * pct / 100.0)), len(ordered) - 1)
+    return round(ordered[index], 2)
+
+
+class _Run:
+    def __init__(self, rides, delay, spread, seed):
+        rng = random.Random(seed)
+        self.delays = {f"ride-{i}": delay + rng.uniform(0, spread) for i in range(rides)}
+        self.due = {}
+        self.lags_ms = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def fire(self, ride_id):
+        lag_ms = (time.time() - self.due[ride_id]) * 1000.0
+        with self.lock:
+            self.lags_ms.append(lag_ms)
+            if len(self.lags_ms) == len(self.delays):
+                self.done.set()
+
+    def report(self, name, arm_s, threads, rss_mb, timeout):
+        finished = self.done.wait(timeout)
+        lags = sorted(self.lags_ms)
+        return {
+            "mode": name,
+            "rides": len(self.delays),
+            "arm_ms": round(arm_s * 1000.0, 1),
+            "threads_pending": threads,
+            "rss_mb_pending": rss_mb,
+            "fired": len(lags),
+            "complete": finished,
+            "lag_p50_ms": _percentile(lags, 50),
+            "lag_p99_ms": _percentile(lags, 99),
+            "lag_max_ms": round(lags[-1], 2) if lags else None,
+        }
+
+
+def run_thread_timers(rides, delay, spread, seed, timeout):
+    run = _Run(rides, delay, spread, seed)
+    timers = []
+    started = time.perf_counter()
+    for ride_id, ride_delay in run.delays.items():
+        run.due[ride_id] = time.time() + ride_delay
+        timer = threading.Timer(ride_delay, run.fire, args=(ride_id,))
+        timer.daemon = True
+        timer.start()
+        timers.append(timer)
+    arm_s = time.perf_counter() - started
+    return run.report("thread-per-timer", arm_s, threading.active_count(), _rss_mb(), timeout)
+
+
+def run_scheduler(rides, delay, spread, seed, timeout, redis_client=None):
+    ride_timers.get_redis_client = lambda: redis_client
+    run = _Run(rides, delay, spread, seed)
+    ride_timers.register_handler("bench", run.fire)
+    ride_timers.start()
+    started = time.perf_counter()
+    for ride_id, ride_delay in run.delays.items():
+        run.due[ride_id] = ride_timers.schedule("bench", ride_id, ride_delay)
+    arm_s = time.perf_counter() - started
+    name = "scheduler+redis" if redis_client is not None else "scheduler"
+    return run.report(name, arm_s, threading.active_count(), _rss_mb(), timeout)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ride expiry timer benchmark")
+    parser.add_argument("--rides", type=int, default=10000, help="Pending rides (timers) to arm")
+    parser.add_argument("--delay", type=float, default=2.0, help="Minimum seconds until expiry")
+    parser.add_argument("--spread", type=float, default=3.0, help="Expiries are spread over this many seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--redis-url", default="", help="Also run the scheduler against this Redis")
+    parser.add_argument("--skip-threads", action="store_true", help="Skip the thread-per-timer baseline")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    timeout = args.delay + args.spread + 30
+    results = []
+    # Scheduler first: the thread baseline leaves thousands of threads winding down.
+    results.append(run_scheduler(args.rides, args.delay, args.spread, args.seed, timeout))
+    if args.redis_url:
+        import redis
+
+        client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+        client.delete(ride_timers.TIMERS_KEY)
+        results.append(run_scheduler(args.rides, args.delay, args.spread, args.seed, timeout, client))
+    if not args.skip_threads:
+        results.append(run_thread_timers(args.rides, args.delay, args.spread, args.seed, timeout))
+
+    columns = ["mode", "rides", "arm_ms", "threads_pending", "rss_mb_pending", "fired", "lag_p50_ms", "lag_p99_ms", "lag_max_ms"]
+    print(" ".join(f"{column:>16}" for column in columns))
+    for row in results:
+        print(" ".join(f"{str(row[column]):>16}" for column in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
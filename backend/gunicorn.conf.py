@@ -0,0 +1,32 @@
+"""
+Gunicorn settings. Usage: gunicorn -c gunicorn.conf.py run:app
+
+SOCKETIO_ASYNC_MODE=gevent (recommended for realtime traffic) uses the
+``gevent`` worker class: every Socket.IO client and /api/events/stream SSE
+stream is a greenlet, so one worker holds 10k+ sockets. The worker patches the
+stdlib before importing the app. Otherwise ``gthread`` is used, which pins one
+thread per long-lived connection.
+
+One worker is the default: with gevent it already holds thousands of
+sockets. Multiple workers need SOCKETIO_TRANSPORTS=websocket or a sticky load
+balancer, plus Redis for the Socket.IO message queue (see app/config.py); the
+app logs a warning at startup when they are missing.
+"""
+
+import os
+
+_async_mode = os.getenv("SOCKETIO_ASYNC_MODE", "threading").strip().lower()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+if _async_mode == "gevent":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "20000"))
+    # Long-lived sockets must never count as a hung request.
+    timeout = max(timeout, 300)
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "100"))
@@ -3,11 +3,23 @@ Entry point for the Flask application.
 Run with: python run.py
 """
 
-import warnings
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+if os.getenv("SOCKETIO_ASYNC_MODE", "threading").strip().lower() == "gevent":
+    # Must run before Flask, redis, requests or grpc import socket/threading.
+    from gevent import monkey
+
+    if not monkey.is_module_patched("socket"):
+        monkey.patch_all()
+
+import warnings  # noqa: E402
 warnings.filterwarnings("ignore", category=Warning, module="requests")
 
-from app import create_app
-from app.services.socket_service import get_socketio
+from app import create_app  # noqa: E402
+from app.services.socket_service import get_socketio  # noqa: E402
 
 app = create_app()
 socketio = get_socketio()
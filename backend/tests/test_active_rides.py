@@ -0,0 +1,71 @@
+import pytest
+
+from app.utils import rides
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def redis_rides(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(rides, "get_redis_client", lambda: client)
+    db = FakeFirestore()
+    with installed(db):
+        for index in range(40):
+            db.collection("rides").document(f"old-{index}").set(
+                {"traveler_uid": "t1", "driver_uid": "d1", "status": rides.RIDE_STATUS_COMPLETED}
+            )
+        db.collection("rides").document("live").set(
+            {"traveler_uid": "t1", "driver_uid": "d1", "status": rides.RIDE_STATUS_IN_PROGRESS}
+        )
+        yield db
+
+
+def test_active_ride_lookup_is_one_pointer_read_after_seeding(redis_rides):
+    assert rides.get_active_ride_for_traveler("t1")["id"] == "live"
+    redis_rides.stats.reset()
+
+    assert rides.get_active_ride_for_traveler("t1")["id"] == "live"
+    assert rides.get_active_ride_for_driver("d1")["id"] == "live"
+    assert redis_rides.stats.queries == 1  # driver pointer seeded once
+    redis_rides.stats.reset()
+    assert rides.get_active_ride_for_driver("d1")["id"] == "live"
+    assert redis_rides.stats.queries == 0
+    assert redis_rides.stats.reads == 1
+
+
+def test_status_change_moves_pointer_and_stale_pointer_self_heals(redis_rides):
+    rides.get_active_ride_for_traveler("t1")
+    redis_rides.collection("rides").document("live").update({"status": rides.RIDE_STATUS_COMPLETED})
+    rides.sync_active_ride_pointers(
+        {"id": "live", "traveler_uid": "t1", "driver_uid": "d1", "status": rides.RIDE_STATUS_COMPLETED}
+    )
+    redis_rides.stats.reset()
+
+    assert rides.get_active_ride_for_traveler("t1") is None
+    assert redis_rides.stats.snapshot()["reads"] == 0
+
+    # A pointer left behind (e.g. a missed transition) is rechecked and reseeded.
+    redis_rides.collection("rides").document("next").set({"traveler_uid": "t1", "status": rides.RIDE_STATUS_REQUESTED})
+    rides.sync_active_ride_pointers({"id": "gone", "traveler_uid": "t1", "status": rides.RIDE_STATUS_REQUESTED})
+    assert rides.get_active_ride_for_traveler("t1")["id"] == "next"
+
+
+def test_seed_does_not_overwrite_a_pointer_written_during_the_scan(redis_rides, monkeypatch):
+    client = rides.get_redis_client()
+    redis_rides.collection("rides").document("live").update({"status": rides.RIDE_STATUS_COMPLETED})
+    real_scan = rides._scan_active_ride
+
+    def _scan_then_new_ride(field, uid):
+        found = real_scan(field, uid)
+        # A ride is requested (and its pointer synced) while the scan is running.
+        redis_rides.collection("rides").document("new").set({"traveler_uid": "t1", "status": rides.RIDE_STATUS_REQUESTED})
+        rides.sync_active_ride_pointers({"id": "new", "traveler_uid": "t1", "status": rides.RIDE_STATUS_REQUESTED})
+        return found
+
+    monkeypatch.setattr(rides, "_scan_active_ride", _scan_then_new_ride)
+    assert rides.get_active_ride_for_traveler("t1") is None
+    monkeypatch.setattr(rides, "_scan_active_ride", real_scan)
+
+    assert client.get(rides._active_ride_key("traveler_uid", "t1")) == "new"
+    assert rides.get_active_ride_for_traveler("t1")["id"] == "new"
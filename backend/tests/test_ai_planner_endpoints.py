@@ -1,5 +1,3 @@
-from types import SimpleNamespace
-
 from app import create_app
 
 
@@ -25,10 +23,11 @@ def test_create_planner_session_endpoint(monkeypatch):
             "created_at": "2026-01-01T00:00:00",
         },
     )
-    monkeypatch.setattr("app.blueprints.ai.run_session", lambda _session_id: None)
+    queued = []
+    monkeypatch.setattr("app.blueprints.ai.planner_jobs.admission_error", lambda uid: (None, None))
     monkeypatch.setattr(
-        "app.blueprints.ai.get_socketio",
-        lambda: SimpleNamespace(start_background_task=lambda *_args, **_kwargs: None),
+        "app.blueprints.ai.planner_jobs.enqueue",
+        lambda session_id, uid: (queued.append((session_id, uid)) or len(queued), None, None),
     )
 
     response = client.post(
@@ -39,6 +38,45 @@ def test_create_planner_session_endpoint(monkeypatch):
     assert response.status_code == 201
     data = response.get_json()["data"]
     assert data["id"] == "session-1"
+    assert data["queue_position"] == 1
+    assert queued == [("session-1", "traveler-1")]
+
+
+def test_create_planner_session_sheds_load_with_retry_after(monkeypatch):
+    app = create_app("development")
+    client = app.test_client()
+
+    monkeypatch.setattr("app.utils.auth.verify_firebase_token", lambda _token: _auth_claims())
+    monkeypatch.setattr("app.blueprints.ai.planner_jobs.admission_error", lambda uid: ("PLANNER_BUSY", 90))
+    monkeypatch.setattr(
+        "app.blueprints.ai.create_session",
+        lambda *_args: (_ for _ in ()).throw(AssertionError("session created while shedding")),
+    )
+
+    response = client.post("/api/ai/planner/sessions", headers=_headers(), json={"destination": "Goa, India"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "90"
+    assert response.get_json()["error"] == "PLANNER_BUSY"
+
+
+def test_create_planner_session_discards_session_refused_at_enqueue(monkeypatch):
+    app = create_app("development")
+    client = app.test_client()
+
+    monkeypatch.setattr("app.utils.auth.verify_firebase_token", lambda _token: _auth_claims())
+    monkeypatch.setattr("app.blueprints.ai.create_session", lambda *_args: {"id": "session-1"})
+    # A concurrent request took the last slot between the early check and the enqueue.
+    monkeypatch.setattr("app.blueprints.ai.planner_jobs.admission_error", lambda uid: (None, None))
+    monkeypatch.setattr(
+        "app.blueprints.ai.planner_jobs.enqueue", lambda session_id, uid: (None, "PLANNER_USER_LIMIT", 45)
+    )
+    discarded = []
+    monkeypatch.setattr("app.blueprints.ai.discard_session", discarded.append)
+
+    response = client.post("/api/ai/planner/sessions", headers=_headers(), json={"destination": "Goa, India"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "45"
+    assert discarded == ["session-1"]
 
 
 def test_list_planner_sessions_endpoint(monkeypatch):
@@ -0,0 +1,30 @@
+import logging
+from types import SimpleNamespace
+
+from app.services import async_runtime
+
+
+def test_gevent_mode_falls_back_to_threading_when_stdlib_unpatched(monkeypatch):
+    monkeypatch.setattr(async_runtime, "is_stdlib_patched", lambda mode: False)
+    app = SimpleNamespace(config={"SOCKETIO_ASYNC_MODE": "gevent"}, logger=logging.getLogger("test"))
+
+    assert async_runtime.init_async_runtime(app) == "threading"
+    assert app.config["SOCKETIO_ASYNC_MODE"] == "threading"
+
+
+def test_unknown_async_mode_is_treated_as_threading():
+    assert async_runtime.configured_async_mode({"SOCKETIO_ASYNC_MODE": "eventlet"}) == "threading"
+    assert async_runtime.configured_async_mode({"SOCKETIO_ASYNC_MODE": " GEVENT "}) == "gevent"
+
+
+def test_polling_across_workers_without_affinity_is_flagged():
+    from app.services.socket_service import _polling_without_affinity
+
+    def _app(**config):
+        return SimpleNamespace(config=config)
+
+    assert _polling_without_affinity(_app(GUNICORN_WORKERS=4), {})
+    assert _polling_without_affinity(_app(GUNICORN_WORKERS=4), {"transports": ["polling", "websocket"]})
+    assert not _polling_without_affinity(_app(GUNICORN_WORKERS=1), {})
+    assert not _polling_without_affinity(_app(GUNICORN_WORKERS=4), {"transports": ["websocket"]})
+    assert not _polling_without_affinity(_app(GUNICORN_WORKERS=4), {"cookie": "io-affinity"})
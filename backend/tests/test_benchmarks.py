@@ -0,0 +1,59 @@
+import json
+
+from firebase_admin import firestore
+
+from benchmarks.firestore_double import FakeFirestore
+from benchmarks.run import BASELINE_PATH
+from benchmarks.suite import compare_to_baseline, run_suite
+
+
+def test_fake_firestore_query_order_limit_and_cursor():
+    db = FakeFirestore()
+    for i in range(5):
+        db.collection("rides").document(f"r{i}").set(
+            {"driver_uid": "d1" if i % 2 else "d2", "created_at": f"2026-01-0{i + 1}"}
+        )
+    db.stats.reset()
+
+    query = db.collection("rides").order_by("created_at", direction="DESCENDING").limit(2)
+    first_page = query.get()
+    second_page = query.start_after(first_page[-1]).get()
+    filtered = db.collection("rides").where("driver_uid", "==", "d1").stream()
+
+    assert [doc.id for doc in first_page] == ["r4", "r3"]
+    assert [doc.id for doc in second_page] == ["r2", "r1"]
+    assert [doc.id for doc in filtered] == ["r1", "r3"]
+    assert db.stats.reads == 6
+
+
+def test_fake_firestore_collection_group_and_transaction_retry():
+    db = FakeFirestore()
+    db.collection("users").document("u1").collection("guide_services").document("g1").set({"n": 1})
+    db.collection("users").document("u2").collection("guide_services").document("g2").set({"n": 2})
+    parents = [doc.reference.parent.parent.id for doc in db.collection_group("guide_services").stream()]
+    assert parents == ["u1", "u2"]
+
+    ref = db.collection("counters").document("c1")
+    ref.set({"value": 0})
+    attempts = []
+
+    @firestore.transactional
+    def _bump(transaction):
+        snapshot = ref.get(transaction=transaction)
+        if not attempts:
+            ref.update({"value": 10})  # concurrent writer forces one retry
+        attempts.append(1)
+        transaction.update(ref, {"value": snapshot.to_dict()["value"] + 1})
+
+    _bump(db.transaction())
+    assert len(attempts) == 2
+    assert ref.get().to_dict()["value"] == 11
+
+
+def test_benchmark_read_counts_do_not_regress():
+    report = run_suite(scale="small", iterations=1)
+    with open(BASELINE_PATH, "r", encoding="utf-8") as handle:
+        baseline = json.load(handle)
+
+    assert set(report["results"]) == set(baseline["small"])
+    assert compare_to_baseline(report, baseline, check_time=False) == []
@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+from app.services import driver_presence
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def local_presence(monkeypatch):
+    monkeypatch.setattr(driver_presence, "get_redis_client", lambda: None)
+    monkeypatch.setattr(driver_presence, "_local_records", {})
+    monkeypatch.setattr(driver_presence, "_last_snapshot", {})
+    db = FakeFirestore()
+    with installed(db):
+        yield db
+
+
+def test_nearest_drivers_ranked_by_distance_within_radius(local_presence):
+    driver_presence.set_online("far", "Jabalpur", "jabalpur", {"lat": 23.30, "lng": 79.95}, "s1")
+    driver_presence.set_online("near", "Jabalpur", "jabalpur", {"lat": 23.182, "lng": 79.951}, "s2")
+    driver_presence.set_online("mid", "Jabalpur", "jabalpur", {"lat": 23.20, "lng": 79.95}, "s3")
+    driver_presence.set_online("other_city", "Indore", "indore", {"lat": 23.181, "lng": 79.95}, "s4")
+
+    drivers = driver_presence.nearest_drivers("jabalpur", 23.18, 79.95, radius_km=5, limit=10)
+
+    assert [d["id"] for d in drivers] == ["near", "mid"]
+    assert drivers[0]["distance_km"] < drivers[1]["distance_km"]
+    assert driver_presence.count_online("jabalpur") == 3
+
+
+def test_stale_drivers_are_swept_and_offline_respects_socket_owner(local_presence, monkeypatch):
+    driver_presence.set_online("d1", "Pune", "pune", {"lat": 18.52, "lng": 73.85}, "sock-a")
+    driver_presence.set_online("d2", "Pune", "pune", {"lat": 18.53, "lng": 73.86}, "sock-b")
+
+    assert driver_presence.set_offline("d1", socket_id="stale-socket") is None
+    assert driver_presence.is_online("d1")
+
+    real_time = time.time
+    monkeypatch.setattr(driver_presence.time, "time", lambda: real_time() + 1000)
+    driver_presence.touch_location("d2", {"lat": 18.54, "lng": 73.86})
+
+    assert driver_presence.sweep_stale() == {"pune": ["d1"]}
+    assert [d["id"] for d in driver_presence.online_drivers("pune")] == ["d2"]
+    assert local_presence.collection("driver_presence").document("d1").get().to_dict()["online"] is False
+
+
+def test_location_pings_snapshot_to_firestore_at_most_once_per_interval(local_presence):
+    driver_presence.set_online("d1", "Goa", "goa", {"lat": 15.49, "lng": 73.82}, "sock")
+    local_presence.stats.reset()
+
+    for step in range(20):
+        driver_presence.touch_location("d1", {"lat": 15.49 + step * 0.0001, "lng": 73.82})
+
+    assert local_presence.stats.writes == 0
+    assert driver_presence.get_presence("d1")["location"]["lat"] == pytest.approx(15.4919)
+
+
+def test_redis_city_counters_follow_real_transitions_only(local_presence, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(driver_presence, "get_redis_client", lambda: client)
+
+    driver_presence.set_online("d1", "Pune", "pune", {"lat": 18.52, "lng": 73.85}, "s1")
+    driver_presence.set_online("d1", "Pune", "pune", {"lat": 18.53, "lng": 73.85}, "s1")
+    driver_presence.set_online("d2", "Pune", "pune", {"lat": 18.54, "lng": 73.85}, "s2")
+    assert driver_presence.count_online("pune") == 2
+
+    driver_presence.set_online("d2", "Goa", "goa", {"lat": 15.49, "lng": 73.82}, "s2")
+    driver_presence.set_offline("d1")
+    driver_presence.set_offline("d1")
+    assert client.hgetall(driver_presence.COUNTS_KEY) == {"pune": "0", "goa": "1"}
+
+    real_time = time.time
+    monkeypatch.setattr(driver_presence.time, "time", lambda: real_time() + 1000)
+    assert driver_presence.sweep_stale() == {"goa": ["d2"]}
+    assert driver_presence.count_online("goa") == 0
+
+
+def test_city_count_pushes_are_debounced(local_presence, monkeypatch):
+    from app.services import ride_timers, socket_service
+
+    scheduled, emitted = [], []
+    monkeypatch.setattr(ride_timers, "schedule", lambda kind, key, delay, local=False: scheduled.append(key))
+    monkeypatch.setattr(socket_service.socketio, "emit", lambda event, payload, **kw: emitted.append(payload))
+    monkeypatch.setattr(socket_service, "_online_count_pending", set())
+    monkeypatch.setattr(socket_service, "_online_count_last", {})
+    monkeypatch.setattr(socket_service, "get_redis_client", lambda: None)
+
+    for uid in ("d1", "d2", "d3"):
+        driver_presence.set_online(uid, "Pune", "pune", {"lat": 18.52, "lng": 73.85}, uid)
+        socket_service._queue_online_count("pune", city="Pune")
+    assert scheduled == ["pune"]
+
+    socket_service._flush_online_count("pune")
+    driver_presence.set_offline("d3")
+    socket_service._queue_online_count("pune")
+    socket_service._flush_online_count("pune")
+    socket_service._flush_online_count("pune")
+
+    assert [(p["count"], p["delta"]) for p in emitted] == [(3, None), (2, -1)]
+    assert scheduled == ["pune", "pune"]
+
+
+def test_city_count_pushes_are_deduped_across_workers(local_presence, monkeypatch):
+    from app.services import ride_timers, socket_service
+
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(driver_presence, "get_redis_client", lambda: client)
+    monkeypatch.setattr(socket_service, "get_redis_client", lambda: client)
+    scheduled, emitted = [], []
+    monkeypatch.setattr(ride_timers, "schedule", lambda kind, key, delay, local=False: scheduled.append(key))
+    monkeypatch.setattr(socket_service.socketio, "emit", lambda event, payload, **kw: emitted.append(payload))
+
+    def _on_worker(step):
+        # Each worker has its own pending set and last-count map; only Redis is shared.
+        monkeypatch.setattr(socket_service, "_online_count_pending", set())
+        monkeypatch.setattr(socket_service, "_online_count_last", {})
+        step()
+
+    for uid in ("d1", "d2", "d3"):
+        driver_presence.set_online(uid, "Pune", "pune", {"lat": 18.52, "lng": 73.85}, uid)
+        _on_worker(lambda: socket_service._queue_online_count("pune", city="Pune"))
+    assert scheduled == ["pune"]
+
+    _on_worker(lambda: socket_service._flush_online_count("pune"))
+    _on_worker(lambda: socket_service._flush_online_count("pune"))
+    driver_presence.set_offline("d3")
+    _on_worker(lambda: socket_service._queue_online_count("pune"))
+    _on_worker(lambda: socket_service._flush_online_count("pune"))
+
+    assert [(p["count"], p["delta"]) for p in emitted] == [(3, None), (2, -1)]
+    assert scheduled == ["pune", "pune"]
+
+
+def test_sweep_keeps_a_driver_whose_ping_lands_mid_sweep(local_presence, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(driver_presence, "get_redis_client", lambda: client)
+    driver_presence.set_online("d1", "Pune", "pune", {"lat": 18.52, "lng": 73.85}, "s1")
+    driver_presence.set_online("d2", "Pune", "pune", {"lat": 18.53, "lng": 73.86}, "s2")
+
+    # Both drivers' last pings are long past (fakeredis expires keys by the real clock).
+    client.zadd(driver_presence._seen_key("pune"), {"d1": time.time() - 1000, "d2": time.time() - 1000})
+    real_pipeline = client.pipeline
+    pinged = []
+
+    def _pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        real_multi = pipe.multi
+
+        def _multi():
+            if not pinged:
+                # d1 pings after the sweep read the stale drivers, before it removes them.
+                pinged.append(True)
+                driver_presence.touch_location("d1", {"lat": 18.521, "lng": 73.85})
+            return real_multi()
+
+        pipe.multi = _multi
+        return pipe
+
+    monkeypatch.setattr(client, "pipeline", _pipeline)
+    assert driver_presence.sweep_stale() == {"pune": ["d2"]}
+
+    assert [driver["id"] for driver in driver_presence.nearest_drivers("pune", 18.52, 73.85)] == ["d1"]
+    assert driver_presence.count_online("pune") == 1
+    assert client.sismember(driver_presence.CITIES_KEY, "pune")
@@ -0,0 +1,87 @@
+import pytest
+
+from app.services import driver_ratings
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def rated_driver():
+    db = FakeFirestore()
+    with installed(db):
+        db.collection("users").document("d1").set(
+            {"role": "BUSINESS", "business_profile": {"business_type": "CAB_DRIVER", "details": {}}}
+        )
+        db.collection("rides").document("old").set(
+            {
+                "driver_uid": "d1",
+                "traveler_uid": "t1",
+                "status": "COMPLETED",
+                "rating": {"stars": 4, "updated_at": "2026-01-01T00:00:00"},
+            }
+        )
+        for ride_id in ("r1", "r2"):
+            db.collection("rides").document(ride_id).set(
+                {"driver_uid": "d1", "traveler_uid": "t1", "status": "COMPLETED", "traveler_name": "Asha"}
+            )
+        yield db
+
+
+def test_ratings_update_aggregates_and_rerating_replaces_the_old_score(rated_driver):
+    assert driver_ratings.summarize(driver_ratings.get_stats("d1"))["rated_rides"] == 1
+
+    driver_ratings.submit_rating("r1", "t1", stars=5)
+    driver_ratings.submit_rating("r1", "t1", stars=2, message="Late pickup")
+    driver_ratings.submit_rating("r2", "t1", message="Polite")
+
+    rated_driver.stats.reset()
+    stats = driver_ratings.get_stats("d1")
+    assert rated_driver.stats.reads == 1
+
+    summary = driver_ratings.summarize(stats)
+    assert summary == {
+        "total_rides": 3,
+        "rated_rides": 2,
+        "text_feedback_count": 2,
+        "average_stars": 3.0,
+        "histogram": {"1": 0, "2": 1, "3": 0, "4": 1, "5": 0},
+    }
+    assert [item["ride_id"] for item in stats["recent"]] == ["r2", "r1", "old"]
+    details = rated_driver.collection("users").document("d1").get().to_dict()["business_profile"]["details"]
+    assert details["cab_rating_count"] == 2
+    assert details["cab_rating_avg"] == 3.0
+
+
+def test_rating_is_rejected_for_other_travelers_and_open_rides(rated_driver):
+    rated_driver.collection("rides").document("open").set({"driver_uid": "d1", "traveler_uid": "t1", "status": "IN_PROGRESS"})
+
+    with pytest.raises(ValueError, match="FORBIDDEN"):
+        driver_ratings.submit_rating("r1", "someone-else", stars=5)
+    with pytest.raises(ValueError, match="INVALID_STATE"):
+        driver_ratings.submit_rating("open", "t1", stars=5)
+    with pytest.raises(ValueError, match="NOT_FOUND"):
+        driver_ratings.submit_rating("missing", "t1", stars=5)
+
+
+def test_backfill_retries_instead_of_overwriting_a_concurrent_rating(rated_driver, monkeypatch):
+    real_apply = driver_ratings._apply_rating
+    interleaved = []
+
+    def _apply_with_concurrent_rating(stats, entry, previous):
+        if not interleaved:
+            # A traveler rates another ride after the backfill has scanned it.
+            interleaved.append(True)
+            driver_ratings.submit_rating("r2", "t1", stars=5)
+        return real_apply(stats, entry, previous)
+
+    monkeypatch.setattr(driver_ratings, "_apply_rating", _apply_with_concurrent_rating)
+    stats = driver_ratings.rebuild_stats("d1")
+
+    assert stats["backfilled"]
+    assert driver_ratings.summarize(stats)["rated_rides"] == 2
+    stored = rated_driver.collection(driver_ratings.STATS_COLLECTION).document("d1").get().to_dict()
+    assert stored["stars_sum"] == 9
+
+    # Once backfilled, another rebuild returns the doc without rescanning.
+    rated_driver.stats.reset()
+    assert driver_ratings.rebuild_stats("d1")["stars_sum"] == 9
+    assert rated_driver.stats.queries == 0
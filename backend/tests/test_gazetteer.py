@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.services import gazetteer, geocode_service
+
+
+@pytest.fixture(autouse=True)
+def compiled_gazetteer(tmp_path, monkeypatch):
+    monkeypatch.setenv("GAZETTEER_CACHE_DIR", str(tmp_path))
+    gazetteer.reset()
+    yield tmp_path
+    gazetteer.reset()
+
+
+def test_table_is_compiled_once_and_memory_mapped(compiled_gazetteer):
+    first = gazetteer.compile_table()
+    assert isinstance(first, np.memmap)
+    assert len(list(compiled_gazetteer.glob("gazetteer-*.npy"))) == 1
+    assert len(gazetteer.compile_table()) == len(first)
+
+
+def test_points_resolve_to_the_tightest_enclosing_place():
+    andheri = gazetteer.resolve_point(19.1140, 72.8690)
+    assert (andheri["city"], andheri["locality"]) == ("Mumbai", "Andheri East")
+    assert (andheri["lat"], andheri["lng"]) == (19.1140, 72.8690)
+    # The airport lies outside Bengaluru's own box but reports it as parent city.
+    assert gazetteer.resolve_point(13.1990, 77.7070)["city"] == "Bengaluru"
+    assert gazetteer.resolve_point(19.2200, 72.9800)["city"] == "Thane"
+    assert gazetteer.resolve_point(20.0, 60.0) is None
+
+
+def test_suggestions_match_word_prefixes_and_aliases():
+    assert [item["name"] for item in gazetteer.suggest("andh")] == ["Andheri East", "Andheri West"]
+    assert gazetteer.suggest("bangalore")[0]["name"] == "Bengaluru"
+    assert gazetteer.suggest("airport", city_hint="Hyderabad")[0]["city"] == "Hyderabad"
+    assert gazetteer.suggest("airport", lat=13.08, lng=80.27)[0]["city"] == "Chennai"
+    assert gazetteer.suggest("zzqx") == []
+
+
+def test_geocoding_skips_the_network_on_gazetteer_hits(monkeypatch):
+    def _offline(_url):
+        raise AssertionError("network call")
+
+    monkeypatch.setattr(geocode_service, "_http_get_json", _offline)
+    located = geocode_service.locate(18.5362, 73.8940, address="Lane 5, Koregaon Park")
+    assert located == {"address": "Lane 5, Koregaon Park", "lat": 18.5362, "lng": 73.894, "city": "Pune"}
+    assert geocode_service.resolve_city(15.4909, 73.8278)["city"] == "Panaji"
+    assert geocode_service.suggest_addresses("koram", limit=3)[0]["name"] == "Koramangala"
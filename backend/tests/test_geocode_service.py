@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from app.services import geocode_service
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+    responses = {}
+
+    def _fake_get(url, timeout=None):
+        calls.append(url)
+        for marker, payload in responses.items():
+            if marker in url:
+                if isinstance(payload, Exception):
+                    raise payload
+                return payload
+        return []
+
+    monkeypatch.setattr(geocode_service, "_http_get_json", _fake_get)
+    monkeypatch.setattr(geocode_service, "get_redis_client", lambda: None)
+    monkeypatch.setattr(geocode_service, "_local_cache", type(geocode_service._local_cache)())
+    monkeypatch.setattr(geocode_service, "_provider_stats", type(geocode_service._provider_stats)())
+    monkeypatch.setenv("NOMINATIM_MIN_INTERVAL_SECONDS", "0")
+    return calls, responses
+
+
+def test_reverse_lookups_share_a_coordinate_bucket(upstream):
+    calls, responses = upstream
+    responses["/reverse"] = {"display_name": "MG Road, Pune", "address": {"city": "Pune"}}
+
+    first = geocode_service.reverse_geocode(18.520431, 73.856744)
+    second = geocode_service.reverse_geocode(18.520449, 73.856711)
+
+    assert len(calls) == 1
+    assert first["city"] == second["city"] == "Pune"
+    assert (second["lat"], second["lng"]) == (18.520449, 73.856711)
+
+
+def test_forward_lookups_normalize_text_and_cache_misses_but_not_errors(upstream):
+    calls, responses = upstream
+    responses["search?q=Shaniwar"] = [{"display_name": "Shaniwar Wada", "lat": "18.519", "lon": "73.855", "address": {"city": "Pune"}}]
+
+    assert geocode_service.forward_geocode("Shaniwar Wada", city_hint="Pune")["city"] == "Pune"
+    first_calls = len(calls)
+    assert geocode_service.forward_geocode("  shaniwar   WADA ", city_hint="pune")["lat"] == 18.519
+    assert len(calls) == first_calls
+
+    assert geocode_service.forward_geocode("Nowhere Lane", city_hint="Pune") is None
+    miss_calls = len(calls)
+    assert geocode_service.forward_geocode("Nowhere Lane", city_hint="Pune") is None
+    assert len(calls) == miss_calls
+
+    responses["search?q=Flaky"] = RuntimeError("upstream down")
+    assert geocode_service.forward_geocode("Flaky Street") is None
+    assert geocode_service.forward_geocode("Flaky Street") is None
+    assert len(calls) == miss_calls + 4
+
+
+def test_redis_tier_is_shared_between_workers(upstream, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(geocode_service, "get_redis_client", lambda: client)
+    calls, responses = upstream
+    responses["/reverse"] = {"display_name": "Baga Beach", "address": {"village": "Baga"}}
+
+    geocode_service.reverse_geocode(15.5553, 73.7517)
+    geocode_service._local_cache.clear()
+    assert geocode_service.reverse_geocode(15.5553, 73.7517)["city"] == "Baga"
+    assert len(calls) == 1
+
+
+def test_nominatim_candidates_run_in_order_within_the_deadline(upstream, monkeypatch):
+    calls, responses = upstream
+    timeouts = []
+    lanes_done = []
+    monkeypatch.setenv("GEOCODE_DEADLINE_SECONDS", "0.3")
+
+    def _fake_get(url, timeout=None):
+        calls.append(url)
+        timeouts.append(timeout)
+        if "India" not in url:
+            time.sleep(timeout)  # the bare address query hangs until its timeout
+            raise requests.Timeout()
+        return [{"display_name": f"hit for {url}", "lat": "1", "lon": "2", "address": {"city": "Goa"}}]
+
+    real_run_lane = geocode_service._run_lane
+
+    def _tracked_lane(calls_, lane, deadline):
+        done = threading.Event()
+        lanes_done.append(done)
+        try:
+            return real_run_lane(calls_, lane, deadline)
+        finally:
+            done.set()
+
+    monkeypatch.setattr(geocode_service, "_http_get_json", _fake_get)
+    monkeypatch.setattr(geocode_service, "_run_lane", _tracked_lane)
+    started = time.monotonic()
+    result = geocode_service.forward_geocode("Baga Road", city_hint="Goa")
+
+    assert time.monotonic() - started < 1.0
+    # One request at a time, each bounded by what is left of the lookup deadline.
+    assert timeouts[0] <= 0.3
+    assert result is None
+    # Timed-out answers are not cached.
+    assert geocode_service._local_get(geocode_service._text_key("fwd", "Baga Road", "Goa")) is None
+
+    def _counted():
+        stats = geocode_service.geocode_stats()["nominatim"]
+        return stats["ok"], stats["errors"], stats["timeouts"]
+
+    # Four candidates, each counted exactly once, before the lookup returns...
+    at_return = _counted()
+    assert sum(at_return) == 4
+    assert at_return[0] == 0 and at_return[2] >= 1
+    # ...and not again when the call still in flight at the deadline finishes.
+    assert lanes_done and all(done.wait(2) for done in lanes_done)
+    assert _counted() == at_return
+
+
+def test_nominatim_requests_are_spaced_and_stop_at_the_first_hit(upstream, monkeypatch):
+    calls, responses = upstream
+    monkeypatch.setenv("NOMINATIM_MIN_INTERVAL_SECONDS", "0.2")
+    responses["Goa%2C+India"] = [{"display_name": "Baga Road", "lat": "15.5", "lon": "73.7", "address": {"city": "Goa"}}]
+    started_at = []
+    real_get = geocode_service._http_get_json
+
+    def _timed_get(url, timeout=None):
+        started_at.append(time.monotonic())
+        return real_get(url, timeout=timeout)
+
+    monkeypatch.setattr(geocode_service, "_http_get_json", _timed_get)
+    assert geocode_service.forward_geocode("Baga Road", city_hint="Goa")["city"] == "Goa"
+
+    # "Baga Road" misses, "Baga Road, Goa" misses, "Baga Road, Goa, India" hits; the last candidate is skipped.
+    assert len(calls) == 3
+    assert all(later - earlier >= 0.19 for earlier, later in zip(started_at, started_at[1:]))
+
+
+def test_suggestions_merge_providers_and_stop_at_the_limit(upstream, monkeypatch):
+    calls, responses = upstream
+    photon = {
+        "features": [
+            {"properties": {"name": f"Spot {index}", "city": "Pune"}, "geometry": {"coordinates": [73.8, 18.5]}}
+            for index in range(3)
+        ]
+    }
+    responses["photon"] = photon
+    responses["search?q="] = [{"display_name": "Spot 0, Pune", "name": "Spot 0", "lat": "18.5", "lon": "73.8", "address": {}}]
+
+    results = geocode_service.suggest_addresses("qqspot", limit=3)
+    assert [item["name"] for item in results] == ["Spot 0", "Spot 1", "Spot 2"]
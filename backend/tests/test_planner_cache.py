@@ -0,0 +1,125 @@
+import pytest
+
+from app.services import planner_cache, planner_orchestrator
+from benchmarks.firestore_double import FakeFirestore, installed
+
+PLAN = {"destination": "Goa", "trip_days": 3, "overview": "Beaches", "daily_plan": [], "retrieval_stats": {"count": 1}}
+MATCHES = [{"id": "HOTEL:h1", "entity_type": "HOTEL", "entity_id": "h1"}]
+
+
+def _fake_embed(text):
+    # Two dimensions: "beach"-ness and everything else, normalized.
+    beach = 1.0 if "beach" in text else 0.0
+    other = 0.2 if "quiet" in text else 0.0
+    norm = (beach**2 + other**2) ** 0.5 or 1.0
+    return [beach / norm, other / norm]
+
+
+@pytest.fixture
+def cache_env(monkeypatch):
+    monkeypatch.setattr(planner_cache, "get_redis_client", lambda: None)
+    monkeypatch.setattr(planner_cache, "embed_text", _fake_embed)
+    planner_cache.reset()
+    yield
+    planner_cache.reset()
+
+
+def _request(**overrides):
+    base = {
+        "destination": "Goa",
+        "trip_days": 3,
+        "budget": "MID_RANGE",
+        "interests": ["Beaches", "food"],
+        "travelers": 2,
+        "origin": "Mumbai",
+        "transport_modes": ["TRAIN"],
+    }
+    return {**base, **overrides}
+
+
+def test_key_ignores_order_case_and_traveler_count_within_bucket(cache_env):
+    assert planner_cache.cache_key(_request(interests=["food", "beaches "], travelers=2)) == planner_cache.cache_key(
+        _request()
+    )
+    assert planner_cache.cache_key(_request(travelers=3)) == planner_cache.cache_key(_request(travelers=4))
+    assert planner_cache.cache_key(_request(trip_days=4)) != planner_cache.cache_key(_request())
+
+
+def test_exact_hit_and_invalidation_by_entity_and_city(cache_env):
+    planner_cache.store(_request(), {**PLAN, "draft_itinerary_id": "it-1"}, "{...}", MATCHES, "s1")
+
+    hit = planner_cache.lookup(_request(interests=["food", "beaches"]))
+    assert hit["match"] == "exact" and hit["source_session_id"] == "s1"
+    assert "draft_itinerary_id" not in hit["result"]
+
+    planner_cache.invalidate_entity("HOTEL:h1")
+    assert planner_cache.lookup(_request()) is None
+
+    planner_cache.store(_request(), PLAN, "{...}", MATCHES, "s2")
+    planner_cache.invalidate_entity("RESTAURANT:r9", city="Goa")
+    assert planner_cache.lookup(_request()) is None
+
+
+def test_similar_request_reuses_plan_only_with_same_days_and_budget(cache_env):
+    planner_cache.store(_request(interests=["beaches"]), PLAN, "{...}", MATCHES, "s1")
+
+    hit = planner_cache.lookup(_request(interests=["beaches", "quiet spots"]))
+    assert hit["match"] == "similar" and hit["similarity"] >= 0.92
+    assert planner_cache.lookup(_request(interests=["beaches", "quiet spots"], trip_days=5)) is None
+    assert planner_cache.lookup(_request(interests=["museums"])) is None
+
+
+def test_similar_request_needs_same_origin_modes_and_party_size(cache_env):
+    planner_cache.store(_request(interests=["beaches"]), PLAN, "{...}", MATCHES, "s1")
+    similar = {"interests": ["beaches", "quiet spots"]}
+
+    assert planner_cache.lookup(_request(**similar, origin="Delhi")) is None
+    assert planner_cache.lookup(_request(**similar, transport_modes=["FLIGHT"])) is None
+    assert planner_cache.lookup(_request(**similar, travelers=5)) is None
+    assert planner_cache.lookup(_request(**similar, travelers=1)) is None
+    assert planner_cache.lookup(_request(**similar, transport_modes=["train"]))["match"] == "similar"
+
+
+def test_redis_backed_cache_and_invalidation(cache_env, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(planner_cache, "get_redis_client", lambda: client)
+
+    planner_cache.store(_request(), PLAN, "{...}", MATCHES, "s1")
+    assert planner_cache.lookup(_request())["match"] == "exact"
+    assert client.ttl(planner_cache.cache_key(_request())) > 0
+
+    planner_cache.invalidate_entity("HOTEL:h1")
+    assert planner_cache.lookup(_request()) is None
+    planner_cache.store(_request(), PLAN, "{...}", MATCHES, "s2")
+    planner_cache.invalidate_all()
+    assert planner_cache.lookup(_request()) is None
+
+
+def test_cached_plan_completes_session_without_generation(cache_env, monkeypatch):
+    db = FakeFirestore()
+    emitted = []
+    monkeypatch.setattr(
+        "app.services.socket_service.emit_planner_event",
+        lambda session_id, name, payload: emitted.append((name, payload)),
+    )
+
+    def _unexpected(*_args, **_kwargs):
+        raise AssertionError("cached sessions must not call the model")
+
+    monkeypatch.setattr(planner_orchestrator, "invoke_bedrock_stream", _unexpected)
+    monkeypatch.setattr(planner_orchestrator, "retrieve", _unexpected)
+    stream_text = '{"destination": "Goa"} ' * 200
+    planner_cache.store(_request(), PLAN, stream_text, MATCHES, "s-original")
+
+    with installed(db):
+        session = planner_orchestrator.create_session("traveler-1", _request())
+        planner_orchestrator.run_session(session["id"])
+        data, _code, _msg = planner_orchestrator.get_session(session["id"], "traveler-1")
+
+    assert data["status"] == "COMPLETED"
+    assert data["result_json"]["cache"]["source_session_id"] == "s-original"
+    assert data["draft_itinerary_id"]
+    assert "".join(event["chunk"] for event in data["events"] if event["type"] == "token") == stream_text
+    assert ("cache_lookup", "DONE") in [(event.get("stage"), event.get("status")) for event in data["events"]]
+    assert emitted[-1][0] == "planner:complete"
@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from app import create_app
+from app.services import planner_events, socket_service
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def local_ring(monkeypatch):
+    monkeypatch.setattr(planner_events, "get_redis_client", lambda: None)
+    planner_events.reset()
+    yield
+    planner_events.reset()
+
+
+def test_events_get_increasing_seq_and_replay_after_last_seen(local_ring):
+    stamped = [planner_events.record("s1", "planner:token", {"chunk": str(index)}) for index in range(5)]
+    planner_events.record("s2", "planner:progress", {})
+
+    assert [payload["seq"] for payload in stamped] == [1, 2, 3, 4, 5]
+    events, complete = planner_events.replay("s1", 3)
+    assert complete
+    assert [(entry["event"], entry["payload"]["chunk"]) for entry in events] == [
+        ("planner:token", "3"),
+        ("planner:token", "4"),
+    ]
+    assert planner_events.replay("s1", 5) == ([], True)
+
+
+def test_replay_reports_gap_when_ring_overflowed(local_ring, monkeypatch):
+    monkeypatch.setenv("PLANNER_REPLAY_RING_SIZE", "10")
+    for index in range(15):
+        planner_events.record("s1", "planner:token", {"chunk": str(index)})
+
+    events, complete = planner_events.replay("s1", 0)
+    assert not complete
+    assert [entry["seq"] for entry in events] == list(range(6, 16))
+    assert planner_events.replay("s1", 5)[1]
+
+
+def test_redis_ring_is_shared(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(planner_events, "get_redis_client", lambda: client)
+
+    planner_events.record("s1", "planner:progress", {"stage": "validate_input"})
+    planner_events.record("s1", "planner:token", {"chunk": "hi"})
+
+    events, complete = planner_events.replay("s1", 1)
+    assert complete and [entry["payload"] for entry in events] == [{"chunk": "hi", "seq": 2}]
+    assert client.ttl("planner:ring:s1") > 0
+
+
+def test_subscribe_replays_events_emitted_before_the_client_joined(local_ring, monkeypatch):
+    app = create_app("development")
+    # Socket.IO binds to the first app created in the test run; later apps share it.
+    app.extensions.setdefault("socketio", socket_service.socketio)
+    db = FakeFirestore()
+    db.collection("planner_sessions").document("s1").set({"traveler_uid": "traveler-1", "status": "RUNNING"})
+    monkeypatch.setattr(
+        socket_service, "verify_firebase_token", lambda _token: {"uid": "traveler-1", "role": "TRAVELER"}
+    )
+
+    with installed(db):
+        socket_service.emit_planner_event("s1", "planner:progress", {"session_id": "s1", "stage": "validate_input"})
+        socket_service.emit_planner_event("s1", "planner:token", {"session_id": "s1", "chunk": "Hello"})
+
+        client = socket_service.socketio.test_client(app, namespace="/planner", auth={"token": "t"})
+        client.get_received("/planner")
+        client.emit("planner:subscribe", {"session_id": "s1", "last_seq": 1}, namespace="/planner")
+        received = client.get_received("/planner")
+        socket_service.emit_planner_event("s1", "planner:token", {"session_id": "s1", "chunk": " world"})
+        live = client.get_received("/planner")
+        client.disconnect(namespace="/planner")
+
+    assert [(event["name"], event["args"][0].get("seq")) for event in received] == [
+        ("planner:token", 2),
+        ("planner:subscribed", None),
+    ]
+    assert received[1]["args"][0]["last_seq"] == 2
+    assert [(event["name"], event["args"][0]["seq"]) for event in live] == [("planner:token", 3)]
+
+
+def test_concurrent_emits_reach_subscribers_in_seq_order(local_ring, monkeypatch):
+    app = create_app("development")
+    app.extensions.setdefault("socketio", socket_service.socketio)
+    db = FakeFirestore()
+    db.collection("planner_sessions").document("s2").set({"traveler_uid": "traveler-1", "status": "RUNNING"})
+    monkeypatch.setattr(
+        socket_service, "verify_firebase_token", lambda _token: {"uid": "traveler-1", "role": "TRAVELER"}
+    )
+
+    with installed(db):
+        client = socket_service.socketio.test_client(app, namespace="/planner", auth={"token": "t"})
+        client.emit("planner:subscribe", {"session_id": "s2", "last_seq": 0}, namespace="/planner")
+        client.get_received("/planner")
+
+        def _stage(name):
+            for index in range(25):
+                payload = {"session_id": "s2", "stage": f"{name}{index}"}
+                socket_service.emit_planner_event("s2", "planner:progress", payload)
+
+        workers = [threading.Thread(target=_stage, args=(f"stage{n}-",)) for n in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        received = client.get_received("/planner")
+        client.disconnect(namespace="/planner")
+
+    assert [event["args"][0]["seq"] for event in received] == list(range(1, 151))
@@ -0,0 +1,138 @@
+import json
+import threading
+from collections import deque
+
+import pytest
+
+from app.services import planner_jobs, planner_orchestrator
+
+
+@pytest.fixture
+def queue_env(monkeypatch):
+    monkeypatch.setattr(planner_jobs, "get_redis_client", lambda: None)
+    monkeypatch.setattr(planner_jobs, "_local_queue", deque())
+    monkeypatch.setattr(planner_jobs, "_local_jobs", {})
+    monkeypatch.setattr(planner_jobs, "_local_user_jobs", {})
+    monkeypatch.setenv("PLANNER_WORKERS", "2")
+    monkeypatch.setenv("PLANNER_QUEUE_MAX", "3")
+    monkeypatch.setenv("PLANNER_MAX_ACTIVE_PER_USER", "2")
+
+    events = []
+    ran = []
+    monkeypatch.setattr(
+        "app.services.socket_service.emit_planner_event",
+        lambda session_id, name, payload: events.append((session_id, name, payload)),
+    )
+    monkeypatch.setattr(planner_orchestrator, "run_session", ran.append)
+    return events, ran
+
+
+def test_queue_admits_within_limits_and_runs_in_order(queue_env):
+    events, ran = queue_env
+
+    assert planner_jobs.enqueue("s1", "alice") == (1, None, None)
+    assert planner_jobs.enqueue("s2", "alice") == (2, None, None)
+    assert planner_jobs.admission_error("alice")[0] == "PLANNER_USER_LIMIT"
+    assert planner_jobs.admission_error("bob") == (None, None)
+    planner_jobs.enqueue("s3", "bob")
+    code, retry_after = planner_jobs.admission_error("carol")
+    assert code == "PLANNER_BUSY" and retry_after >= 5
+
+    events.clear()
+    assert planner_jobs.work_once(timeout=0.01) == "s1"
+    assert [(sid, payload["position"]) for sid, _name, payload in events] == [("s2", 1), ("s3", 2)]
+    assert planner_jobs.admission_error("alice") == (None, None)
+
+    planner_jobs.remove("s2")
+    assert planner_jobs.work_once(timeout=0.01) == "s3"
+    assert planner_jobs.work_once(timeout=0.01) is None
+    assert ran == ["s1", "s3"]
+
+
+def test_redis_queue_is_shared_and_recovers_dead_claims(queue_env, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(planner_jobs, "get_redis_client", lambda: client)
+    _events, ran = queue_env
+
+    planner_jobs.enqueue("s1", "alice")
+    planner_jobs.enqueue("s2", "bob")
+    assert planner_jobs._claim(timeout=1) == "s1"  # worker dies before finishing
+
+    assert planner_jobs.recover_stale() == 0
+    claimed = json.loads(client.hget(planner_jobs.JOBS_KEY, "s1"))["claimed_at"]
+    assert planner_jobs.recover_stale(now=claimed + planner_jobs.job_max_seconds() + 1) == 1
+    assert client.lrange(planner_jobs.QUEUE_KEY, 0, -1) == ["s1", "s2"]
+
+    assert planner_jobs.work_once(timeout=1) == "s1"
+    assert planner_jobs.work_once(timeout=1) == "s2"
+    assert ran == ["s1", "s2"]
+    assert client.hlen(planner_jobs.JOBS_KEY) == 0
+    assert planner_jobs.admission_error("alice") == (None, None)
+
+
+def test_claim_lost_before_it_was_stamped_is_recovered(queue_env, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(planner_jobs, "get_redis_client", lambda: client)
+    _events, ran = queue_env
+
+    planner_jobs.enqueue("s1", "alice")
+    # A worker moved the job to processing and died before writing claimed_at.
+    client.blmove(planner_jobs.QUEUE_KEY, planner_jobs.PROCESSING_KEY, 1, "LEFT", "RIGHT")
+    assert client.llen(planner_jobs.QUEUE_KEY) == 0
+
+    assert planner_jobs.recover_stale() == 0  # a live claimer may still be about to stamp it
+    assert planner_jobs.recover_stale() == 1
+    assert client.lrange(planner_jobs.QUEUE_KEY, 0, -1) == ["s1"]
+    assert client.llen(planner_jobs.PROCESSING_KEY) == 0
+
+    assert planner_jobs.work_once(timeout=1) == "s1"
+    assert ran == ["s1"]
+    assert client.llen(planner_jobs.PROCESSING_KEY) == 0
+    assert client.hlen(planner_jobs.UNCLAIMED_KEY) == 0
+
+
+def _enqueue_concurrently(requests):
+    barrier = threading.Barrier(len(requests))
+    outcomes = []
+
+    def _post(session_id, uid):
+        barrier.wait()
+        outcomes.append(planner_jobs.enqueue(session_id, uid))
+
+    threads = [threading.Thread(target=_post, args=request) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_concurrent_enqueues_never_exceed_the_limits(queue_env, monkeypatch, shared):
+    if shared:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis(decode_responses=True)
+        monkeypatch.setattr(planner_jobs, "get_redis_client", lambda: client)
+    # Workers started by other tests may claim jobs; keep those running until the end.
+    claimed = []
+    release = threading.Event()
+    monkeypatch.setattr(
+        planner_orchestrator, "run_session", lambda session_id: claimed.append(session_id) or release.wait(5)
+    )
+
+    try:
+        # Eight simultaneous POSTs from one traveler: only two get a slot.
+        same_user = _enqueue_concurrently([(f"a{index}", "alice") for index in range(8)])
+        assert sum(position is not None for position, _code, _retry in same_user) == 2
+        assert {code for position, code, _retry in same_user if position is None} == {"PLANNER_USER_LIMIT"}
+
+        # A burst from many travelers fills the queue (max 3) and no further.
+        burst = _enqueue_concurrently([(f"u{index}", f"user-{index}") for index in range(8)])
+        admitted = sum(position is not None for position, _code, _retry in burst)
+        assert 1 <= admitted <= 1 + len(claimed)
+        assert planner_jobs.queue_length_now() <= planner_jobs.queue_max()
+        assert {code for position, code, _retry in burst if position is None} == {"PLANNER_BUSY"}
+    finally:
+        release.set()
@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from app.services import planner_orchestrator
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def planner_db(monkeypatch):
+    db = FakeFirestore()
+    emitted = []
+    monkeypatch.setenv("PLANNER_CACHE_ENABLED", "false")
+    monkeypatch.setattr(planner_orchestrator, "is_ai_configured", lambda: True)
+    monkeypatch.setattr(planner_orchestrator, "retrieve", lambda _query: [])
+    monkeypatch.setattr(planner_orchestrator, "generate_transport_suggestions", lambda _criteria, _modes: ({}, []))
+    monkeypatch.setattr(
+        "app.services.socket_service.emit_planner_event",
+        lambda session_id, name, payload: emitted.append((name, payload)),
+    )
+    with installed(db):
+        yield db, emitted
+
+
+def _stream(chunks):
+    def _invoke(_prompt, on_token=None, **_kwargs):
+        for chunk in chunks:
+            on_token(chunk)
+        return "".join(chunks)
+
+    return _invoke
+
+
+def test_streamed_chunks_are_persisted_and_emitted_in_batches(planner_db, monkeypatch):
+    db, emitted = planner_db
+    monkeypatch.setenv("PLANNER_TOKEN_FLUSH_BYTES", "200")
+    monkeypatch.setenv("PLANNER_TOKEN_FLUSH_MS", "60000")
+    chunks = [f'{{"n": {index}}} ' for index in range(300)]
+    monkeypatch.setattr(planner_orchestrator, "invoke_bedrock_stream", _stream(chunks))
+
+    session = planner_orchestrator.create_session("traveler-1", {"destination": "Goa", "trip_days": 2})
+    planner_orchestrator.run_session(session["id"])
+
+    data, _code, _msg = planner_orchestrator.get_session(session["id"], "traveler-1")
+    token_events = [event for event in data["events"] if event["type"] == "token"]
+    assert 1 < len(token_events) <= len("".join(chunks)) // 200 + 1
+    assert "".join(event["chunk"] for event in token_events) == "".join(chunks)
+    assert sum(event["count"] for event in token_events) == len(chunks)
+
+    token_emits = [payload["chunk"] for name, payload in emitted if name == "planner:token"]
+    assert token_emits == [event["chunk"] for event in token_events]
+    # Every token batch is written before the synthesis stage reports DONE.
+    types = [(event["type"], event.get("stage"), event.get("status")) for event in data["events"]]
+    assert types.index(("progress", "plan_synthesis_stream", "DONE")) > max(
+        index for index, item in enumerate(types) if item[0] == "token"
+    )
+    assert data["status"] == "COMPLETED"
+
+
+def test_buffered_tokens_are_flushed_when_the_stream_fails(planner_db, monkeypatch):
+    db, emitted = planner_db
+
+    def _failing(_prompt, on_token=None, **_kwargs):
+        on_token("partial ")
+        on_token("output")
+        raise RuntimeError("stream broke")
+
+    monkeypatch.setattr(planner_orchestrator, "invoke_bedrock_stream", _failing)
+    session = planner_orchestrator.create_session("traveler-1", {"destination": "Goa"})
+    planner_orchestrator.run_session(session["id"])
+
+    data, _code, _msg = planner_orchestrator.get_session(session["id"], "traveler-1")
+    assert [(event["type"], event.get("chunk")) for event in data["events"][-2:]] == [
+        ("token", "partial output"),
+        ("error", None),
+    ]
+    assert data["status"] == "FAILED"
+    assert planner_orchestrator._token_batchers == {}
+
+
+def test_independent_stages_overlap_and_dependents_wait():
+    def _slow(name):
+        def _stage(results):
+            time.sleep(0.3)
+            return name, sorted(results)
+
+        return _stage
+
+    started = time.monotonic()
+    results = planner_orchestrator._run_stage_graph(
+        "s1",
+        {
+            "rag": ((), _slow("rag")),
+            "transport": ((), _slow("transport")),
+            "synthesis": (("rag", "transport"), lambda results: sorted(results)),
+        },
+    )
+
+    assert time.monotonic() - started < 0.55
+    assert results["synthesis"] == ["rag", "transport"]
+    assert results["rag"] == ("rag", [])
+
+
+def test_stage_graph_stops_waiting_once_cancelled():
+    released = threading.Event()
+
+    def _slow(_results):
+        planner_orchestrator.mark_session_cancelled("s-cancel")
+        return released.wait(5)
+
+    started = time.monotonic()
+    try:
+        with pytest.raises(RuntimeError, match="PLANNER_CANCELLED"):
+            planner_orchestrator._run_stage_graph("s-cancel", {"slow": ((), _slow), "after": (("slow",), _slow)})
+        assert time.monotonic() - started < 2
+    finally:
+        released.set()
+        planner_orchestrator._clear_cancel("s-cancel")
+
+
+def test_stage_failure_propagates():
+    def _broken(_results):
+        raise RuntimeError("TRANSPORT_PROVIDER_UNAVAILABLE")
+
+    with pytest.raises(RuntimeError, match="TRANSPORT_PROVIDER_UNAVAILABLE"):
+        planner_orchestrator._run_stage_graph(
+            "s1",
+            {"rag": ((), lambda _results: "ok"), "transport": ((), _broken), "next": (("transport",), lambda _r: 1)},
+        )
+
+
+def test_cancel_handled_by_another_process_is_not_overwritten(planner_db, monkeypatch):
+    db, emitted = planner_db
+
+    def _cancelled_elsewhere(_prompt, on_token=None, **_kwargs):
+        on_token('{"destination": "Goa"}')
+        # Another worker's cancel_session: only Firestore changes on this process.
+        db.collection("planner_sessions").document(session["id"]).set({"status": "CANCELLED"}, merge=True)
+        return '{"destination": "Goa"}'
+
+    monkeypatch.setattr(planner_orchestrator, "invoke_bedrock_stream", _cancelled_elsewhere)
+    session = planner_orchestrator.create_session("traveler-1", {"destination": "Goa", "trip_days": 2})
+    planner_orchestrator.run_session(session["id"])
+
+    data, _code, _msg = planner_orchestrator.get_session(session["id"], "traveler-1")
+    assert data["status"] == "CANCELLED"
+    assert data["result_json"] is None
+    assert "planner:complete" not in [name for name, _payload in emitted]
+    assert list(db.collection("itineraries").stream()) == []
+
+
+def test_shared_cancel_flag_stops_a_run_on_another_process(planner_db, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(planner_orchestrator, "get_redis_client", lambda: client)
+    _db, _emitted = planner_db
+    session = planner_orchestrator.create_session("traveler-1", {"destination": "Goa", "trip_days": 2})
+
+    ran = []
+
+    def _stage(_results):
+        ran.append(True)
+        client.set(planner_orchestrator.CANCEL_KEY_PREFIX + session["id"], "1")
+        time.sleep(0.6)  # the flag is polled while the stage runs
+        return "done"
+
+    try:
+        with pytest.raises(RuntimeError, match="PLANNER_CANCELLED"):
+            planner_orchestrator._run_stage_graph(session["id"], {"first": ((), _stage), "next": (("first",), _stage)})
+        assert len(ran) == 1
+    finally:
+        planner_orchestrator._clear_cancel(session["id"])
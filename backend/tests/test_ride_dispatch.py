@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from app.services import ride_dispatch
+
+
+def _driver(uid, lat):
+    return {"id": uid, "location": {"lat": lat, "lng": 79.95}}
+
+
+def _ride(ride_id):
+    return {"id": ride_id, "source": {"lat": 23.18, "lng": 79.95}}
+
+
+def test_rides_are_offered_nearest_first_in_expanding_waves(monkeypatch):
+    monkeypatch.setenv("DISPATCH_WAVE_SIZES", "2,3")
+    monkeypatch.setenv("DISPATCH_WAVE_TIMEOUT_SECONDS", "60")
+    drivers = [_driver(f"d{i}", 23.18 + i * 0.02) for i in range(8)]
+    offers, waves = [], []
+
+    ride_dispatch.start_dispatch(
+        _ride("ride-waves"),
+        candidates_fn=lambda ride: list(reversed(drivers)),
+        offer_fn=lambda driver, ride: offers.append(driver["id"]),
+        on_wave=lambda ride, info: waves.append(info),
+    )
+    assert offers == ["d0", "d1"]
+
+    ride_dispatch._run_wave("ride-waves")
+    assert offers == ["d0", "d1", "d2", "d3", "d4"]
+    assert [w["offered"] for w in waves] == [2, 3]
+
+    result = ride_dispatch.record_acceptance("ride-waves", "d3")
+    assert result["wave"] == 2
+    assert result["offered_total"] == 5
+    assert not ride_dispatch.is_dispatching("ride-waves")
+
+
+def test_next_wave_fires_after_timeout_and_stops_when_dispatch_ends(monkeypatch):
+    monkeypatch.setenv("DISPATCH_WAVE_SIZES", "1")
+    monkeypatch.setenv("DISPATCH_WAVE_TIMEOUT_SECONDS", "0.5")
+    drivers = [_driver("near", 23.181), _driver("far", 23.25)]
+    offers = []
+
+    ride_dispatch.start_dispatch(
+        _ride("ride-timeout"),
+        candidates_fn=lambda ride: drivers,
+        offer_fn=lambda driver, ride: offers.append(driver["id"]),
+    )
+    time.sleep(0.8)
+    ride_dispatch.stop_dispatch("ride-timeout")
+    time.sleep(0.6)
+
+    assert offers == ["near", "far"]
+    assert ride_dispatch.dispatch_stats()["active"] == 0
+
+
+def test_waves_stop_once_another_worker_closes_the_ride(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(ride_dispatch, "get_redis_client", lambda: client)
+    monkeypatch.setenv("DISPATCH_WAVE_SIZES", "1")
+    monkeypatch.setenv("DISPATCH_WAVE_TIMEOUT_SECONDS", "60")
+    drivers = [_driver(f"d{i}", 23.18 + i * 0.02) for i in range(3)]
+    offers, waves = [], []
+
+    ride_dispatch.start_dispatch(
+        _ride("ride-elsewhere"),
+        candidates_fn=lambda ride: drivers,
+        offer_fn=lambda driver, ride: offers.append(driver["id"]),
+        on_wave=lambda ride, info: waves.append(info),
+    )
+    # The accept lands on a worker that is not running this dispatch.
+    client.set(ride_dispatch.CLOSED_KEY_PREFIX + "ride-elsewhere", "1")
+    ride_dispatch._run_wave("ride-elsewhere")
+
+    assert offers == ["d0"]
+    assert len(waves) == 1
+    assert not ride_dispatch.is_dispatching("ride-elsewhere")
+
+
+def test_empty_waves_are_not_announced(monkeypatch):
+    monkeypatch.setenv("DISPATCH_WAVE_SIZES", "1")
+    monkeypatch.setenv("DISPATCH_WAVE_TIMEOUT_SECONDS", "60")
+    waves = []
+
+    ride_dispatch.start_dispatch(
+        _ride("ride-empty"),
+        candidates_fn=lambda ride: [],
+        offer_fn=lambda driver, ride: None,
+        on_wave=lambda ride, info: waves.append(info),
+    )
+    ride_dispatch._run_wave("ride-empty")
+    ride_dispatch.stop_dispatch("ride-empty")
+
+    assert waves == []
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from app.services import ride_cleanup
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+def _headers():
+    return {"Authorization": "Bearer test-token"}
+
+
+@pytest.fixture
+def history_db():
+    db = FakeFirestore()
+    with installed(db):
+        for index in range(5):
+            db.collection("rides").document(f"r{index}").set(
+                {
+                    "traveler_uid": "traveler-1",
+                    "status": "EXPIRED" if index == 3 else "COMPLETED",
+                    "created_at": f"2026-01-01T00:0{index}:00",
+                    "updated_at": f"2026-01-01T00:0{index}:00",
+                }
+            )
+        db.collection("rides").document("other").set(
+            {"traveler_uid": "traveler-2", "status": "COMPLETED", "created_at": "2026-01-01T00:09:00"}
+        )
+        yield db
+
+
+def test_traveler_history_pages_newest_first_without_writes(monkeypatch, history_db):
+    app = create_app("development")
+    client = app.test_client()
+    monkeypatch.setattr(
+        "app.utils.auth.verify_firebase_token",
+        lambda _token: {"uid": "traveler-1", "email": "t@example.com", "role": "TRAVELER"},
+    )
+    history_db.stats.reset()
+
+    # The EXPIRED ride is skipped and the scan reads on to fill the page.
+    first = client.get("/api/rides/traveler?page_size=2", headers=_headers()).get_json()
+    assert [ride["id"] for ride in first["data"]] == ["r4", "r2"]
+    assert first["pagination"] == {"page_size": 2, "next_cursor": "r2", "has_more": True}
+
+    cursor = first["pagination"]["next_cursor"]
+    second = client.get(f"/api/rides/traveler?page_size=2&cursor={cursor}", headers=_headers()).get_json()
+    assert [ride["id"] for ride in second["data"]] == ["r1", "r0"]
+
+    last = client.get("/api/rides/traveler?page_size=3&cursor=r2", headers=_headers()).get_json()
+    assert [ride["id"] for ride in last["data"]] == ["r1", "r0"]
+    assert last["pagination"]["has_more"] is False
+    assert history_db.stats.writes == 0
+
+    response = client.get("/api/rides/traveler?cursor=other", headers=_headers())
+    assert response.status_code == 400
+
+
+def test_history_never_returns_an_empty_page_with_more_to_come(monkeypatch, history_db):
+    for index in range(5, 9):
+        history_db.collection("rides").document(f"r{index}").set(
+            {"traveler_uid": "traveler-1", "status": "EXPIRED", "created_at": f"2026-01-01T00:0{index}:00"}
+        )
+    app = create_app("development")
+    client = app.test_client()
+    monkeypatch.setattr(
+        "app.utils.auth.verify_firebase_token",
+        lambda _token: {"uid": "traveler-1", "email": "t@example.com", "role": "TRAVELER"},
+    )
+
+    first = client.get("/api/rides/traveler?page_size=2", headers=_headers()).get_json()
+    assert [ride["id"] for ride in first["data"]] == ["r4", "r2"]
+    assert first["pagination"]["next_cursor"] == "r2"
+
+
+def test_sweeper_deletes_expired_rides_past_retention(monkeypatch, history_db):
+    history_db.collection("rides").document("fresh").set(
+        {"traveler_uid": "traveler-1", "status": "EXPIRED", "updated_at": "2026-01-01T00:59:00"}
+    )
+    monkeypatch.setattr(ride_cleanup, "SWEEP_BATCH_SIZE", 1)
+    monkeypatch.setenv("RIDE_EXPIRED_RETENTION_SECONDS", "600")
+
+    assert ride_cleanup.sweep_expired(now=datetime(2026, 1, 1, 1, 0)) == 1
+    assert not history_db.collection("rides").document("r3").get().exists
+    assert history_db.collection("rides").document("fresh").get().exists
+    assert history_db.collection("rides").document("r4").get().exists
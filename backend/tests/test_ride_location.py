@@ -0,0 +1,154 @@
+import time
+
+import pytest
+
+from app.services import ride_location
+from app.utils.rides import RIDE_STATUS_COMPLETED, RIDE_STATUS_DRIVER_EN_ROUTE
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def local_rides(monkeypatch):
+    monkeypatch.setattr(ride_location, "get_redis_client", lambda: None)
+    monkeypatch.setattr(ride_location, "_local_live", {})
+    monkeypatch.setattr(ride_location, "_local_dirty", {})
+    db = FakeFirestore()
+    ride = {
+        "traveler_uid": "t1",
+        "driver_uid": "d1",
+        "status": RIDE_STATUS_DRIVER_EN_ROUTE,
+        "source": {"lat": 23.18, "lng": 79.95},
+        "destination": {"lat": 23.25, "lng": 79.99},
+        "driver_location": None,
+        "eta_minutes": None,
+        "updated_at": "2026-01-01T00:00:00",
+    }
+    with installed(db):
+        db.collection("rides").document("r1").set(ride)
+        ride_location.track(dict(ride, id="r1"))
+        db.stats.reset()
+        yield db
+
+
+def test_pings_are_buffered_and_flushed_once_per_interval(local_rides, monkeypatch):
+    for step in range(30):
+        ride_location.update_location("r1", {"lat": 23.2 + step * 0.001, "lng": 79.95}, 5)
+
+    assert local_rides.stats.writes == 0
+    assert ride_location.flush_due() == 0
+
+    monkeypatch.setenv("RIDE_LOCATION_FLUSH_SECONDS", "1")
+    monkeypatch.setitem(ride_location._local_dirty, "r1", 0.0)
+    assert ride_location.flush_due() == 1
+    assert ride_location.flush_due() == 0
+
+    stored = local_rides.collection("rides").document("r1").get().to_dict()
+    assert local_rides.stats.writes == 1
+    assert stored["driver_location"]["lat"] == pytest.approx(23.229)
+    assert stored["eta_minutes"] == 5
+
+
+def test_status_transition_flushes_and_stops_tracking(local_rides):
+    ride_location.update_location("r1", {"lat": 23.21, "lng": 79.96}, 3)
+    ride = local_rides.collection("rides").document("r1").get().to_dict()
+    ride.update({"id": "r1", "status": RIDE_STATUS_COMPLETED})
+
+    synced = ride_location.sync_status(ride)
+
+    assert synced["driver_location"] == {"lat": 23.21, "lng": 79.96}
+    stored = local_rides.collection("rides").document("r1").get().to_dict()
+    assert stored["driver_location"] == {"lat": 23.21, "lng": 79.96}
+    assert stored["updated_at"] == "2026-01-01T00:00:00"
+    assert ride_location.get_live("r1") is None
+    assert ride_location.update_location("r1", {"lat": 1.0, "lng": 1.0}, 1) is None
+
+
+def test_location_batch_is_applied_as_one_update(local_rides, monkeypatch):
+    from app.services import driver_presence, ride_trace, socket_service
+
+    emitted = []
+    monkeypatch.setattr(socket_service, "_emit_location_and_eta", emitted.append)
+    monkeypatch.setattr(driver_presence, "touch_location", lambda uid, location: None)
+    monkeypatch.setattr(ride_trace, "get_redis_client", lambda: None)
+    monkeypatch.setattr(ride_trace, "_local_points", {})
+    start = int(time.time()) - 60
+    points = [{"lat": 23.20 + i * 0.001, "lng": 79.95, "ts": (start + i * 2) * 1000} for i in range(12)]
+
+    ack, error_code, _ = socket_service.ingest_driver_locations("d1", {"ride_id": "r1", "points": points[::-1]})
+
+    assert error_code is None
+    assert ack["points"] == 12
+    assert len(emitted) == 1
+    assert emitted[0]["driver_location"] == {"lat": pytest.approx(23.211), "lng": 79.95}
+    assert [p["ts"] for p in ride_trace.get_points("r1")] == [start + i * 2 for i in range(12)]
+    assert local_rides.stats.writes == 0
+
+    # A late upload of older points must not move the live location back.
+    socket_service.ingest_driver_locations("d1", {"ride_id": "r1", "points": points[:2]})
+    assert ride_location.get_live("r1")["driver_location"]["lat"] == pytest.approx(23.211)
+    assert socket_service.ingest_driver_locations("other", {"ride_id": "r1", "points": points})[1] == "FORBIDDEN"
+
+
+def test_ping_landing_during_the_dirty_clear_stays_dirty(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(ride_location, "get_redis_client", lambda: client)
+    ride = {"id": "r2", "status": RIDE_STATUS_DRIVER_EN_ROUTE, "updated_at": "2026-01-01T00:00:00"}
+    ride_location.track(ride)
+    flushed = ride_location.update_location("r2", {"lat": 23.2, "lng": 79.95}, 4)
+
+    real_loads = ride_location.json.loads
+
+    def _loads_then_ping(raw):
+        # A newer ping is stored after the flusher read the live record.
+        monkeypatch.setattr(ride_location.json, "loads", real_loads)
+        ride_location.update_location("r2", {"lat": 23.3, "lng": 79.95}, 3)
+        return real_loads(raw)
+
+    monkeypatch.setattr(ride_location.json, "loads", _loads_then_ping)
+    ride_location._mark_clean("r2", flushed["updated_at"])
+
+    assert ride_location._is_dirty("r2")
+    ride_location._mark_clean("r2", ride_location.get_live("r2")["updated_at"])
+    assert not ride_location._is_dirty("r2")
+
+
+def test_older_ping_racing_a_newer_one_cannot_move_the_driver_back(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(ride_location, "get_redis_client", lambda: client)
+    ride_location.track({"id": "r3", "status": RIDE_STATUS_DRIVER_EN_ROUTE, "updated_at": "2026-01-01T00:00:00"})
+    ride_location.update_location("r3", {"lat": 23.1, "lng": 79.95}, 6, ts=100.0)
+
+    real_apply = ride_location._apply_ping
+
+    def _apply_then_newer_ping(record, location, eta_minutes, ts):
+        # A live ping is stored on another worker after this batch point passed the check.
+        monkeypatch.setattr(ride_location, "_apply_ping", real_apply)
+        ride_location.update_location("r3", {"lat": 23.3, "lng": 79.95}, 3, ts=300.0)
+        return real_apply(record, location, eta_minutes, ts)
+
+    monkeypatch.setattr(ride_location, "_apply_ping", _apply_then_newer_ping)
+    result = ride_location.update_location("r3", {"lat": 23.2, "lng": 79.95}, 4, ts=200.0)
+
+    assert result["location_ts"] == 300.0
+    assert ride_location.get_live("r3")["driver_location"]["lat"] == pytest.approx(23.3)
+
+
+def test_device_clock_skew_cannot_freeze_the_live_location(local_rides, monkeypatch):
+    from app.services import driver_presence, socket_service
+
+    monkeypatch.setattr(socket_service, "_emit_location_and_eta", lambda record: None)
+    monkeypatch.setattr(driver_presence, "touch_location", lambda uid, location: None)
+    now = time.time()
+
+    # A clock an hour ahead is clamped to server time, so a later server-stamped ping still applies.
+    ahead = {"ride_id": "r1", "points": [{"lat": 23.21, "lng": 79.95, "ts": (now + 3600) * 1000}]}
+    socket_service.ingest_driver_locations("d1", ahead)
+    assert ride_location.get_live("r1")["location_ts"] <= time.time()
+    socket_service.ingest_driver_locations("d1", {"ride_id": "r1", "location": {"lat": 23.22, "lng": 79.95}})
+    assert ride_location.get_live("r1")["driver_location"]["lat"] == pytest.approx(23.22)
+
+    # Points from long ago are dropped.
+    stale = {"ride_id": "r1", "points": [{"lat": 1.0, "lng": 1.0, "ts": now - 86400}]}
+    assert socket_service.ingest_driver_locations("d1", stale)[1] == "INVALID_LOCATION"
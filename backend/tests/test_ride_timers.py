@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from app.services import ride_timers
+
+
+@pytest.fixture
+def timers(monkeypatch):
+    monkeypatch.setattr(ride_timers, "get_redis_client", lambda: None)
+    monkeypatch.setattr(ride_timers, "_heap", [])
+    monkeypatch.setattr(ride_timers, "_local_due", {})
+    monkeypatch.setattr(ride_timers, "_local_only", set())
+    monkeypatch.setattr(ride_timers, "_handlers", {})
+    fired = []
+    ride_timers.register_handler("request", lambda ride_id: fired.append(("request", ride_id)))
+    ride_timers.register_handler("quote", lambda ride_id: fired.append(("quote", ride_id)))
+    return fired
+
+
+def test_due_timers_fire_once_and_cancelled_or_rescheduled_ones_do_not(timers):
+    now = time.time()
+    ride_timers.schedule("request", "r1", 10)
+    ride_timers.schedule("request", "r2", 10)
+    ride_timers.schedule("quote", "r3", 10)
+    ride_timers.cancel("request", "r2")
+    ride_timers.schedule("quote", "r3", 100)
+
+    assert ride_timers.pending_count() == 2
+    assert ride_timers.run_due(now + 5) == 0
+    assert ride_timers.run_due(now + 20) == 1
+    assert ride_timers.run_due(now + 20) == 0
+    assert timers == [("request", "r1")]
+    assert ride_timers.run_due(now + 200) == 1
+    assert timers[-1] == ("quote", "r3")
+
+
+def test_shared_timers_are_claimed_by_exactly_one_worker(timers, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(ride_timers, "get_redis_client", lambda: client)
+    now = time.time()
+    ride_timers.schedule("request", "r1", 1)
+    ride_timers.schedule("request", "local", 1, local=True)
+
+    # Another worker (no local heap entry) sees the shared timer in Redis.
+    ride_timers._local_due.pop("request|r1")
+    assert client.zcard(ride_timers.TIMERS_KEY) == 1
+    assert ride_timers.run_due(now + 2) == 2
+    assert ride_timers.run_due(now + 2) == 0
+    assert sorted(timers) == [("request", "local"), ("request", "r1")]
+
+
+def test_timer_rescheduled_during_a_claim_is_not_removed(timers, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(ride_timers, "get_redis_client", lambda: client)
+    now = time.time()
+    client.zadd(ride_timers.TIMERS_KEY, {"request|r1": now - 1})
+
+    real_pipeline = client.pipeline
+
+    def _pipeline_with_reschedule(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        real_multi = pipe.multi
+
+        def _multi():
+            # Another worker pushes the timer out after it was read as due.
+            client.zadd(ride_timers.TIMERS_KEY, {"request|r1": now + 60})
+            monkeypatch.setattr(client, "pipeline", real_pipeline)
+            real_multi()
+
+        pipe.multi = _multi
+        return pipe
+
+    monkeypatch.setattr(client, "pipeline", _pipeline_with_reschedule)
+
+    assert ride_timers.run_due(now) == 0
+    assert client.zscore(ride_timers.TIMERS_KEY, "request|r1") == pytest.approx(now + 60)
+    assert timers == []
+
+
+def test_slow_handler_does_not_hold_back_other_timers(timers):
+    from concurrent.futures import ThreadPoolExecutor
+
+    started = time.monotonic()
+    ride_timers.register_handler("slow", lambda ride_id: time.sleep(0.5))
+    ride_timers.schedule("slow", "r1", 0)
+    ride_timers.schedule("request", "r2", 0)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert ride_timers.run_due(time.time() + 1, executor=pool) == 2
+        deadline = time.monotonic() + 1
+        while not timers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert timers == [("request", "r2")]
+        assert time.monotonic() - started < 0.4
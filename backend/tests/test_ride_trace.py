@@ -0,0 +1,51 @@
+import pytest
+
+from app.services import ride_trace
+from app.utils.polyline import decode_deltas, decode_polyline, encode_deltas, encode_polyline
+from benchmarks.firestore_double import FakeFirestore, installed
+
+
+@pytest.fixture
+def local_trace(monkeypatch):
+    monkeypatch.setattr(ride_trace, "get_redis_client", lambda: None)
+    monkeypatch.setattr(ride_trace, "_local_points", {})
+    monkeypatch.setenv("RIDE_TRACE_CHUNK_POINTS", "50")
+    db = FakeFirestore()
+    with installed(db):
+        yield db
+
+
+def test_polyline_matches_reference_encoding():
+    coords = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+    assert encode_polyline(coords) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == pytest.approx(coords)
+    assert decode_deltas(encode_deltas([0, 2, 4, 9, 3])) == [0, 2, 4, 9, 3]
+
+
+def test_points_are_chunked_then_sealed_into_one_document(local_trace):
+    points = [{"lat": 23.18 + i * 0.0005, "lng": 79.95 + i * 0.0002, "ts": 1_700_000_000 + i * 2} for i in range(130)]
+    for start in range(0, 130, 10):
+        ride_trace.append_points("r1", points[start:start + 10])
+
+    doc = local_trace.collection("ride_traces").document("r1").get().to_dict()
+    assert len(doc["chunks"]) == 2
+    assert doc["point_count"] == 100
+    assert local_trace.stats.writes == 2
+
+    live = ride_trace.get_trace("r1")
+    assert live["sealed"] is False
+    assert live["point_count"] == 130
+
+    sealed = ride_trace.seal({"id": "r1", "driver_uid": "d1", "traveler_uid": "t1", "status": "COMPLETED"})
+    stored = local_trace.collection("ride_traces").document("r1").get().to_dict()
+    assert sealed["point_count"] == 130
+    assert "chunks" not in stored
+
+    trace = ride_trace.get_trace("r1")
+    assert trace["sealed"] is True
+    assert [p["ts"] for p in trace["points"]] == [p["ts"] for p in points]
+    assert [p["lat"] for p in trace["points"]] == pytest.approx([p["lat"] for p in points], abs=1e-5)
+    assert [p["lng"] for p in trace["points"]] == pytest.approx([p["lng"] for p in points], abs=1e-5)
+    assert trace["distance_km"] == pytest.approx(ride_trace.path_distance_km(points), rel=1e-3)
+    assert ride_trace.seal({"id": "r1", "status": "COMPLETED"})["point_count"] == 130
@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.utils.rides import (
+    estimate_eta_minutes,
+    estimate_eta_minutes_many,
+    haversine_km,
+    haversine_km_many,
+    nearest_k,
+)
+
+
+def _points(n, seed=3):
+    rng = random.Random(seed)
+    lats = [rng.uniform(8.0, 32.0) for _ in range(n)]
+    lngs = [rng.uniform(68.0, 92.0) for _ in range(n)]
+    return lats, lngs
+
+
+def test_vectorized_haversine_and_eta_match_scalar():
+    target = {"lat": 23.1815, "lng": 79.9864}
+    lats, lngs = _points(500)
+
+    distances = haversine_km_many(target["lat"], target["lng"], lats, lngs)
+    etas = estimate_eta_minutes_many(target, lats, lngs)
+
+    expected_km = [haversine_km(lat, lng, target["lat"], target["lng"]) for lat, lng in zip(lats, lngs)]
+    expected_eta = [
+        estimate_eta_minutes({"lat": lat, "lng": lng}, target) for lat, lng in zip(lats, lngs)
+    ]
+    assert distances == pytest.approx(expected_km, rel=1e-9)
+    assert etas.tolist() == expected_eta
+
+
+def test_nearest_k_returns_closest_first():
+    lats, lngs = _points(1000, seed=11)
+    order, distances = nearest_k(23.18, 79.98, lats, lngs, 25)
+
+    expected = sorted(range(len(lats)), key=lambda i: haversine_km(23.18, 79.98, lats[i], lngs[i]))[:25]
+    assert order.tolist() == expected
+    assert np.all(np.diff(distances) >= 0)
+    assert nearest_k(23.18, 79.98, [], [], 5)[0].size == 0
+
+
+def test_eta_many_rejects_unusable_target():
+    assert estimate_eta_minutes_many({"lat": None, "lng": 1.0}, [1.0], [1.0]) is None
+    assert estimate_eta_minutes_many({"lat": 1.0, "lng": 1.0}, [1.0], [1.0], avg_speed_kmph=0) is None
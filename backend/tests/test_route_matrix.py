@@ -0,0 +1,55 @@
+import numpy as np
+
+from app.services import route_matrix
+
+
+def _minutes(duration):
+    hours, minutes = duration.split("h ")
+    return int(hours) * 60 + int(minutes.rstrip("m"))
+
+
+def test_route_resolves_aliases_localities_and_states():
+    origin, destination, distance = route_matrix.route("Bombay", "Goa")
+    assert (origin, destination) == ("Mumbai", "Panaji")
+    assert 400 < distance < 500
+
+    assert route_matrix.route("Andheri East", "New Delhi")[:2] == ("Mumbai", "Delhi")
+    assert route_matrix.route("Kerala", "Mumbai")[1] == "Mumbai"
+    assert route_matrix.route("Atlantis", "Mumbai") is None
+    assert not route_matrix.covers("India", "Goa")
+
+
+def test_route_resolves_comma_qualified_names():
+    assert route_matrix.route("Mumbai", "Goa, India")[:2] == ("Mumbai", "Panaji")
+    assert route_matrix.route("Jaipur, Rajasthan", "Delhi")[:2] == ("Jaipur", "Delhi")
+    assert route_matrix.route("Andheri East, Mumbai, Maharashtra, India", "Delhi")[:2] == ("Mumbai", "Delhi")
+    assert route_matrix.route("Atlantis, India", "Mumbai") is None
+
+
+def test_estimates_scale_with_distance_and_travelers():
+    near = route_matrix.estimate("Mumbai", "Goa", "FLIGHT")
+    far = route_matrix.estimate("Mumbai", "Delhi", "FLIGHT")
+    group = route_matrix.estimate("Mumbai", "Delhi", "FLIGHT", travelers=3)
+
+    assert near[0]["price"] < far[0]["price"]
+    assert _minutes(near[0]["duration"]) < _minutes(far[0]["duration"])
+    assert group[0]["price"] == 3 * far[0]["price"]
+    assert "medium-haul" in far[0]["notes"]
+
+    long_rail = [row["provider"] for row in route_matrix.estimate("Delhi", "Chennai", "TRAIN")]
+    assert "Rajdhani (est.)" in long_rail and "Vande Bharat (est.)" not in long_rail
+    assert route_matrix.estimate("Mumbai", "Mumbai", "TRAIN") == []
+
+
+def test_matrix_is_compiled_once_and_memory_mapped(tmp_path):
+    cities = np.array(
+        [(19.07, 72.87), (28.61, 77.20)],
+        dtype=[("lat", "f8"), ("lng", "f8")],
+    )
+    first = route_matrix.compile_matrix(cities, cache_dir=str(tmp_path))
+    second = route_matrix.compile_matrix(cities, cache_dir=str(tmp_path))
+
+    assert isinstance(second, np.memmap)
+    assert first.dtype == np.float32 and first.shape == (2, 2)
+    assert len(list(tmp_path.glob("route-matrix-*.npy"))) == 1
+    assert 1100 < float(second[0, 1]) < 1200
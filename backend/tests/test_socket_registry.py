@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+from app.services import socket_registry, socket_service
+
+
+class _FakeRedis:
+    """Just enough of redis-py for the registry: strings, sets and pipelines."""
+
+    def __init__(self):
+        self.strings = {}
+        self.sets = {}
+
+    def set(self, key, value, ex=None):
+        self.strings[key] = value
+
+    def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def srem(self, key, member):
+        self.sets.get(key, set()).discard(member)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def pipeline(self, transaction=False):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_registry_local_fallback(monkeypatch):
+    monkeypatch.setattr(socket_registry, "get_redis_client", lambda: None)
+    monkeypatch.setattr(socket_registry, "_local_user_conns", {})
+
+    socket_registry.register_connection("/rides", "sid-1", "driver-1")
+    socket_registry.register_connection("/planner", "sid-2", "traveler-1")
+
+    assert socket_registry.connected_users(["driver-1", "traveler-1", "ghost"], "/rides") == {"driver-1"}
+    assert socket_registry.is_user_connected("traveler-1", "/planner")
+
+    socket_registry.unregister_connection("/rides", "sid-1", "driver-1")
+    assert not socket_registry.is_user_connected("driver-1")
+
+
+def test_registry_prunes_connections_of_dead_workers(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(socket_registry, "get_redis_client", lambda: fake)
+
+    socket_registry.register_connection("/rides", "sid-live", "driver-1")
+    fake.sadd("sio:user:driver-2", "/rides|sid-dead|crashed-host:1")
+
+    assert socket_registry.connected_users(["driver-1", "driver-2"], "/rides") == {"driver-1"}
+    assert fake.smembers("sio:user:driver-2") == set()
+
+
+def test_message_queue_resolution(monkeypatch):
+    app = SimpleNamespace(config={"REDIS_URL": "redis://cache:6379/0", "SOCKETIO_MESSAGE_QUEUE": "auto"})
+
+    monkeypatch.setattr(socket_service, "get_redis_client", lambda: None)
+    assert socket_service._resolve_message_queue(app) is None
+
+    monkeypatch.setattr(socket_service, "get_redis_client", lambda: object())
+    assert socket_service._resolve_message_queue(app) == "redis://cache:6379/0"
+
+    app.config["SOCKETIO_MESSAGE_QUEUE"] = "off"
+    assert socket_service._resolve_message_queue(app) is None
+    app.config["SOCKETIO_MESSAGE_QUEUE"] = "redis://queue:6379/2"
+    assert socket_service._resolve_message_queue(app) == "redis://queue:6379/2"
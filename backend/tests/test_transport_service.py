@@ -1,4 +1,14 @@
-from app.services.transport_service import search_flights, search_trains
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote_plus
+
+import pytest
+
+from app.services import transport_service
+from app.services.transport_service import generate_transport_suggestions, search_flights, search_trains
+from benchmarks.firestore_double import FakeFirestore, installed
 
 
 def test_search_flights_normalizes_results(monkeypatch):
@@ -49,3 +59,111 @@ def test_search_trains_normalizes_results(monkeypatch):
     assert options[0]["mode"] == "TRAIN"
     assert options[0]["price"] == 1200
     assert options[0]["booking_url"] == "https://example.com/train"
+
+
+@pytest.fixture
+def route_cache(monkeypatch):
+    calls = []
+
+    def fake_stream(prompt, on_token=None, **_kwargs):
+        calls.append(prompt)
+        time.sleep(0.05)
+        return json.dumps(
+            {
+                "flights": [{"provider": "IndiGo", "duration": "2h 10m", "price": 5400}],
+                "trains": [{"provider": "Rajdhani", "duration": "15h", "price": 2100}],
+            }
+        )
+
+    monkeypatch.setenv("TRANSPORT_MODEL_ESTIMATES", "true")
+    monkeypatch.setattr(transport_service, "get_redis_client", lambda: None)
+    monkeypatch.setattr(transport_service, "is_ai_configured", lambda: True)
+    monkeypatch.setattr(transport_service, "invoke_bedrock_stream", fake_stream)
+    monkeypatch.setattr(transport_service, "_local_cache", OrderedDict())
+    monkeypatch.setattr(transport_service, "_inflight", {})
+    return calls
+
+
+def _criteria(date="2026-12-05", travelers=2, origin="Delhi", destination="Goa"):
+    return {"origin": origin, "destination": destination, "date": date, "travelers": travelers}
+
+
+def test_route_cache_reuses_estimates_within_month_and_keeps_exact_dates(route_cache):
+    first, _ = generate_transport_suggestions(_criteria(), {"FLIGHT", "TRAIN"})
+    second, _ = generate_transport_suggestions(_criteria(date="2026-12-20", travelers=1, origin="New Delhi"), {"TRAIN", "FLIGHT"})
+    generate_transport_suggestions(_criteria(date="2027-01-03"), {"FLIGHT", "TRAIN"})
+
+    assert len(route_cache) == 3  # December Delhi (2), December New Delhi (1), January Delhi (2)
+    generate_transport_suggestions(_criteria(date="2026-12-28"), {"FLIGHT", "TRAIN"})
+    assert len(route_cache) == 3
+    assert first["flights"][0]["price"] == second["flights"][0]["price"] == 5400
+    assert "2026-12-20" in unquote_plus(second["trains"][0]["booking_url"])
+
+
+def test_concurrent_misses_for_a_route_call_the_model_once(route_cache):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(generate_transport_suggestions(_criteria(), {"FLIGHT"})[0]))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(route_cache) == 1
+    assert [options["flights"][0]["provider"] for options in results] == ["IndiGo"] * 6
+
+
+def test_other_process_fill_is_awaited_instead_of_duplicated(route_cache, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(transport_service, "get_redis_client", lambda: client)
+    key = transport_service.route_key(_criteria(), {"FLIGHT"})
+    client.set(transport_service.FILL_LOCK_PREFIX + key[len(transport_service.CACHE_PREFIX):], "other", ex=30)
+
+    def _other_process_finishes():
+        time.sleep(0.3)
+        client.setex(key, 60, json.dumps({"flights": [{"provider": "Akasa", "price": 4100}], "trains": []}))
+
+    threading.Thread(target=_other_process_finishes).start()
+    options, _ = generate_transport_suggestions(_criteria(), {"FLIGHT"})
+
+    assert route_cache == []
+    assert options["flights"][0]["provider"] == "Akasa"
+
+
+def test_prewarm_fills_most_requested_upcoming_routes(route_cache):
+    db = FakeFirestore()
+    sessions = [("Delhi", "Goa", "2099-05-02")] * 3 + [("Mumbai", "Jaipur", None)] * 2 + [("Pune", "Goa", "2001-01-01")] * 4
+    for index, (origin, destination, date) in enumerate(sessions):
+        db.collection("planner_sessions").document(f"s{index}").set(
+            {
+                "created_at": f"2026-10-{index + 1:02d}T00:00:00",
+                "input": {"origin": origin, "destination": destination, "start_date": date, "travelers": 2},
+            }
+        )
+
+    with installed(db):
+        routes = transport_service.popular_routes(limit=5)
+        assert [(criteria["origin"], count) for criteria, _modes, count in routes] == [("Delhi", 3), ("Mumbai", 2)]
+        assert transport_service.prewarm_routes(limit=5) == 2
+        assert transport_service.prewarm_routes(limit=5) == 0
+
+    generate_transport_suggestions(_criteria(date="2099-05-20"), {"FLIGHT", "TRAIN"})
+    assert len(route_cache) == 2
+
+
+def test_known_city_pairs_use_offline_matrix_without_the_model(route_cache, monkeypatch):
+    monkeypatch.delenv("TRANSPORT_MODEL_ESTIMATES")
+
+    options, warnings = generate_transport_suggestions(_criteria(destination="Goa"), {"FLIGHT", "TRAIN"})
+    short, _ = generate_transport_suggestions(_criteria(origin="Mumbai", destination="Pune"), {"FLIGHT", "TRAIN"})
+    generate_transport_suggestions(_criteria(origin="India", destination="Goa"), {"TRAIN"})
+
+    assert len(route_cache) == 1  # only the pair the matrix cannot place
+    assert warnings == []
+    assert options["flights"][0]["arrival"] == "Panaji"
+    assert options["flights"][0]["price"] < options["flights"][-1]["price"]
+    assert short["flights"] == [] and short["trains"]
+    assert short["trains"][0]["price"] < options["trains"][-1]["price"]
@@ -1,5 +1,6 @@
 import { Calendar, Clock, MapPin, Navigation, User } from "lucide-react";
 import { motion } from "motion/react";
+import Button from "../ui/Button";
 import Card from "../ui/Card";
 import { formatDate } from "../../utils/dateUtils";
 import StatusBadge from "../ui/StatusBadge";
@@ -11,6 +12,9 @@ export default function RideHistoryTable({
   rides = [],
   travelerView = true,
   loading = false,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
 }) {
   if (loading) {
     return <TableSkeleton columns={5} rows={6} />;
@@ -56,7 +60,7 @@ export default function RideHistoryTable({
                   <motion.tr
                     initial={{ opacity: 0, y: 10 }}
                     animate={{ opacity: 1, y: 0 }}
-                    transition={{ duration: 0.2, delay: index * 0.05 }}
+                    transition={{ duration: 0.2, delay: Math.min(index, 10) * 0.05 }}
                     key={ride.id}
                     className="hover:bg-surface-hover/30 transition-colors"
                   >
@@ -130,6 +134,20 @@ export default function RideHistoryTable({
           </table>
         </div>
       )}
+
+      {hasMore && onLoadMore && (
+        <div className="p-4 border-t border-border flex justify-center">
+          <Button
+            variant="secondary"
+            size="sm"
+            loading={loadingMore}
+            loadingText="Loading..."
+            onClick={onLoadMore}
+          >
+            Load more
+          </Button>
+        </div>
+      )}
     </Card>
   );
 }
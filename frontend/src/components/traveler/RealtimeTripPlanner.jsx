@@ -70,6 +70,7 @@ export default function RealtimeTripPlanner() {
     error: socketError,
     subscribeSession,
     unsubscribeSession,
+    deliverEvent,
   } = usePlannerSocket(true);
 
   const sortedProgress = useMemo(
@@ -86,42 +87,82 @@ export default function RealtimeTripPlanner() {
     const onProgress = (payload) => {
       if (sessionId && payload?.session_id && payload.session_id !== sessionId)
         return;
-      setSessionStatus(payload?.status || "RUNNING");
-      setProgressEvents((prev) => [
-        ...prev,
-        {
-          stage: payload?.stage,
-          status: payload?.status,
-          message: payload?.message,
-          elapsed_ms: payload?.elapsed_ms || 0,
-        },
-      ]);
+      deliverEvent(payload, () => {
+        setSessionStatus(payload?.status || "RUNNING");
+        setProgressEvents((prev) => [
+          ...prev,
+          {
+            stage: payload?.stage,
+            status: payload?.status,
+            message: payload?.message,
+            elapsed_ms: payload?.elapsed_ms || 0,
+          },
+        ]);
+      });
     };
 
     const onToken = (payload) => {
       if (sessionId && payload?.session_id && payload.session_id !== sessionId)
         return;
-      if (payload?.chunk) {
-        setStreamText((prev) => `${prev}${payload.chunk}`);
-      }
+      deliverEvent(payload, () => {
+        if (payload?.chunk) {
+          setStreamText((prev) => `${prev}${payload.chunk}`);
+        }
+      });
     };
 
     const onComplete = (payload) => {
       if (sessionId && payload?.session_id && payload.session_id !== sessionId)
         return;
-      setSessionStatus(payload?.status || "COMPLETED");
-      setResult(payload?.result || null);
+      deliverEvent(payload, () => {
+        setSessionStatus(payload?.status || "COMPLETED");
+        setResult(payload?.result || null);
+      });
     };
 
     const onPlannerError = (payload) => {
       if (sessionId && payload?.session_id && payload.session_id !== sessionId)
         return;
-      setSessionStatus(payload?.status || "FAILED");
-      setError(payload?.error?.message || "Planner session failed.");
+      deliverEvent(payload, () => {
+        setSessionStatus(payload?.status || "FAILED");
+        setError(payload?.error?.message || "Planner session failed.");
+      });
     };
 
-    const onCancelled = () => {
-      setSessionStatus("CANCELLED");
+    const onCancelled = (payload) => {
+      deliverEvent(payload, () => setSessionStatus("CANCELLED"));
+    };
+
+    // The server no longer holds every event we missed; rebuild from the stored session.
+    const onResync = async (payload) => {
+      const targetId = payload?.session_id || sessionId;
+      if (!targetId || (sessionId && targetId !== sessionId)) return;
+      try {
+        const res = await api.get(`/ai/planner/sessions/${targetId}`);
+        const data = res?.data?.data || {};
+        const events = data.events || [];
+        if (data.status) setSessionStatus(data.status);
+        setStreamText(
+          data.stream_text ||
+            events
+              .filter((item) => item.type === "token")
+              .map((item) => item.chunk || "")
+              .join(""),
+        );
+        if (data.result_json) setResult(data.result_json);
+        setProgressEvents(
+          events
+            .filter((item) => item.type === "progress")
+            .map((item) => ({
+              stage: item.stage,
+              status: item.status,
+              message: item.message,
+              elapsed_ms: item.elapsed_ms,
+            })),
+        );
+      } catch {
+        setError("Could not refresh planner session details.");
+      }
     };
 
     socket.on("planner:progress", onProgress);
@@ -129,6 +170,7 @@ export default function RealtimeTripPlanner() {
     socket.on("planner:complete", onComplete);
     socket.on("planner:error", onPlannerError);
     socket.on("planner:cancelled", onCancelled);
+    socket.on("planner:resync", onResync);
 
     return () => {
       socket.off("planner:progress", onProgress);
@@ -136,8 +178,9 @@ export default function RealtimeTripPlanner() {
       socket.off("planner:complete", onComplete);
       socket.off("planner:error", onPlannerError);
       socket.off("planner:cancelled", onCancelled);
+      socket.off("planner:resync", onResync);
     };
-  }, [socket, sessionId]);
+  }, [socket, sessionId, deliverEvent]);
 
   useEffect(
     () => () => {
@@ -190,37 +233,6 @@ export default function RealtimeTripPlanner() {
       setSessionId(createdId || "");
       if (createdId) {
         subscribeSession(createdId);
-        // Auto-refresh after a delay to catch any events missed before subscribing
-        setTimeout(async () => {
-          try {
-            const refreshRes = await api.get(
-              `/ai/planner/sessions/${createdId}`,
-            );
-            const refreshData = refreshRes?.data?.data || {};
-            if (refreshData.status && refreshData.status !== "QUEUED") {
-              setSessionStatus(refreshData.status);
-            }
-            if (refreshData.stream_text) {
-              setStreamText(refreshData.stream_text);
-            }
-            if (refreshData.result_json) {
-              setResult(refreshData.result_json);
-            }
-            const evts = (refreshData.events || [])
-              .filter((item) => item.type === "progress")
-              .map((item) => ({
-                stage: item.stage,
-                status: item.status,
-                message: item.message,
-                elapsed_ms: item.elapsed_ms,
-              }));
-            if (evts.length > 0) {
-              setProgressEvents(evts);
-            }
-          } catch {
-            /* ignore */
-          }
-        }, 5000);
       }
     } catch (err) {
       setError(
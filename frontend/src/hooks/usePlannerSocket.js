@@ -9,6 +9,21 @@ function getSocketBaseUrl() {
   return apiBase.endsWith("/api") ? apiBase.slice(0, -4) : apiBase;
 }
 
+// Wait this long for an out-of-order gap to fill before asking for a replay.
+const GAP_REPLAY_DELAY_MS = 1500;
+
+function sequenceFor(sequences, sessionId) {
+  if (!sequences[sessionId]) {
+    sequences[sessionId] = { next: 1, pending: new Map(), gapTimer: null };
+  }
+  return sequences[sessionId];
+}
+
+function lastAppliedSeq(sequences, sessionId) {
+  const next = sequences[sessionId]?.next;
+  return next ? next - 1 : 0;
+}
+
 export function usePlannerSocket(enabled = true) {
   const { currentUser } = useAuth();
   const [socket, setSocket] = useState(null);
@@ -16,6 +31,11 @@ export function usePlannerSocket(enabled = true) {
   const [error, setError] = useState("");
   const socketRef = useRef(null);
   const reconnectTriedRef = useRef(false);
+  // Per session: next seq to apply, early events held back by seq, and the gap
+  // timer. Events are applied strictly in seq order; next - 1 is sent on
+  // (re)subscribe so the server replays only what we missed.
+  const sequencesRef = useRef({});
+  const activeSessionRef = useRef("");
   const socketUrl = useMemo(() => getSocketBaseUrl(), []);
 
   useEffect(() => {
@@ -46,6 +66,25 @@ export function usePlannerSocket(enabled = true) {
           setConnected(true);
           setError("");
           reconnectTriedRef.current = false;
+          // Room membership does not survive a reconnect; rejoin and catch up.
+          const activeSession = activeSessionRef.current;
+          if (activeSession) {
+            localSocket.emit("planner:subscribe", {
+              session_id: activeSession,
+              last_seq: lastAppliedSeq(sequencesRef.current, activeSession),
+            });
+          }
+        });
+
+        // The server no longer holds the missing events; the page reloads the
+        // session over REST, so stop waiting for them.
+        localSocket.on("planner:resync", (payload) => {
+          const state = sequencesRef.current[payload?.session_id];
+          if (!state) return;
+          clearTimeout(state.gapTimer);
+          state.gapTimer = null;
+          state.pending.clear();
+          state.next = null;
         });
 
         localSocket.on("disconnect", (reason) => {
@@ -79,6 +118,10 @@ export function usePlannerSocket(enabled = true) {
     setup();
     return () => {
       isCancelled = true;
+      Object.values(sequencesRef.current).forEach((state) => {
+        clearTimeout(state.gapTimer);
+        state.gapTimer = null;
+      });
       if (localSocket) {
         localSocket.disconnect();
       }
@@ -91,10 +134,15 @@ export function usePlannerSocket(enabled = true) {
   const subscribeSession = useCallback((sessionId) => {
     if (!socketRef.current || !sessionId) return;
     console.debug("[PlannerSocket] subscribing to session=%s", sessionId);
-    socketRef.current.emit("planner:subscribe", { session_id: sessionId });
+    activeSessionRef.current = sessionId;
+    socketRef.current.emit("planner:subscribe", {
+      session_id: sessionId,
+      last_seq: lastAppliedSeq(sequencesRef.current, sessionId),
+    });
     // Log all incoming planner events for this session for debugging
     const debugEvents = [
       "planner:subscribed",
+      "planner:resync",
       "planner:progress",
       "planner:token",
       "planner:complete",
@@ -118,14 +166,58 @@ export function usePlannerSocket(enabled = true) {
 
   const unsubscribeSession = useCallback((sessionId) => {
     if (!socketRef.current || !sessionId) return;
+    if (activeSessionRef.current === sessionId) activeSessionRef.current = "";
     socketRef.current.emit("planner:unsubscribe", { session_id: sessionId });
   }, []);
 
+  // Applies planner events in seq order: duplicates (live and again in a
+  // replay) are dropped, early ones wait for the gap to fill, and a gap that
+  // does not fill triggers a re-subscribe from the last applied seq.
+  const deliverEvent = useCallback((payload, apply) => {
+    const sessionId = payload?.session_id;
+    const seq = payload?.seq;
+    if (!sessionId || typeof seq !== "number") {
+      apply(payload);
+      return;
+    }
+    const state = sequenceFor(sequencesRef.current, sessionId);
+    if (state.next === null) state.next = seq;
+    if (seq < state.next || state.pending.has(seq)) return;
+    if (seq > state.next) {
+      state.pending.set(seq, () => apply(payload));
+      if (!state.gapTimer) {
+        state.gapTimer = setTimeout(() => {
+          state.gapTimer = null;
+          if (state.pending.size && socketRef.current) {
+            socketRef.current.emit("planner:subscribe", {
+              session_id: sessionId,
+              last_seq: lastAppliedSeq(sequencesRef.current, sessionId),
+            });
+          }
+        }, GAP_REPLAY_DELAY_MS);
+      }
+      return;
+    }
+    apply(payload);
+    state.next = seq + 1;
+    while (state.pending.has(state.next)) {
+      const applyPending = state.pending.get(state.next);
+      state.pending.delete(state.next);
+      applyPending();
+      state.next += 1;
+    }
+    if (!state.pending.size && state.gapTimer) {
+      clearTimeout(state.gapTimer);
+      state.gapTimer = null;
+    }
+  }, []);
+
   return {
     socket,
     connected,
     error,
     subscribeSession,
     unsubscribeSession,
+    deliverEvent,
   };
 }
@@ -37,6 +37,8 @@ export default function BusinessRides() {
   const [history, setHistory] = useState([]);
   const [currentRide, setCurrentRide] = useState(null);
   const [loadingHistory, setLoadingHistory] = useState(true);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [loadingMoreHistory, setLoadingMoreHistory] = useState(false);
   const [quotePrice, setQuotePrice] = useState("");
   const [quoteNote, setQuoteNote] = useState("");
   const [error, setError] = useState("");
@@ -68,6 +70,7 @@ export default function BusinessRides() {
       const res = await api.get("/rides/driver");
       const rides = res?.data?.data || [];
       setHistory(rides);
+      setHistoryCursor(res?.data?.pagination?.next_cursor || null);
       const active =
         rides.find((ride) => ACTIVE_STATUSES.includes(ride.status)) || null;
       setCurrentRide(active);
@@ -80,6 +83,28 @@ export default function BusinessRides() {
     }
   }, [toast]);
 
+  const loadMoreHistory = useCallback(async () => {
+    if (!historyCursor) return;
+    try {
+      setLoadingMoreHistory(true);
+      const res = await api.get(
+        `/rides/driver?cursor=${encodeURIComponent(historyCursor)}`,
+      );
+      const rides = res?.data?.data || [];
+      setHistory((prev) => [
+        ...prev,
+        ...rides.filter((ride) => !prev.some((item) => item.id === ride.id)),
+      ]);
+      setHistoryCursor(res?.data?.pagination?.next_cursor || null);
+    } catch (err) {
+      const message = err?.response?.data?.message || "Failed to load more rides.";
+      setError(message);
+      toast.error("Rides", message);
+    } finally {
+      setLoadingMoreHistory(false);
+    }
+  }, [historyCursor, toast]);
+
   useEffect(() => {
     if (businessType === "CAB_DRIVER") {
       fetchHistory();
@@ -528,7 +553,14 @@ export default function BusinessRides() {
         <PageSectionSkeleton titleWidthClass="w-40" blocks={1} blockHeightClass="h-72" />
       ) : (
         <motion.div initial={{ opacity: 0 }} animate={{ opacity: 1 }} transition={{ delay: 0.2 }}>
-          <RideHistoryTable title="Ride History" rides={history} travelerView={false} />
+          <RideHistoryTable
+            title="Ride History"
+            rides={history}
+            travelerView={false}
+            hasMore={Boolean(historyCursor)}
+            loadingMore={loadingMoreHistory}
+            onLoadMore={loadMoreHistory}
+          />
         </motion.div>
       )}
 
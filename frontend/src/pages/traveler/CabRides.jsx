@@ -45,6 +45,8 @@ export default function CabRides() {
   const [activeRide, setActiveRide] = useState(null);
   const [onlineDriversCount, setOnlineDriversCount] = useState(0);
   const [loadingHistory, setLoadingHistory] = useState(true);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [loadingMoreHistory, setLoadingMoreHistory] = useState(false);
   const [searching, setSearching] = useState(false);
   const [quoteActionLoading, setQuoteActionLoading] = useState(false);
   const [ratingStars, setRatingStars] = useState(0);
@@ -119,6 +121,7 @@ export default function CabRides() {
       const res = await api.get("/rides/traveler");
       const rides = res?.data?.data || [];
       setHistory(rides);
+      setHistoryCursor(res?.data?.pagination?.next_cursor || null);
       const current =
         rides.find((r) => ACTIVE_STATUSES.includes(r.status)) || null;
       setActiveRide(current);
@@ -133,6 +136,26 @@ export default function CabRides() {
     }
   }, [notifyError]);
 
+  const loadMoreHistory = useCallback(async () => {
+    if (!historyCursor) return;
+    try {
+      setLoadingMoreHistory(true);
+      const res = await api.get(
+        `/rides/traveler?cursor=${encodeURIComponent(historyCursor)}`,
+      );
+      const rides = res?.data?.data || [];
+      setHistory((prev) => [
+        ...prev,
+        ...rides.filter((ride) => !prev.some((item) => item.id === ride.id)),
+      ]);
+      setHistoryCursor(res?.data?.pagination?.next_cursor || null);
+    } catch (err) {
+      notifyError(err?.response?.data?.message || "Failed to load more rides.");
+    } finally {
+      setLoadingMoreHistory(false);
+    }
+  }, [historyCursor, notifyError]);
+
   useEffect(() => {
     fetchHistory();
   }, [fetchHistory]);
@@ -879,7 +902,14 @@ export default function CabRides() {
           animate={{ opacity: 1 }}
           transition={{ delay: 0.2 }}
         >
-          <RideHistoryTable title="Ride History" rides={history} travelerView />
+          <RideHistoryTable
+            title="Ride History"
+            rides={history}
+            travelerView
+            hasMore={Boolean(historyCursor)}
+            loadingMore={loadingMoreHistory}
+            onLoadMore={loadMoreHistory}
+          />
         </motion.div>
       )}
 